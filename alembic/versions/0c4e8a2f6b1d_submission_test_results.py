@@ -0,0 +1,42 @@
+"""Add submission_test_results
+
+Revision ID: 0c4e8a2f6b1d
+Revises: f3a8d2c6e1b9
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c4e8a2f6b1d'
+down_revision: Union[str, Sequence[str], None] = 'f3a8d2c6e1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('submission_test_results',
+    sa.Column('submission_id', sa.Integer(), nullable=False),
+    sa.Column('test_case_id', sa.Integer(), nullable=False),
+    sa.Column('case_hash', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'accepted', 'wrong_answer', 'error', name='statusenum', create_type=False),
+              nullable=False),
+    sa.Column('execution_time_ms', sa.Float(), nullable=True),
+    sa.Column('judged_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['submission_id'], ['submissions.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('submission_id', 'test_case_id')
+    )
+    op.create_index('ix_submission_test_results_test_case_id', 'submission_test_results', ['test_case_id'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_submission_test_results_test_case_id', table_name='submission_test_results')
+    op.drop_table('submission_test_results')
@@ -0,0 +1,42 @@
+"""Add matches and submissions.match_id
+
+Revision ID: 3c1f0b7d9a2e
+Revises: 6be4b6c6a71b
+Create Date: 2026-10-18 05:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0b7d9a2e'
+down_revision: Union[str, Sequence[str], None] = '6be4b6c6a71b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('matches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('ended_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('submissions') as batch_op:
+        batch_op.add_column(sa.Column('match_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_submissions_match_id_matches', 'matches', ['match_id'], ['id'])
+        batch_op.create_index('ix_submissions_match_id', ['match_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('submissions') as batch_op:
+        batch_op.drop_index('ix_submissions_match_id')
+        batch_op.drop_constraint('fk_submissions_match_id_matches', type_='foreignkey')
+        batch_op.drop_column('match_id')
+    op.drop_table('matches')
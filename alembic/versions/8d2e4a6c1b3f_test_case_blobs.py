@@ -0,0 +1,37 @@
+"""Reference large test case data in the blob store
+
+Revision ID: 8d2e4a6c1b3f
+Revises: 3c1f0b7d9a2e
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4a6c1b3f'
+down_revision: Union[str, Sequence[str], None] = '3c1f0b7d9a2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('test_cases') as batch_op:
+        batch_op.add_column(sa.Column('input_blob', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('expected_output_blob', sa.String(length=64), nullable=True))
+        batch_op.alter_column('input', existing_type=sa.Text(), nullable=True)
+        batch_op.alter_column('expected_output', existing_type=sa.Text(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Test cases stored in the blob store have to be moved back inline before downgrading
+    with op.batch_alter_table('test_cases') as batch_op:
+        batch_op.alter_column('expected_output', existing_type=sa.Text(), nullable=False)
+        batch_op.alter_column('input', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('expected_output_blob')
+        batch_op.drop_column('input_blob')
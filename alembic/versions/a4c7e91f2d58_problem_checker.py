@@ -0,0 +1,32 @@
+"""Add problems.checker and problems.checker_tolerance
+
+Revision ID: a4c7e91f2d58
+Revises: 8d2e4a6c1b3f
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7e91f2d58'
+down_revision: Union[str, Sequence[str], None] = '8d2e4a6c1b3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('problems') as batch_op:
+        batch_op.add_column(sa.Column('checker', sa.String(length=30), nullable=False, server_default='whitespace'))
+        batch_op.add_column(sa.Column('checker_tolerance', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('problems') as batch_op:
+        batch_op.drop_column('checker_tolerance')
+        batch_op.drop_column('checker')
@@ -0,0 +1,33 @@
+"""Add indexes for the submission history, problem statistics and problem bank
+
+Revision ID: b9e3f5a1c7d4
+Revises: a4c7e91f2d58
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e3f5a1c7d4'
+down_revision: Union[str, Sequence[str], None] = 'a4c7e91f2d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_submissions_user_id_submitted_at', 'submissions', ['user_id', 'submitted_at', 'id'], unique=False)
+    op.create_index('ix_submissions_problem_id_status', 'submissions', ['problem_id', 'status'], unique=False)
+    op.create_index('ix_test_cases_problem_id_is_hidden', 'test_cases', ['problem_id', 'is_hidden'], unique=False)
+    op.create_index('ix_problems_difficulty_id', 'problems', ['difficulty', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_problems_difficulty_id', table_name='problems')
+    op.drop_index('ix_test_cases_problem_id_is_hidden', table_name='test_cases')
+    op.drop_index('ix_submissions_problem_id_status', table_name='submissions')
+    op.drop_index('ix_submissions_user_id_submitted_at', table_name='submissions')
@@ -0,0 +1,32 @@
+"""Add problems.content_hash
+
+Revision ID: d5a1e7c3b8f2
+Revises: c2d8f4b6a9e1
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a1e7c3b8f2'
+down_revision: Union[str, Sequence[str], None] = 'c2d8f4b6a9e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('problems') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_problems_content_hash', ['content_hash'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('problems') as batch_op:
+        batch_op.drop_constraint('uq_problems_content_hash', type_='unique')
+        batch_op.drop_column('content_hash')
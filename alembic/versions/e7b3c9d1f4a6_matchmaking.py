@@ -0,0 +1,61 @@
+"""Add users.rating, matches.problem_id, match_players and match_tickets
+
+Revision ID: e7b3c9d1f4a6
+Revises: d5a1e7c3b8f2
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c9d1f4a6'
+down_revision: Union[str, Sequence[str], None] = 'd5a1e7c3b8f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('rating', sa.Float(), nullable=False, server_default='1200'))
+    with op.batch_alter_table('matches') as batch_op:
+        batch_op.add_column(sa.Column('problem_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_matches_problem_id_problems', 'problems', ['problem_id'], ['id'])
+    op.create_table('match_players',
+    sa.Column('match_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('rating_before', sa.Float(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=True),
+    sa.Column('rating_after', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['match_id'], ['matches.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('match_id', 'user_id')
+    )
+    op.create_index('ix_match_players_user_id', 'match_players', ['user_id'], unique=False)
+    op.create_table('match_tickets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    # The enum type exists since the initial schema
+    sa.Column('difficulty', sa.Enum('easy', 'medium', 'hard', name='difficultyenum', create_type=False),
+              nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('match_tickets')
+    op.drop_index('ix_match_players_user_id', table_name='match_players')
+    op.drop_table('match_players')
+    with op.batch_alter_table('matches') as batch_op:
+        batch_op.drop_constraint('fk_matches_problem_id_problems', type_='foreignkey')
+        batch_op.drop_column('problem_id')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('rating')
@@ -0,0 +1,37 @@
+"""Add submission_sketches
+
+Revision ID: f3a8d2c6e1b9
+Revises: e7b3c9d1f4a6
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d2c6e1b9'
+down_revision: Union[str, Sequence[str], None] = 'e7b3c9d1f4a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('submission_sketches',
+    sa.Column('problem_id', sa.Integer(), nullable=False),
+    sa.Column('language', sa.String(length=30), nullable=False),
+    sa.Column('metric', sa.String(length=30), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('last_submission_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['problem_id'], ['problems.id'], ),
+    sa.PrimaryKeyConstraint('problem_id', 'language', 'metric')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('submission_sketches')
@@ -0,0 +1,118 @@
+"""!
+@file common.py
+@brief Result files and baseline comparison shared by the benchmarks
+@details Every benchmark writes one JSON document: the configuration it ran with and one entry of
+         measurements per case. compare() checks a run against a stored baseline and lists the cases
+         that got slower than the tolerance allows. Baselines are only comparable when they were
+         recorded on the same machine with the same configuration.
+"""
+
+from typing import Dict, List, Sequence
+import json
+import math
+import os
+import platform
+import sys
+
+## @brief Directory of the benchmarks and their stored baselines
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+## @brief Directory holding the application modules
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "src")
+
+## @brief Relative slowdown tolerated before a case counts as regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """!
+    @brief Nearest-rank percentile
+    @param sorted_values Sequence[float]: Measurements in ascending order
+    @param fraction float: The percentile as fraction, e.g. 0.95
+    @return float: The percentile, 0 without measurements
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values), math.ceil(fraction * len(sorted_values))) - 1)]
+
+
+def summarize_latencies(latencies_s: List[float]) -> Dict[str, float]:
+    """!
+    @brief Latency percentiles of a case
+    @param latencies_s list[float]: Latencies in seconds
+    @return dict: p50_ms, p95_ms, p99_ms and max_ms
+    """
+    values = sorted(latencies_s)
+    return {
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def environment() -> dict:
+    """!
+    @brief Description of the machine a benchmark ran on
+    """
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def write_results(results: dict, path: str):
+    """!
+    @brief Write a benchmark result document, "-" for stdout
+    """
+    text = json.dumps(results, indent=2, sort_keys=True) + "\n"
+    if path == "-":
+        sys.stdout.write(text)
+        return
+    with open(path, "w") as output:
+        output.write(text)
+
+
+def load_results(path: str) -> dict:
+    """!
+    @brief Read a benchmark result document
+    """
+    with open(path) as source:
+        return json.load(source)
+
+
+def compare(results: dict, baseline: dict, lower_is_better: Sequence[str], higher_is_better: Sequence[str],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """!
+    @brief Compare a run with a baseline
+    @details Cases or metrics missing from either side are ignored. A differing configuration is
+             reported as a regression, since the numbers cannot be compared.
+    @param results dict: The current run
+    @param baseline dict: The stored baseline
+    @param lower_is_better Sequence[str]: Metrics that regress when they grow, e.g. p95_ms
+    @param higher_is_better Sequence[str]: Metrics that regress when they shrink, e.g. throughput_rps
+    @param tolerance float: Relative change tolerated
+    @return list[str]: One line per regression, empty if there is none
+    """
+    if results.get("config") != baseline.get("config"):
+        return [f"configuration differs from the baseline: {results.get('config')} != {baseline.get('config')}"]
+    regressions = []
+    for case, current in sorted(results.get("cases", {}).items()):
+        reference = baseline.get("cases", {}).get(case)
+        if reference is None:
+            continue
+        for metric in lower_is_better:
+            if metric in current and metric in reference and current[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{case}: {metric} {current[metric]} > baseline {reference[metric]}")
+        for metric in higher_is_better:
+            if metric in current and metric in reference and current[metric] < reference[metric] * (1 - tolerance):
+                regressions.append(f"{case}: {metric} {current[metric]} < baseline {reference[metric]}")
+    return regressions
+
+
+def report(results: dict, columns: Sequence[str]):
+    """!
+    @brief Print the cases of a run as a table
+    """
+    cases = results.get("cases", {})
+    width = max([len("case")] + [len(case) for case in cases])
+    print("case".ljust(width) + "".join(column.rjust(16) for column in columns))
+    for case, values in cases.items():
+        print(case.ljust(width) + "".join(str(values.get(column, "")).rjust(16) for column in columns))
@@ -0,0 +1,263 @@
+"""!
+@file load_test.py
+@brief Load test of the API against a throwaway database
+@details Creates a fresh database (a temporary SQLite file unless --database-url names a throwaway
+         PostgreSQL database), applies the migrations, imports a small problem pack and starts the
+         API with uvicorn. Then every scenario sends --requests requests, at most --concurrency at a
+         time, and reports throughput and latency percentiles:
+
+             register      POST /register with new users
+             login         POST /login of the registered users
+             me            GET /me
+             problem       GET /problems/{problem_id}
+             submit        POST /submissions with distinct code; judge_throughput_sps covers judging
+             leaderboard   GET /leaderboards/global and /leaderboards/problems/{problem_id}
+
+         Run from the repository root (needs httpx, see benchmarks/requirements.txt):
+
+             python benchmarks/load_test.py [--concurrency 32] [--requests 500] [--output results.json]
+                                            [--baseline benchmarks/baseline_load.json]
+
+         Exits with 1 if a scenario got slower than the baseline by more than the tolerance. Register
+         and login are bound by bcrypt, set BCRYPT_ROUNDS the same way for the run and the baseline.
+"""
+
+from typing import Awaitable, Callable, List
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from common import (
+    BENCHMARKS_DIR, DEFAULT_TOLERANCE, SRC_DIR, compare, environment, load_results, report, summarize_latencies,
+    write_results
+)
+
+## @brief Scenarios in the order they run, later ones use the users and problems of earlier ones
+SCENARIOS = ("register", "login", "me", "problem", "submit", "leaderboard")
+
+## @brief Metrics that regress when they grow
+LOWER_IS_BETTER = ("p95_ms", "p99_ms")
+
+## @brief Metrics that regress when they shrink
+HIGHER_IS_BETTER = ("throughput_rps", "judge_throughput_sps")
+
+## @brief Seconds to wait for the API to start and for the judge to finish
+STARTUP_TIMEOUT_S = 60
+JUDGE_TIMEOUT_S = 600
+
+## @brief Accepted solution of the benchmark problem
+SOLUTION = "a, b = map(int, input().split())\nprint(a + b)\n"
+
+
+class Scenario:
+    """!
+    @brief Runs one kind of request at a fixed concurrency and records its latencies
+    """
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self.client = client
+        self.concurrency = concurrency
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    async def run(self, count: int, request: Callable[[int], Awaitable[httpx.Response]]) -> dict:
+        """!
+        @brief Send count requests built by request(i), at most concurrency at a time
+        @return dict: Requests, errors, throughput and latency percentiles
+        """
+        self.latencies, self.errors = [], 0
+        next_index = iter(range(count))
+
+        async def worker():
+            for index in next_index:
+                started = time.perf_counter()
+                try:
+                    response = await request(index)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                self.latencies.append(time.perf_counter() - started)
+                self.errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, count))))
+        elapsed = time.perf_counter() - started
+        return {"requests": count, "errors": self.errors, "throughput_rps": round(count / elapsed, 2),
+                **summarize_latencies(self.latencies)}
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def prepare(env: dict, workdir: str) -> None:
+    """!
+    @brief Apply the migrations and import the benchmark problem
+    """
+    repository = os.path.dirname(BENCHMARKS_DIR)
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=repository, env=env, check=True,
+                   capture_output=True)
+    pack = os.path.join(workdir, "pack.jsonl")
+    with open(pack, "w") as output:
+        output.write(json.dumps({
+            "title": "Sum", "description": "Add two numbers", "difficulty": "easy",
+            "test_cases": [{"input": f"{i} {i * 7}\n", "expected_output": f"{i * 8}\n", "is_hidden": i > 0}
+                           for i in range(10)],
+        }) + "\n")
+    subprocess.run([sys.executable, os.path.join(repository, "scripts", "import_problems.py"), pack],
+                   cwd=repository, env=env, check=True, capture_output=True)
+
+
+async def wait_for(client: httpx.AsyncClient, server: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("the API exited during startup")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("the API did not start")
+
+
+async def wait_for_judge(client: httpx.AsyncClient, headers: dict):
+    deadline = time.monotonic() + JUDGE_TIMEOUT_S
+    while time.monotonic() < deadline:
+        stats = (await client.get("/judge/stats", headers=headers)).json()
+        if stats["queued"] == 0 and stats["inflight"] == 0:
+            return
+        await asyncio.sleep(0.1)
+    raise RuntimeError("the judge did not finish")
+
+
+async def run_scenarios(base_url: str, server: subprocess.Popen, args) -> dict:
+    cases = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await wait_for(client, server)
+        scenario = Scenario(client, args.concurrency)
+        run_id = secrets.token_hex(3)
+        users = max(1, min(args.requests, args.users))
+        tokens = [None] * users
+
+        async def register(i):
+            response = await client.post("/register", json={
+                "username": f"bench_{run_id}_{i}", "email": f"bench_{run_id}_{i}@example.com", "password": "benchmark"
+            })
+            if response.status_code == 201:
+                tokens[i] = response.json()["access_token"]
+            return response
+
+        # Every later scenario needs the users, so they are registered even if register is skipped
+        registered = await scenario.run(users, register)
+        if "register" in args.scenarios:
+            cases["register"] = registered
+        headers = [{"Authorization": f"Bearer {token}"} for token in tokens if token is not None]
+        if not headers:
+            raise RuntimeError("registering the benchmark users failed")
+        problem_id = (await client.get("/problems", params={"limit": 1})).json()["items"][0]["id"]
+
+        if "login" in args.scenarios:
+            cases["login"] = await scenario.run(args.requests, lambda i: client.post("/login", json={
+                "username": f"bench_{run_id}_{i % users}", "password": "benchmark"
+            }))
+        if "me" in args.scenarios:
+            cases["me"] = await scenario.run(args.requests, lambda i: client.get("/me", headers=headers[i % len(headers)]))
+        if "problem" in args.scenarios:
+            cases["problem"] = await scenario.run(args.requests, lambda i: client.get(f"/problems/{problem_id}"))
+        if "submit" in args.scenarios:
+            started = time.perf_counter()
+            cases["submit"] = await scenario.run(args.requests, lambda i: client.post("/submissions", json={
+                # Distinct code per submission, so the verdict cache does not answer
+                "problem_id": problem_id, "language": "python", "code": f"{SOLUTION}# {run_id} {i}\n"
+            }, headers=headers[i % len(headers)]))
+            await wait_for_judge(client, headers[0])
+            cases["submit"]["judge_throughput_sps"] = round(args.requests / (time.perf_counter() - started), 2)
+        if "leaderboard" in args.scenarios:
+            cases["leaderboard"] = await scenario.run(args.requests, lambda i: client.get(
+                "/leaderboards/global" if i % 2 else f"/leaderboards/problems/{problem_id}"
+            ))
+    return cases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("@details")[0].strip(' !"\n'))
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at a time")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--users", type=int, default=100, help="users registered and used by the scenarios")
+    parser.add_argument("--scenario", dest="scenarios", action="append", choices=SCENARIOS,
+                        help="run only this scenario, may be repeated")
+    parser.add_argument("--database-url", default=None, help="throwaway database, a temporary SQLite file by default")
+    parser.add_argument("--judge-workers", type=int, default=2, help="judge worker processes of the API")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file, - for stdout")
+    parser.add_argument("--baseline", default=None, help="compare with this result file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative slowdown tolerated")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    workdir = tempfile.mkdtemp(prefix="coderunner-bench-")
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "SECRET_KEY": secrets.token_hex(32),
+        "PYTHONPATH": SRC_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "JUDGE_WORKERS": str(args.judge_workers),
+        "JUDGE_CACHE_DIR": os.path.join(workdir, "cache"),
+        "BLOB_STORE_DIR": os.path.join(workdir, "blobs"),
+        # The submit scenario measures throughput with a single user, not the admission control
+        "JUDGE_USER_RATE": "1000000",
+        "JUDGE_USER_BURST": "1000000",
+        "JUDGE_USER_MAX_QUEUED": "1000000",
+    })
+    server = None
+    try:
+        prepare(env, workdir)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:create_app", "--factory", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=SRC_DIR, env=env,
+        )
+        cases = asyncio.run(run_scenarios(f"http://127.0.0.1:{port}", server, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "benchmark": "load",
+        "config": {"concurrency": args.concurrency, "requests": args.requests, "users": args.users,
+                   "judge_workers": args.judge_workers, "bcrypt_rounds": int(os.getenv("BCRYPT_ROUNDS", 12)),
+                   "database": "sqlite" if args.database_url is None else args.database_url.split(":")[0]},
+        "environment": environment(),
+        "cases": {name: cases[name] for name in SCENARIOS if name in cases},
+    }
+    report(results, ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors"))
+    if args.output:
+        write_results(results, args.output)
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), LOWER_IS_BETTER, HIGHER_IS_BETTER,
+                              args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
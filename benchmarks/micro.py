@@ -0,0 +1,122 @@
+"""!
+@file micro.py
+@brief Micro-benchmarks of the per-request authentication and serialization work
+@details Times the code every authenticated request runs, in process and without a database:
+         issuing a token, decoding it as get_current_user() does on a cache miss, resolving a
+         principal from the principal cache and validating the /me response. Run from the repository
+         root:
+
+             python benchmarks/micro.py [--output results.json] [--baseline benchmarks/baseline_micro.json]
+
+         Exits with 1 if a case is slower than the baseline by more than the tolerance.
+"""
+
+from datetime import datetime
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from common import DEFAULT_TOLERANCE, SRC_DIR, compare, environment, load_results, report, write_results
+
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-sufficient-length-0123456789")
+
+import jwt  # noqa: E402
+
+from auth.auth import ALGORITHM, SECRET_KEY, create_access_token  # noqa: E402
+from auth.principal_cache import Principal, principal_cache, token_claims  # noqa: E402
+from dependencies import resolve_principal  # noqa: E402
+from models.models import User  # noqa: E402
+from models.schemas import UserResponse  # noqa: E402
+
+## @brief Default seconds each case is measured for
+MICRO_MIN_TIME_S = 1.0
+
+## @brief Metrics that regress when they grow, the best round is the least sensitive to noise
+LOWER_IS_BETTER = ("best_us",)
+
+
+def measure(function, min_time: float) -> dict:
+    """!
+    @brief Call a function in rounds until min_time passed
+    @param function callable: Function running one operation
+    @param min_time float: Seconds to measure for
+    @return dict: Operations per second, mean and best round time per operation in microseconds
+    """
+    # Size rounds to about 10 ms so the timer overhead does not count
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= 0.01:
+            break
+        number *= 2
+    rounds = []
+    deadline = time.perf_counter() + min_time
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - started) / number)
+    mean = sum(rounds) / len(rounds)
+    return {"ops_per_s": round(1 / mean), "mean_us": round(mean * 1e6, 3), "best_us": round(min(rounds) * 1e6, 3)}
+
+
+def cases() -> dict:
+    """!
+    @brief The benchmarked operations by name
+    """
+    user = User(id=1, username="benchmark", email="benchmark@example.com", hashed_password="x",
+                created_at=datetime(2026, 1, 1), is_admin=False)
+    claims = token_claims(user)
+    token = create_access_token(claims)
+    loop = asyncio.new_event_loop()
+
+    def resolve_cached():
+        # The principal cache is warm, as for every request but the first of a token
+        loop.run_until_complete(resolve_principal(token))
+
+    principal_cache.put_token(token, jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+    principal = Principal.from_user(user)
+    principal_cache.put_user(principal)
+    return {
+        "create_access_token": lambda: create_access_token(claims),
+        "jwt_decode": lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+        "resolve_principal_cached": resolve_cached,
+        "user_response_model_validate": lambda: UserResponse.model_validate(user),
+        "me_response_model_validate": lambda: UserResponse.model_validate(principal),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("@details")[0].strip(' !"\n'))
+    parser.add_argument("--min-time", type=float, default=MICRO_MIN_TIME_S, help="seconds per case")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file, - for stdout")
+    parser.add_argument("--baseline", default=None, help="compare with this result file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative slowdown tolerated")
+    parser.add_argument("--only", action="append", help="run only this case, may be repeated")
+    args = parser.parse_args()
+
+    results = {"benchmark": "micro", "config": {}, "environment": environment(), "cases": {}}
+    for name, function in cases().items():
+        if args.only and name not in args.only:
+            continue
+        results["cases"][name] = measure(function, args.min_time)
+
+    report(results, ("ops_per_s", "mean_us", "best_us"))
+    if args.output:
+        write_results(results, args.output)
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), LOWER_IS_BETTER, (), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
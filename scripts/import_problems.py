@@ -0,0 +1,49 @@
+"""!
+@file import_problems.py
+@brief Import a problem pack into the problem bank
+@details Reads a JSONL pack or a pack directory (see src/problems/importer.py) and writes it in
+         batches, printing progress after every batch. Problems imported before are skipped, so an
+         interrupted import is resumed by running the same command again. Run from the repository
+         root with the environment of the API (DATABASE_URL, BLOB_STORE_DIR):
+
+             python scripts/import_problems.py <pack> [--check]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from problems.importer import PackError, import_problems, read_pack  # noqa: E402
+
+
+def print_progress(report):
+    print(f"{report.read} read, {report.imported} imported, {report.skipped} skipped, {report.invalid} invalid, "
+          f"{report.test_cases} test cases, {report.seconds:.1f} s", flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("@details")[0].strip(' !"\n'))
+    parser.add_argument("pack", help="JSONL file or pack directory")
+    parser.add_argument("--check", action="store_true", help="only validate the pack, write nothing")
+    args = parser.parse_args()
+
+    if args.check:
+        count = invalid = 0
+        for location, record in read_pack(args.pack):
+            count += 1
+            if isinstance(record, PackError):
+                invalid += 1
+                print(f"{location}: {record}")
+        print(f"{count} record(s), {invalid} invalid")
+        return 1 if invalid else 0
+
+    report = import_problems(read_pack(args.pack), on_progress=print_progress)
+    for error in report.errors:
+        print(error)
+    return 1 if report.invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
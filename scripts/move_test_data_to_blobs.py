@@ -0,0 +1,63 @@
+"""!
+@file move_test_data_to_blobs.py
+@brief Move large test case data out of the database into the blob store
+@details Rewrites every test case whose input or expected output exceeds BLOB_INLINE_MAX_BYTES so it
+         references a blob instead (see src/judge/blob_store.py). Test cases are loaded one at a time,
+         so the script runs in bounded memory, and running it again skips test cases already moved.
+         Run from the repository root with the environment of the API (DATABASE_URL, BLOB_STORE_DIR):
+
+             python scripts/move_test_data_to_blobs.py [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sqlalchemy import func, or_, select  # noqa: E402
+
+from database import SessionLocal  # noqa: E402
+from judge.blob_store import BLOB_INLINE_MAX_BYTES, get_blob_store  # noqa: E402
+from models.models import TestCase  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("@details")[0].strip(' !"\n'))
+    parser.add_argument("--dry-run", action="store_true", help="only list the test cases that would move")
+    args = parser.parse_args()
+
+    store = get_blob_store()
+    db = SessionLocal()
+    try:
+        ids = db.execute(
+            select(TestCase.id)
+            .where(or_(func.length(TestCase.input) > BLOB_INLINE_MAX_BYTES,
+                       func.length(TestCase.expected_output) > BLOB_INLINE_MAX_BYTES))
+            .order_by(TestCase.id)
+        ).scalars().all()
+        for test_case_id in ids:
+            if args.dry_run:
+                print(f"test case {test_case_id}")
+                continue
+            test_case = db.get(TestCase, test_case_id)
+            moved = []
+            for column in ("input", "expected_output"):
+                text = getattr(test_case, column)
+                if text is not None and len(text.encode()) > BLOB_INLINE_MAX_BYTES:
+                    key = store.put(text.encode())
+                    setattr(test_case, f"{column}_blob", key)
+                    setattr(test_case, column, None)
+                    moved.append(f"{column} -> {key}")
+            db.commit()
+            # Drop the loaded text right away instead of keeping every moved test case in the session
+            db.expunge(test_case)
+            print(f"test case {test_case_id}: {', '.join(moved)}")
+    finally:
+        db.close()
+    print(f"{len(ids)} test case(s) {'to move' if args.dry_run else 'moved'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
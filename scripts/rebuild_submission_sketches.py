@@ -0,0 +1,47 @@
+"""!
+@file rebuild_submission_sketches.py
+@brief Recompute the submission sketches from the accepted submissions
+@details The API keeps the sketches up to date by itself. Rebuild them after a crash, to count
+         verdicts lost since the last flush, or after changing SKETCH_RELATIVE_ACCURACY. Stop the API
+         first, it would write its own sketches back on shutdown. Run from the repository root with the
+         environment of the API (DATABASE_URL):
+
+             python scripts/rebuild_submission_sketches.py
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from analysis.service import REBUILD_BATCH_SIZE, SketchStore, accepted_submissions, write_statements  # noqa: E402
+from database import get_engine  # noqa: E402
+from models.models import SubmissionSketch  # noqa: E402
+
+
+def main() -> int:
+    argparse.ArgumentParser(description=__doc__.split("@details")[0].strip(' !"\n')).parse_args()
+    engine = get_engine()
+    store = SketchStore()
+    counted = 0
+    with engine.connect() as connection:
+        while True:
+            rows = connection.execute(accepted_submissions(store.last_submission_id, REBUILD_BATCH_SIZE)).all()
+            for row in rows:
+                store.record(row.id, row.problem_id, row.language,
+                             {"execution_time_ms": row.execution_time_ms, "memory_usage_mb": row.memory_usage_mb})
+            counted += len(rows)
+            if len(rows) < REBUILD_BATCH_SIZE:
+                break
+    _, rows = store.take_dirty()
+    with engine.begin() as connection:
+        connection.execute(SubmissionSketch.__table__.delete())
+        if rows:
+            connection.execute(write_statements()[1], rows)
+    print(f"counted {counted} accepted submissions in {len(rows)} sketches")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
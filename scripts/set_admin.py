@@ -0,0 +1,44 @@
+"""!
+@file set_admin.py
+@brief Grant or revoke the admin privileges of a user
+@details Admins may edit the problem bank through the API. Run from the repository root with the
+         environment of the API (DATABASE_URL):
+
+             python scripts/set_admin.py <username> [--revoke]
+
+         Running API processes pick the change up after at most AUTH_PRINCIPAL_CACHE_TTL_S. With
+         AUTH_TRUST_TOKEN_CLAIMS enabled it applies to tokens issued after the change only.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from database import SessionLocal  # noqa: E402
+from auth.user_service import get_user_by_username  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("@details")[0].strip(' !"\n'))
+    parser.add_argument("username", help="the user to change")
+    parser.add_argument("--revoke", action="store_true", help="revoke instead of grant")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = get_user_by_username(db, args.username)
+        if user is None:
+            print(f"user {args.username} not found", file=sys.stderr)
+            return 1
+        user.is_admin = not args.revoke
+        db.commit()
+    finally:
+        db.close()
+    print(f"user {args.username} is {'no longer ' if args.revoke else ''}an admin")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
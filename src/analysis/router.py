@@ -0,0 +1,59 @@
+"""!
+@file router.py
+@brief Post-match analysis API routes
+@details Tells where an accepted submission stands among all accepted submissions of its problem
+         in the same language, for execution time and memory, from the submission sketches.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analysis.service import METRICS, SubmissionStatsService
+from auth.principal_cache import Principal
+from database import get_async_db
+from dependencies import get_current_user, get_submission_stats
+from judge.submission_service import get_submission
+from models.models import StatusEnum
+from models.schemas import SubmissionAnalysis
+
+router = APIRouter(tags=["analysis"])
+
+
+@router.get("/submissions/{submission_id}/analysis", response_model=SubmissionAnalysis,
+            response_model_exclude_none=True)
+async def get_submission_analysis(
+    submission_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    stats: SubmissionStatsService = Depends(get_submission_stats)
+):
+    """!
+    @brief Compare one of the current user's accepted submissions with the other accepted ones
+    @details For execution time and memory reports the share of accepted submissions of the same
+             problem and language that needed more (beats_percent) and the p50, p90 and p99 among them.
+             Values are accurate to SKETCH_RELATIVE_ACCURACY.
+    @param submission_id int: The id of the submission
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param stats SubmissionStatsService: The submission statistics of the application
+    @return SubmissionAnalysis: The analysis of every metric the submission has a value for
+    @throws HTTPException: 404 if the submission does not exist or belongs to another user, 409 if it is not accepted, 503 while the statistics are loaded
+    """
+    db_submission = await get_submission(db, submission_id)
+    if db_submission is None or db_submission.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if db_submission.status != StatusEnum.accepted:
+        raise HTTPException(status_code=409, detail="Only accepted submissions are analysed")
+    if not stats.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Submission statistics are being loaded, please try again shortly",
+            headers={"Retry-After": "2"}
+        )
+    return {
+        "submission_id": db_submission.id,
+        "problem_id": db_submission.problem_id,
+        "language": db_submission.language,
+        **{metric: stats.describe(db_submission.problem_id, db_submission.language, metric,
+                                  getattr(db_submission, metric)) for metric in METRICS},
+    }
@@ -0,0 +1,315 @@
+"""!
+@file service.py
+@brief Per-problem, per-language percentiles of accepted submissions
+@details Keeps a sketch (see analysis/sketch.py) of execution_time_ms and one of memory_usage_mb
+         per problem and language, so "faster than 87% of accepted submissions" is an O(1) lookup
+         instead of a sort over the submissions table. The judge service reports every stored verdict
+         and accepted submissions are added to the sketches of their problem and language. Verdicts
+         changed by a rejudge take the previous values of the submission out of its sketches again.
+
+         Changed sketches are written to the submission_sketches table every SKETCH_FLUSH_S seconds
+         and on shutdown, a few hundred bytes each. On startup the sketches are loaded and the accepted
+         submissions above the highest submission id they count are replayed, without stored
+         sketches everything is rebuilt from the submissions table. A crash loses the verdicts
+         that were judged out of id order since the last flush;
+         scripts/rebuild_submission_sketches.py recomputes the sketches exactly.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import bisect
+import logging
+import os
+
+from sqlalchemy import bindparam, select
+
+from analysis.sketch import LogHistogram
+from database import AsyncSessionLocal
+from models.models import StatusEnum, Submission, SubmissionSketch
+
+logger = logging.getLogger(__name__)
+
+## @brief Seconds between writes of changed sketches
+SKETCH_FLUSH_S = float(os.getenv("SKETCH_FLUSH_S", 30))
+
+## @brief Accepted submissions fetched per round trip while rebuilding
+REBUILD_BATCH_SIZE = 5000
+
+## @brief Submission columns with a sketch
+METRICS = ("execution_time_ms", "memory_usage_mb")
+
+## @brief Quantiles reported next to the rank of a value
+REPORTED_QUANTILES = (("p50", 0.50), ("p90", 0.90), ("p99", 0.99))
+
+SketchKey = Tuple[int, str, str]
+
+
+class SketchStore:
+    """!
+    @brief The sketches by problem, language and metric
+    @details Shared by the statistics service and the rebuild script. Not thread-safe.
+    """
+
+    def __init__(self):
+        self.sketches: Dict[SketchKey, LogHistogram] = {}
+        self.dirty: Set[SketchKey] = set()
+        self.last_submission_id = 0
+
+    def record(self, submission_id: int, problem_id: int, language: str, values: Dict[str, Optional[float]]):
+        """!
+        @brief Count an accepted submission
+        @param submission_id int: The id of the submission
+        @param problem_id int: Its problem
+        @param language str: Its language
+        @param values dict[str, float|None]: The value of every metric, None if unknown
+        """
+        for metric in METRICS:
+            value = values.get(metric)
+            if value is None:
+                continue
+            key = (problem_id, language, metric)
+            sketch = self.sketches.get(key)
+            if sketch is None:
+                sketch = self.sketches[key] = LogHistogram()
+            sketch.add(value)
+            self.dirty.add(key)
+        self.last_submission_id = max(self.last_submission_id, submission_id)
+
+    def forget(self, problem_id: int, language: str, values: Dict[str, Optional[float]]):
+        """!
+        @brief Stop counting a submission that was counted with record()
+        @param problem_id int: Its problem
+        @param language str: Its language
+        @param values dict[str, float|None]: The values it was recorded with
+        """
+        for metric in METRICS:
+            value = values.get(metric)
+            sketch = self.sketches.get((problem_id, language, metric))
+            if value is None or sketch is None:
+                continue
+            sketch.remove(value)
+            self.dirty.add((problem_id, language, metric))
+
+    def get(self, problem_id: int, language: str, metric: str) -> Optional[LogHistogram]:
+        """!
+        @brief The sketch of a problem, language and metric
+        @return LogHistogram|None: The sketch, None if no accepted submission was counted
+        """
+        return self.sketches.get((problem_id, language, metric))
+
+    def load(self, rows: Iterable):
+        """!
+        @brief Take stored sketches over
+        @param rows Iterable: Rows of submission_sketches
+        """
+        for row in rows:
+            try:
+                self.sketches[(row.problem_id, row.language, row.metric)] = LogHistogram.from_bytes(row.data)
+            except ValueError:
+                logger.warning("Dropping unreadable sketch of problem %d %s %s", row.problem_id, row.language,
+                               row.metric)
+                continue
+            self.last_submission_id = max(self.last_submission_id, row.last_submission_id)
+
+    def take_dirty(self) -> Tuple[List[SketchKey], List[dict]]:
+        """!
+        @brief The rows of the sketches changed since the last call
+        @return tuple[list, list[dict]]: The keys of the changed sketches and their submission_sketches rows
+        """
+        keys, self.dirty = list(self.dirty), set()
+        return keys, [{
+            "problem_id": problem_id, "language": language, "metric": metric,
+            "count": self.sketches[(problem_id, language, metric)].count,
+            "data": self.sketches[(problem_id, language, metric)].to_bytes(),
+            "last_submission_id": self.last_submission_id,
+        } for problem_id, language, metric in keys]
+
+
+def accepted_submissions(after_id: int, limit: int):
+    """!
+    @brief Query of a batch of accepted submissions in id order, as replayed into the sketches
+    """
+    return (
+        select(Submission.id, Submission.problem_id, Submission.language,
+               Submission.execution_time_ms, Submission.memory_usage_mb)
+        .where(Submission.status == StatusEnum.accepted, Submission.id > after_id)
+        .order_by(Submission.id)
+        .limit(limit)
+    )
+
+
+def write_statements():
+    """!
+    @brief Statements replacing stored sketches, executed with the rows of SketchStore.take_dirty()
+    @return tuple: The DELETE and the INSERT statement
+    """
+    table = SubmissionSketch.__table__
+    remove = table.delete().where(table.c.problem_id == bindparam("problem_id"),
+                                  table.c.language == bindparam("language"),
+                                  table.c.metric == bindparam("metric"))
+    return remove, table.insert()
+
+
+class SubmissionStatsService:
+    """!
+    @brief Sketches of the accepted submissions of the application
+    @details Must be used from the event loop. While the sketches are loaded, reported submissions
+             are buffered and applied afterwards, except for the ones the replay of the submissions
+             table already read: a sketch counts every value it is given, so they would count twice.
+    """
+
+    def __init__(self):
+        self.store = SketchStore()
+        self.ready = False
+        self._buffer: Optional[list] = None
+        self._task = None
+
+    def start(self):
+        """!
+        @brief Load the sketches in the background and write changed ones periodically
+        """
+        self._buffer = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """!
+        @brief Stop writing periodically and write the changed sketches
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.ready:
+            await self.flush()
+
+    def on_judged(self, submission: Submission, result):
+        """!
+        @brief Judge service listener, counts accepted submissions
+        @param submission Submission: The judged submission with its stored verdict
+        @param result JudgeResult: The verdict
+        """
+        if submission.status != StatusEnum.accepted:
+            return
+        self._apply((submission.id, submission.problem_id, submission.language, _values(submission), None))
+
+    def on_rejudged(self, submission: Submission, previous):
+        """!
+        @brief Judge service rejudge listener, replaces the values of a rejudged accepted submission
+        @param submission Submission: The rejudged submission with its stored verdict
+        @param previous StoredVerdict: Its verdict before the rejudge
+        """
+        if previous.status != StatusEnum.accepted:
+            return
+        added = _values(submission) if submission.status == StatusEnum.accepted else None
+        self._apply((submission.id, submission.problem_id, submission.language, added, _values(previous)))
+
+    def describe(self, problem_id: int, language: str, metric: str, value: Optional[float]) -> Optional[dict]:
+        """!
+        @brief Where a value stands among the accepted submissions of a problem and language
+        @param problem_id int: The problem
+        @param language str: The language
+        @param metric str: execution_time_ms or memory_usage_mb
+        @param value float|None: The value of a submission
+        @return dict|None: The value, the share of accepted submissions with a higher value in
+                percent (ties count half) and the quantiles; None without value or sketch
+        """
+        sketch = self.store.get(problem_id, language, metric)
+        if value is None or sketch is None or sketch.count == 0:
+            return None
+        return {
+            "value": value,
+            "beats_percent": round(100.0 * (sketch.count - sketch.rank(value)) / sketch.count, 1),
+            "accepted": sketch.count,
+            **{name: round(sketch.quantile(fraction), 3) for name, fraction in REPORTED_QUANTILES},
+        }
+
+    async def flush(self):
+        """!
+        @brief Write the sketches changed since the last flush in one transaction
+        """
+        keys, rows = self.store.take_dirty()
+        if not rows:
+            return
+        remove, add = write_statements()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(remove, rows)
+                await db.execute(add, rows)
+                await db.commit()
+        except Exception:
+            logger.exception("Writing %d submission sketches failed, retrying with the next flush", len(rows))
+            self.store.dirty.update(keys)
+
+    def stats(self) -> dict:
+        """!
+        @brief Number of sketches and unwritten changes
+        """
+        return {"ready": self.ready, "sketches": len(self.store.sketches), "dirty": len(self.store.dirty)}
+
+    async def _run(self):
+        stored_up_to, replayed = 0, array("q")
+        try:
+            stored_up_to = await self._load(replayed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Loading the submission sketches failed, continuing with live updates only")
+        buffered, self._buffer = self._buffer, None
+        for submission_id, problem_id, language, added, removed in buffered:
+            position = bisect.bisect_left(replayed, submission_id)
+            if position < len(replayed) and replayed[position] == submission_id:
+                # The replay read the verdict as it is now
+                continue
+            if submission_id > stored_up_to:
+                # Neither the stored sketches nor the replay counted the previous values
+                removed = None
+            self._apply((submission_id, problem_id, language, added, removed))
+        self.ready = True
+        while True:
+            await asyncio.sleep(SKETCH_FLUSH_S)
+            await self.flush()
+
+    def _apply(self, entry: tuple):
+        # (submission id, problem id, language, values to count or None, values to stop counting or None)
+        if self._buffer is not None:
+            self._buffer.append(entry)
+            return
+        submission_id, problem_id, language, added, removed = entry
+        if removed is not None:
+            self.store.forget(problem_id, language, removed)
+        if added is not None:
+            self.store.record(submission_id, problem_id, language, added)
+
+    async def _load(self, replayed: array) -> int:
+        """!
+        @brief Load the stored sketches and replay the accepted submissions they do not count
+        @param replayed array: Receives the ids of the replayed submissions in ascending order
+        @return int: The highest submission id counted by the stored sketches
+        """
+        async with AsyncSessionLocal() as db:
+            self.store.load((await db.execute(select(SubmissionSketch))).scalars())
+        stored = len(self.store.sketches)
+        stored_up_to = self.store.last_submission_id
+        while True:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    accepted_submissions(self.store.last_submission_id, REBUILD_BATCH_SIZE)
+                )).all()
+            for row in rows:
+                self.store.record(row.id, row.problem_id, row.language,
+                                  {"execution_time_ms": row.execution_time_ms, "memory_usage_mb": row.memory_usage_mb})
+                replayed.append(row.id)
+            if len(rows) < REBUILD_BATCH_SIZE:
+                break
+            # Let requests run between batches
+            await asyncio.sleep(0)
+        logger.info("Loaded %d submission sketches and replayed %d accepted submissions", stored, len(replayed))
+        return stored_up_to
+
+
+def _values(verdict) -> Dict[str, Optional[float]]:
+    """!
+    @brief The sketched metrics of a Submission or StoredVerdict
+    """
+    return {metric: getattr(verdict, metric) for metric in METRICS}
@@ -0,0 +1,187 @@
+"""!
+@file sketch.py
+@brief Mergeable log-bucketed histogram for percentiles of execution time and memory
+@details Values are counted in logarithmic buckets: bucket i holds the values between
+         SKETCH_MIN_VALUE * gamma^(i-1) and SKETCH_MIN_VALUE * gamma^i with
+         gamma = (1 + accuracy) / (1 - accuracy), so every value is known to a relative accuracy of
+         SKETCH_RELATIVE_ACCURACY, as in DDSketch or an HDR histogram. Values below SKETCH_MIN_VALUE
+         share bucket 0, values above SKETCH_MAX_VALUE the last bucket, so a sketch never holds more
+         than a few hundred buckets however many values it counts.
+
+         Sketches with the same parameters are merged by adding their counts. rank() answers "how many
+         values are below this one" in O(1) from a cumulative array that is rebuilt on the first
+         lookup after a change.
+"""
+
+from array import array
+from typing import Dict, Optional
+import math
+import os
+import struct
+import zlib
+
+## @brief Relative accuracy of the recorded values
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("SKETCH_RELATIVE_ACCURACY", 0.02))
+
+## @brief Smallest value told apart from 0, and the largest one told apart from each other
+SKETCH_MIN_VALUE = 1e-3
+SKETCH_MAX_VALUE = 1e6
+
+## @brief Format version of to_bytes()
+_FORMAT = 1
+
+
+class LogHistogram:
+    """!
+    @brief Counts of values in logarithmic buckets
+    @details Not thread-safe, the statistics service only uses it from the event loop.
+    """
+
+    __slots__ = ("gamma", "_log_gamma", "max_index", "counts", "count", "_cumulative", "_lowest")
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, gamma: Optional[float] = None):
+        self.gamma = gamma or (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_index = 1 + int(math.log(SKETCH_MAX_VALUE / SKETCH_MIN_VALUE) / self._log_gamma)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self._cumulative: Optional[array] = None
+        self._lowest = 0
+
+    def index(self, value: float) -> int:
+        """!
+        @brief Bucket of a value
+        @param value float: The value
+        @return int: The bucket index, 0 for values up to SKETCH_MIN_VALUE
+        """
+        if value <= SKETCH_MIN_VALUE:
+            return 0
+        return min(1 + int(math.log(value / SKETCH_MIN_VALUE) / self._log_gamma), self.max_index)
+
+    def value(self, index: int) -> float:
+        """!
+        @brief Representative value of a bucket, within the relative accuracy of all its values
+        @param index int: The bucket index
+        @return float: The value
+        """
+        if index <= 0:
+            return 0.0
+        return SKETCH_MIN_VALUE * self.gamma ** (index - 1) * (1 + self.gamma) / 2
+
+    def add(self, value: float, count: int = 1):
+        """!
+        @brief Count a value
+        @param value float: The value
+        @param count int: How often it occurred
+        """
+        bucket = self.index(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += count
+        self._cumulative = None
+
+    def remove(self, value: float, count: int = 1):
+        """!
+        @brief Stop counting a value that was counted before
+        @details Only the bucket of the value is known, so any value of the same bucket is removed.
+        @param value float: The value
+        @param count int: How often it occurred
+        """
+        bucket = self.index(value)
+        left = self.counts.get(bucket, 0) - count
+        if left > 0:
+            self.counts[bucket] = left
+        else:
+            self.counts.pop(bucket, None)
+        self.count = max(self.count - count, 0)
+        self._cumulative = None
+
+    def merge(self, other: "LogHistogram"):
+        """!
+        @brief Add the counts of another sketch with the same accuracy
+        @param other LogHistogram: The other sketch
+        @throws ValueError: If the accuracies differ
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("sketches of different accuracy cannot be merged")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self._cumulative = None
+
+    def rank(self, value: float) -> float:
+        """!
+        @brief Number of counted values below a value
+        @details Values in the same bucket count half, as ties.
+        @param value float: The value
+        @return float: Values below it, between 0 and count
+        """
+        if self.count == 0:
+            return 0.0
+        cumulative = self._cumulative
+        if cumulative is None:
+            cumulative = self._build_cumulative()
+        position = self.index(value) - self._lowest
+        if position < 0:
+            return 0.0
+        if position >= len(cumulative) - 1:
+            return float(self.count)
+        below = cumulative[position]
+        return below + (cumulative[position + 1] - below) / 2
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """!
+        @brief Value at a quantile
+        @param fraction float: The quantile as fraction, e.g. 0.99
+        @return float|None: The value, None for an empty sketch
+        """
+        if self.count == 0:
+            return None
+        target = fraction * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > target:
+                return self.value(bucket)
+        return self.value(max(self.counts))
+
+    def to_bytes(self) -> bytes:
+        """!
+        @brief Compact serialization: format, accuracy and the non-empty buckets, compressed
+        @return bytes: The serialized sketch, usually a few hundred bytes
+        """
+        buckets = sorted(self.counts)
+        payload = array("I", buckets).tobytes() + array("Q", (self.counts[b] for b in buckets)).tobytes()
+        return struct.pack("<Bd", _FORMAT, self.gamma) + zlib.compress(payload)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LogHistogram":
+        """!
+        @brief Read a sketch written by to_bytes()
+        @param data bytes: The serialized sketch
+        @return LogHistogram: The sketch
+        @throws ValueError: If the data is not a sketch of a known format
+        """
+        header = struct.calcsize("<Bd")
+        version, gamma = struct.unpack("<Bd", data[:header])
+        if version != _FORMAT:
+            raise ValueError(f"unknown sketch format {version}")
+        sketch = cls(gamma=gamma)
+        payload = zlib.decompress(data[header:])
+        size = len(payload) // (array("I").itemsize + array("Q").itemsize)
+        buckets, counts = array("I"), array("Q")
+        buckets.frombytes(payload[:size * buckets.itemsize])
+        counts.frombytes(payload[size * buckets.itemsize:])
+        sketch.counts = dict(zip(buckets, counts))
+        sketch.count = sum(counts)
+        return sketch
+
+    def _build_cumulative(self) -> array:
+        # cumulative[i] holds the values in the buckets below self._lowest + i
+        self._lowest = min(self.counts)
+        cumulative = array("Q", [0]) * (max(self.counts) - self._lowest + 2)
+        for bucket, count in self.counts.items():
+            cumulative[bucket - self._lowest + 1] += count
+        for position in range(1, len(cumulative)):
+            cumulative[position] += cumulative[position - 1]
+        self._cumulative = cumulative
+        return cumulative
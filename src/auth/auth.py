@@ -5,20 +5,45 @@
          for user authentication in the CodeRunner application.
 """
 
-from passlib.context import CryptContext
+from typing import Optional, Tuple
 import jwt
 from datetime import datetime, timedelta, timezone
 import os
 
+from monitoring.metrics import PASSWORD_HASH_SECONDS
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable is not set. The application cannot start without it.")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-## @brief Password hashing context using bcrypt
-## @details Configured with bcrypt scheme for secure password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+## @brief bcrypt cost factor of new hashes, every increment doubles the hashing time
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+## @brief Password hashing context, created on first use by get_pwd_context()
+_pwd_context = None
+
+
+def get_pwd_context():
+    """!
+    @brief Password hashing context using bcrypt
+    @details Configured with bcrypt scheme for secure password hashing. Stored hashes with another
+             cost factor are flagged for an upgrade on the next successful login. passlib is only
+             imported here, so processes that never hash a password do not pay for it.
+    @return CryptContext: The shared hashing context
+    """
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=BCRYPT_ROUNDS,
+            bcrypt__min_rounds=BCRYPT_ROUNDS,
+            bcrypt__max_rounds=BCRYPT_ROUNDS,
+        )
+    return _pwd_context
 
 
 def hash_password(password: str) -> str:
@@ -28,7 +53,9 @@ def hash_password(password: str) -> str:
     @param password str: The plain text password to hash
     @return str: The hashed password string
     """
-    return pwd_context.hash(password)
+    context = get_pwd_context()
+    with PASSWORD_HASH_SECONDS.labels("hash").time():
+        return context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -39,7 +66,32 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     @param hashed_password str: The stored hashed password to compare against
     @return bool: True if password matches, False otherwise
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    context = get_pwd_context()
+    with PASSWORD_HASH_SECONDS.labels("verify").time():
+        return context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """!
+    @brief Verify a password and rehash it if the stored hash uses an outdated cost factor
+    @param plain_password str: The plain text password to verify
+    @param hashed_password str: The stored hashed password to compare against
+    @return tuple[bool, str|None]: Whether the password matches and the replacement hash, None if the
+            stored hash is up to date
+    """
+    context = get_pwd_context()
+    with PASSWORD_HASH_SECONDS.labels("verify").time():
+        return context.verify_and_update(plain_password, hashed_password)
+
+
+def dummy_verify_password():
+    """!
+    @brief Spend the time of a password verification without a stored hash
+    @details Used for unknown usernames so that failed logins take the same time either way
+    """
+    context = get_pwd_context()
+    with PASSWORD_HASH_SECONDS.labels("verify").time():
+        context.dummy_verify()
 
 
 def create_access_token(data: dict):
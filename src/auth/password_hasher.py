@@ -0,0 +1,104 @@
+"""!
+@file password_hasher.py
+@brief Bounded executor for password hashing
+@details bcrypt is deliberately slow, a single hash takes a few hundred milliseconds of CPU time.
+         Running it on the event loop stalls every other request of the server process, so all
+         hashing goes through a thread pool sized to the CPU cores (bcrypt releases the GIL while
+         hashing). Requests beyond the pool and a bounded waiting line are rejected right away
+         instead of piling up, so a burst of logins cannot freeze the API.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import os
+
+from auth.auth import hash_password, verify_and_update_password, dummy_verify_password
+
+## @brief Number of threads hashing passwords, defaults to the number of CPU cores
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", os.cpu_count() or 1))
+
+## @brief Maximum number of hashing requests waiting for a free thread
+AUTH_HASH_QUEUE_SIZE = int(os.getenv("AUTH_HASH_QUEUE_SIZE", 64))
+
+
+class PasswordHasherBusy(Exception):
+    """!
+    @brief Raised when a hashing request cannot be accepted because all threads and the queue are busy
+    """
+
+
+class PasswordHasher:
+    """!
+    @brief Thread pool with admission control for bcrypt hashing and verification
+    @details Must be used from a single event loop, the admission counter is not thread-safe.
+    """
+
+    def __init__(self, workers: int = AUTH_HASH_WORKERS, queue_size: int = AUTH_HASH_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        """!
+        @brief Hash a new password
+        @param password str: The plain text password
+        @return str: The bcrypt hash
+        @throws PasswordHasherBusy: If the hasher is saturated
+        """
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """!
+        @brief Verify a password and compute an upgraded hash if the stored one is outdated
+        @details Without a stored hash (unknown user) a dummy verification is run, so the response
+                 time does not reveal whether a username exists.
+        @param password str: The plain text password
+        @param hashed_password str|None: The stored hash, None if the user does not exist
+        @return tuple[bool, str|None]: Whether the password matches and the new hash to store, if any
+        @throws PasswordHasherBusy: If the hasher is saturated
+        """
+        if hashed_password is None:
+            await self._run(dummy_verify_password)
+            return False, None
+        return await self._run(verify_and_update_password, password, hashed_password)
+
+    def prepare(self, function):
+        """!
+        @brief Run a warm-up function on a hashing thread without waiting for it
+        @param function callable: Function without arguments, e.g. building the hashing context
+        """
+        self._executor.submit(function)
+
+    def stats(self) -> dict:
+        """!
+        @brief Current load of the hasher
+        @return dict: Pool size, pending, completed and rejected requests
+        """
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """!
+        @brief Stop the hashing threads after the running requests finished
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _run(self, function, *args):
+        if self._pending >= self.capacity:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        finally:
+            self._pending -= 1
+            self.completed += 1
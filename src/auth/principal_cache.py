@@ -0,0 +1,251 @@
+"""!
+@file principal_cache.py
+@brief In-process cache of authenticated principals
+@details Resolving the user behind a bearer token costs a JWT decode and a database round trip. Both
+         results are kept in bounded LRU maps with a time to live: decoded tokens map to a user id
+         until they expire, user ids map to the user's public fields. Changes to a user made through
+         the ORM invalidate its entry when they are flushed and once more when the session commits,
+         so a request reading the user in between cannot keep the old state cached. Writers updating
+         users with Core or bulk statements, which the ORM events do not see, register the users with
+         invalidate_after_commit(). Other processes see the changes after at most the TTL.
+
+         With AUTH_TRUST_TOKEN_CLAIMS enabled the principal is built from the signed token claims
+         and the database is never consulted. A deleted or renamed user then keeps the old identity
+         until the token expires.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models.models import User
+
+## @brief Seconds a resolved user stays cached
+AUTH_PRINCIPAL_CACHE_TTL_S = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_S", 60))
+
+## @brief Maximum number of cached users and of cached tokens
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", 10000))
+
+## @brief Build principals from the signed token claims instead of loading the user
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() in ("1", "true", "yes")
+
+## @brief Key of the ids of users changed in a transaction in Session.info
+_CHANGED_USERS = "principal_cache_changed_users"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """!
+    @brief Public fields of an authenticated user
+    @details Detached from any database session, so it can be shared between requests.
+    """
+    id: int
+    username: str
+    email: str
+    created_at: datetime
+    is_admin: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, username=user.username, email=user.email, created_at=user.created_at,
+                   is_admin=bool(user.is_admin))
+
+    @classmethod
+    def from_claims(cls, claims: dict) -> Optional["Principal"]:
+        """!
+        @brief Build a principal from the claims of a token issued by token_claims()
+        @return Principal|None: The principal, None if the token lacks the user claims
+        """
+        try:
+            return cls(
+                id=int(claims["sub"]),
+                username=claims["username"],
+                email=claims["email"],
+                created_at=datetime.fromisoformat(claims["created_at"]),
+                is_admin=bool(claims.get("admin", False)),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+def token_claims(user: User) -> dict:
+    """!
+    @brief Claims identifying a user in an access token
+    @param user User: The authenticated user
+    @return dict: The subject and the public user fields
+    """
+    return {
+        "sub": str(user.id),
+        "username": user.username,
+        "email": user.email,
+        "created_at": user.created_at.isoformat(),
+        "admin": bool(user.is_admin),
+    }
+
+
+class _TTLCache:
+    """!
+    @brief Thread-safe LRU map whose entries expire
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PrincipalCache:
+    """!
+    @brief Cache of decoded tokens and resolved users
+    """
+
+    def __init__(self, ttl: float = AUTH_PRINCIPAL_CACHE_TTL_S, max_entries: int = AUTH_PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self._tokens = _TTLCache(max_entries)
+        self._users = _TTLCache(max_entries)
+        self.counters = {"token_hits": 0, "token_misses": 0, "user_hits": 0, "user_misses": 0, "invalidations": 0}
+
+    def get_token(self, token: str) -> Optional[dict]:
+        """!
+        @brief Claims of an already verified token
+        @param token str: The encoded token
+        @return dict|None: The decoded claims, None if the token was not verified recently
+        """
+        claims = self._tokens.get(token)
+        self.counters["token_hits" if claims is not None else "token_misses"] += 1
+        return claims
+
+    def put_token(self, token: str, claims: dict):
+        """!
+        @brief Remember the claims of a verified token until the token or the TTL expires
+        @param token str: The encoded token
+        @param claims dict: Its decoded claims
+        """
+        ttl = self.ttl
+        expires = claims.get("exp")
+        if isinstance(expires, (int, float)):
+            ttl = min(ttl, expires - time.time())
+        if ttl > 0:
+            self._tokens.put(token, claims, ttl)
+
+    def get_user(self, user_id: int) -> Optional[Principal]:
+        """!
+        @brief Cached principal of a user
+        @param user_id int: The id of the user
+        @return Principal|None: The principal, None on a miss
+        """
+        principal = self._users.get(user_id)
+        self.counters["user_hits" if principal is not None else "user_misses"] += 1
+        return principal
+
+    def put_user(self, principal: Principal):
+        """!
+        @brief Remember a principal loaded from the database
+        @param principal Principal: The principal to cache
+        """
+        self._users.put(principal.id, principal, self.ttl)
+
+    def invalidate_user(self, user_id: int):
+        """!
+        @brief Drop a user, the next request loads it from the database again
+        @param user_id int: The id of the changed or deleted user
+        """
+        self._users.pop(user_id)
+        self.counters["invalidations"] += 1
+
+    def clear(self):
+        """!
+        @brief Drop all cached tokens and users
+        """
+        self._tokens.clear()
+        self._users.clear()
+
+    def stats(self) -> dict:
+        """!
+        @brief Size and hit/miss counters of the cache
+        @return dict: Cache statistics
+        """
+        return {"tokens": len(self._tokens), "users": len(self._users), **self.counters}
+
+
+## @brief Principal cache of this process
+principal_cache = PrincipalCache()
+
+
+def invalidate_after_commit(session, user_ids):
+    """!
+    @brief Drop users from the cache once the transaction of a session commits
+    @details Needed for Core and bulk UPDATE or DELETE statements on users, changes to loaded users
+             are picked up by the ORM events.
+    @param session Session|AsyncSession: The session the users are changed in
+    @param user_ids Iterable[int]: The ids of the changed users
+    """
+    session = getattr(session, "sync_session", session)
+    session.info.setdefault(_CHANGED_USERS, set()).update(user_ids)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    """!
+    @brief Drop the cached principal of a user whenever it is changed or deleted through the ORM
+    """
+    if target.id is not None:
+        principal_cache.invalidate_user(target.id)
+        session = object_session(target)
+        if session is not None:
+            invalidate_after_commit(session, (target.id,))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    """!
+    @brief Drop the users changed in a transaction that just committed
+    """
+    for user_id in session.info.pop(_CHANGED_USERS, ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    """!
+    @brief Forget the users changed in a transaction that was rolled back, their cached state is still valid
+    """
+    session.info.pop(_CHANGED_USERS, None)
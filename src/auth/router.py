@@ -6,38 +6,71 @@
 """
 
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
 from models.schemas import UserCreate, UserLogin, UserResponse, Token
-from auth.user_service import get_user_by_username, get_user_by_email, create_user, authenticate_user
+from auth.user_service import (
+    get_user_by_username_async, get_user_by_email_async, create_user_async, update_password_hash_async
+)
 from auth.auth import create_access_token
-from dependencies import get_current_user
-from models.models import User
+from auth.password_hasher import PasswordHasher, PasswordHasherBusy
+from dependencies import get_current_user, get_password_hasher
+from auth.principal_cache import Principal, token_claims
 router = APIRouter()
 
 
+def _hasher_busy():
+    """!
+    @brief Response for requests rejected because the password hasher is saturated
+    @return HTTPException: 503 asking the client to retry shortly
+    """
+    return HTTPException(
+        status_code=503,
+        detail="Too many authentication requests, please try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(
+    user_data: UserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    hasher: PasswordHasher = Depends(get_password_hasher)
+):
+    """!
+    @brief Register a new user and generate an access token
+    @details Database queries are asynchronous and the password is hashed on the bounded password
+             hasher, so the event loop is never blocked.
+    @param user_data UserCreate: Username, email and password of the new user
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param hasher PasswordHasher: The password hasher of the application
+    @return Token: Access token, token type, and user information
+    @throws HTTPException: 400 if the username or email is taken, 503 if the password hasher is saturated
+    """
     # Check if username exists
-    if get_user_by_username(db, user_data.username):
+    if await get_user_by_username_async(db, user_data.username):
         raise HTTPException(
             status_code=400, 
             detail="Username already registered"
         )
     
     # Check if email exists
-    if get_user_by_email(db, user_data.email):
+    if await get_user_by_email_async(db, user_data.email):
         raise HTTPException(
             status_code=400, 
             detail="Email already registered"
         )
     
     # Create user
-    db_user = create_user(db, user_data.username, user_data.email, user_data.password)
+    try:
+        hashed_password = await hasher.hash(user_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    db_user = await create_user_async(db, user_data.username, user_data.email, hashed_password=hashed_password)
     
     # Create token
-    access_token = create_access_token(data={"sub": db_user.id})
+    access_token = create_access_token(data=token_claims(db_user))
     
     return {
         "access_token": access_token,
@@ -47,23 +80,37 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(
+    user_credentials: UserLogin,
+    db: AsyncSession = Depends(get_async_db),
+    hasher: PasswordHasher = Depends(get_password_hasher)
+):
     """!
     @brief Authenticate user and generate access token
-    @details Validates user credentials and returns an access token upon successful authentication
+    @details Validates user credentials and returns an access token upon successful authentication.
+             Hashes with an outdated bcrypt cost factor are replaced after a successful login.
     @param user_credentials UserLogin: Login credentials containing username and password
-    @param db Session: SQLAlchemy database session
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param hasher PasswordHasher: The password hasher of the application
     @return Token: Access token, token type, and user information
-    @throws HTTPException: 401 if credentials are incorrect
+    @throws HTTPException: 401 if credentials are incorrect, 503 if the password hasher is saturated
     """
-    user = authenticate_user(db, user_credentials.username, user_credentials.password)
-    if not user:
+    user = await get_user_by_username_async(db, user_credentials.username)
+    try:
+        valid, new_hash = await hasher.verify(
+            user_credentials.password, str(user.hashed_password) if user else None
+        )
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password"
         )
+    if new_hash is not None:
+        await update_password_hash_async(db, user, new_hash)
     
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data=token_claims(user))
     
     return {
         "access_token": access_token,
@@ -73,11 +120,11 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     """!
     @brief Get current authenticated user information
     @details Returns the profile information of the currently authenticated user
-    @param current_user User: The authenticated user from JWT token (injected by dependency)
+    @param current_user Principal: The authenticated user from JWT token (injected by dependency)
     @return UserResponse: Current user's profile information
     @note Requires valid JWT token in Authorization header
     """
@@ -2,12 +2,19 @@
 @file user_service.py
 @brief User service layer for database operations
 @details Provides service functions for user management including creation, retrieval, and authentication.
-         Acts as an abstraction layer between the API routes and the database models.
+         Acts as an abstraction layer between the API routes and the database models. Password hashing
+         is left to the caller, so these functions only wait on the database; authenticate_user(), which
+         still verifies the password itself, is deprecated. Every other function has an
+         asynchronous counterpart with an _async suffix taking an AsyncSession.
 """
 
+import warnings
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from models.models import User 
-from auth.auth import hash_password, verify_password
+from auth.auth import verify_password
+from models.models import User
 
 def get_user_by_username(db: Session, username: str):
     """!
@@ -31,18 +38,18 @@ def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
 
-def create_user(db: Session, username: str, email: str, password: str):
+def create_user(db: Session, username: str, email: str, *, hashed_password: str):
     """!
     @brief Create a new user in the database
-    @details Creates a new user with hashed password, saves to database, and returns the created user
+    @details Saves a new user with an already hashed password and returns the created user. The hash is
+             keyword-only, so a caller still passing a plain text password positionally fails instead
+             of storing it.
     @param db Session: SQLAlchemy database session
     @param username str: The desired username for the new user
     @param email str: The email address for the new user
-    @param password str: The plain text password (will be hashed before storage)
+    @param hashed_password str: The bcrypt hash of the user's password
     @return User: The newly created user object with assigned ID
-    @note The password is automatically hashed before storage for security
     """
-    hashed_password = hash_password(password)
     db_user = User(
         username=username,
         email=email,
@@ -62,10 +69,99 @@ def authenticate_user(db: Session, username: str, password: str):
     @param username str: The username for authentication
     @param password str: The plain text password to verify
     @return User|False: User object if authentication successful, False otherwise
-    @retval User: Valid user object when credentials are correct
-    @retval False: When user not found or password is incorrect
+    @deprecated Verifies the password on the calling thread, which blocks an event loop for the whole
+                bcrypt computation. Use get_user_by_username_async() and PasswordHasher.verify() instead.
     """
+    warnings.warn("authenticate_user() blocks on bcrypt, use PasswordHasher.verify() instead",
+                  DeprecationWarning, stacklevel=2)
     user = get_user_by_username(db, username)
     if not user or not verify_password(password, str(user.hashed_password)):
         return False
     return user
+
+
+def update_password_hash(db: Session, user: User, hashed_password: str):
+    """!
+    @brief Replace the stored password hash of a user
+    @details Used to upgrade hashes to the current bcrypt cost factor after a successful login
+    @param db Session: SQLAlchemy database session
+    @param user User: The user whose hash is replaced
+    @param hashed_password str: The new bcrypt hash of the same password
+    """
+    user.hashed_password = hashed_password
+    db.commit()
+
+
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    """!
+    @brief Retrieve a user by username, asynchronous counterpart of get_user_by_username()
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param username str: The username to search for
+    @return User|None: User object if found, None otherwise
+    """
+    return (await db.execute(select(User).where(User.username == username))).scalars().first()
+
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """!
+    @brief Retrieve a user by email address, asynchronous counterpart of get_user_by_email()
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param email str: The email address to search for
+    @return User|None: User object if found, None otherwise
+    """
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
+
+async def get_user_by_id_async(db: AsyncSession, user_id: int):
+    """!
+    @brief Retrieve a user by id
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param user_id int: The id of the user
+    @return User|None: User object if found, None otherwise
+    """
+    return await db.get(User, user_id)
+
+
+async def get_usernames_async(db: AsyncSession, user_ids):
+    """!
+    @brief Retrieve the usernames of several users in one query
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param user_ids Iterable[int]: The ids of the users
+    @return dict[int, str]: Usernames keyed by user id, unknown ids are left out
+    """
+    ids = set(user_ids)
+    if not ids:
+        return {}
+    rows = await db.execute(select(User.id, User.username).where(User.id.in_(ids)))
+    return {row.id: row.username for row in rows}
+
+
+async def create_user_async(db: AsyncSession, username: str, email: str, *, hashed_password: str):
+    """!
+    @brief Create a new user in the database, asynchronous counterpart of create_user()
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param username str: The desired username for the new user
+    @param email str: The email address for the new user
+    @param hashed_password str: The bcrypt hash of the user's password
+    @return User: The newly created user object with assigned ID
+    """
+    db_user = User(
+        username=username,
+        email=email,
+        hashed_password=hashed_password
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def update_password_hash_async(db: AsyncSession, user: User, hashed_password: str):
+    """!
+    @brief Replace the stored password hash of a user, asynchronous counterpart of update_password_hash()
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param user User: The user whose hash is replaced
+    @param hashed_password str: The new bcrypt hash of the same password
+    """
+    user.hashed_password = hashed_password
+    await db.commit()
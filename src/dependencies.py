@@ -1,42 +1,153 @@
 """!
 @file dependencies.py
 @brief Dependency utilities for FastAPI authentication and user retrieval
-@details Provides dependency functions for extracting and validating the current user from JWT tokens in API requests.
+@details Provides dependency functions for extracting and validating the current user from JWT tokens in API requests
+         and for accessing the services attached to the application.
 """
 
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from typing import Optional
 import jwt
 
-from database import get_db
-from models.models import User
+from database import AsyncSessionLocal
 from auth.auth import SECRET_KEY, ALGORITHM
+from auth.principal_cache import AUTH_TRUST_TOKEN_CLAIMS, Principal, principal_cache
+from auth.user_service import get_user_by_id_async
 
 ## @brief HTTP Bearer security scheme for FastAPI
 security = HTTPBearer()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+
+async def load_principal(user_id: int) -> Optional[Principal]:
+    """!
+    @brief Load the principal of a user with a short-lived database session
+    @param user_id int: The id of the user
+    @return Principal|None: The principal, None if the user does not exist
+    """
+    async with AsyncSessionLocal() as db:
+        user = await get_user_by_id_async(db, user_id)
+        return Principal.from_user(user) if user is not None else None
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """!
     @brief Retrieve the current authenticated user from JWT credentials
-    @details Decodes the JWT token, extracts the user ID, and fetches the user from the database. Raises HTTP 401 if invalid or not found.
+    @details Decoded tokens and users are served from the principal cache, the database is only
+             queried on a miss and no session is opened otherwise. With AUTH_TRUST_TOKEN_CLAIMS the
+             user is taken from the signed claims alone. Raises HTTP 401 if invalid or not found.
     @param credentials HTTPAuthorizationCredentials: Bearer token credentials from the request
-    @param db Session: SQLAlchemy database session
-    @return User: The authenticated user object
+    @return Principal: The authenticated user
     @throws HTTPException: If the token is invalid or user is not found
     """
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
+    return await resolve_principal(credentials.credentials)
+
+
+async def resolve_principal(token: str):
+    """!
+    @brief Resolve the user behind an access token issued by create_access_token()
+    @details Shared by get_current_user() and the WebSocket endpoints, which receive the token
+             outside of an Authorization header.
+    @param token str: The encoded JWT
+    @return Principal: The authenticated user
+    @throws HTTPException: 401 if the token is invalid or the user is not found
+    """
+    payload = principal_cache.get_token(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
             raise HTTPException(status_code=401, detail="Invalid token")
-    except jwt.PyJWTError:
+        principal_cache.put_token(token, payload)
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        principal = Principal.from_claims(payload)
+        if principal is not None:
+            return principal
+
+    principal = principal_cache.get_user(user_id)
+    if principal is None:
+        principal = await load_principal(user_id)
+        if principal is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal_cache.put_user(principal)
+    return principal
+
+
+async def get_current_admin(current_user: Principal = Depends(get_current_user)):
+    """!
+    @brief Retrieve the current user and require admin privileges
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @return Principal: The authenticated admin
+    @throws HTTPException: 403 if the user is not an admin
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
+
+
+def get_judge_service(request: Request):
+    """!
+    @brief Retrieve the judge service of the running application
+    @param request Request: The incoming request
+    @return JudgeService: The judge service started by the application lifespan
+    """
+    return request.app.state.judge
+
+
+def get_password_hasher(request: Request):
+    """!
+    @brief Retrieve the password hasher of the running application
+    @param request Request: The incoming request
+    @return PasswordHasher: The password hasher started by the application lifespan
+    """
+    return request.app.state.password_hasher
+
+
+def get_leaderboards(request: Request):
+    """!
+    @brief Retrieve the leaderboards of the running application
+    @param request Request: The incoming request
+    @return LeaderboardService: The leaderboards started by the application lifespan
+    """
+    return request.app.state.leaderboards
+
+
+def get_hub(request: Request):
+    """!
+    @brief Retrieve the live event hub of the running application
+    @param request Request: The incoming request
+    @return Hub: The hub started by the application lifespan
+    """
+    return request.app.state.hub
+
+
+def get_matchmaking(request: Request):
+    """!
+    @brief Retrieve the matchmaking service of the running application
+    @param request Request: The incoming request
+    @return MatchmakingService: The matchmaking started by the application lifespan
+    """
+    return request.app.state.matchmaking
+
+
+def get_submission_stats(request: Request):
+    """!
+    @brief Retrieve the submission statistics of the running application
+    @param request Request: The incoming request
+    @return SubmissionStatsService: The statistics started by the application lifespan
+    """
+    return request.app.state.submission_stats
+
+
+def get_rejudge(request: Request):
+    """!
+    @brief Retrieve the rejudge service of the running application
+    @param request Request: The incoming request
+    @return RejudgeService: The rejudges of the application
+    """
+    return request.app.state.rejudge
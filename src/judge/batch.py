@@ -0,0 +1,332 @@
+"""!
+@file batch.py
+@brief Single-launch execution of all test cases of a submission
+@details Starts the batch harness of a language once inside the sandbox, sends it the submission and
+         then streams the test cases through it one by one (see harness.py for the protocol). The
+         CPU time of every case is measured from /proc by the judge rather than reported by the
+         sandboxed process, so a submission cannot tamper with its own timings.
+"""
+
+from dataclasses import replace
+from typing import Optional
+import os
+import select
+import signal
+import threading
+import time
+
+from judge.sandbox import (
+    CHUNK_SIZE, STDERR_LIMIT, Language, Limits, ProcessResult, PipeReader, kill_process_group, spawn, wait
+)
+
+## @brief CPU and wall-clock time granted to the harness for its own startup, in ms
+HARNESS_STARTUP_MS = 1000
+
+## @brief Time the harness gets to exit after its stdin was closed, in seconds
+HARNESS_EXIT_GRACE = 1.0
+
+## @brief Clock ticks per second used by /proc/<pid>/stat
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+class HarnessExited(Exception):
+    """!
+    @brief Raised when the harness exited cleanly in the middle of a test case
+    @details Happens when a submission terminates the whole interpreter (e.g. os._exit(0)). The case
+             has to be re-run in a process of its own.
+    """
+
+
+class HarnessCompileError(Exception):
+    """!
+    @brief Raised when the harness could not compile a submission
+    @details The message is the error as the interpreter reports it, with the offending line.
+    """
+
+
+def process_cpu_time_ms(pid: int) -> Optional[float]:
+    """!
+    @brief CPU time consumed so far by a running process
+    @details Uses the nanosecond scheduler statistics where available and falls back to the
+             tick-based utime and stime of /proc/<pid>/stat.
+    @param pid int: The process id
+    @return float|None: The CPU time in ms, None if the process is gone
+    """
+    try:
+        with open(f"/proc/{pid}/schedstat") as schedstat:
+            return int(schedstat.read().split()[0]) / 1e6
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # The command name may contain spaces, the fields after it are fixed
+            fields = stat.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) * 1000 / CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_peak_memory_mb(pid: int) -> Optional[float]:
+    """!
+    @brief Peak resident set size of a running process
+    @param pid int: The process id
+    @return float|None: The VmHWM of the process in MB, None if the process is gone
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class BatchRun:
+    """!
+    @brief A running batch harness
+    @details The harness is started ahead of time and judges one submission per load(), so it can be
+             kept warm in a RuntimePool and reused. Use as a context manager, the harness is killed and
+             reaped on exit. After close() exit_code and memory_mb hold the harness exit status and its
+             peak memory usage.
+    """
+
+    def __init__(self, language: Language, cwd: str, limits: Limits, cpu_budget_ms: int):
+        """!
+        @brief Start a harness
+        @param language Language: The language of the harness
+        @param cwd str: Working directory of the harness
+        @param limits Limits: Limits applied to every single test case
+        @param cpu_budget_ms int: CPU rlimit of the harness process over its whole lifetime, every
+               single case is checked against limits.cpu_time_ms by the judge
+        @throws SandboxError: If the harness could not be isolated
+        """
+        self.language = language
+        self.limits = limits
+        self.cwd = cwd
+        self.proc, self._status_fd, self.pid = spawn(language.harness, cwd,
+                                                     replace(limits, cpu_time_ms=cpu_budget_ms),
+                                                     language.limit_address_space)
+        self._stderr = PipeReader(self.proc.stderr, STDERR_LIMIT)
+        self._stderr.start()
+        self._watchdog = None
+        self._buffer = bytearray()
+        self.uses = 0
+        self.broken = False
+        self.exit_code = None
+        self.cpu_time_ms = 0.0
+        self.memory_mb = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def stderr(self) -> bytes:
+        return self._stderr.data()
+
+    @property
+    def alive(self) -> bool:
+        """!
+        @brief Whether the harness can judge another submission
+        """
+        if self.broken or self.exit_code is not None:
+            return False
+        try:
+            # Peek at the launcher without reaping it, close() still needs its status
+            return os.waitid(os.P_PID, self.proc.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None
+        except ChildProcessError:
+            return False
+
+    def load(self, code: str, cases: int):
+        """!
+        @brief Send the source code of a submission to the harness and wait until it is compiled
+        @details Waiting keeps the interpreter startup out of the CPU time of the first test case. Arms
+                 a watchdog that kills the harness if the submission is not finished within the
+                 wall-clock limit of all its cases.
+        @param code str: The submitted source code
+        @param cases int: Number of test cases that will be run
+        @return bool: False if the harness did not acknowledge the code and cannot be used
+        @throws HarnessCompileError: If the code does not compile
+        """
+        self.uses += 1
+        total_wall_ms = self.limits.wall_time_ms * max(cases, 1) + HARNESS_STARTUP_MS
+        self._watchdog = threading.Timer(total_wall_ms / 1000, self._kill)
+        self._watchdog.start()
+        if self.uses > 1:
+            # Reset the peak RSS so peak_memory_mb() only covers this submission
+            try:
+                with open(f"/proc/{self.pid}/clear_refs", "w") as clear_refs:
+                    clear_refs.write("5")
+            except OSError:
+                pass
+        try:
+            self._send(b"C", code.encode())
+            deadline = time.perf_counter() + (self.limits.wall_time_ms + HARNESS_STARTUP_MS) / 1000
+            acknowledged = self._read_line(deadline)
+            if acknowledged is not None:
+                _, status, size = acknowledged.split()
+                message = self._read_exact(int(size), deadline)
+        except OSError:
+            acknowledged = None
+        if acknowledged is None or message is None:
+            self._kill()
+            return False
+        if status == b"error":
+            raise HarnessCompileError(message.decode(errors="replace"))
+        return True
+
+    def finish(self) -> float:
+        """!
+        @brief Mark the current submission as done
+        @return float: Peak memory usage of the harness in MB while judging the submission
+        """
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        peak = process_peak_memory_mb(self.pid)
+        return peak if peak is not None else self.memory_mb
+
+    def run_case(self, data, stdout_sink=None) -> ProcessResult:
+        """!
+        @brief Run the submission against one test case
+        @details With a stdout_sink the output is streamed into it as it is read from the harness
+                 instead of being collected. Once the sink rejected it, the rest is skipped.
+        @param data bytes|mmap.mmap: The test case input, any buffer
+        @param stdout_sink Checker|None: Receives the output through feed(chunk) -> bool
+        @return ProcessResult: Output and timing of the case. exit_code is 0 when the program finished
+                normally, memory_mb is not tracked per case and is always 0.
+        @throws HarnessExited: If the harness exited cleanly without answering
+        """
+        started = time.perf_counter()
+        deadline = started + self.limits.wall_time_ms / 1000
+        cpu_before = process_cpu_time_ms(self.pid) or 0.0
+        try:
+            self._send(b"I", data)
+            header = self._read_line(deadline)
+        except OSError:
+            header = None
+
+        if header is None:
+            timed_out = time.perf_counter() >= deadline
+            if timed_out:
+                self._kill()
+            self.close()
+            if self.exit_code == 0 and not timed_out:
+                raise HarnessExited()
+            return ProcessResult(
+                exit_code=self.exit_code,
+                stdout=b"",
+                stderr=self.stderr,
+                cpu_time_ms=self.limits.cpu_time_ms if timed_out else 0.0,
+                wall_time_ms=(time.perf_counter() - started) * 1000,
+                memory_mb=0.0,
+                timed_out=timed_out or self.exit_code == -signal.SIGXCPU,
+                output_exceeded=self.exit_code == -signal.SIGXFSZ,
+            )
+
+        _, status, size = header.split()
+        size = int(size)
+        output_exceeded = size > self.limits.output_bytes or status == b"output_limit"
+        diverged = False
+        if output_exceeded:
+            stdout = b""
+        elif stdout_sink is None:
+            stdout = self._read_exact(size, deadline)
+        else:
+            stdout, diverged = self._stream(size, deadline, stdout_sink)
+        wall_time_ms = (time.perf_counter() - started) * 1000
+        cpu_after = process_cpu_time_ms(self.pid)
+        cpu_time_ms = cpu_after - cpu_before if cpu_after is not None else wall_time_ms
+        truncated = stdout is None and time.perf_counter() < deadline
+        timed_out = (stdout is None and not truncated) or cpu_time_ms > self.limits.cpu_time_ms
+        if output_exceeded or timed_out or truncated:
+            self._kill()
+        return ProcessResult(
+            exit_code=0 if status == b"ok" and not truncated else 1,
+            stdout=stdout or b"",
+            stderr=b"",
+            cpu_time_ms=cpu_time_ms,
+            wall_time_ms=wall_time_ms,
+            memory_mb=0.0,
+            timed_out=timed_out,
+            output_exceeded=output_exceeded,
+            diverged=diverged,
+        )
+
+    def close(self):
+        """!
+        @brief Stop the harness and collect its exit status and resource usage
+        """
+        if self.exit_code is not None:
+            return
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+        grace = threading.Timer(HARNESS_EXIT_GRACE, kill_process_group, (self.proc.pid,))
+        grace.start()
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            self._kill()
+        self.exit_code, self.cpu_time_ms, self.memory_mb = wait(self.proc, self._status_fd)
+        grace.cancel()
+        kill_process_group(self.proc.pid)
+        self._stderr.join()
+        self.proc.stdout.close()
+        self.proc.stderr.close()
+
+    def _kill(self):
+        self.broken = True
+        kill_process_group(self.proc.pid)
+
+    def _send(self, tag: bytes, payload):
+        self.proc.stdin.write(tag + b" %d\n" % len(payload))
+        with memoryview(payload) as view:
+            for offset in range(0, len(view), CHUNK_SIZE):
+                self.proc.stdin.write(view[offset:offset + CHUNK_SIZE])
+        self.proc.stdin.flush()
+
+    def _fill(self, deadline: float) -> bool:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        readable, _, _ = select.select([self.proc.stdout], [], [], remaining)
+        if not readable:
+            return False
+        chunk = os.read(self.proc.stdout.fileno(), CHUNK_SIZE)
+        if not chunk:
+            return False
+        self._buffer += chunk
+        return True
+
+    def _read_line(self, deadline: float) -> Optional[bytes]:
+        while b"\n" not in self._buffer:
+            if not self._fill(deadline):
+                return None
+        line, _, rest = bytes(self._buffer).partition(b"\n")
+        self._buffer = bytearray(rest)
+        return line
+
+    def _stream(self, size: int, deadline: float, sink):
+        # Returns (b"", diverged) or (None, diverged) if the frame did not arrive in time. The rest of
+        # a rejected output is still read but not compared, so the harness stays usable.
+        diverged = False
+        while size:
+            if not self._buffer and not self._fill(deadline):
+                return None, diverged
+            chunk = bytes(self._buffer[:size])
+            del self._buffer[:len(chunk)]
+            size -= len(chunk)
+            if not diverged and not sink.feed(chunk):
+                diverged = True
+        return b"", diverged
+
+    def _read_exact(self, size: int, deadline: float) -> Optional[bytes]:
+        while len(self._buffer) < size:
+            if not self._fill(deadline):
+                return None
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
@@ -0,0 +1,253 @@
+"""!
+@file blob_store.py
+@brief Content-addressed store for large test case data
+@details Test inputs and expected outputs above BLOB_INLINE_MAX_BYTES are kept out of the database,
+         in files named after the SHA-256 digest of their content, and TestCase only references the
+         digest. Identical data is stored once, files are never modified after they were published,
+         so every API process and judge worker with access to BLOB_STORE_DIR can share them.
+         Blob files and directories are private to their owner, since they hold hidden test data the
+         sandbox user must not read.
+
+         Blobs are stored raw or, with BLOB_STORE_COMPRESS enabled, gzip compressed. Judge workers
+         memory-map raw blobs and hand the mapping to the sandbox, so the data is streamed from the
+         page cache into the stdin of the submission without being copied into the Python heap.
+         Compressed blobs are decompressed once per host into a spool directory below
+         JUDGE_CACHE_DIR and mapped from there; the spool is bounded by JUDGE_BLOB_SPOOL_MB.
+"""
+
+from contextlib import contextmanager
+from typing import BinaryIO, Optional, Tuple
+import gzip
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+
+from judge.cache import JUDGE_CACHE_DIR, _evict_lru, make_private_dirs
+from models.models import TestCase
+
+## @brief Directory of the blob files, shared by the API and all judge hosts
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(os.path.expanduser("~"), ".coderunner", "blobs"))
+
+## @brief Whether new blobs are stored gzip compressed
+BLOB_STORE_COMPRESS = os.getenv("BLOB_STORE_COMPRESS", "false").lower() in ("1", "true", "yes")
+
+## @brief Test data up to this size in bytes stays inline in the test_cases table
+BLOB_INLINE_MAX_BYTES = int(os.getenv("BLOB_INLINE_MAX_BYTES", 256 * 1024))
+
+## @brief Size bound of the spool of decompressed blobs in MB
+JUDGE_BLOB_SPOOL_MB = int(os.getenv("JUDGE_BLOB_SPOOL_MB", 4096))
+
+## @brief Size of the chunks copied while storing and decompressing blobs
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """!
+    @brief Content-addressed files below a root directory
+    @details A blob lives at root/<digest[:2]>/<digest>, or <digest>.gz when compressed. Files are
+             published with an atomic rename, so concurrent writers of the same content are harmless.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR, compress: bool = BLOB_STORE_COMPRESS,
+                 spool_root: str = os.path.join(JUDGE_CACHE_DIR, "blobs"), max_spool_mb: int = JUDGE_BLOB_SPOOL_MB):
+        self.root = root
+        self.compress = compress
+        self.spool_root = spool_root
+        self.max_spool_bytes = max_spool_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._spooled = 0
+        self.counters = {"stores": 0, "deduplicated": 0, "opens": 0, "spooled": 0, "spool_evictions": 0}
+
+    def put(self, data: bytes) -> str:
+        """!
+        @brief Store a blob held in memory
+        @param data bytes: The content
+        @return str: Hex encoded SHA-256 digest of the content
+        """
+        return self.put_stream(io.BytesIO(data))
+
+    def put_stream(self, stream: BinaryIO) -> str:
+        """!
+        @brief Store a blob read from a binary stream, in constant memory
+        @param stream BinaryIO: The content, read to its end
+        @return str: Hex encoded SHA-256 digest of the content
+        """
+        make_private_dirs(self.root)
+        handle, temporary = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(handle, "wb") as file:
+                target = gzip.GzipFile(fileobj=file, mode="wb", mtime=0) if self.compress else file
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    target.write(chunk)
+                if target is not file:
+                    target.close()
+            key = digest.hexdigest()
+            if self.locate(key) is not None:
+                os.unlink(temporary)
+                self._count("deduplicated")
+                return key
+            path = self._path(key, self.compress)
+            make_private_dirs(os.path.dirname(path))
+            # mkstemp creates the file with mode 0o600, which is kept: only processes of the owner read blobs
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        self._count("stores")
+        return key
+
+    def locate(self, key: str) -> Optional[Tuple[str, bool]]:
+        """!
+        @brief Find the file of a blob
+        @param key str: The digest of the blob
+        @return tuple[str, bool]|None: Path of the file and whether it is compressed, None if missing
+        """
+        for compressed in (False, True):
+            path = self._path(key, compressed)
+            if os.path.exists(path):
+                return path, compressed
+        return None
+
+    @contextmanager
+    def open(self, key: str):
+        """!
+        @brief Map a blob into memory
+        @details The mapping is read-only and shares the page cache with every other process reading
+                 the blob. It supports the buffer protocol, len() and readline().
+        @param key str: The digest of the blob
+        @return ContextManager[mmap.mmap|bytes]: The mapped content, empty bytes for an empty blob
+        @throws FileNotFoundError: If the blob is not in the store
+        """
+        located = self.locate(key)
+        if located is None:
+            raise FileNotFoundError(f"Blob {key} is missing from {self.root}")
+        path, compressed = located
+        if compressed:
+            path = self._spool(key, path)
+        self._count("opens")
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                yield b""
+                return
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapping
+        finally:
+            mapping.close()
+
+    def read(self, key: str) -> bytes:
+        """!
+        @brief Load a whole blob into memory, for callers that need it as a value
+        @param key str: The digest of the blob
+        @return bytes: The content
+        """
+        with self.open(key) as data:
+            return bytes(data)
+
+    def stats(self) -> dict:
+        """!
+        @brief Store and spool counters
+        @return dict: Blob store statistics
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def _spool(self, key: str, path: str) -> str:
+        spooled = os.path.join(self.spool_root, key[:2], key)
+        if os.path.exists(spooled):
+            os.utime(spooled)
+            return spooled
+        make_private_dirs(os.path.dirname(spooled))
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(spooled), prefix=".tmp-")
+        try:
+            with os.fdopen(handle, "wb") as target, gzip.open(path, "rb") as source:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            os.replace(temporary, spooled)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        with self._lock:
+            self.counters["spooled"] += 1
+            self._spooled += 1
+            sweep = self._spooled % 100 == 0
+        if sweep:
+            entries = []
+            for directory, _, files in os.walk(self.spool_root):
+                entries.extend(os.path.join(directory, name) for name in files if not name.startswith(".tmp-"))
+            evicted = _evict_lru(entries, self.max_spool_bytes)
+            with self._lock:
+                self.counters["spool_evictions"] += evicted
+        return spooled
+
+    def _path(self, key: str, compressed: bool) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.gz" if compressed else key)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+
+## @brief Blob store of the current process
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """!
+    @brief Blob store shared by the current process
+    @return BlobStore: The store, created on first use
+    """
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore()
+    return _blob_store
+
+
+def set_test_case_data(test_case: TestCase, input_data: bytes, expected_output: bytes,
+                       store: Optional[BlobStore] = None):
+    """!
+    @brief Fill in the test data of a test case, moving large data to the blob store
+    @details Each of input and expected output is kept inline when it is small enough and valid
+             UTF-8, and stored as blob otherwise.
+    @param test_case TestCase: The test case to update, not flushed
+    @param input_data bytes: The test input
+    @param expected_output bytes: The expected output
+    @param store BlobStore|None: The blob store, defaults to the one of the process
+    """
+    for column, value in test_case_data_columns(input_data, expected_output, store).items():
+        setattr(test_case, column, value)
+
+
+def test_case_data_columns(input_data: bytes, expected_output: bytes,
+                           store: Optional[BlobStore] = None) -> dict:
+    """!
+    @brief Column values of test data, for bulk inserts that bypass the ORM
+    @details Applies the same inline or blob decision as set_test_case_data().
+    @param input_data bytes: The test input
+    @param expected_output bytes: The expected output
+    @param store BlobStore|None: The blob store, defaults to the one of the process
+    @return dict: input, input_blob, expected_output and expected_output_blob
+    """
+    store = store or get_blob_store()
+    columns = {}
+    columns["input"], columns["input_blob"] = _inline_or_blob(store, input_data)
+    columns["expected_output"], columns["expected_output_blob"] = _inline_or_blob(store, expected_output)
+    return columns
+
+
+def _inline_or_blob(store: BlobStore, data: bytes) -> Tuple[Optional[str], Optional[str]]:
+    if len(data) <= BLOB_INLINE_MAX_BYTES:
+        try:
+            return data.decode(), None
+        except UnicodeDecodeError:
+            pass
+    return None, store.put(data)
@@ -0,0 +1,432 @@
+"""!
+@file cache.py
+@brief Content-addressed caches for judge verdicts and compiled artifacts
+@details Verdicts are keyed by the language, a hash of the submitted code, a hash of the problem's
+         test set, the checker and the limits, so a byte-identical resubmission against unchanged test
+         cases is answered without executing it again, while any change to the test cases or limits
+         yields a new key. Verdicts live in a
+         bounded in-memory LRU backed by a disk tier shared by all processes of the host.
+         Compiled artifacts are keyed by language and code hash only and are kept on disk so every
+         judge worker can reuse them.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from sqlalchemy import event
+
+from models.models import TestCase
+
+## @brief Root directory of the disk tiers
+JUDGE_CACHE_DIR = os.getenv("JUDGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "coderunner-cache"))
+
+## @brief Number of verdicts kept in memory
+JUDGE_VERDICT_CACHE_ENTRIES = int(os.getenv("JUDGE_VERDICT_CACHE_ENTRIES", 10000))
+
+## @brief Size bound of the verdict disk tier in MB
+JUDGE_VERDICT_CACHE_DISK_MB = int(os.getenv("JUDGE_VERDICT_CACHE_DISK_MB", 64))
+
+## @brief Size bound of the compiled artifact cache in MB
+JUDGE_ARTIFACT_CACHE_MB = int(os.getenv("JUDGE_ARTIFACT_CACHE_MB", 1024))
+
+## @brief Mode of the directories of the caches and the blob store
+## @details Only the API and the judge workers, which run as the owner, read them. The sandbox user must not
+##          see hidden test data or the verdicts and artifacts of other submissions.
+PRIVATE_DIR_MODE = 0o700
+
+
+def make_private_dirs(path: str):
+    """!
+    @brief Create a directory and its missing parents with PRIVATE_DIR_MODE
+    @details Unlike os.makedirs(), the mode also applies to the parents created on the way. Existing
+             directories are left as they are.
+    @param path str: The directory
+    """
+    parent = os.path.dirname(path)
+    if parent and parent != path and not os.path.isdir(parent):
+        make_private_dirs(parent)
+    try:
+        os.mkdir(path, PRIVATE_DIR_MODE)
+    except FileExistsError:
+        pass
+
+
+def code_hash(language: str, code: str) -> str:
+    """!
+    @brief Hash of a submission's language and source code
+    @param language str: The language identifier
+    @param code str: The submitted source code
+    @return str: Hex encoded SHA-256 digest
+    """
+    digest = hashlib.sha256(language.encode())
+    digest.update(b"\0")
+    digest.update(code.encode())
+    return digest.hexdigest()
+
+
+def test_set_hash(test_cases) -> str:
+    """!
+    @brief Version hash of a problem's test set
+    @details Covers the ids, inputs and expected outputs of the test cases in the given order. Data in
+             the blob store is covered by its digest, so it is never read for hashing.
+    @param test_cases Iterable[TestCaseData]: The test cases as shipped to the judge workers
+    @return str: Hex encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    for case in test_cases:
+        _update_case(digest, case)
+    return digest.hexdigest()
+
+
+def case_hash(case) -> str:
+    """!
+    @brief Version hash of a single test case
+    @details Covers the same parts as test_set_hash(), per-test-case results are stale once it changes.
+    @param case TestCaseData: The test case as shipped to the judge workers
+    @return str: Hex encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    _update_case(digest, case)
+    return digest.hexdigest()
+
+
+def _update_case(digest, case):
+    input_part = f"blob:{case.input_blob}" if case.input_blob is not None else case.input
+    output_part = (f"blob:{case.expected_output_blob}" if case.expected_output_blob is not None
+                   else case.expected_output)
+    for part in (str(case.id), input_part, output_part):
+        encoded = part.encode()
+        digest.update(b"%d:" % len(encoded))
+        digest.update(encoded)
+
+
+def limits_key(limits) -> str:
+    """!
+    @brief Part of a cache key covering the limits a program was executed with
+    @details Memory and output limit verdicts depend on them, and so does a CPU time close to the limit.
+    @param limits Limits: The sandbox limits of the job
+    @return str: The CPU time, memory and output limits
+    """
+    return f"{limits.cpu_time_ms}:{limits.memory_mb}:{limits.output_bytes}"
+
+
+def verdict_key(language: str, code_digest: str, tests_digest: str, checker: str = "", limits: str = "") -> str:
+    """!
+    @brief Cache key of a verdict
+    @param language str: The language identifier
+    @param code_digest str: Result of code_hash()
+    @param tests_digest str: Result of test_set_hash()
+    @param checker str: The output checker and its settings
+    @param limits str: Result of limits_key()
+    @return str: Hex encoded SHA-256 digest
+    """
+    return hashlib.sha256(f"{language}:{code_digest}:{tests_digest}:{checker}:{limits}".encode()).hexdigest()
+
+
+def run_key(language: str, code_digest: str, stdin: str, expected_output: Optional[str], checker: str = "",
+            limits: str = "") -> str:
+    """!
+    @brief Cache key of the outcome of a run
+    @param language str: The language identifier
+    @param code_digest str: Result of code_hash()
+    @param stdin str: The input of the run
+    @param expected_output str|None: The output the run is checked against, None if unchecked
+    @param checker str: The output checker and its settings
+    @param limits str: Result of limits_key()
+    @return str: Hex encoded SHA-256 digest
+    """
+    digest = hashlib.sha256(f"run:{language}:{code_digest}:{checker}:{limits}".encode())
+    for part in (stdin, expected_output):
+        encoded = b"-" if part is None else part.encode()
+        digest.update(b"%d:" % len(encoded))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, data: bytes):
+    """!
+    @brief Write a file so concurrent readers never see it half written
+    """
+    make_private_dirs(os.path.dirname(path))
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+def _evict_lru(entries, max_bytes: int) -> int:
+    """!
+    @brief Remove the least recently used disk entries until the tier fits its size bound
+    @param entries list[str]: Paths of the entries (files or directories) of the tier
+    @param max_bytes int: Size bound of the tier
+    @return int: Number of removed entries
+    """
+    sized = []
+    for path in entries:
+        try:
+            size = os.path.getsize(path) if os.path.isfile(path) else _directory_size(path)
+            sized.append((os.path.getmtime(path), size, path))
+        except OSError:
+            pass
+    total = sum(size for _, size, _ in sized)
+    evicted = 0
+    for _, size, path in sorted(sized):
+        if total <= max_bytes:
+            break
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        total -= size
+        evicted += 1
+    return evicted
+
+
+class VerdictCache:
+    """!
+    @brief Two-tier LRU cache of judge verdicts
+    @details Entries are plain dicts with status, execution_time_ms, memory_usage_mb, detail and the
+             per-test-case results. The
+             disk tier stores one JSON file per verdict below a directory per problem, so all
+             verdicts of a problem can be dropped at once when its test cases change.
+    """
+
+    def __init__(self, root: str = os.path.join(JUDGE_CACHE_DIR, "verdicts"),
+                 max_entries: int = JUDGE_VERDICT_CACHE_ENTRIES, max_disk_mb: int = JUDGE_VERDICT_CACHE_DISK_MB):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                         "invalidations": 0}
+
+    def get(self, problem_id: int, key: str) -> Optional[dict]:
+        """!
+        @brief Look a verdict up, memory first
+        @param problem_id int: The problem the verdict belongs to
+        @param key str: Result of verdict_key()
+        @return dict|None: The cached verdict, None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+        path = self._path(problem_id, key)
+        try:
+            with open(path, "rb") as file:
+                verdict = json.loads(file.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+        with self._lock:
+            self.counters["disk_hits"] += 1
+            self._remember(problem_id, key, verdict)
+        return verdict
+
+    def put(self, problem_id: int, key: str, verdict: dict):
+        """!
+        @brief Store a verdict in both tiers
+        @param problem_id int: The problem the verdict belongs to
+        @param key str: Result of verdict_key()
+        @param verdict dict: The verdict to store
+        """
+        with self._lock:
+            self._remember(problem_id, key, verdict)
+            self.counters["stores"] += 1
+            self._disk_writes += 1
+            sweep = self._disk_writes % 1000 == 0
+        try:
+            _write_atomic(self._path(problem_id, key), json.dumps(verdict).encode())
+        except OSError:
+            return
+        if sweep:
+            self.sweep()
+
+    def invalidate_problem(self, problem_id: int):
+        """!
+        @brief Drop all verdicts of a problem
+        @details Keys already change with the test set, this frees the space of stale entries.
+        @param problem_id int: The problem whose test cases changed
+        """
+        with self._lock:
+            stale = [key for key, (owner, _) in self._memory.items() if owner == problem_id]
+            for key in stale:
+                del self._memory[key]
+            self.counters["invalidations"] += 1
+        shutil.rmtree(os.path.join(self.root, str(problem_id)), ignore_errors=True)
+
+    def sweep(self):
+        """!
+        @brief Shrink the disk tier to its size bound, least recently used verdicts first
+        """
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            entries.extend(os.path.join(directory, name) for name in files if not name.startswith(".tmp-"))
+        evicted = _evict_lru(entries, self.max_disk_bytes)
+        with self._lock:
+            self.counters["evictions"] += evicted
+
+    def stats(self) -> dict:
+        """!
+        @brief Size and hit-rate counters of the cache
+        @return dict: Cache statistics
+        """
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                "entries": len(self._memory),
+                **self.counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def _remember(self, problem_id: int, key: str, verdict: dict):
+        # Called with the lock held
+        self._memory[key] = (problem_id, verdict)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _path(self, problem_id: int, key: str) -> str:
+        return os.path.join(self.root, str(problem_id), key[:2], f"{key}.json")
+
+
+class ArtifactCache:
+    """!
+    @brief Disk cache of compiled artifacts
+    @details An entry is a directory holding the files a compiler produced next to the source. Entries
+             are published with an atomic rename, so several judge workers can share the cache.
+    """
+
+    def __init__(self, root: str = os.path.join(JUDGE_CACHE_DIR, "artifacts"),
+                 max_mb: int = JUDGE_ARTIFACT_CACHE_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self._stores = 0
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def restore(self, key: str, workdir: str) -> bool:
+        """!
+        @brief Copy a cached artifact into a working directory
+        @param key str: Result of code_hash()
+        @param workdir str: The working directory of the submission
+        @return bool: True on a hit
+        """
+        entry = os.path.join(self.root, key)
+        try:
+            names = os.listdir(entry)
+            for name in names:
+                shutil.copy2(os.path.join(entry, name), os.path.join(workdir, name))
+            os.utime(entry)
+        except OSError:
+            self.counters["misses"] += 1
+            return False
+        self.counters["hits"] += 1
+        return True
+
+    def store(self, key: str, workdir: str, source: str):
+        """!
+        @brief Publish the files a compiler produced
+        @param key str: Result of code_hash()
+        @param workdir str: The working directory holding the compiled files
+        @param source str: File name of the source, which is not part of the artifact
+        """
+        entry = os.path.join(self.root, key)
+        if os.path.isdir(entry):
+            return
+        make_private_dirs(self.root)
+        staging = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            for name in os.listdir(workdir):
+                path = os.path.join(workdir, name)
+                if name != source and os.path.isfile(path):
+                    shutil.copy2(path, os.path.join(staging, name))
+            os.rename(staging, entry)
+        except OSError:
+            # Another worker published the same artifact first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.counters["stores"] += 1
+        self._stores += 1
+        if self._stores % 100 == 0:
+            entries = [os.path.join(self.root, name) for name in os.listdir(self.root)
+                       if not name.startswith(".tmp-")]
+            self.counters["evictions"] += _evict_lru(entries, self.max_bytes)
+
+    def stats(self) -> dict:
+        """!
+        @brief Hit and miss counters of the cache
+        @return dict: Cache statistics
+        """
+        return dict(self.counters)
+
+
+## @brief Verdict cache of the API process
+_verdict_cache: Optional[VerdictCache] = None
+
+## @brief Artifact cache of the current judge worker process
+_artifact_cache: Optional[ArtifactCache] = None
+
+
+def get_verdict_cache() -> VerdictCache:
+    """!
+    @brief Verdict cache shared by the judge service of this process
+    @return VerdictCache: The cache, created on first use
+    """
+    global _verdict_cache
+    if _verdict_cache is None:
+        _verdict_cache = VerdictCache()
+    return _verdict_cache
+
+
+def get_artifact_cache() -> ArtifactCache:
+    """!
+    @brief Artifact cache of the current judge worker process
+    @return ArtifactCache: The cache, created on first use
+    """
+    global _artifact_cache
+    if _artifact_cache is None:
+        _artifact_cache = ArtifactCache()
+    return _artifact_cache
+
+
+@event.listens_for(TestCase, "after_insert")
+@event.listens_for(TestCase, "after_update")
+@event.listens_for(TestCase, "after_delete")
+def _invalidate_test_set(mapper, connection, target):
+    """!
+    @brief Drop the cached verdicts of a problem whenever one of its test cases changes
+    """
+    if _verdict_cache is not None and target.problem_id is not None:
+        _verdict_cache.invalidate_problem(target.problem_id)
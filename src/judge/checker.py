@@ -0,0 +1,323 @@
+"""!
+@file checker.py
+@brief Streaming comparison of program output with the expected output
+@details A checker is created per test case run and fed the program's stdout chunk by chunk while
+         the program is still running. It walks the expected output in lockstep, which may be a
+         memory-mapped blob, so neither side is ever held in memory as a whole. As soon as the output
+         can no longer be accepted feed() returns False and the judge kills the program.
+
+         Every problem names its checker in Problem.checker:
+
+             exact       byte-for-byte equality
+             whitespace  trailing whitespace on each line and trailing blank lines are ignored (default)
+             tokens      whitespace separated tokens must be equal, the layout is ignored
+             float       like tokens, numbers may differ by Problem.checker_tolerance, absolute or
+                         relative to the expected value
+
+         Further checkers are registered with @register_checker("name") in modules listed in
+         JUDGE_CHECKER_MODULES, which every judge worker imports on first use. Checkers that need the
+         whole output, for example to verify one of several valid answers, derive from BufferedChecker.
+"""
+
+from typing import Dict, Optional, Type
+import abc
+import importlib
+import math
+import os
+import re
+
+## @brief Comma separated modules registering custom checkers, imported by the judge workers
+JUDGE_CHECKER_MODULES = os.getenv("JUDGE_CHECKER_MODULES", "")
+
+## @brief Checker of problems that do not name one
+DEFAULT_CHECKER = "whitespace"
+
+## @brief Tolerance of the float checker when the problem does not set one
+DEFAULT_TOLERANCE = 1e-6
+
+## @brief Size of the slices of the expected output inspected at once
+CHUNK_SIZE = 64 * 1024
+
+## @brief Checkers by name, filled by register_checker()
+CHECKERS: Dict[str, Type["Checker"]] = {}
+
+_SPACE = re.compile(rb"\s")
+_custom_modules_loaded = False
+
+
+class Checker(abc.ABC):
+    """!
+    @brief Incremental comparison of one program output with one expected output
+    """
+
+    def __init__(self, expected, data=b"", tolerance: Optional[float] = None):
+        """!
+        @param expected bytes|mmap.mmap: The expected output
+        @param data bytes|mmap.mmap: The input of the test case
+        @param tolerance float|None: Tolerance configured for the problem
+        """
+        self.expected = expected
+        self.data = data
+        self.tolerance = DEFAULT_TOLERANCE if tolerance is None else tolerance
+
+    @abc.abstractmethod
+    def feed(self, chunk: bytes) -> bool:
+        """!
+        @brief Take the next chunk of the program output
+        @param chunk bytes: Output in the order it was written
+        @return bool: False once the output cannot be accepted anymore
+        """
+
+    @abc.abstractmethod
+    def finish(self) -> bool:
+        """!
+        @brief Decide after the program output ended
+        @return bool: True if the output is accepted
+        """
+
+
+def register_checker(name: str):
+    """!
+    @brief Class decorator adding a checker to the registry
+    @param name str: The name problems refer to the checker by
+    """
+    def register(cls):
+        CHECKERS[name] = cls
+        return cls
+    return register
+
+
+def get_checker(name: Optional[str]) -> Optional[Type[Checker]]:
+    """!
+    @brief Look a checker up, importing JUDGE_CHECKER_MODULES on first use
+    @param name str|None: The name of the checker, None for the default one
+    @return type[Checker]|None: The checker class, None if no checker has the name
+    """
+    global _custom_modules_loaded
+    if not _custom_modules_loaded:
+        _custom_modules_loaded = True
+        for module in filter(None, (part.strip() for part in JUDGE_CHECKER_MODULES.split(","))):
+            importlib.import_module(module)
+    return CHECKERS.get(name or DEFAULT_CHECKER)
+
+
+def _is_blank(buffer, start: int, end: int) -> bool:
+    for offset in range(start, end, CHUNK_SIZE):
+        if buffer[offset:min(offset + CHUNK_SIZE, end)].strip():
+            return False
+    return True
+
+
+@register_checker("exact")
+class ExactChecker(Checker):
+    """!
+    @brief Output and expected output must be identical
+    """
+
+    def __init__(self, expected, data=b"", tolerance: Optional[float] = None):
+        super().__init__(expected, data, tolerance)
+        self.position = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        end = self.position + len(chunk)
+        if end > len(self.expected) or self.expected[self.position:end] != chunk:
+            return False
+        self.position = end
+        return True
+
+    def finish(self) -> bool:
+        return self.position == len(self.expected)
+
+
+@register_checker("whitespace")
+class WhitespaceChecker(Checker):
+    """!
+    @brief Lines must be equal up to trailing whitespace, trailing blank lines are ignored
+    @details As long as the output is byte-for-byte equal to the expected output, chunks are compared
+             directly. After the first difference both sides are split into lines, which are compared
+             in batches; blank output lines at the end of a chunk are held back since they may turn
+             out to be trailing. Memory use is bounded by a chunk plus the longest line.
+    """
+
+    def __init__(self, expected, data=b"", tolerance: Optional[float] = None):
+        super().__init__(expected, data, tolerance)
+        self.exact = True
+        self.position = 0
+        ## Expected lines read ahead, without trailing whitespace, and the next one to match
+        self.lines = []
+        self.line_index = 0
+        ## Start of the expected output not yet split into lines
+        self.cursor = 0
+        self.pending = b""
+        self.blank_lines = 0
+        self.failed = False
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.failed:
+            return False
+        if self.exact:
+            end = self.position + len(chunk)
+            if self.expected[self.position:end] == chunk:
+                self.position = end
+                return True
+            self._leave_exact()
+        text = self.pending + chunk
+        pieces = text.split(b"\n")
+        self.pending = pieces.pop()
+        lines = [piece.rstrip() for piece in pieces]
+        content = len(lines)
+        while content and not lines[content - 1]:
+            content -= 1
+        if content:
+            if not self._match([b""] * self.blank_lines + lines[:content]):
+                self.failed = True
+                return False
+            self.blank_lines = 0
+        self.blank_lines += len(lines) - content
+        return True
+
+    def finish(self) -> bool:
+        if self.failed:
+            return False
+        if self.exact:
+            if self.position == len(self.expected):
+                return True
+            self._leave_exact()
+        last = self.pending.rstrip()
+        if last and not self._match([b""] * self.blank_lines + [last]):
+            return False
+        return (not any(self.lines[self.line_index:])
+                and _is_blank(self.expected, min(self.cursor, len(self.expected)), len(self.expected)))
+
+    def _leave_exact(self):
+        # The output so far equals the expected output, continue line by line from the current line
+        self.exact = False
+        self.cursor = self.expected.rfind(b"\n", 0, self.position) + 1
+        self.pending = self.expected[self.cursor:self.position]
+
+    def _match(self, batch) -> bool:
+        if self.line_index + len(batch) > len(self.lines):
+            self._read_lines(len(batch))
+        end = self.line_index + len(batch)
+        if self.lines[self.line_index:end] != batch:
+            return False
+        self.line_index = end
+        return True
+
+    def _read_lines(self, count: int):
+        del self.lines[:self.line_index]
+        self.line_index = 0
+        size = len(self.expected)
+        while len(self.lines) < count and self.cursor < size:
+            # Split at a line break, so every piece is a complete line
+            end = self.expected.find(b"\n", self.cursor + CHUNK_SIZE)
+            end = size if end < 0 else end
+            self.lines.extend(line.rstrip() for line in self.expected[self.cursor:end].split(b"\n"))
+            self.cursor = end + 1
+
+
+@register_checker("tokens")
+class TokenChecker(Checker):
+    """!
+    @brief Whitespace separated tokens must be equal, regardless of the layout
+    @details Tokens are compared in batches against tokens read ahead from the expected output.
+    """
+
+    def __init__(self, expected, data=b"", tolerance: Optional[float] = None):
+        super().__init__(expected, data, tolerance)
+        self.tokens = []
+        self.token_index = 0
+        ## Start of the expected output not yet split into tokens
+        self.cursor = 0
+        self.partial = b""
+        self.failed = False
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.failed:
+            return False
+        text = self.partial + chunk
+        tokens = text.split()
+        # A token touching the end of the chunk may continue in the next one
+        self.partial = tokens.pop() if tokens and not text[-1:].isspace() else b""
+        if tokens and not self._match(tokens):
+            self.failed = True
+        return not self.failed
+
+    def finish(self) -> bool:
+        if self.failed or (self.partial and not self._match([self.partial])):
+            return False
+        return (self.token_index == len(self.tokens)
+                and _is_blank(self.expected, min(self.cursor, len(self.expected)), len(self.expected)))
+
+    def match(self, token: bytes, expected: bytes) -> bool:
+        """!
+        @brief Compare one output token with the expected one, called for unequal batches only
+        """
+        return token == expected
+
+    def _match(self, tokens) -> bool:
+        if self.token_index + len(tokens) > len(self.tokens):
+            self._read_tokens(len(tokens))
+        end = self.token_index + len(tokens)
+        expected = self.tokens[self.token_index:end]
+        if expected != tokens and (len(expected) != len(tokens) or not all(map(self.match, tokens, expected))):
+            return False
+        self.token_index = end
+        return True
+
+    def _read_tokens(self, count: int):
+        del self.tokens[:self.token_index]
+        self.token_index = 0
+        size = len(self.expected)
+        while len(self.tokens) < count and self.cursor < size:
+            # Split at whitespace, so no token is cut in two
+            boundary = None
+            if self.cursor + CHUNK_SIZE < size:
+                boundary = _SPACE.search(self.expected, self.cursor + CHUNK_SIZE)
+            end = boundary.start() if boundary is not None else size
+            self.tokens.extend(self.expected[self.cursor:end].split())
+            self.cursor = end
+
+
+@register_checker("float")
+class FloatChecker(TokenChecker):
+    """!
+    @brief Tokens must be equal, numbers up to an absolute or relative tolerance
+    """
+
+    def match(self, token: bytes, expected: bytes) -> bool:
+        if token == expected:
+            return True
+        try:
+            value, wanted = float(token), float(expected)
+        except ValueError:
+            return False
+        if not (math.isfinite(value) and math.isfinite(wanted)):
+            return False
+        return abs(value - wanted) <= self.tolerance * max(1.0, abs(wanted))
+
+
+class BufferedChecker(Checker):
+    """!
+    @brief Base of custom checkers that look at the complete output at once
+    @details Collects the output, so its memory use is bounded by the output size limit only.
+    """
+
+    def __init__(self, expected, data=b"", tolerance: Optional[float] = None):
+        super().__init__(expected, data, tolerance)
+        self.chunks = []
+
+    def feed(self, chunk: bytes) -> bool:
+        self.chunks.append(chunk)
+        return True
+
+    def finish(self) -> bool:
+        return self.check(b"".join(self.chunks))
+
+    @abc.abstractmethod
+    def check(self, output: bytes) -> bool:
+        """!
+        @brief Decide on the complete output, self.expected and self.data hold the test case
+        @param output bytes: The program output
+        @return bool: True if the output is accepted
+        """
@@ -0,0 +1,171 @@
+"""!
+@file harness.py
+@brief Batch harness running all test cases of a Python submission in one interpreter
+@details Executed as a standalone script inside the sandbox (python -I harness.py), never imported.
+         The judge talks to the harness over its stdin and stdout with length-prefixed frames:
+
+             judge   -> harness   C <size>\\n<source code>     once, compiles the submission
+             harness -> judge     R <ok|error> <size>\\n<syntax error message, empty if ok>
+             judge   -> harness   I <size>\\n<test input>      once per test case
+             harness -> judge     R <ok|error|output_limit> <size>\\n<output>
+
+         For every test case the harness places the input in an in-memory file on fd 0 and captures
+         fd 1 in another one, so programs reading sys.stdin, sys.stdin.buffer or open(0) and writing
+         through print, sys.stdout.buffer or os.write(1, ...) behave exactly like in a fresh process.
+         Each case runs in fresh globals with the builtins restored to their state at startup, modules
+         imported by the submission are shared between cases.
+         The harness exits when its stdin is closed. It is started ahead of time by the runtime pool
+         and may judge several submissions, each one starting with a C frame.
+"""
+
+import builtins
+import errno
+import os
+import sys
+import traceback
+
+## @brief Modules imported before the harness waits for a submission, so importing them is free
+PRELOAD = ("bisect", "collections", "functools", "heapq", "itertools", "math", "random", "re", "string")
+
+## @brief Size of the chunks copied between the protocol pipes and the in-memory files
+CHUNK_SIZE = 64 * 1024
+
+
+def read_header(stream):
+    """!
+    @brief Read a frame header
+    @return tuple: (frame tag, payload size), (None, 0) once the judge closed the pipe
+    """
+    line = stream.readline()
+    if not line:
+        return None, 0
+    tag, size = line.split()
+    return tag.decode(), int(size)
+
+
+def copy_to_fd(stream, fd: int, size: int):
+    """!
+    @brief Copy a frame payload from the protocol pipe into a file descriptor
+    """
+    while size:
+        chunk = stream.read(min(CHUNK_SIZE, size))
+        if not chunk:
+            raise EOFError("Truncated frame")
+        os.write(fd, chunk)
+        size -= len(chunk)
+
+
+def copy_from_fd(fd: int, stream, size: int):
+    """!
+    @brief Copy size bytes from a file descriptor into the protocol pipe
+    """
+    while size:
+        chunk = os.read(fd, min(CHUNK_SIZE, size))
+        if not chunk:
+            break
+        stream.write(chunk)
+        size -= len(chunk)
+
+
+def reset(memfd: int, fd: int):
+    """!
+    @brief Truncate an in-memory file, rewind it and place it on a standard descriptor
+    @details The descriptor is re-attached for every case since a submission may have closed it.
+    """
+    os.ftruncate(memfd, 0)
+    os.lseek(memfd, 0, os.SEEK_SET)
+    os.dup2(memfd, fd)
+
+
+def restore_builtins(snapshot: dict):
+    """!
+    @brief Undo changes a previous case made to the builtins module
+    """
+    namespace = builtins.__dict__
+    for name in [name for name in namespace if name not in snapshot]:
+        del namespace[name]
+    namespace.update(snapshot)
+
+
+def compile_source(source: bytes):
+    """!
+    @brief Compile a submission
+    @return tuple: (code object, b"") or (None, the error message in the format of the interpreter)
+    """
+    try:
+        return compile(source, "main.py", "exec"), b""
+    except (SyntaxError, ValueError) as error:
+        return None, "".join(traceback.format_exception_only(error)).encode(errors="replace")
+
+
+def run_case(code, recursion_limit: int, builtins_snapshot: dict) -> str:
+    """!
+    @brief Execute the compiled submission once against the input on fd 0
+    @details The builtins are restored right after the submission returns, before the harness uses them.
+    @return str: "ok" if the program finished normally, "output_limit" if it exceeded the output file
+             size limit and "error" otherwise
+    """
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.setrecursionlimit(recursion_limit)
+    status = "ok"
+    try:
+        try:
+            exec(code, {"__name__": "__main__", "__file__": "main.py", "__builtins__": builtins})
+        finally:
+            restore_builtins(builtins_snapshot)
+    except SystemExit as exit:
+        if exit.code not in (None, 0):
+            status = "error"
+    except BaseException as error:
+        traceback.print_exc()
+        status = "output_limit" if isinstance(error, OSError) and error.errno == errno.EFBIG else "error"
+    try:
+        sys.stdout.flush()
+    except OSError as error:
+        status = "output_limit" if error.errno == errno.EFBIG else "error"
+    except BaseException:
+        status = "error"
+    sys.stderr.flush()
+    return status
+
+
+def main():
+    for module in PRELOAD:
+        __import__(module)
+    protocol_in = os.fdopen(os.dup(0), "rb")
+    protocol_out = os.fdopen(os.dup(1), "wb")
+    stdin = os.memfd_create("stdin")
+    stdout = os.memfd_create("stdout")
+    recursion_limit = sys.getrecursionlimit()
+    builtins_snapshot = dict(builtins.__dict__)
+    code = None
+
+    while True:
+        tag, size = read_header(protocol_in)
+        if tag is None:
+            break
+        if tag == "C":
+            code, error = compile_source(protocol_in.read(size))
+            protocol_out.write(b"R %s %d\n" % (b"ok" if code is not None else b"error", len(error)) + error)
+            protocol_out.flush()
+            continue
+
+        reset(stdin, 0)
+        copy_to_fd(protocol_in, stdin, size)
+        os.lseek(stdin, 0, os.SEEK_SET)
+        reset(stdout, 1)
+        status = run_case(code, recursion_limit, builtins_snapshot) if code is not None else "error"
+
+        output_size = os.fstat(stdout).st_size
+        os.lseek(stdout, 0, os.SEEK_SET)
+        protocol_out.write(f"R {status} {output_size}\n".encode())
+        copy_from_fd(stdout, protocol_out, output_size)
+        protocol_out.flush()
+
+    # Skip interpreter teardown, threads left behind by a submission must not keep the harness alive
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
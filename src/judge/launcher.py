@@ -0,0 +1,149 @@
+"""!
+@file launcher.py
+@brief Minimal process launcher used by the sandbox
+@details Executed as a standalone script with the isolated interpreter (python -I -S), never imported.
+         It applies the rlimits, forks and execs the sandboxed program and reports on a status pipe:
+         the program's pid once it has been isolated, then its exit code, CPU time in ms and peak RSS
+         in kB once it has exited. The kernel carries the peak RSS of the forking process over into
+         the exec'd program, so forking from this small process instead of a judge worker keeps the
+         reported memory usage close to what the program itself used.
+
+         Unless the uid is -1 the program is isolated before the exec: it runs as pid 1 of new PID,
+         network, mount, IPC and UTS namespaces, sees a /proc of its own namespace only, the directory
+         holding the working directories of other submissions and /dev/shm are replaced by empty
+         tmpfs mounts, and it runs as the given unprivileged uid/gid with no_new_privs set. This needs
+         root (or CAP_SYS_ADMIN, CAP_SETUID and CAP_SETGID). If the isolation fails the launcher
+         reports "error <message>" instead of the pid and the program is never started.
+
+         Usage: launcher.py <status fd> <cpu seconds> <memory bytes, 0 for none> <file size bytes>
+                <uid, -1 for no isolation> <gid> <argv...>
+"""
+
+import ctypes
+import os
+import resource
+import sys
+# Imported lazily by os.execvp(), the standard library may not be readable anymore after the privilege drop
+import warnings  # noqa: F401
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+
+PR_SET_DUMPABLE = 4
+PR_SET_NO_NEW_PRIVS = 38
+
+## @brief Options of the tmpfs mounts hiding shared directories, they are writable scratch space for the program
+TMPFS_OPTIONS = b"size=64m,mode=1777"
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result: int, action: str):
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{action}: {os.strerror(errno)}")
+
+
+def _prctl(option: int, value: int):
+    # prctl() checks that the unused arguments are zero, so pass them with their full width
+    args = (ctypes.c_ulong(value), ctypes.c_ulong(0), ctypes.c_ulong(0), ctypes.c_ulong(0))
+    _check(_libc.prctl(ctypes.c_int(option), *args), f"prctl({option})")
+
+
+def _mount(source, target: str, fstype, flags: int, data=None):
+    _check(_libc.mount(source, target.encode(), fstype, ctypes.c_ulong(flags), data), f"mounting {target}")
+
+
+def isolate(uid: int, gid: int):
+    """!
+    @brief Isolate the forked program before the exec
+    @details Runs as pid 1 of the PID namespace unshared by main(). The working directory is bound
+             back into the tmpfs that hides its parent, so it keeps its path.
+    """
+    workdir = os.getcwd()
+    parent = os.path.dirname(workdir)
+    _mount(None, "/", None, MS_REC | MS_PRIVATE)
+    _mount(b"proc", "/proc", b"proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    workdir_fd = os.open(".", os.O_PATH | os.O_DIRECTORY)
+    for path in {parent, "/dev/shm"} - {"/"}:
+        if os.path.isdir(path):
+            _mount(b"tmpfs", path, b"tmpfs", MS_NOSUID | MS_NODEV, TMPFS_OPTIONS)
+    os.makedirs(workdir, exist_ok=True)
+    _mount(f"/proc/self/fd/{workdir_fd}".encode(), workdir, None, MS_BIND)
+    os.close(workdir_fd)
+    os.chdir(workdir)
+    os.chown(".", uid, gid)
+    os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+    _prctl(PR_SET_NO_NEW_PRIVS, 1)
+
+
+def main():
+    status_fd = int(sys.argv[1])
+    cpu_seconds, memory, file_size, uid, gid = (int(value) for value in sys.argv[2:7])
+    argv = sys.argv[7:]
+
+    # Neither the launcher nor the worker above it may be inspected through /proc by the program
+    _prctl(PR_SET_DUMPABLE, 0)
+    if uid >= 0:
+        try:
+            _check(_libc.unshare(CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS),
+                   "unshare")
+        except OSError as error:
+            os.write(status_fd, f"error Sandbox isolation failed: {error}\n".encode())
+            os._exit(0)
+
+    # Isolation errors of the child arrive here, the pipe is closed by a successful exec
+    error_read, error_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(status_fd)
+            os.close(error_read)
+            try:
+                if uid >= 0:
+                    isolate(uid, gid)
+            except OSError as error:
+                os.write(error_write, f"Sandbox isolation failed: {error}".encode())
+                os._exit(126)
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+            if memory:
+                resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+            resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+            os.execvp(argv[0], argv)
+        finally:
+            os._exit(127)
+
+    os.close(error_write)
+    with os.fdopen(error_read, "rb") as error_pipe:
+        error = error_pipe.read().decode(errors="replace")
+    if error:
+        os.waitpid(pid, 0)
+        os.write(status_fd, f"error {error}\n".encode())
+        os._exit(0)
+
+    os.write(status_fd, f"{pid}\n".encode())
+    # The launcher only waits, its own stdio belongs to the program
+    for fd in (0, 1, 2):
+        os.close(fd)
+    _, status, usage = os.wait4(pid, 0)
+    exit_code = os.waitstatus_to_exitcode(status)
+    cpu_time_ms = (usage.ru_utime + usage.ru_stime) * 1000
+    os.write(status_fd, f"{exit_code} {cpu_time_ms:.3f} {usage.ru_maxrss}\n".encode())
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
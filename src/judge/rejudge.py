@@ -0,0 +1,256 @@
+"""!
+@file rejudge.py
+@brief Incremental rejudging of the accepted submissions of a problem
+@details After test cases of a problem were added or fixed, a rejudge runs every accepted submission
+         of the problem against only the test cases it has no current result for. Every row of
+         submission_test_results names the case_hash() of the test case it was produced with, so
+         unchanged test cases are never executed again and submissions with results for the whole
+         current test set are skipped without executing anything. Identical code is executed once:
+         the jobs go through the verdict cache and the in-flight sharing of the judge service, keyed
+         by the code hash and the hash of the rejudged test cases.
+
+         The jobs wait in the judge queue in the rejudge priority class, whose small weight lets
+         live judging go first, and a rejudge keeps at most REJUDGE_CONCURRENCY of them in the
+         queue, so it never fills the queue or holds more than that many workers.
+
+         A failing test case turns the verdict of a submission into wrong_answer or error. Changed
+         verdicts are reported to the rejudge listeners of the judge service, which take failed
+         submissions off the leaderboards, the submission statistics and the results of their matches.
+         Results without any executed test case, such as compilation or judge errors, leave the verdict
+         alone and are counted as errors. Submissions judged before per-test-case results were stored
+         have no results yet and are run against all test cases once.
+"""
+
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import itertools
+import logging
+import os
+import time
+
+from database import AsyncSessionLocal
+from judge.cache import case_hash
+from judge.service import JudgeService
+from judge.submission_service import (
+    count_accepted_submissions, list_accepted_submissions, load_test_set, store_rejudge_result
+)
+from judge.worker import CaseResult, JudgeJob, TestCaseData
+from models.models import StatusEnum
+
+logger = logging.getLogger(__name__)
+
+## @brief Jobs of a rejudge waiting in the judge queue or executing at once
+REJUDGE_CONCURRENCY = int(os.getenv("REJUDGE_CONCURRENCY", 2))
+
+## @brief Accepted submissions loaded per round trip
+REJUDGE_BATCH_SIZE = 500
+
+
+class RejudgeConflict(Exception):
+    """!
+    @brief Raised when a rejudge of the problem is running already
+    """
+
+
+@dataclass
+class RejudgeProgress:
+    """!
+    @brief State and counters of a rejudge
+    @details status is running, finished, cancelled or failed. total counts the accepted submissions
+             when the rejudge started; checked ones were either up_to_date and skipped, or rejudged.
+             failed ones are not accepted anymore, errors could not be rejudged.
+    """
+    id: int
+    problem_id: int
+    started_at: datetime
+    status: str = "running"
+    total: int = 0
+    checked: int = 0
+    up_to_date: int = 0
+    rejudged: int = 0
+    failed: int = 0
+    errors: int = 0
+    test_cases_run: int = 0
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    def snapshot(self) -> dict:
+        """!
+        @brief The progress with the share of checked submissions and the elapsed time
+        @return dict: The fields of the progress, percent and elapsed_s
+        """
+        end = self.finished_at or datetime.now(timezone.utc)
+        return {
+            **self.__dict__,
+            "percent": round(100.0 * self.checked / self.total, 1) if self.total else 100.0,
+            "elapsed_s": round((end - self.started_at).total_seconds(), 1),
+        }
+
+
+class RejudgeService:
+    """!
+    @brief Rejudges of the application, at most one per problem at a time
+    @details Must be used from the event loop. The progress of the latest rejudge of every problem is
+             kept until the process ends.
+    """
+
+    def __init__(self, judge: JudgeService, concurrency: int = REJUDGE_CONCURRENCY):
+        self.judge = judge
+        self.concurrency = max(1, concurrency)
+        self.progress: Dict[int, RejudgeProgress] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._ids = itertools.count(1)
+
+    def start(self, problem_id: int) -> RejudgeProgress:
+        """!
+        @brief Rejudge the accepted submissions of a problem in the background
+        @param problem_id int: The problem, must exist
+        @return RejudgeProgress: The progress of the new rejudge
+        @throws RejudgeConflict: If a rejudge of the problem is running already
+        """
+        if problem_id in self._tasks:
+            raise RejudgeConflict(f"A rejudge of problem {problem_id} is running already")
+        progress = self.progress[problem_id] = RejudgeProgress(next(self._ids), problem_id,
+                                                               datetime.now(timezone.utc))
+        task = self._tasks[problem_id] = asyncio.create_task(self._run(progress))
+        task.add_done_callback(lambda _: self._tasks.pop(problem_id, None))
+        return progress
+
+    def get(self, problem_id: int) -> Optional[RejudgeProgress]:
+        """!
+        @brief The progress of the latest rejudge of a problem
+        @return RejudgeProgress|None: The progress, None if the problem was not rejudged
+        """
+        return self.progress.get(problem_id)
+
+    async def cancel(self, problem_id: int) -> bool:
+        """!
+        @brief Stop the running rejudge of a problem
+        @details Stored results stay, so running the rejudge again continues where it stopped.
+        @return bool: False if no rejudge of the problem is running
+        """
+        task = self._tasks.get(problem_id)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def stop(self):
+        """!
+        @brief Cancel all running rejudges
+        """
+        for problem_id in list(self._tasks):
+            await self.cancel(problem_id)
+
+    async def _run(self, progress: RejudgeProgress):
+        started = time.monotonic()
+        try:
+            await self._rejudge(progress)
+            progress.status = "finished"
+        except asyncio.CancelledError:
+            progress.status = "cancelled"
+            raise
+        except Exception as error:
+            logger.exception("Rejudge of problem %d failed", progress.problem_id)
+            progress.status, progress.error = "failed", str(error)
+        finally:
+            progress.finished_at = datetime.now(timezone.utc)
+            logger.info("Rejudge of problem %d %s after %.1f s: %d checked, %d rejudged, %d failed, %d errors",
+                        progress.problem_id, progress.status, time.monotonic() - started, progress.checked,
+                        progress.rejudged, progress.failed, progress.errors)
+
+    async def _rejudge(self, progress: RejudgeProgress):
+        async with AsyncSessionLocal() as db:
+            test_set = await load_test_set(db, progress.problem_id)
+            if test_set is None:
+                raise ValueError("Problem not found")
+            progress.total = await count_accepted_submissions(db, progress.problem_id)
+        checker, checker_tolerance, cases = test_set
+        hashes = {case.id: case_hash(case) for case in cases}
+
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+
+        def finished(task: asyncio.Task):
+            running.discard(task)
+            slots.release()
+
+        after_id = 0
+        try:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    rows, stored = await list_accepted_submissions(db, progress.problem_id, after_id,
+                                                                   REJUDGE_BATCH_SIZE)
+                for row in rows:
+                    done = stored.get(row.id, {})
+                    stale = [case for case in cases if done.get(case.id) != hashes[case.id]]
+                    if not stale:
+                        progress.checked += 1
+                        progress.up_to_date += 1
+                        continue
+                    job = JudgeJob(
+                        submission_id=row.id,
+                        problem_id=progress.problem_id,
+                        language=row.language,
+                        code=row.submitted_code,
+                        test_cases=stale,
+                        limits=self.judge.limits,
+                        user_id=row.user_id,
+                        checker=checker,
+                        checker_tolerance=checker_tolerance,
+                    )
+                    await slots.acquire()
+                    task = asyncio.create_task(self._rejudge_submission(progress, job, hashes))
+                    running.add(task)
+                    task.add_done_callback(finished)
+                if len(rows) < REJUDGE_BATCH_SIZE:
+                    break
+                after_id = rows[-1].id
+            while running:
+                await asyncio.wait(list(running))
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _rejudge_submission(self, progress: RejudgeProgress, job: JudgeJob, hashes: Dict[int, str]):
+        try:
+            result = await self.judge.judge_job(job)
+            if not result.cases and result.status != StatusEnum.accepted:
+                logger.warning("Rejudging submission %d executed no test case: %s", job.submission_id,
+                               result.detail.splitlines()[0] if result.detail else result.status.value)
+                progress.errors += 1
+                return
+            if result.status == StatusEnum.accepted:
+                result = replace(result, cases=_complete(result.cases, job.test_cases))
+            async with AsyncSessionLocal() as db:
+                stored = await store_rejudge_result(db, job.submission_id, result, hashes)
+            progress.rejudged += 1
+            progress.test_cases_run += len(result.cases)
+            if stored is None:
+                return
+            submission, previous = stored
+            if submission.status != StatusEnum.accepted:
+                progress.failed += 1
+            if (submission.status, submission.execution_time_ms, submission.memory_usage_mb) != (
+                    previous.status, previous.execution_time_ms, previous.memory_usage_mb):
+                self.judge.notify_rejudged(submission, previous)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Rejudging submission %d failed", job.submission_id)
+            progress.errors += 1
+        finally:
+            progress.checked += 1
+
+
+def _complete(cases: List[CaseResult], test_cases: List[TestCaseData]) -> List[CaseResult]:
+    """!
+    @brief Results of all test cases of an accepted verdict
+    @details Verdicts cached before per-test-case results were kept have none, all of their test
+             cases passed with unknown times.
+    """
+    executed = {case.test_case_id for case in cases}
+    return cases + [CaseResult(case.id, StatusEnum.accepted, None) for case in test_cases if case.id not in executed]
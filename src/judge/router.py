@@ -0,0 +1,320 @@
+"""!
+@file router.py
+@brief Submission API routes
+@details Provides FastAPI router endpoints to submit code for judging, to run code against the
+         examples of a problem or a custom input, to poll the verdict of a submission, to page through
+         the submission history, to inspect the judge load and, for admins, to rejudge the accepted
+         submissions of a problem. Submitting only stores and enqueues the submission, judging happens
+         in the background judge service.
+"""
+
+from datetime import datetime
+from typing import Optional
+import math
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from dependencies import get_current_admin, get_current_user, get_judge_service, get_rejudge
+from auth.principal_cache import Principal
+from models.models import StatusEnum
+from models.schemas import (
+    RejudgeStatus, RunCreate, RunResponse, SubmissionCreate, SubmissionPage, SubmissionResponse
+)
+from judge.rejudge import RejudgeConflict, RejudgeService
+from judge.sandbox import LANGUAGES
+from judge.scheduler import PRIORITY_MATCH, PRIORITY_PRACTICE
+from judge.service import JudgeService, JudgeQueueFull, JudgeRateLimited, RunSuperseded
+from judge.worker import RunJob
+from judge.submission_service import (
+    get_match, get_problem, get_submission, create_submission, is_match_player, list_user_submissions
+)
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+
+router = APIRouter(tags=["submissions"])
+
+
+@router.post("/submissions", response_model=SubmissionResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit(
+    submission_data: SubmissionCreate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    judge: JudgeService = Depends(get_judge_service)
+):
+    """!
+    @brief Submit code for judging
+    @details Stores the submission as pending and enqueues it. The verdict is written back
+             asynchronously and can be polled through GET /submissions/{submission_id}. Submissions
+             of a player to the problem of its running match are judged with priority over practice
+             submissions, every user is limited to a fair share of the judge (see judge/scheduler.py).
+    @param submission_data SubmissionCreate: Problem id, optional match id, language and source code
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param judge JudgeService: The judge service of the application
+    @return SubmissionResponse: The pending submission
+    @throws HTTPException: 400 for unsupported languages or a problem that is not the one of the match, 403 if the
+            user does not play in the match, 404 for unknown problems or matches, 429 if the user submits too
+            fast, 503 if the judge queue is full
+    """
+    if submission_data.language not in LANGUAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language, expected one of: {', '.join(LANGUAGES)}"
+        )
+
+    if await get_problem(db, submission_data.problem_id) is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+
+    priority = PRIORITY_PRACTICE
+    if submission_data.match_id is not None:
+        match = await get_match(db, submission_data.match_id)
+        if match is None:
+            raise HTTPException(status_code=404, detail="Match not found")
+        if not await is_match_player(db, match.id, current_user.id):
+            raise HTTPException(status_code=403, detail="Not a player of this match")
+        if match.problem_id is not None and match.problem_id != submission_data.problem_id:
+            raise HTTPException(status_code=400, detail="The problem is not the one of this match")
+        if match.ended_at is None:
+            priority = PRIORITY_MATCH
+
+    try:
+        judge.admit(current_user.id)
+    except JudgeRateLimited as error:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many submissions, please slow down",
+            headers={"Retry-After": str(math.ceil(error.retry_after))}
+        )
+    except JudgeQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Judge queue is full, please try again later",
+            headers={"Retry-After": "5"}
+        )
+
+    db_submission = await create_submission(
+        db, current_user.id, submission_data.problem_id, submission_data.language, submission_data.code,
+        submission_data.match_id
+    )
+
+    try:
+        judge.enqueue(db_submission.id, current_user.id, priority)
+    except JudgeQueueFull:
+        # The submission stays pending and is re-enqueued on the next judge start
+        raise HTTPException(
+            status_code=503,
+            detail="Judge queue is full, please try again later",
+            headers={"Retry-After": "5"}
+        )
+
+    return SubmissionResponse.model_validate(db_submission)
+
+
+@router.post("/problems/{problem_id}/run", response_model=RunResponse)
+async def run(
+    problem_id: int,
+    run_data: RunCreate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    judge: JudgeService = Depends(get_judge_service)
+):
+    """!
+    @brief Run code against the example of a problem or a custom input and wait for the outcome
+    @details Nothing is stored. Without input the code runs on the example input and its output is
+             checked against the example output with the problem's checker, with input the output is
+             returned unchecked. Running the same code on the same input again is answered from the
+             cache. A newer run of the same user and problem cancels this one.
+    @param problem_id int: The id of the problem
+    @param run_data RunCreate: Language, source code and optional custom input
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param judge JudgeService: The judge service of the application
+    @return RunResponse: Status, output and resource usage of the run
+    @throws HTTPException: 400 for unsupported languages or problems without example input, 404 for unknown problems,
+            409 if a newer run superseded this one, 429 if the user runs code too fast, 503 if the judge queue is full
+    """
+    if run_data.language not in LANGUAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language, expected one of: {', '.join(LANGUAGES)}"
+        )
+
+    problem = await get_problem(db, problem_id)
+    if problem is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    expected_output = None
+    if run_data.input is None:
+        if problem.example_input is None:
+            raise HTTPException(status_code=400, detail="Problem has no example input, provide an input")
+        expected_output = problem.example_output
+    job = RunJob(
+        run_id=0,
+        problem_id=problem.id,
+        language=run_data.language,
+        code=run_data.code,
+        input=problem.example_input if run_data.input is None else run_data.input,
+        limits=judge.run_limits,
+        expected_output=expected_output,
+        checker=problem.checker,
+        checker_tolerance=problem.checker_tolerance,
+    )
+    # Release the connection while the run waits for a worker
+    await db.close()
+
+    try:
+        result, cached = await judge.run(current_user.id, job)
+    except RunSuperseded:
+        raise HTTPException(status_code=409, detail="Superseded by a newer run")
+    except JudgeRateLimited as error:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many runs, please slow down",
+            headers={"Retry-After": str(math.ceil(error.retry_after))}
+        )
+    except JudgeQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Judge queue is full, please try again later",
+            headers={"Retry-After": "5"}
+        )
+    return RunResponse(
+        status=result.status, stdout=result.stdout, stderr=result.stderr, detail=result.detail,
+        execution_time_ms=result.execution_time_ms, memory_usage_mb=result.memory_usage_mb,
+        expected_output=expected_output, cached=cached
+    )
+
+
+@router.get("/submissions", response_model=SubmissionPage)
+async def list_submissions(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    problem_id: Optional[int] = None,
+    submission_status: Optional[StatusEnum] = Query(None, alias="status"),
+    match_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """!
+    @brief Get a page of the current user's submissions, newest first
+    @param limit int: Maximum number of submissions
+    @param cursor str|None: next_cursor of the previous page, None for the first page
+    @param problem_id int|None: Only submissions of this problem
+    @param submission_status StatusEnum|None: Only submissions with this status (query parameter status)
+    @param match_id int|None: Only submissions of this match
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @return SubmissionPage: The submissions and the cursor of the next page, None on the last page
+    @throws HTTPException: 400 for malformed cursors
+    """
+    try:
+        after = decode_cursor(cursor, (datetime.fromisoformat, int)) if cursor is not None else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # One extra row tells whether there is a next page
+    submissions = await list_user_submissions(db, current_user.id, limit + 1, after, problem_id,
+                                              submission_status, match_id)
+    next_cursor = None
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        next_cursor = encode_cursor(submissions[-1].submitted_at, submissions[-1].id)
+    return {"items": [SubmissionResponse.model_validate(item) for item in submissions], "next_cursor": next_cursor}
+
+
+@router.get("/submissions/{submission_id}", response_model=SubmissionResponse)
+async def get_submission_status(
+    submission_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """!
+    @brief Get the status and verdict of one of the current user's submissions
+    @param submission_id int: The id of the submission
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @return SubmissionResponse: The submission with its current status
+    @throws HTTPException: 404 if the submission does not exist or belongs to another user
+    """
+    db_submission = await get_submission(db, submission_id)
+    if db_submission is None or db_submission.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return SubmissionResponse.model_validate(db_submission)
+
+
+@router.get("/judge/stats")
+async def get_judge_stats(
+    current_user: Principal = Depends(get_current_user),
+    judge: JudgeService = Depends(get_judge_service)
+):
+    """!
+    @brief Get the load of the judge
+    @details Reports the queue depth, the average queue latency, the size and hit/miss counters of
+             the warm runtime pools of the judge workers and the hit rates of the judge caches
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param judge JudgeService: The judge service of the application
+    @return dict: Judge statistics
+    """
+    return judge.stats()
+
+
+@router.post("/problems/{problem_id}/rejudge", response_model=RejudgeStatus, status_code=status.HTTP_202_ACCEPTED)
+async def start_rejudge(
+    problem_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    rejudge: RejudgeService = Depends(get_rejudge)
+):
+    """!
+    @brief Rejudge the accepted submissions of a problem against its new and changed test cases
+    @details Runs in the background at a low priority, poll GET /problems/{problem_id}/rejudge for the progress.
+    @param problem_id int: The id of the problem
+    @param current_user Principal: The authenticated admin (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param rejudge RejudgeService: The rejudges of the application
+    @return RejudgeStatus: The progress of the started rejudge
+    @throws HTTPException: 403 for non-admins, 404 for unknown problems, 409 if the problem is being rejudged already
+    """
+    if await get_problem(db, problem_id) is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    try:
+        return rejudge.start(problem_id).snapshot()
+    except RejudgeConflict as error:
+        raise HTTPException(status_code=409, detail=str(error))
+
+
+@router.get("/problems/{problem_id}/rejudge", response_model=RejudgeStatus)
+async def get_rejudge_status(
+    problem_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    rejudge: RejudgeService = Depends(get_rejudge)
+):
+    """!
+    @brief Get the progress of the latest rejudge of a problem
+    @param problem_id int: The id of the problem
+    @param current_user Principal: The authenticated admin (injected by dependency)
+    @param rejudge RejudgeService: The rejudges of the application
+    @return RejudgeStatus: The progress
+    @throws HTTPException: 403 for non-admins, 404 if the problem was not rejudged since the start of the API
+    """
+    progress = rejudge.get(problem_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No rejudge of this problem")
+    return progress.snapshot()
+
+
+@router.delete("/problems/{problem_id}/rejudge", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_rejudge(
+    problem_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    rejudge: RejudgeService = Depends(get_rejudge)
+):
+    """!
+    @brief Cancel the running rejudge of a problem, starting it again continues where it stopped
+    @param problem_id int: The id of the problem
+    @param current_user Principal: The authenticated admin (injected by dependency)
+    @param rejudge RejudgeService: The rejudges of the application
+    @throws HTTPException: 403 for non-admins, 404 if the problem is not being rejudged
+    """
+    if not await rejudge.cancel(problem_id):
+        raise HTTPException(status_code=404, detail="No running rejudge of this problem")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,209 @@
+"""!
+@file runtime_pool.py
+@brief Pool of pre-warmed batch harness runtimes
+@details Every judge worker process keeps a few harnesses per language started ahead of time: the
+         interpreter is up, common modules are imported and the sandbox limits are in place, so a
+         submission only has to send its code. A background thread refills the pool after every
+         acquisition and runtimes are recycled after JUDGE_RUNTIME_MAX_USES submissions.
+
+         Reusing a runtime lets state left behind by one submission (imported modules, threads, files
+         in the working directory) be observed by the next one, which may belong to another user.
+         JUDGE_RUNTIME_MAX_USES therefore defaults to 1: runtimes are still pre-warmed but never shared.
+"""
+
+from collections import deque
+from typing import Optional
+import logging
+import multiprocessing.util
+import os
+import shutil
+import tempfile
+import threading
+
+from judge.sandbox import LANGUAGES, Language, Limits
+from judge.batch import BatchRun
+
+logger = logging.getLogger(__name__)
+
+## @brief Number of idle runtimes kept per language in every judge worker, 0 disables the pool
+JUDGE_RUNTIME_POOL_SIZE = int(os.getenv("JUDGE_RUNTIME_POOL_SIZE", 2))
+
+## @brief Number of submissions a runtime may judge before it is replaced
+JUDGE_RUNTIME_MAX_USES = int(os.getenv("JUDGE_RUNTIME_MAX_USES", 1))
+
+## @brief Lifetime CPU rlimit of a pooled runtime, in multiples of the per-case CPU limit
+RUNTIME_CPU_BUDGET_CASES = 500
+
+
+class RuntimePool:
+    """!
+    @brief Idle batch harnesses per language, refilled in the background
+    """
+
+    def __init__(self, limits: Limits, size: int = JUDGE_RUNTIME_POOL_SIZE, max_uses: int = JUDGE_RUNTIME_MAX_USES):
+        self.limits = limits
+        self.size = size
+        self.max_uses = max(1, max_uses)
+        self.languages = [language for language in LANGUAGES.values() if language.harness is not None]
+        self._idle = {language.name: deque() for language in self.languages}
+        self._counters = {
+            language.name: {"hits": 0, "misses": 0, "spawned": 0, "recycled": 0, "reused": 0}
+            for language in self.languages
+        }
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._refiller = threading.Thread(target=self._refill, name="runtime-pool-refill", daemon=True)
+        if self.size > 0:
+            self._refiller.start()
+
+    def acquire(self, language: Language, limits: Limits) -> BatchRun:
+        """!
+        @brief Take a warm runtime for a submission, starting a cold one on a miss
+        @param language Language: The language of the submission, must have a harness
+        @param limits Limits: The limits the submission is judged with
+        @return BatchRun: A runtime waiting for the code of the submission
+        """
+        runtime = None
+        dead = []
+        with self._lock:
+            idle = self._idle.get(language.name)
+            # Runtimes were started with the pool limits, other limits need a runtime of their own
+            while idle and limits == self.limits:
+                candidate = idle.popleft()
+                if candidate.alive:
+                    runtime = candidate
+                    break
+                dead.append(candidate)
+            counters = self._counters.get(language.name)
+            if counters is not None:
+                counters["hits" if runtime is not None else "misses"] += 1
+                counters["recycled"] += len(dead)
+            self._wakeup.notify()
+        for candidate in dead:
+            close_runtime(candidate)
+        return runtime if runtime is not None else start_runtime(language, limits)
+
+    def release(self, runtime: BatchRun, reusable: bool):
+        """!
+        @brief Hand a runtime back after it judged a submission
+        @details The runtime is recycled if it was used max_uses times, if the submission broke it
+                 or if the caller does not consider it reusable.
+        @param runtime BatchRun: The runtime returned by acquire()
+        @param reusable bool: Whether the submission finished cleanly
+        """
+        language = runtime.language
+        with self._lock:
+            idle = self._idle.get(language.name)
+            keep = (
+                reusable and idle is not None and not self._closed and runtime.limits == self.limits
+                and runtime.uses < self.max_uses and len(idle) < self.size and runtime.alive
+            )
+            if keep:
+                idle.append(runtime)
+                self._counters[language.name]["reused"] += 1
+                return
+            if language.name in self._counters:
+                self._counters[language.name]["recycled"] += 1
+        close_runtime(runtime)
+
+    def stats(self) -> dict:
+        """!
+        @brief Pool size and hit/miss counters per language
+        @return dict: Statistics keyed by language name
+        """
+        with self._lock:
+            return {
+                name: {"idle": len(self._idle[name]), **counters}
+                for name, counters in self._counters.items()
+            }
+
+    def close(self):
+        """!
+        @brief Stop refilling and shut all idle runtimes down
+        """
+        with self._lock:
+            self._closed = True
+            idle = [runtime for runtimes in self._idle.values() for runtime in runtimes]
+            for runtimes in self._idle.values():
+                runtimes.clear()
+            self._wakeup.notify_all()
+        for runtime in idle:
+            close_runtime(runtime)
+
+    def _missing(self):
+        for language in self.languages:
+            if len(self._idle[language.name]) < self.size:
+                return language
+        return None
+
+    def _refill(self):
+        while True:
+            with self._lock:
+                while not self._closed and self._missing() is None:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                language = self._missing()
+            try:
+                runtime = start_runtime(language, self.limits)
+            except Exception:
+                logger.exception("Starting a %s runtime failed", language.name)
+                with self._lock:
+                    self._wakeup.wait(timeout=5)
+                continue
+            with self._lock:
+                if self._closed:
+                    break
+                self._idle[language.name].append(runtime)
+                self._counters[language.name]["spawned"] += 1
+        close_runtime(runtime)
+
+
+def start_runtime(language: Language, limits: Limits) -> BatchRun:
+    """!
+    @brief Start a runtime in a working directory of its own
+    @param language Language: The language of the runtime, must have a harness
+    @param limits Limits: Limits applied to every single test case
+    @return BatchRun: The started runtime
+    """
+    workdir = tempfile.mkdtemp(prefix="coderunner-runtime-")
+    try:
+        return BatchRun(language, workdir, limits, limits.cpu_time_ms * RUNTIME_CPU_BUDGET_CASES)
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+
+
+def close_runtime(runtime: BatchRun):
+    """!
+    @brief Shut a runtime down and remove its working directory
+    @param runtime BatchRun: The runtime to close
+    """
+    runtime.close()
+    shutil.rmtree(runtime.cwd, ignore_errors=True)
+
+
+## @brief Runtime pool of the current judge worker process
+_pool: Optional[RuntimePool] = None
+
+
+def init_runtime_pool(limits: Limits):
+    """!
+    @brief Create the runtime pool of a judge worker process
+    @details Used as initializer of the judge process pool, the refill thread starts warming
+             runtimes right away.
+    @param limits Limits: The default limits of the judge service
+    """
+    global _pool
+    _pool = RuntimePool(limits)
+    # Worker processes leave through multiprocessing, which skips atexit but runs its finalizers
+    multiprocessing.util.Finalize(_pool, _pool.close, exitpriority=10)
+
+
+def get_runtime_pool() -> Optional[RuntimePool]:
+    """!
+    @brief Runtime pool of the current judge worker process
+    @return RuntimePool|None: The pool, None outside of judge workers or if the pool is disabled
+    """
+    return _pool if _pool is not None and _pool.size > 0 else None
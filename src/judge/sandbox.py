@@ -0,0 +1,368 @@
+"""!
+@file sandbox.py
+@brief Process sandbox used by the judge workers to execute submitted code
+@details Runs a program in its own session under CPU, memory, file size and wall-clock limits
+         and reports its exit status, output and resource usage. Unless JUDGE_SANDBOX_ISOLATION is
+         "none" the program runs in its own namespaces as JUDGE_SANDBOX_USER, see launcher.py. Also
+         holds the table of supported languages with their compile and run commands.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+import ctypes
+import functools
+import math
+import os
+import pwd
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+## @brief Size of the chunks read from and written to the sandboxed process pipes
+CHUNK_SIZE = 64 * 1024
+
+## @brief Maximum number of stderr bytes kept for diagnostics
+STDERR_LIMIT = 64 * 1024
+
+## @brief Path of the batch harness for Python submissions
+PYTHON_HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harness.py")
+
+## @brief Path of the launcher script that applies the limits and execs the sandboxed program
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+
+## @brief Environment handed to sandboxed processes
+## @details Replaces the environment of the judge worker instead of extending it, so the variables of
+##          the server do not show up in the environment of submitted code. Secrets are also kept out
+##          of the judge workers themselves (see service.py), and the isolation below keeps the program
+##          from reading the memory or /proc entries of any process outside its sandbox.
+SANDBOX_ENV = {
+    "PATH": os.environ.get("PATH", "/usr/local/bin:/usr/bin:/bin"),
+    "LANG": "C.UTF-8",
+    "PYTHONDONTWRITEBYTECODE": "1",
+}
+
+## @brief "namespaces" to isolate programs as described in launcher.py, "none" to only apply the rlimits
+## @details Isolation needs the judge to run as root. "none" is meant for development machines only,
+##          programs then run with the privileges of the API and can read its files and connect to the network.
+JUDGE_SANDBOX_ISOLATION = os.getenv("JUDGE_SANDBOX_ISOLATION", "namespaces")
+
+## @brief Unprivileged user (name or uid) that isolated programs run as
+## @details It must be able to read and execute the interpreters and compilers but should own no files.
+##          Setting it to root keeps the namespaces but not the privilege drop, for development only.
+JUDGE_SANDBOX_USER = os.getenv("JUDGE_SANDBOX_USER", "nobody")
+
+
+class SandboxError(Exception):
+    """!
+    @brief The sandbox could not be set up, the program was not started
+    """
+
+
+def sandbox_ids() -> tuple:
+    """!
+    @brief The uid and gid isolated programs run as
+    @return tuple: (uid, gid), (-1, -1) if programs are not isolated
+    """
+    if JUDGE_SANDBOX_ISOLATION == "none":
+        return -1, -1
+    if JUDGE_SANDBOX_USER.isdigit():
+        return int(JUDGE_SANDBOX_USER), int(JUDGE_SANDBOX_USER)
+    entry = pwd.getpwnam(JUDGE_SANDBOX_USER)
+    return entry.pw_uid, entry.pw_gid
+
+
+@dataclass(frozen=True)
+class Limits:
+    """!
+    @brief Resource limits applied to a single sandboxed process
+    """
+    cpu_time_ms: int
+    memory_mb: int
+    wall_time_ms: int
+    output_bytes: int = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Language:
+    """!
+    @brief Compile and run description of a supported language
+    @details Commands are executed inside the submission working directory. The run command
+             must read the test input from stdin and write the answer to stdout.
+    """
+    name: str
+    source: str
+    run: tuple
+    compile: Optional[tuple] = None
+    ## Runtimes that reserve large virtual address ranges up front (JVM, V8) cannot run
+    ## under RLIMIT_AS and are limited through their own heap flags instead
+    limit_address_space: bool = True
+    ## Command line of a batch harness that runs all test cases in one process (see batch.py),
+    ## languages without one are started once per test case
+    harness: Optional[tuple] = None
+
+
+## @brief Languages accepted in Submission.language, keyed by their identifier
+LANGUAGES = {
+    "python": Language("python", "main.py", (sys.executable, "-I", "main.py"),
+                       harness=(sys.executable, "-I", PYTHON_HARNESS)),
+    "c": Language("c", "main.c", ("./main",), compile=("gcc", "-O2", "-std=c11", "-o", "main", "main.c", "-lm")),
+    "cpp": Language("cpp", "main.cpp", ("./main",), compile=("g++", "-O2", "-std=c++17", "-o", "main", "main.cpp")),
+    "java": Language("java", "Main.java", ("java", "-Xss64m", "-XX:+UseSerialGC", "Main"),
+                     compile=("javac", "Main.java"), limit_address_space=False),
+    "javascript": Language("javascript", "main.js", ("node", "main.js"), limit_address_space=False),
+}
+
+## @brief Limits used for compiler invocations
+COMPILE_LIMITS = Limits(cpu_time_ms=15000, memory_mb=1024, wall_time_ms=30000)
+
+
+@dataclass
+class ProcessResult:
+    """!
+    @brief Outcome of a sandboxed process run
+    """
+    exit_code: int
+    stdout: bytes
+    stderr: bytes
+    cpu_time_ms: float
+    wall_time_ms: float
+    memory_mb: float
+    timed_out: bool = False
+    output_exceeded: bool = False
+    ## The output was rejected by the checker while the program was running
+    diverged: bool = False
+
+
+def make_undumpable():
+    """!
+    @brief Keep the current process from being inspected through ptrace or its /proc entries by its own uid
+    @details Called in every judge worker, whose memory holds the problems' expected outputs.
+    """
+    PR_SET_DUMPABLE = 4
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.prctl(PR_SET_DUMPABLE, ctypes.c_ulong(0), ctypes.c_ulong(0), ctypes.c_ulong(0), ctypes.c_ulong(0)) != 0:
+        raise OSError(ctypes.get_errno(), "prctl(PR_SET_DUMPABLE) failed")
+
+
+def kill_process_group(pid: int):
+    """!
+    @brief Kill a sandboxed process together with everything it spawned
+    @param pid int: Process id of the session leader
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_process(pid: int):
+    """!
+    @brief Kill a single sandboxed program, leaving its launcher alive to report its resource usage
+    @param pid int: Process id of the program
+    """
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def spawn(argv, cwd: str, limits: Limits, limit_address_space: bool = True):
+    """!
+    @brief Start a process in a new session under the given limits
+    @details The program is started through the launcher, which reports the program's exit code and
+             resource usage on the returned status pipe once it has exited.
+    @param argv Sequence[str]: Command line to execute
+    @param cwd str: Working directory of the process
+    @param limits Limits: Resource limits to apply
+    @param limit_address_space bool: Whether to limit the address space
+    @return tuple: (subprocess.Popen with stdin, stdout and stderr pipes, readable status pipe fd,
+            pid of the program)
+    @throws SandboxError: If the program could not be isolated
+    """
+    cpu_seconds = max(1, math.ceil(limits.cpu_time_ms / 1000))
+    memory = limits.memory_mb * 1024 * 1024 if limit_address_space else 0
+    try:
+        uid, gid = sandbox_ids()
+    except KeyError:
+        raise SandboxError(f"Unknown sandbox user '{JUDGE_SANDBOX_USER}'") from None
+    status_read, status_write = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, "-I", "-S", LAUNCHER, str(status_write),
+             str(cpu_seconds), str(memory), str(limits.output_bytes), str(uid), str(gid), *argv],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=SANDBOX_ENV,
+            start_new_session=True,
+            pass_fds=(status_write,),
+        )
+    except BaseException:
+        os.close(status_read)
+        raise
+    finally:
+        os.close(status_write)
+    line = _read_line(status_read)
+    if line.startswith(b"error"):
+        proc.communicate()
+        os.close(status_read)
+        raise SandboxError(line[len(b"error"):].decode(errors="replace").strip())
+    return proc, status_read, int(line) if line else 0
+
+
+class PipeReader(threading.Thread):
+    """!
+    @brief Background reader draining a pipe up to a byte limit
+    @details With a sink the data is handed to sink.feed() chunk by chunk instead of being kept. Once
+             the sink rejects a chunk, on_reject is called and reading stops.
+    """
+
+    def __init__(self, pipe, limit: int, on_overflow=None, sink=None, on_reject=None):
+        super().__init__(daemon=True)
+        self.pipe = pipe
+        self.limit = limit
+        self.on_overflow = on_overflow
+        self.sink = sink
+        self.on_reject = on_reject
+        self.chunks = []
+        self.size = 0
+        self.overflowed = False
+        self.diverged = False
+
+    def run(self):
+        while True:
+            chunk = self.pipe.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            if self.overflowed or self.diverged:
+                # Keep draining so the writer never blocks on a full pipe
+                continue
+            if self.size + len(chunk) > self.limit:
+                self.chunks.append(chunk[:self.limit - self.size])
+                self.size = self.limit
+                self.overflowed = True
+                if self.on_overflow is not None:
+                    self.on_overflow()
+                    break
+                continue
+            self.size += len(chunk)
+            if self.sink is None:
+                self.chunks.append(chunk)
+            elif not self.sink.feed(chunk):
+                self.diverged = True
+                if self.on_reject is not None:
+                    self.on_reject()
+                    break
+
+    def data(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+def _feed(pipe, data):
+    """!
+    @brief Write the test input to the stdin of a process and close it
+    @details Writes slices of the buffer, so a memory-mapped input is streamed from the page cache
+             without being copied. A process that exits without reading all of its input is not an error.
+    """
+    try:
+        with memoryview(data) as view:
+            for offset in range(0, len(view), CHUNK_SIZE):
+                pipe.write(view[offset:offset + CHUNK_SIZE])
+        pipe.close()
+    except (BrokenPipeError, OSError):
+        pass
+
+
+def wait(proc: subprocess.Popen, status_fd: int):
+    """!
+    @brief Reap a sandboxed process and collect its resource usage
+    @details The usage is the one the launcher measured with wait4() for the program alone. If the
+             launcher was killed before it could report, the program counts as killed by SIGKILL.
+    @param proc subprocess.Popen: The launcher process to reap
+    @param status_fd int: Status pipe returned by spawn(), closed by this function
+    @return tuple: (exit code, cpu time in ms, peak memory in MB)
+    """
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    with os.fdopen(status_fd, "rb") as status_pipe:
+        lines = status_pipe.read().splitlines()
+    report = lines[-1].split() if lines else []
+    if len(report) != 3:
+        return -signal.SIGKILL, (usage.ru_utime + usage.ru_stime) * 1000, usage.ru_maxrss / 1024
+    # ru_maxrss is reported in kilobytes on Linux
+    return int(report[0]), float(report[1]), int(report[2]) / 1024
+
+
+def _read_line(status_fd: int) -> bytes:
+    """!
+    @brief Read the first line of the launcher status pipe
+    @return bytes: The line without its newline, empty if the launcher exited without writing one
+    """
+    line = b""
+    while not line.endswith(b"\n"):
+        byte = os.read(status_fd, 1)
+        if not byte:
+            return b""
+        line += byte
+    return line[:-1]
+
+
+def run_process(argv, cwd: str, stdin_data, limits: Limits,
+                limit_address_space: bool = True, stdout_sink=None, on_spawn=None) -> ProcessResult:
+    """!
+    @brief Run a program to completion inside the sandbox
+    @details Feeds stdin_data to the process, collects stdout up to the output limit and kills
+             the whole process group once the wall-clock limit is reached. With a stdout_sink the
+             output is streamed into it instead of being collected, and the program is killed as
+             soon as the sink rejects it.
+    @param argv Sequence[str]: Command line to execute
+    @param cwd str: Working directory of the process
+    @param stdin_data bytes|mmap.mmap: Data written to the process stdin, any buffer; must stay valid
+           until the call returns
+    @param limits Limits: Resource limits to apply
+    @param limit_address_space bool: Whether to limit the address space
+    @param stdout_sink Checker|None: Receives the output through feed(chunk) -> bool
+    @param on_spawn callable|None: Called with the process group id right after the start, so the run
+           can be killed from another process with kill_process_group()
+    @return ProcessResult: Exit status, output (empty with a sink) and resource usage of the run
+    @throws SandboxError: If the program could not be isolated
+    """
+    started = time.perf_counter()
+    proc, status_fd, program = spawn(argv, cwd, limits, limit_address_space)
+    if on_spawn is not None:
+        on_spawn(proc.pid)
+    killer = functools.partial(kill_process_group, proc.pid)
+    # Only the program is killed on rejected output, so the launcher still reports its usage
+    stdout = PipeReader(proc.stdout, limits.output_bytes, on_overflow=killer, sink=stdout_sink,
+                        on_reject=functools.partial(kill_process, program) if program else killer)
+    stderr = PipeReader(proc.stderr, STDERR_LIMIT)
+    writer = threading.Thread(target=_feed, args=(proc.stdin, stdin_data), daemon=True)
+    timer = threading.Timer(limits.wall_time_ms / 1000, killer)
+    for thread in (stdout, stderr, writer, timer):
+        thread.start()
+
+    exit_code, cpu_time_ms, memory_mb = wait(proc, status_fd)
+    wall_time_ms = (time.perf_counter() - started) * 1000
+    timer.cancel()
+    # Take down anything the program left running so the pipes reach EOF
+    kill_process_group(proc.pid)
+    for thread in (stdout, stderr, writer):
+        thread.join()
+    for pipe in (proc.stdin, proc.stdout, proc.stderr):
+        pipe.close()
+
+    return ProcessResult(
+        exit_code=exit_code,
+        stdout=stdout.data(),
+        stderr=stderr.data(),
+        cpu_time_ms=cpu_time_ms,
+        wall_time_ms=wall_time_ms,
+        memory_mb=memory_mb,
+        timed_out=(wall_time_ms >= limits.wall_time_ms or cpu_time_ms > limits.cpu_time_ms
+                   or exit_code == -signal.SIGXCPU),
+        output_exceeded=stdout.overflowed,
+        diverged=stdout.diverged,
+    )
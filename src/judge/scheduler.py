@@ -0,0 +1,244 @@
+"""!
+@file scheduler.py
+@brief Fair-share queue and per-user admission control in front of the judge workers
+@details FairQueue orders queued jobs by start-time fair queuing. Every job belongs to a flow: the
+         user who submitted it within a priority class. A flow of weight w advances its virtual
+         finish time by 1/w per job, and the dispatchers take the job with the smallest finish time.
+         A user flooding the queue only pushes its own later jobs back. A job of an idle flow waits
+         for at most about one job of every other busy flow, however long their backlogs are.
+
+         The weight of a flow is the weight of its priority class: quick runs of the examples come
+         before live-match submissions, which come before practice submissions, and rejudges of
+         old submissions come last. The weights are relative shares, so even under constant
+         high-priority load practice submissions keep moving.
+
+         AdmissionControl hands every user a token bucket of JUDGE_USER_BURST submissions refilled
+         at JUDGE_USER_RATE per second and limits the jobs a user may have queued. Runs of the run
+         endpoint draw from a bucket of their own (JUDGE_USER_RUN_BURST, JUDGE_USER_RUN_RATE). Rejected
+         submissions and runs are told when to retry instead of growing the queue.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+import asyncio
+import heapq
+import math
+import os
+import time
+
+## @brief Priority classes of judge jobs
+PRIORITY_RUN = "run"
+PRIORITY_MATCH = "match"
+PRIORITY_PRACTICE = "practice"
+PRIORITY_REJUDGE = "rejudge"
+
+## @brief Share of the judge workers of every priority class relative to each other
+PRIORITY_WEIGHTS = {
+    PRIORITY_RUN: float(os.getenv("JUDGE_WEIGHT_RUN", 8)),
+    PRIORITY_MATCH: float(os.getenv("JUDGE_WEIGHT_MATCH", 4)),
+    PRIORITY_PRACTICE: float(os.getenv("JUDGE_WEIGHT_PRACTICE", 1)),
+    PRIORITY_REJUDGE: float(os.getenv("JUDGE_WEIGHT_REJUDGE", 0.5)),
+}
+
+## @brief Submissions per second a user is granted in the long run
+JUDGE_USER_RATE = float(os.getenv("JUDGE_USER_RATE", 0.5))
+
+## @brief Submissions a user may send at once after being idle
+JUDGE_USER_BURST = float(os.getenv("JUDGE_USER_BURST", 10))
+
+## @brief Jobs a single user may have waiting in the queue
+JUDGE_USER_MAX_QUEUED = int(os.getenv("JUDGE_USER_MAX_QUEUED", 20))
+
+## @brief Runs of the run endpoint a user may start per second, in the long run
+JUDGE_USER_RUN_RATE = float(os.getenv("JUDGE_USER_RUN_RATE", 1))
+
+## @brief Runs a user may start at once after being idle
+JUDGE_USER_RUN_BURST = float(os.getenv("JUDGE_USER_RUN_BURST", 10))
+
+
+class QueueFull(Exception):
+    """!
+    @brief Raised by FairQueue.put_nowait() when the queue holds its maximum number of jobs
+    """
+
+
+@dataclass
+class QueuedJob:
+    """!
+    @brief A job waiting in the fair queue
+    """
+    item: object
+    user_id: Optional[int]
+    priority: str
+    enqueued_at: float
+
+
+class _Flow:
+    __slots__ = ("finish", "queued")
+
+    def __init__(self):
+        self.finish = 0.0
+        self.queued = 0
+
+
+class FairQueue:
+    """!
+    @brief Weighted fair queue of judge jobs with an asyncio interface
+    @details put_nowait() and get() are O(log n). Must be used from the event loop.
+    """
+
+    def __init__(self, maxsize: int = 0, weights: Dict[str, float] = PRIORITY_WEIGHTS):
+        self.maxsize = maxsize
+        self.weights = dict(weights)
+        self._heap: List[Tuple[float, int, QueuedJob]] = []
+        self._flows: Dict[Hashable, _Flow] = {}
+        self._queued_by_user: Dict[Optional[int], int] = {}
+        self._queued_by_priority: Dict[str, int] = {priority: 0 for priority in self.weights}
+        self._virtual_time = 0.0
+        self._sequence = 0
+        self._getters: List[asyncio.Future] = []
+        self._putters: List[asyncio.Future] = []
+
+    def qsize(self) -> int:
+        return len(self._heap)
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._heap)
+
+    def queued_by(self, user_id: Optional[int]) -> int:
+        """!
+        @brief Number of jobs of a user waiting in the queue
+        """
+        return self._queued_by_user.get(user_id, 0)
+
+    def put_nowait(self, item, user_id: Optional[int] = None, priority: str = PRIORITY_PRACTICE):
+        """!
+        @brief Queue a job
+        @param item object: The job, returned by get()
+        @param user_id int|None: The user the job belongs to, None for jobs without owner
+        @param priority str: PRIORITY_RUN, PRIORITY_MATCH, PRIORITY_PRACTICE or PRIORITY_REJUDGE
+        @throws QueueFull: If the queue holds maxsize jobs
+        @throws ValueError: For unknown priority classes
+        """
+        if self.full():
+            raise QueueFull()
+        weight = self.weights.get(priority)
+        if weight is None:
+            raise ValueError(f"unknown priority class {priority}")
+        flow = self._flows.get((priority, user_id))
+        if flow is None:
+            flow = self._flows[(priority, user_id)] = _Flow()
+        # An idle flow starts at the current virtual time and does not bank credit for its idle time
+        flow.finish = max(flow.finish, self._virtual_time) + 1.0 / weight
+        flow.queued += 1
+        self._queued_by_user[user_id] = self._queued_by_user.get(user_id, 0) + 1
+        self._queued_by_priority[priority] += 1
+        self._sequence += 1
+        heapq.heappush(self._heap, (flow.finish, self._sequence, QueuedJob(item, user_id, priority, time.monotonic())))
+        self._wake(self._getters)
+
+    async def put(self, item, user_id: Optional[int] = None, priority: str = PRIORITY_PRACTICE):
+        """!
+        @brief Queue a job, waiting while the queue is full
+        """
+        while self.full():
+            await self._wait(self._putters, self.full)
+        self.put_nowait(item, user_id, priority)
+
+    async def get(self) -> QueuedJob:
+        """!
+        @brief Take the job with the smallest virtual finish time, waiting while the queue is empty
+        @return QueuedJob: The job with its owner, priority and enqueue time
+        """
+        while not self._heap:
+            await self._wait(self._getters, lambda: not self._heap)
+        finish, _, job = heapq.heappop(self._heap)
+        # Start-time fair queuing: the clock follows the tag of the job taken into service
+        self._virtual_time = max(self._virtual_time, finish - 1.0 / self.weights[job.priority])
+        key = (job.priority, job.user_id)
+        flow = self._flows[key]
+        flow.queued -= 1
+        if flow.queued == 0:
+            # An idle flow is at most one job ahead of the virtual time, forgetting it bounds the memory
+            del self._flows[key]
+        self._queued_by_priority[job.priority] -= 1
+        remaining = self._queued_by_user[job.user_id] - 1
+        if remaining:
+            self._queued_by_user[job.user_id] = remaining
+        else:
+            del self._queued_by_user[job.user_id]
+        self._wake(self._putters)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """!
+        @brief Number of queued jobs per priority class
+        """
+        return dict(self._queued_by_priority)
+
+    async def _wait(self, waiters: List[asyncio.Future], blocked):
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in waiters:
+                waiters.remove(waiter)
+            elif not blocked():
+                # Woken but cancelled before acting on it, pass the wake-up on
+                self._wake(waiters)
+            raise
+
+    @staticmethod
+    def _wake(waiters: List[asyncio.Future]):
+        while waiters:
+            waiter = waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+
+class AdmissionControl:
+    """!
+    @brief Per-user token buckets limiting the rate of submissions
+    @details Buckets of users that are full again are dropped, so the memory follows the number of
+             recently active users.
+    """
+
+    def __init__(self, rate: float = JUDGE_USER_RATE, burst: float = JUDGE_USER_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._last_prune = time.monotonic()
+
+    def acquire(self, user_id: int) -> float:
+        """!
+        @brief Take a token of a user
+        @param user_id int: The user
+        @return float: 0 if the submission is admitted, otherwise the seconds until a token is available
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1.0:
+            self._buckets[user_id] = (tokens, now)
+            return (1.0 - tokens) / self.rate if self.rate > 0 else math.inf
+        self._buckets[user_id] = (tokens - 1.0, now)
+        self._prune(now)
+        return 0.0
+
+    def refund(self, user_id: int):
+        """!
+        @brief Give a token back, for submissions rejected after acquire()
+        """
+        tokens, updated = self._buckets.get(user_id, (self.burst, time.monotonic()))
+        self._buckets[user_id] = (min(self.burst, tokens + 1.0), updated)
+
+    def _prune(self, now: float):
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        refill = self.burst / self.rate if self.rate > 0 else math.inf
+        for user_id, (tokens, updated) in list(self._buckets.items()):
+            if now - updated >= refill:
+                del self._buckets[user_id]
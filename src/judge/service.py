@@ -0,0 +1,683 @@
+"""!
+@file service.py
+@brief Asynchronous judging pipeline
+@details The judge service owns a bounded fair-share queue of submission ids (see judge/scheduler.py)
+         and a pool of worker processes. Request handlers check the admission of the user, enqueue a
+         submission and return; dispatcher tasks on the event loop move queued submissions into the
+         process pool and write the verdicts back to the database.
+         The submissions table acts as the durable queue: pending rows are re-enqueued on startup.
+         Byte-identical resubmissions against an unchanged test set are answered from the verdict
+         cache, and identical submissions judged at the same time share a single execution.
+         Runs of the run endpoint execute code once against the examples or a custom input without a
+         submission. They share the queue in the run priority class, are cached like verdicts, and a
+         newer run of the same user and problem drops or kills the one before it. Rejudges (see
+         judge/rejudge.py) hand judge jobs of stored submissions in through judge_job().
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import popen_spawn_posix, reduction, resource_tracker, spawn, util
+from multiprocessing.context import set_spawning_popen
+from dataclasses import replace
+from fastapi.concurrency import run_in_threadpool
+from typing import Tuple
+import asyncio
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from database import AsyncSessionLocal
+from models.models import StatusEnum
+from judge.cache import case_hash, code_hash, get_verdict_cache, limits_key, run_key, test_set_hash, verdict_key
+from judge.sandbox import Limits, kill_process_group
+from judge.scheduler import (
+    JUDGE_USER_MAX_QUEUED, JUDGE_USER_RUN_BURST, JUDGE_USER_RUN_RATE, PRIORITY_MATCH, PRIORITY_PRACTICE,
+    PRIORITY_REJUDGE, PRIORITY_RUN, AdmissionControl, FairQueue, QueueFull
+)
+from judge.worker import (
+    RUN_ERROR, CaseResult, JudgeJob, JudgeResult, RunJob, RunResult, init_worker, judge_submission, run_code,
+    warm_up
+)
+from judge.submission_service import get_pending_submissions, load_judge_job, store_judge_result
+from monitoring.metrics import (
+    JUDGE_QUEUE_WAIT_SECONDS, JUDGE_REJECTED, JUDGE_RUNS, JUDGE_STAGE_SECONDS, JUDGE_VERDICTS
+)
+
+logger = logging.getLogger(__name__)
+
+## @brief Number of judge worker processes, defaults to the number of CPU cores
+JUDGE_WORKERS = int(os.getenv("JUDGE_WORKERS", os.cpu_count() or 1))
+
+## @brief Maximum number of submissions waiting in the judge queue
+JUDGE_QUEUE_SIZE = int(os.getenv("JUDGE_QUEUE_SIZE", 10000))
+
+## @brief Retry-After in seconds for users with JUDGE_USER_MAX_QUEUED submissions waiting
+JUDGE_FULL_USER_RETRY_S = 5.0
+
+## @brief Default limits applied to every test case run
+JUDGE_LIMITS = Limits(
+    cpu_time_ms=int(os.getenv("JUDGE_TIME_LIMIT_MS", 2000)),
+    memory_mb=int(os.getenv("JUDGE_MEMORY_LIMIT_MB", 256)),
+    wall_time_ms=int(os.getenv("JUDGE_WALL_TIME_LIMIT_MS", 5000)),
+)
+
+## @brief Output a run may write, its output is returned to the user
+JUDGE_RUN_OUTPUT_BYTES = int(os.getenv("JUDGE_RUN_OUTPUT_BYTES", 64 * 1024))
+
+## @brief Parts of the names of environment variables that are kept out of the judge workers
+## @details The workers need neither the database nor the signing key, and a variable they never had
+##          cannot be read from their /proc/<pid>/environ
+SECRET_ENV_MARKERS = ("SECRET", "PASSWORD", "TOKEN", "CREDENTIAL", "_KEY", "DATABASE_URL")
+
+## @brief Program that starts the judge workers with an explicit environment
+WORKER_ENV_LAUNCHER = "/usr/bin/env"
+
+
+def worker_environment() -> dict:
+    """!
+    @brief Environment of the judge workers
+    @return dict: The variables of the API process without the ones matching SECRET_ENV_MARKERS
+    """
+    return {
+        name: value for name, value in os.environ.items()
+        if not any(marker in name.upper() for marker in SECRET_ENV_MARKERS)
+    }
+
+
+def worker_command(command: list) -> list:
+    """!
+    @brief Prefix the command line of a spawned interpreter with WORKER_ENV_LAUNCHER
+    @param command list: Command line built by multiprocessing.spawn.get_command_line()
+    @return list: Arguments of WORKER_ENV_LAUNCHER that run the command in worker_environment()
+    """
+    variables = [f"{name}={value}" for name, value in worker_environment().items()]
+    return [WORKER_ENV_LAUNCHER, "-i", *variables, *command]
+
+
+class JudgeQueueFull(Exception):
+    """!
+    @brief Raised when a submission cannot be enqueued because the judge queue is full
+    """
+
+
+class JudgeRateLimited(Exception):
+    """!
+    @brief Raised when a user submits or runs code faster than the admission control allows
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+class RunSuperseded(Exception):
+    """!
+    @brief Raised when a run was replaced by a newer run of the same user and problem
+    """
+
+
+class _PendingRun:
+    """!
+    @brief A run from its enqueueing until its worker finished
+    """
+    __slots__ = ("job", "future", "process_group", "superseded")
+
+    def __init__(self, job: RunJob, future: asyncio.Future):
+        self.job = job
+        self.future = future
+        self.process_group = 0
+        self.superseded = False
+
+
+class _PendingJudge:
+    """!
+    @brief A judge job handed in through JudgeService.judge_job(), with the future of its verdict
+    """
+    __slots__ = ("job", "future")
+
+    def __init__(self, job: JudgeJob, future: asyncio.Future):
+        self.job = job
+        self.future = future
+
+
+class _WorkerPopen(popen_spawn_posix.Popen):
+    """!
+    @brief Spawns a judge worker without the secrets of the API environment
+    @details Works like the spawn start method, with two differences. The interpreter is started through
+             env -i with an explicit environment that lacks the secrets, so the environment of the API
+             process is never changed. And the worker does not import the __main__ module of the API
+             process: running `python main.py` would import the application and auth.auth, which
+             refuses to load without SECRET_KEY. Everything a worker runs lives in importable modules.
+    """
+
+    def _launch(self, process_obj):
+        tracker_fd = resource_tracker.getfd()
+        self._fds.append(tracker_fd)
+        prep_data = spawn.get_preparation_data(process_obj._name)
+        prep_data.pop("init_main_from_path", None)
+        prep_data.pop("init_main_from_name", None)
+        data = io.BytesIO()
+        set_spawning_popen(self)
+        try:
+            reduction.dump(prep_data, data)
+            reduction.dump(process_obj, data)
+        finally:
+            set_spawning_popen(None)
+
+        parent_r = child_w = child_r = parent_w = None
+        try:
+            parent_r, child_w = os.pipe()
+            child_r, parent_w = os.pipe()
+            command = spawn.get_command_line(tracker_fd=tracker_fd, pipe_handle=child_r)
+            self._fds.extend([child_r, child_w])
+            self.pid = util.spawnv_passfds(os.fsencode(WORKER_ENV_LAUNCHER), worker_command(command), self._fds)
+            self.sentinel = parent_r
+            with open(parent_w, "wb", closefd=False) as pipe:
+                pipe.write(data.getbuffer())
+        finally:
+            self.finalizer = util.Finalize(self, util.close_fds, [fd for fd in (parent_r, parent_w) if fd is not None])
+            for fd in (child_r, child_w):
+                if fd is not None:
+                    os.close(fd)
+
+
+class _WorkerProcess(multiprocessing.context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        return _WorkerPopen(process_obj)
+
+
+class _WorkerContext(multiprocessing.context.SpawnContext):
+    Process = _WorkerProcess
+
+
+class JudgeService:
+    """!
+    @brief Queue and worker pool that judge pending submissions in the background
+    """
+
+    def __init__(self, workers: int = JUDGE_WORKERS, queue_size: int = JUDGE_QUEUE_SIZE,
+                 limits: Limits = JUDGE_LIMITS):
+        self.workers = workers
+        self.limits = limits
+        self._queue = FairQueue(maxsize=queue_size)
+        self.admission = AdmissionControl()
+        self.run_admission = AdmissionControl(JUDGE_USER_RUN_RATE, JUDGE_USER_RUN_BURST)
+        self.run_limits = replace(limits, output_bytes=JUDGE_RUN_OUTPUT_BYTES)
+        self._run_ids = itertools.count(1)
+        self._runs = {}
+        self._run_owners = {}
+        self._pool = None
+        self._tasks = []
+        self.judged = 0
+        self.total_queue_wait_ms = 0.0
+        self.cache = get_verdict_cache()
+        self._inflight = {}
+        self._listeners = []
+        self._rejudge_listeners = []
+        self._progress_listeners = []
+        self._running = {}
+        self._progress = None
+        self._progress_reader = None
+        self._worker_stats = {}
+
+    async def start(self):
+        """!
+        @brief Start the worker processes and dispatchers and re-enqueue pending submissions
+        """
+        loop = asyncio.get_running_loop()
+        self._progress = multiprocessing.get_context("spawn").Queue()
+        self._progress_reader = threading.Thread(
+            target=self._read_progress, args=(loop, self._progress), name="judge-progress", daemon=True
+        )
+        self._progress_reader.start()
+        self._pool = self._create_pool()
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover()))
+        self._tasks.append(asyncio.create_task(self._warm_up()))
+
+    async def stop(self):
+        """!
+        @brief Stop the dispatchers and shut the worker processes down
+        @details Submissions still in the queue stay pending in the database and are picked up
+                 again on the next start.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._progress is not None:
+            self._progress.put(None)
+            self._progress_reader.join()
+            self._progress.close()
+            self._progress = self._progress_reader = None
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # Worker processes are spawned rather than forked so they do not inherit the event loop,
+        # open database connections, threads or secrets of the API process
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_WorkerContext(),
+            initializer=init_worker,
+            initargs=(self.limits, self._progress),
+        )
+
+    def add_listener(self, listener):
+        """!
+        @brief Register a callback for stored verdicts
+        @details Listeners run on the event loop right after a verdict was committed and must not
+                 block. Exceptions are logged and do not affect judging.
+        @param listener callable: Called with the updated Submission and the JudgeResult
+        """
+        self._listeners.append(listener)
+
+    def add_rejudge_listener(self, listener):
+        """!
+        @brief Register a callback for verdicts changed by a rejudge
+        @details Called like the listeners of add_listener() whenever a rejudge (see judge/rejudge.py) turned
+                 an accepted submission into a failed one or changed its execution time or memory usage.
+        @param listener callable: Called with the updated Submission and its StoredVerdict before the rejudge
+        """
+        self._rejudge_listeners.append(listener)
+
+    def notify_rejudged(self, submission, previous):
+        """!
+        @brief Report a verdict changed by a rejudge to the rejudge listeners
+        @param submission Submission: The rejudged submission with its stored verdict
+        @param previous StoredVerdict: Its verdict before the rejudge
+        """
+        for listener in self._rejudge_listeners:
+            try:
+                listener(submission, previous)
+            except Exception:
+                logger.exception("Rejudge listener failed for submission %d", submission.id)
+
+    def add_progress_listener(self, listener):
+        """!
+        @brief Register a callback for the progress of running submissions
+        @details Called on the event loop with the JudgeJob and the number of passed and total test
+                 cases, once when judging starts and after every executed test case. Must not block.
+        @param listener callable: Called with job, passed and total
+        """
+        self._progress_listeners.append(listener)
+
+    def admit(self, user_id: int):
+        """!
+        @brief Check whether a user may submit now, before the submission is stored
+        @details Takes a token of the user's bucket, see judge/scheduler.py.
+        @param user_id int: The submitting user
+        @throws JudgeQueueFull: If the queue already holds JUDGE_QUEUE_SIZE submissions
+        @throws JudgeRateLimited: If the user has JUDGE_USER_MAX_QUEUED submissions queued or no token left
+        """
+        self._admit(user_id, self.admission)
+
+    def _admit(self, user_id: int, admission: AdmissionControl):
+        if self._queue.full():
+            JUDGE_REJECTED.labels("queue_full").inc()
+            raise JudgeQueueFull()
+        if self._queue.queued_by(user_id) >= JUDGE_USER_MAX_QUEUED:
+            JUDGE_REJECTED.labels("user_queue_full").inc()
+            raise JudgeRateLimited(JUDGE_FULL_USER_RETRY_S)
+        retry_after = admission.acquire(user_id)
+        if retry_after > 0:
+            JUDGE_REJECTED.labels("rate_limited").inc()
+            raise JudgeRateLimited(min(retry_after, 3600.0))
+
+    def enqueue(self, submission_id: int, user_id: int = None, priority: str = PRIORITY_PRACTICE):
+        """!
+        @brief Queue a submission for judging without waiting for the verdict
+        @param submission_id int: The id of a pending submission
+        @param user_id int|None: The submitting user, whose submissions share one fair-queuing flow
+        @param priority str: PRIORITY_MATCH for submissions to running matches, PRIORITY_PRACTICE otherwise
+        @throws JudgeQueueFull: If the queue already holds JUDGE_QUEUE_SIZE submissions
+        """
+        try:
+            self._queue.put_nowait(submission_id, user_id, priority)
+        except QueueFull:
+            if user_id is not None:
+                self.admission.refund(user_id)
+            JUDGE_REJECTED.labels("queue_full").inc()
+            raise JudgeQueueFull()
+
+    async def run(self, user_id: int, job: RunJob) -> Tuple[RunResult, bool]:
+        """!
+        @brief Execute code once, from the cache if the same code already ran on the same input
+        @details Takes a token of the user's run bucket, then supersedes the unfinished run of the same
+                 user and problem, even if this one is answered from the cache: a queued one is dropped,
+                 an executing one is killed.
+        @param user_id int: The user running the code
+        @param job RunJob: The code and input, run_id is assigned here
+        @return tuple[RunResult, bool]: The outcome and whether it came from the cache
+        @throws JudgeQueueFull: If the queue already holds JUDGE_QUEUE_SIZE jobs
+        @throws JudgeRateLimited: If the user has JUDGE_USER_MAX_QUEUED jobs queued or no run token left
+        @throws RunSuperseded: If a newer run of the user and problem replaced this one
+        """
+        self._admit(user_id, self.run_admission)
+        owner = (user_id, job.problem_id)
+        previous = self._run_owners.get(owner)
+        if previous is not None:
+            self._supersede(previous)
+        job.run_id = next(self._run_ids)
+        pending = _PendingRun(job, asyncio.get_running_loop().create_future())
+        # Registered before the cache lookup, so a newer run started meanwhile supersedes this one
+        self._run_owners[owner] = pending
+        try:
+            key = run_key(job.language, code_hash(job.language, job.code), job.input, job.expected_output,
+                          f"{job.checker}:{job.checker_tolerance}", limits_key(job.limits))
+            cached = await run_in_threadpool(self.cache.get, job.problem_id, key)
+            if pending.superseded:
+                raise RunSuperseded()
+            if cached is not None:
+                JUDGE_RUNS.labels("cache").inc()
+                return RunResult(**cached), True
+            try:
+                self._queue.put_nowait(pending, user_id, PRIORITY_RUN)
+            except QueueFull:
+                self.run_admission.refund(user_id)
+                JUDGE_REJECTED.labels("queue_full").inc()
+                raise JudgeQueueFull()
+            self._runs[job.run_id] = pending
+            try:
+                result = await pending.future
+            except asyncio.CancelledError:
+                # Nobody waits for the outcome anymore
+                self._supersede(pending)
+                raise
+        finally:
+            if self._run_owners.get(owner) is pending:
+                del self._run_owners[owner]
+        if result is None:
+            raise RunSuperseded()
+
+        JUDGE_RUNS.labels("executed").inc()
+        if result.cacheable:
+            await run_in_threadpool(self.cache.put, job.problem_id, key, {
+                "status": result.status,
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+                "execution_time_ms": result.execution_time_ms,
+                "memory_usage_mb": result.memory_usage_mb,
+                "detail": result.detail,
+            })
+        return result, False
+
+    async def judge_job(self, job: JudgeJob, priority: str = PRIORITY_REJUDGE) -> JudgeResult:
+        """!
+        @brief Judge a job built outside the submissions queue and wait for the verdict
+        @details The verdict is neither stored nor reported to the listeners, and no progress is
+                 published. Waits while the queue is full.
+        @param job JudgeJob: The job, usually a stored submission against some of its test cases
+        @param priority str: The priority class of the job in the queue
+        @return JudgeResult: The verdict
+        """
+        pending = _PendingJudge(job, asyncio.get_running_loop().create_future())
+        await self._queue.put(pending, None, priority)
+        return await pending.future
+
+    def stats(self) -> dict:
+        """!
+        @brief Current queue depth, average queue latency, runtime pool and cache counters
+        @details Worker counters are summed over the latest snapshot reported by every worker.
+        @return dict: Queue statistics of this service
+        """
+        workers = {}
+        for snapshot in self._worker_stats.values():
+            _add_counters(workers, snapshot)
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "queued_by_priority": self._queue.stats(),
+            "judged": self.judged,
+            "avg_queue_wait_ms": self.total_queue_wait_ms / self.judged if self.judged else 0.0,
+            "inflight": len(self._inflight),
+            "runs": len(self._runs),
+            "runtimes": workers.get("runtimes", {}),
+            "artifact_cache": workers.get("artifacts", {}),
+            "blob_store": workers.get("blobs", {}),
+            "verdict_cache": self.cache.stats(),
+        }
+
+    async def _warm_up(self):
+        # Process pools start workers on demand, submit one no-op per worker to start them all now
+        loop = asyncio.get_running_loop()
+        snapshots = await asyncio.gather(
+            *(loop.run_in_executor(self._pool, warm_up) for _ in range(self.workers)),
+            return_exceptions=True
+        )
+        for snapshot in snapshots:
+            if isinstance(snapshot, dict):
+                self._worker_stats[snapshot["worker_pid"]] = snapshot["worker_stats"]
+
+    async def _recover(self):
+        pending = await _with_session(get_pending_submissions)
+        if pending:
+            logger.info("Re-enqueueing %d pending submissions", len(pending))
+        for submission_id, user_id, match_id in pending:
+            await self._queue.put(submission_id, user_id, PRIORITY_PRACTICE if match_id is None else PRIORITY_MATCH)
+
+    async def _dispatch(self):
+        while True:
+            queued = await self._queue.get()
+            if isinstance(queued.item, _PendingRun):
+                await self._dispatch_run(queued.item, queued.enqueued_at)
+                continue
+            if isinstance(queued.item, _PendingJudge):
+                await self._dispatch_job(queued.item, queued.enqueued_at, queued.priority)
+                continue
+            submission_id = queued.item
+            try:
+                queue_wait = time.monotonic() - queued.enqueued_at
+                self.total_queue_wait_ms += queue_wait * 1000
+                JUDGE_STAGE_SECONDS.labels("queue_wait").observe(queue_wait)
+                JUDGE_QUEUE_WAIT_SECONDS.labels(queued.priority).observe(queue_wait)
+                job = await _with_session(load_judge_job, submission_id, self.limits)
+                if job is None:
+                    continue
+                result = await self._judge(job)
+                case_hashes = {case.id: case_hash(case) for case in job.test_cases}
+                submission = await _with_session(store_judge_result, submission_id, result, case_hashes)
+                self.judged += 1
+                if submission is not None:
+                    self._notify(submission, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Dispatching submission %d failed", submission_id)
+
+    async def _dispatch_run(self, pending: _PendingRun, enqueued_at: float):
+        JUDGE_QUEUE_WAIT_SECONDS.labels(PRIORITY_RUN).observe(time.monotonic() - enqueued_at)
+        result = None
+        try:
+            if pending.superseded:
+                return
+            result = await self._execute_run(pending.job)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Executing run %d failed", pending.job.run_id)
+            result = RunResult(RUN_ERROR, detail="Internal judge error", cacheable=False)
+        finally:
+            # The process group of the run may be reused from now on
+            self._runs.pop(pending.job.run_id, None)
+            if not pending.future.done():
+                pending.future.set_result(None if pending.superseded else result)
+
+    async def _dispatch_job(self, pending: _PendingJudge, enqueued_at: float, priority: str):
+        JUDGE_QUEUE_WAIT_SECONDS.labels(priority).observe(time.monotonic() - enqueued_at)
+        if pending.future.done():
+            # The caller stopped waiting
+            return
+        result = JudgeResult(StatusEnum.error, detail="Internal judge error", cacheable=False)
+        try:
+            result = await self._judge(pending.job, report=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Judging job of submission %d failed", pending.job.submission_id)
+        finally:
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    def _supersede(self, pending: _PendingRun):
+        pending.superseded = True
+        if not pending.future.done():
+            pending.future.set_result(None)
+        if pending.process_group and pending.job.run_id in self._runs:
+            kill_process_group(pending.process_group)
+        JUDGE_RUNS.labels("superseded").inc()
+
+    def _read_progress(self, loop: asyncio.AbstractEventLoop, progress):
+        # Blocks on the queue filled by the workers, so it runs in a thread of its own
+        handlers = {"progress": self._on_progress, "run": self._on_run_started}
+        while True:
+            item = progress.get()
+            if item is None:
+                return
+            try:
+                loop.call_soon_threadsafe(handlers[item[0]], *item[1:])
+            except RuntimeError:
+                # The event loop is closed
+                return
+
+    def _on_run_started(self, run_id: int, process_group: int):
+        pending = self._runs.get(run_id)
+        if pending is None:
+            # The run finished before its start was reported
+            return
+        pending.process_group = process_group
+        if pending.superseded:
+            kill_process_group(process_group)
+
+    def _on_progress(self, submission_id: int, passed: int, total: int):
+        job = self._running.get(submission_id)
+        if job is None:
+            return
+        for listener in self._progress_listeners:
+            try:
+                listener(job, passed, total)
+            except Exception:
+                logger.exception("Judge progress listener failed for submission %d", submission_id)
+
+    def _notify(self, submission, result: JudgeResult):
+        for listener in self._listeners:
+            try:
+                listener(submission, result)
+            except Exception:
+                logger.exception("Judge listener failed for submission %d", submission.id)
+
+    async def _judge(self, job: JudgeJob, report: bool = True) -> JudgeResult:
+        """!
+        @brief Produce the verdict of a job from the cache, a running execution or the worker pool
+        @param job JudgeJob: The job to judge
+        @param report bool: Whether to publish the progress of an execution
+        @return JudgeResult: The verdict
+        """
+        key = verdict_key(job.language, code_hash(job.language, job.code), test_set_hash(job.test_cases),
+                          f"{job.checker}:{job.checker_tolerance}", limits_key(job.limits))
+        cached = await run_in_threadpool(self.cache.get, job.problem_id, key)
+        if cached is not None:
+            JUDGE_VERDICTS.labels(cached["status"], "cache").inc()
+            return JudgeResult(StatusEnum(cached["status"]), cached["execution_time_ms"],
+                               cached["memory_usage_mb"], cached["detail"], passed=cached.get("passed", 0),
+                               total=len(job.test_cases),
+                               cases=[CaseResult(case_id, StatusEnum(status), execution_time_ms)
+                                      for case_id, status, execution_time_ms in cached.get("cases", ())])
+
+        running = self._inflight.get(key)
+        if running is not None:
+            result = await asyncio.shield(running)
+            JUDGE_VERDICTS.labels(result.status.value, "shared").inc()
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result = JudgeResult(StatusEnum.error, detail="Internal judge error", cacheable=False)
+        try:
+            result = await self._execute(job, report)
+            for stage, seconds in result.timings.items():
+                JUDGE_STAGE_SECONDS.labels(stage).observe(seconds)
+            if result.cacheable:
+                await run_in_threadpool(self.cache.put, job.problem_id, key, {
+                    "status": result.status.value,
+                    "execution_time_ms": result.execution_time_ms,
+                    "memory_usage_mb": result.memory_usage_mb,
+                    "detail": result.detail,
+                    "passed": result.passed,
+                    "cases": [[case.test_case_id, case.status.value, case.execution_time_ms] for case in result.cases],
+                })
+        except Exception:
+            logger.exception("Judging submission %d failed", job.submission_id)
+        finally:
+            JUDGE_VERDICTS.labels(result.status.value, "executed").inc()
+            del self._inflight[key]
+            # Waiting duplicates get the same verdict, also when this dispatcher is cancelled
+            future.set_result(result)
+        return result
+
+    async def _execute(self, job: JudgeJob, report: bool = True) -> JudgeResult:
+        if report:
+            self._running[job.submission_id] = job
+            self._on_progress(job.submission_id, 0, len(job.test_cases))
+        try:
+            return await self._in_pool(judge_submission, job)
+        except BrokenProcessPool:
+            logger.exception("Judge worker pool broke while judging submission %d", job.submission_id)
+            return JudgeResult(StatusEnum.error, detail="Internal judge error", cacheable=False)
+        finally:
+            # Progress still queued by the worker is dropped, the verdict follows right away
+            if report:
+                self._running.pop(job.submission_id, None)
+
+    async def _execute_run(self, job: RunJob) -> RunResult:
+        try:
+            return await self._in_pool(run_code, job)
+        except BrokenProcessPool:
+            logger.exception("Judge worker pool broke while executing run %d", job.run_id)
+            return RunResult(RUN_ERROR, detail="Internal judge error", cacheable=False)
+
+    async def _in_pool(self, function, job):
+        """!
+        @brief Run a worker function in the pool and keep the statistics of the worker
+        @throws BrokenProcessPool: If a worker died, the pool is replaced once
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            result = await loop.run_in_executor(pool, function, job)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OOM killer), replace the pool once
+            if self._pool is pool:
+                self._pool = self._create_pool()
+                self._worker_stats.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._worker_stats[result.worker_pid] = result.worker_stats
+        return result
+
+
+def _add_counters(totals: dict, counters: dict):
+    """!
+    @brief Sum nested counter dicts into totals, non-numeric values are ignored
+    """
+    for name, value in counters.items():
+        if isinstance(value, dict):
+            _add_counters(totals.setdefault(name, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            totals[name] = totals.get(name, 0) + value
+
+
+async def _with_session(function, *args):
+    """!
+    @brief Run a service function with a short-lived database session
+    @param function callable: Asynchronous service function taking the session as first argument
+    @return Any: The return value of the function
+    """
+    async with AsyncSessionLocal() as db:
+        return await function(db, *args)
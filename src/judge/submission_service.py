@@ -0,0 +1,309 @@
+"""!
+@file submission_service.py
+@brief Submission service layer for database operations
+@details Provides service functions to create submissions, load them as judge jobs and store the
+         verdicts produced by the judge workers together with their per-test-case results, and to
+         page through the accepted submissions of a problem for rejudging. All functions take an
+         asynchronous session.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from models.models import Match, MatchPlayer, Submission, SubmissionTestResult, Problem, TestCase, StatusEnum
+from judge.sandbox import Limits
+from judge.worker import CaseResult, JudgeJob, JudgeResult, TestCaseData
+
+
+@dataclass(frozen=True)
+class StoredVerdict:
+    """!
+    @brief Verdict columns of a submission as they were before a rejudge changed them
+    """
+    status: StatusEnum
+    execution_time_ms: Optional[float]
+    memory_usage_mb: Optional[float]
+
+
+async def get_problem(db: AsyncSession, problem_id: int):
+    """!
+    @brief Retrieve a problem by id
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem_id int: The id of the problem
+    @return Problem|None: Problem object if found, None otherwise
+    """
+    return await db.get(Problem, problem_id)
+
+
+async def get_match(db: AsyncSession, match_id: int):
+    """!
+    @brief Retrieve a match by id
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param match_id int: The id of the match
+    @return Match|None: Match object if found, None otherwise
+    """
+    return await db.get(Match, match_id)
+
+
+async def is_match_player(db: AsyncSession, match_id: int, user_id: int) -> bool:
+    """!
+    @brief Check whether a user plays in a match
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param match_id int: The id of the match
+    @param user_id int: The id of the user
+    @return bool: True if the user is one of the players of the match
+    """
+    return await db.get(MatchPlayer, (match_id, user_id)) is not None
+
+
+async def get_submission(db: AsyncSession, submission_id: int):
+    """!
+    @brief Retrieve a submission by id
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param submission_id int: The id of the submission
+    @return Submission|None: Submission object if found, None otherwise
+    """
+    return await db.get(Submission, submission_id)
+
+
+async def list_user_submissions(db: AsyncSession, user_id: int, limit: int,
+                                after: Optional[Tuple[datetime, int]] = None, problem_id: Optional[int] = None,
+                                status: Optional[StatusEnum] = None, match_id: Optional[int] = None):
+    """!
+    @brief List the submissions of a user, newest first
+    @details Keyset pagination over (submitted_at, id) descending, served by the
+             ix_submissions_user_id_submitted_at index. The submitted code is not loaded.
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param user_id int: The id of the user
+    @param limit int: Maximum number of submissions
+    @param after tuple[datetime, int]|None: (submitted_at, id) of the last submission of the previous page
+    @param problem_id int|None: Only submissions of this problem
+    @param status StatusEnum|None: Only submissions with this status
+    @param match_id int|None: Only submissions of this match
+    @return list[Submission]: Up to limit submissions
+    """
+    query = select(Submission).options(defer(Submission.submitted_code)).where(Submission.user_id == user_id)
+    if after is not None:
+        query = query.where(tuple_(Submission.submitted_at, Submission.id) < tuple_(*after))
+    if problem_id is not None:
+        query = query.where(Submission.problem_id == problem_id)
+    if status is not None:
+        query = query.where(Submission.status == status)
+    if match_id is not None:
+        query = query.where(Submission.match_id == match_id)
+    query = query.order_by(Submission.submitted_at.desc(), Submission.id.desc()).limit(limit)
+    return list((await db.execute(query)).scalars())
+
+
+async def create_submission(db: AsyncSession, user_id: int, problem_id: int, language: str, code: str,
+                            match_id: Optional[int] = None):
+    """!
+    @brief Store a new pending submission
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param user_id int: The id of the submitting user
+    @param problem_id int: The id of the problem the code solves
+    @param language str: The language identifier of the code
+    @param code str: The submitted source code
+    @param match_id int|None: The match the submission belongs to, if any
+    @return Submission: The newly created submission in StatusEnum.pending
+    """
+    db_submission = Submission(
+        user_id=user_id,
+        problem_id=problem_id,
+        language=language,
+        submitted_code=code,
+        match_id=match_id,
+        status=StatusEnum.pending
+    )
+    db.add(db_submission)
+    await db.commit()
+    await db.refresh(db_submission)
+    return db_submission
+
+
+async def get_pending_submissions(db: AsyncSession):
+    """!
+    @brief List all submissions that still wait for a verdict
+    @details Used to refill the judge queue after a restart, oldest submissions first.
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @return list[tuple[int, int, int|None]]: Id, user id and match id of the pending submissions
+    """
+    rows = await db.execute(
+        select(Submission.id, Submission.user_id, Submission.match_id)
+        .where(Submission.status == StatusEnum.pending)
+        .order_by(Submission.id)
+    )
+    return [tuple(row) for row in rows]
+
+
+async def load_judge_job(db: AsyncSession, submission_id: int, limits: Limits):
+    """!
+    @brief Build the judge job of a pending submission
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param submission_id int: The id of the submission to judge
+    @param limits Limits: Resource limits applied to every test case run
+    @return JudgeJob|None: The job, or None if the submission does not exist or was already judged
+    """
+    submission = await get_submission(db, submission_id)
+    if submission is None or submission.status != StatusEnum.pending:
+        return None
+    checker, checker_tolerance, test_cases = await load_test_set(db, submission.problem_id)
+    return JudgeJob(
+        submission_id=submission.id,
+        problem_id=submission.problem_id,
+        language=submission.language,
+        code=submission.submitted_code,
+        test_cases=test_cases,
+        limits=limits,
+        user_id=submission.user_id,
+        match_id=submission.match_id,
+        checker=checker,
+        checker_tolerance=checker_tolerance,
+    )
+
+
+async def store_judge_result(db: AsyncSession, submission_id: int, result: JudgeResult,
+                             case_hashes: Optional[Dict[int, str]] = None):
+    """!
+    @brief Write a verdict back to its submission
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param submission_id int: The id of the judged submission
+    @param result JudgeResult: The verdict produced by the judge worker
+    @param case_hashes dict[int, str]|None: case_hash() of the judged test cases by id, to store the
+           per-test-case results of the verdict
+    @return Submission|None: The updated submission, None if it no longer exists
+    """
+    submission = await get_submission(db, submission_id)
+    if submission is None:
+        return None
+    submission.status = result.status
+    submission.execution_time_ms = result.execution_time_ms
+    submission.memory_usage_mb = result.memory_usage_mb
+    if case_hashes is not None:
+        await store_test_results(db, submission_id, result.cases, case_hashes)
+    await db.commit()
+    return submission
+
+
+async def store_test_results(db: AsyncSession, submission_id: int, cases: List[CaseResult],
+                             case_hashes: Dict[int, str]):
+    """!
+    @brief Replace the results of executed test cases of a submission, without committing
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param submission_id int: The id of the submission
+    @param cases list[CaseResult]: The executed test cases
+    @param case_hashes dict[int, str]: case_hash() of the test cases by id
+    """
+    if not cases:
+        return
+    await db.execute(delete(SubmissionTestResult).where(
+        SubmissionTestResult.submission_id == submission_id,
+        SubmissionTestResult.test_case_id.in_([case.test_case_id for case in cases])
+    ))
+    await db.execute(insert(SubmissionTestResult), [{
+        "submission_id": submission_id,
+        "test_case_id": case.test_case_id,
+        "case_hash": case_hashes[case.test_case_id],
+        "status": case.status,
+        "execution_time_ms": case.execution_time_ms,
+    } for case in cases])
+
+
+async def load_test_set(db: AsyncSession, problem_id: int):
+    """!
+    @brief Load the checker and the test cases of a problem as shipped to the judge workers
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem_id int: The id of the problem
+    @return tuple|None: (checker, checker tolerance, list[TestCaseData]), None for unknown problems
+    """
+    checker = (await db.execute(
+        select(Problem.checker, Problem.checker_tolerance).where(Problem.id == problem_id)
+    )).one_or_none()
+    if checker is None:
+        return None
+    test_cases = (await db.execute(
+        select(TestCase).where(TestCase.problem_id == problem_id).order_by(TestCase.id)
+    )).scalars().all()
+    return checker.checker, checker.checker_tolerance, [
+        TestCaseData(case.id, case.input, case.expected_output, case.input_blob, case.expected_output_blob)
+        for case in test_cases
+    ]
+
+
+async def count_accepted_submissions(db: AsyncSession, problem_id: int) -> int:
+    """!
+    @brief Count the accepted submissions of a problem
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem_id int: The id of the problem
+    @return int: The number of accepted submissions
+    """
+    return (await db.execute(
+        select(func.count()).select_from(Submission)
+        .where(Submission.problem_id == problem_id, Submission.status == StatusEnum.accepted)
+    )).scalar_one()
+
+
+async def list_accepted_submissions(db: AsyncSession, problem_id: int, after_id: int, limit: int):
+    """!
+    @brief Get a batch of the accepted submissions of a problem with their stored test case results
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem_id int: The id of the problem
+    @param after_id int: Only submissions with a higher id
+    @param limit int: Maximum number of submissions
+    @return tuple: (rows with id, user_id, language and submitted_code in id order,
+            dict of submission id to {test case id: case hash} of the stored results)
+    """
+    rows = (await db.execute(
+        select(Submission.id, Submission.user_id, Submission.language, Submission.submitted_code)
+        .where(Submission.problem_id == problem_id, Submission.status == StatusEnum.accepted,
+               Submission.id > after_id)
+        .order_by(Submission.id)
+        .limit(limit)
+    )).all()
+    stored: Dict[int, Dict[int, str]] = {}
+    if rows:
+        results = await db.execute(
+            select(SubmissionTestResult.submission_id, SubmissionTestResult.test_case_id,
+                   SubmissionTestResult.case_hash)
+            .where(SubmissionTestResult.submission_id.in_([row.id for row in rows]))
+        )
+        for submission_id, test_case_id, digest in results:
+            stored.setdefault(submission_id, {})[test_case_id] = digest
+    return rows, stored
+
+
+async def store_rejudge_result(db: AsyncSession, submission_id: int, result: JudgeResult,
+                               case_hashes: Dict[int, str]) -> Optional[Tuple[Submission, StoredVerdict]]:
+    """!
+    @brief Write the outcome of rejudging some test cases of an accepted submission
+    @details Stores the per-test-case results. A failing test case turns the verdict into the status
+             of the failure. The execution time becomes the maximum over the stored results of the
+             current test cases, the memory usage is not tracked per test case and only grows.
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param submission_id int: The id of the rejudged submission
+    @param result JudgeResult: The verdict over the rejudged test cases
+    @param case_hashes dict[int, str]: case_hash() of all current test cases of the problem by id
+    @return tuple[Submission, StoredVerdict]|None: The updated submission and its verdict before the rejudge,
+            None if the submission no longer exists or is not accepted anymore
+    """
+    submission = await db.get(Submission, submission_id)
+    if submission is None or submission.status != StatusEnum.accepted:
+        return None
+    previous = StoredVerdict(submission.status, submission.execution_time_ms, submission.memory_usage_mb)
+    await store_test_results(db, submission_id, result.cases, case_hashes)
+    submission.status = result.status
+    if result.memory_usage_mb is not None:
+        submission.memory_usage_mb = max(submission.memory_usage_mb or 0.0, result.memory_usage_mb)
+    slowest = (await db.execute(
+        select(func.max(SubmissionTestResult.execution_time_ms))
+        .where(SubmissionTestResult.submission_id == submission_id,
+               SubmissionTestResult.test_case_id.in_(list(case_hashes)))
+    )).scalar_one()
+    if slowest is not None:
+        submission.execution_time_ms = slowest
+    await db.commit()
+    return submission, previous
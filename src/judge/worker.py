@@ -0,0 +1,527 @@
+"""!
+@file worker.py
+@brief Judge work executed inside the worker processes of the judge pool
+@details Compiles a submission when its language requires it, reusing compiled artifacts of identical
+         code, and runs it against the test cases of its problem inside the sandbox, in a single
+         process launch where the language supports it. Test data kept in the blob store is
+         memory-mapped and streamed into the sandbox, it is never loaded into the worker's heap, and
+         the output is compared with the problem's checker while the program runs (see checker.py).
+         run_code() executes code once against a single input, for the run endpoint, and reports
+         the process group of every sandboxed process it starts so the API process can kill it
+         when a newer run supersedes it.
+         Everything in this module must stay picklable and free of database access, the results are
+         written back by the judge service.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import functools
+import tempfile
+import os
+import time
+
+from models.models import StatusEnum
+from judge.sandbox import LANGUAGES, COMPILE_LIMITS, Language, Limits, ProcessResult, make_undumpable, run_process
+from judge.batch import HarnessCompileError, HarnessExited
+from judge.blob_store import get_blob_store
+from judge.checker import Checker, get_checker
+from judge.cache import code_hash, get_artifact_cache
+from judge.runtime_pool import close_runtime, get_runtime_pool, init_runtime_pool, start_runtime
+
+## @brief Queue to the API process for per-test-case progress and started runs, set by init_worker()
+_progress = None
+
+## @brief Statuses of a run, see RunResult
+RUN_OK = "ok"
+RUN_WRONG_ANSWER = "wrong_answer"
+RUN_ERROR = "error"
+
+## @brief Launches of an empty program per startup baseline, the fastest one is used
+STARTUP_SAMPLES = 3
+
+## @brief Startup baselines in ms by language, see startup_time_ms()
+_startup_ms: Dict[str, float] = {}
+
+
+@dataclass
+class TestCaseData:
+    """!
+    @brief Test case as shipped to a judge worker
+    @details Large data is not shipped, only the digest of its blob is set instead.
+    """
+    id: int
+    input: Optional[str]
+    expected_output: Optional[str]
+    input_blob: Optional[str] = None
+    expected_output_blob: Optional[str] = None
+
+
+@dataclass
+class JudgeJob:
+    """!
+    @brief Everything a worker needs to judge one submission
+    """
+    submission_id: int
+    problem_id: int
+    language: str
+    code: str
+    test_cases: List[TestCaseData]
+    limits: Limits
+    user_id: Optional[int] = None
+    match_id: Optional[int] = None
+    checker: Optional[str] = None
+    checker_tolerance: Optional[float] = None
+
+
+@dataclass
+class CaseResult:
+    """!
+    @brief Outcome of a single test case run, stored in submission_test_results
+    """
+    test_case_id: int
+    status: StatusEnum
+    execution_time_ms: float
+
+
+@dataclass
+class JudgeResult:
+    """!
+    @brief Verdict of a judged submission
+    @details execution_time_ms and memory_usage_mb hold the maxima over all executed test cases,
+             cases lists the executed test cases in order up to the first failing one. Verdicts that
+             depend on the load of the host (time limits) or on the judge are not cacheable. The
+             worker attaches a snapshot of its runtime pool and artifact cache statistics and the
+             seconds spent in each judge stage (compile, sandbox_start, execution, comparison).
+    """
+    status: StatusEnum
+    execution_time_ms: Optional[float] = None
+    memory_usage_mb: Optional[float] = None
+    detail: str = ""
+    passed: int = 0
+    total: int = 0
+    cases: List[CaseResult] = field(default_factory=list)
+    cacheable: bool = True
+    worker_pid: int = 0
+    worker_stats: dict = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def add_time(self, stage: str, seconds: float):
+        """!
+        @brief Add time spent in a judge stage
+        """
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+@dataclass
+class RunJob:
+    """!
+    @brief Code executed once against a single input, without a submission
+    @details Without expected_output the output is returned but not checked.
+    """
+    run_id: int
+    problem_id: int
+    language: str
+    code: str
+    input: str
+    limits: Limits
+    expected_output: Optional[str] = None
+    checker: Optional[str] = None
+    checker_tolerance: Optional[float] = None
+
+
+@dataclass
+class RunResult:
+    """!
+    @brief Outcome of a run
+    @details status is RUN_OK if the program exited cleanly and, with an expected output, the checker
+             accepted its output, RUN_WRONG_ANSWER if the checker rejected it and RUN_ERROR for
+             compilation errors, runtime errors and exceeded limits, explained by detail. stdout and
+             stderr are decoded leniently and cut at the output limit of the run.
+    """
+    status: str
+    stdout: str = ""
+    stderr: str = ""
+    execution_time_ms: Optional[float] = None
+    memory_usage_mb: Optional[float] = None
+    detail: str = ""
+    cacheable: bool = True
+    worker_pid: int = 0
+    worker_stats: dict = field(default_factory=dict)
+
+
+class TimedChecker:
+    """!
+    @brief Checker wrapper adding up the time spent comparing output
+    @details The comparison runs while the program executes, its time is subtracted from the
+             execution stage by run_timed().
+    """
+
+    def __init__(self, checker: Checker):
+        self.checker = checker
+        self.seconds = 0.0
+
+    def feed(self, chunk: bytes) -> bool:
+        started = time.perf_counter()
+        try:
+            return self.checker.feed(chunk)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def finish(self) -> bool:
+        started = time.perf_counter()
+        try:
+            return self.checker.finish()
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def run_timed(result: "JudgeResult", checker: TimedChecker, run, *args, **kwargs) -> ProcessResult:
+    """!
+    @brief Run a test case and split its time into the execution and comparison stages
+    @param result JudgeResult: The verdict being built, receives the timings
+    @param checker TimedChecker: The checker the output is streamed into
+    @param run callable: Function running the test case
+    @return ProcessResult: The outcome of the run
+    """
+    started = time.perf_counter()
+    compared = checker.seconds
+    try:
+        return run(*args, stdout_sink=checker, **kwargs)
+    finally:
+        result.add_time("execution", time.perf_counter() - started - (checker.seconds - compared))
+
+
+@contextmanager
+def open_case(case: TestCaseData):
+    """!
+    @brief Access the input and expected output of a test case
+    @param case TestCaseData: The test case
+    @return ContextManager[tuple]: (input, expected output), each bytes or a read-only mmap.mmap
+    """
+    store = get_blob_store()
+    with (store.open(case.input_blob) if case.input_blob is not None else _inline(case.input)) as data, \
+            (store.open(case.expected_output_blob) if case.expected_output_blob is not None
+             else _inline(case.expected_output)) as expected:
+        yield data, expected
+
+
+@contextmanager
+def _inline(text: Optional[str]):
+    yield (text or "").encode()
+
+
+def init_worker(limits: Limits, progress=None):
+    """!
+    @brief Initializer of the judge worker processes
+    @param limits Limits: The default limits of the judge service
+    @param progress multiprocessing.Queue|None: Queue receiving ("progress", submission_id, passed, total)
+           after every test case and ("run", run_id, process group) for every process a run starts,
+           None to not report
+    """
+    global _progress
+    _progress = progress
+    make_undumpable()
+    init_runtime_pool(limits)
+
+
+def report_progress(job: JudgeJob, result: JudgeResult):
+    """!
+    @brief Tell the API process how far judging a submission got
+    @param job JudgeJob: The submission being judged
+    @param result JudgeResult: The verdict being built
+    """
+    if _progress is not None:
+        _progress.put_nowait(("progress", job.submission_id, result.passed, result.total))
+
+
+def report_run_started(run_id: int, process_group: int):
+    """!
+    @brief Tell the API process which process group a run is executing in
+    @param run_id int: The run
+    @param process_group int: Process group of the sandboxed process, see run_process()
+    """
+    if _progress is not None:
+        _progress.put_nowait(("run", run_id, process_group))
+
+
+def startup_time_ms(language: Language, limits: Limits) -> float:
+    """!
+    @brief CPU time a fresh process of a language with a batch harness spends before running any code
+    @details The harness only measures the test cases, its interpreter was started before. Subtracting
+             this baseline from the time of a case run in a fresh process keeps both on the same basis.
+             Measured once per worker with an empty program.
+    @param language Language: The language
+    @param limits Limits: The limits the baseline is measured with
+    @return float: The baseline in ms, 0 for languages without a harness
+    """
+    if language.harness is None:
+        return 0.0
+    baseline = _startup_ms.get(language.name)
+    if baseline is None:
+        with tempfile.TemporaryDirectory(prefix="coderunner-") as workdir:
+            open(os.path.join(workdir, language.source), "w").close()
+            runs = [run_process(language.run, workdir, b"", limits, limit_address_space=language.limit_address_space)
+                    for _ in range(STARTUP_SAMPLES)]
+        baseline = min((run.cpu_time_ms for run in runs if run.exit_code == 0), default=0.0)
+        _startup_ms[language.name] = baseline
+    return baseline
+
+
+def without_startup(run: ProcessResult, language: Language, limits: Limits) -> ProcessResult:
+    """!
+    @brief Take the startup baseline of the language off the time of a run in a fresh process
+    @param run ProcessResult: The run, updated in place
+    @param language Language: Its language
+    @param limits Limits: Its limits
+    @return ProcessResult: The run
+    """
+    run.cpu_time_ms = max(run.cpu_time_ms - startup_time_ms(language, limits), 0.0)
+    return run
+
+
+def record_case(result: JudgeResult, case: TestCaseData, run: ProcessResult, checker: TimedChecker) -> bool:
+    """!
+    @brief Check one test case run and add it to the verdict
+    @details Output the checker rejected while the program was running is a wrong answer, even if the
+             program was killed because of it.
+    @param result JudgeResult: The verdict being built, updated in place
+    @param case TestCaseData: The executed test case
+    @param run ProcessResult: The outcome of the run
+    @param checker TimedChecker: The checker the output was streamed into
+    @return bool: True if the case passed and judging should continue
+    """
+    try:
+        return _record_case(result, case, run, checker)
+    finally:
+        result.add_time("comparison", checker.seconds)
+
+
+def _record_case(result: JudgeResult, case: TestCaseData, run: ProcessResult, checker: TimedChecker) -> bool:
+    result.execution_time_ms = max(result.execution_time_ms, run.cpu_time_ms)
+    result.memory_usage_mb = max(result.memory_usage_mb, run.memory_mb)
+
+    if run.timed_out:
+        status, detail = StatusEnum.error, f"Time limit exceeded on test case {case.id}"
+        result.cacheable = False
+    elif run.output_exceeded:
+        status, detail = StatusEnum.error, f"Output limit exceeded on test case {case.id}"
+    elif run.diverged:
+        status, detail = StatusEnum.wrong_answer, f"Wrong answer on test case {case.id}"
+    elif run.exit_code != 0:
+        status, detail = StatusEnum.error, f"Runtime error on test case {case.id}"
+        # Signals also come from outside, e.g. the OOM killer or a judge shutdown, and may not repeat
+        result.cacheable = result.cacheable and run.exit_code > 0
+    elif not checker.finish():
+        status, detail = StatusEnum.wrong_answer, f"Wrong answer on test case {case.id}"
+    else:
+        result.passed += 1
+        result.cases.append(CaseResult(case.id, StatusEnum.accepted, run.cpu_time_ms))
+        return True
+
+    result.status, result.detail = status, detail
+    result.cases.append(CaseResult(case.id, status, run.cpu_time_ms))
+    return False
+
+
+def run_batched(job: JudgeJob, language: Language, checker_class: type, result: JudgeResult) -> int:
+    """!
+    @brief Run test cases through a single launch of the language's batch harness
+    @details Takes a warm runtime from the runtime pool of the worker when there is one. Stops at the
+             first failing case, a submission that does not compile fails with a compilation error.
+             If the submission terminates the harness itself, or an input is too large for the
+             harness, the remaining cases are left to the caller, which runs them in fresh processes
+             and takes the startup baseline of the interpreter off their time (see startup_time_ms()).
+    @param job JudgeJob: The submission and test cases to judge
+    @param language Language: The language of the submission, must have a harness
+    @param checker_class type[Checker]: The checker of the problem
+    @param result JudgeResult: The verdict being built, updated in place
+    @return int: Number of test cases that were handled
+    """
+    started = time.perf_counter()
+    pool = get_runtime_pool()
+    runtime = pool.acquire(language, job.limits) if pool is not None else start_runtime(language, job.limits)
+    handled = 0
+    try:
+        try:
+            loaded = runtime.load(job.code, len(job.test_cases))
+        except HarnessCompileError as error:
+            result.status, result.detail = StatusEnum.error, f"Compilation failed\n{error}"
+            loaded = False
+        result.add_time("sandbox_start", time.perf_counter() - started)
+        if not loaded:
+            return 0
+        for case in job.test_cases:
+            with open_case(case) as (data, expected):
+                if len(data) > job.limits.output_bytes:
+                    # The harness buffers inputs in a file, which is bound by the output size limit;
+                    # such cases are streamed into a process of their own instead
+                    break
+                checker = TimedChecker(checker_class(expected, data, job.checker_tolerance))
+                try:
+                    run = run_timed(result, checker, runtime.run_case, data)
+                except HarnessExited:
+                    break
+                handled += 1
+                passed = record_case(result, case, run, checker)
+            report_progress(job, result)
+            if not passed:
+                handled = len(job.test_cases)
+                break
+        result.memory_usage_mb = max(result.memory_usage_mb, runtime.finish())
+    finally:
+        if pool is not None:
+            pool.release(runtime, reusable=result.status == StatusEnum.accepted)
+        else:
+            close_runtime(runtime)
+    return handled
+
+
+def worker_stats() -> dict:
+    """!
+    @brief Statistics of the runtime pool, the artifact cache and the blob store of this worker process
+    @return dict: The statistics keyed by component
+    """
+    pool = get_runtime_pool()
+    return {"runtimes": pool.stats() if pool is not None else {}, "artifacts": get_artifact_cache().stats(),
+            "blobs": get_blob_store().stats()}
+
+
+def warm_up() -> dict:
+    """!
+    @brief Make sure the worker process is running and its runtime pool is filling
+    @return dict: The pid and the statistics of the worker
+    """
+    return {"worker_pid": os.getpid(), "worker_stats": worker_stats()}
+
+
+def compile_source(language: Language, code: str, workdir: str, result: Optional[JudgeResult] = None,
+                   on_spawn=None) -> Optional[ProcessResult]:
+    """!
+    @brief Compile the source in a working directory, reusing the artifacts of identical code
+    @param language Language: The language of the source
+    @param code str: The source code, already written to the working directory
+    @param workdir str: The working directory
+    @param result JudgeResult|None: Verdict receiving the compile time
+    @param on_spawn callable|None: Passed to run_process()
+    @return ProcessResult|None: The failed compiler run, None if the source compiled or needs no compiling
+    """
+    artifacts = get_artifact_cache()
+    artifact_key = code_hash(language.name, code)
+    if language.compile is None or artifacts.restore(artifact_key, workdir):
+        return None
+    started = time.perf_counter()
+    compiled = run_process(language.compile, workdir, b"", COMPILE_LIMITS, limit_address_space=False,
+                           on_spawn=on_spawn)
+    if result is not None:
+        result.add_time("compile", time.perf_counter() - started)
+    if compiled.exit_code != 0 or compiled.timed_out:
+        return compiled
+    artifacts.store(artifact_key, workdir, language.source)
+    return None
+
+
+def run_code(job: RunJob) -> RunResult:
+    """!
+    @brief Run code once against the input of a run
+    @details Always starts a fresh process rather than a pooled runtime, so killing a superseded run
+             never takes a warm runtime down.
+    @param job RunJob: The code and input
+    @return RunResult: The output and outcome of the run
+    """
+    result = _run(job)
+    result.worker_pid = os.getpid()
+    result.worker_stats = worker_stats()
+    return result
+
+
+def judge_submission(job: JudgeJob) -> JudgeResult:
+    """!
+    @brief Judge a submission against all of its test cases
+    @details Languages with a batch harness run all cases in one process launch, all others are
+             started once per case. Stops at the first failing test case.
+    @param job JudgeJob: The submission and test cases to judge
+    @return JudgeResult: The verdict together with the maximum time and memory usage
+    """
+    result = _judge(job)
+    result.worker_pid = os.getpid()
+    result.worker_stats = worker_stats()
+    return result
+
+
+def _judge(job: JudgeJob) -> JudgeResult:
+    language = LANGUAGES.get(job.language)
+    total = len(job.test_cases)
+    if language is None:
+        return JudgeResult(StatusEnum.error, detail=f"Unsupported language '{job.language}'", total=total)
+    checker_class = get_checker(job.checker)
+    if checker_class is None:
+        return JudgeResult(StatusEnum.error, detail=f"Unknown checker '{job.checker}'", total=total,
+                           cacheable=False)
+
+    with tempfile.TemporaryDirectory(prefix="coderunner-") as workdir:
+        with open(os.path.join(workdir, language.source), "w", encoding="utf-8") as source:
+            source.write(job.code)
+
+        result = JudgeResult(StatusEnum.accepted, 0.0, 0.0, total=total)
+        compiled = compile_source(language, job.code, workdir, result)
+        if compiled is not None:
+            detail = compiled.stderr.decode(errors="replace")
+            return JudgeResult(StatusEnum.error, detail=f"Compilation failed\n{detail}", total=total,
+                               cacheable=not compiled.timed_out, timings=result.timings)
+
+        handled = run_batched(job, language, checker_class, result) if language.harness is not None else 0
+        if result.status != StatusEnum.accepted:
+            return result
+
+        for case in job.test_cases[handled:]:
+            with open_case(case) as (data, expected):
+                checker = TimedChecker(checker_class(expected, data, job.checker_tolerance))
+                run = run_timed(result, checker, run_process, language.run, workdir, data, job.limits,
+                                limit_address_space=language.limit_address_space)
+                passed = record_case(result, case, without_startup(run, language, job.limits), checker)
+            report_progress(job, result)
+            if not passed:
+                break
+        return result
+
+
+def _run(job: RunJob) -> RunResult:
+    language = LANGUAGES.get(job.language)
+    if language is None:
+        return RunResult(RUN_ERROR, detail=f"Unsupported language '{job.language}'")
+    checker_class = None
+    if job.expected_output is not None:
+        checker_class = get_checker(job.checker)
+        if checker_class is None:
+            return RunResult(RUN_ERROR, detail=f"Unknown checker '{job.checker}'", cacheable=False)
+    on_spawn = functools.partial(report_run_started, job.run_id)
+
+    with tempfile.TemporaryDirectory(prefix="coderunner-") as workdir:
+        with open(os.path.join(workdir, language.source), "w", encoding="utf-8") as source:
+            source.write(job.code)
+        compiled = compile_source(language, job.code, workdir, on_spawn=on_spawn)
+        if compiled is not None:
+            return RunResult(RUN_ERROR, stderr=compiled.stderr.decode(errors="replace"),
+                             detail="Compilation failed", cacheable=not compiled.timed_out)
+
+        data = job.input.encode()
+        run = run_process(language.run, workdir, data, job.limits,
+                          limit_address_space=language.limit_address_space, on_spawn=on_spawn)
+        without_startup(run, language, job.limits)
+
+    result = RunResult(RUN_OK, run.stdout.decode(errors="replace"), run.stderr.decode(errors="replace"),
+                       run.cpu_time_ms, run.memory_mb)
+    if run.timed_out:
+        result.status, result.detail, result.cacheable = RUN_ERROR, "Time limit exceeded", False
+    elif run.output_exceeded:
+        result.status, result.detail = RUN_ERROR, "Output limit exceeded"
+    elif run.exit_code != 0:
+        result.status, result.detail = RUN_ERROR, "Runtime error"
+        # A program killed from outside, e.g. because the run was superseded, says nothing about the code
+        result.cacheable = run.exit_code > 0
+    elif checker_class is not None:
+        checker = checker_class(job.expected_output.encode(), data, job.checker_tolerance)
+        if not (checker.feed(run.stdout) and checker.finish()):
+            result.status, result.detail = RUN_WRONG_ANSWER, "Output differs from the expected output"
+    return result
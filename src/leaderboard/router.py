@@ -0,0 +1,176 @@
+"""!
+@file router.py
+@brief Leaderboard API routes
+@details Serves the global, per-problem and per-match rankings from the in-memory leaderboards.
+         Pages are addressed by offset and limit, /me returns the caller's entry and its neighbours.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.principal_cache import Principal
+from auth.user_service import get_usernames_async
+from database import get_async_db
+from dependencies import get_current_user, get_leaderboards
+from leaderboard.service import LeaderboardService
+from models.schemas import LeaderboardPage, LeaderboardPosition
+
+router = APIRouter(prefix="/leaderboards", tags=["leaderboards"])
+
+
+def _ranking(leaderboards: LeaderboardService, board: str, board_id: Optional[int] = None):
+    """!
+    @brief Look a ranking up once the leaderboards are ready
+    @throws HTTPException: 503 while the leaderboards are rebuilt after a restart
+    """
+    if not leaderboards.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Leaderboards are being rebuilt, please try again shortly",
+            headers={"Retry-After": "2"}
+        )
+    return leaderboards.ranking(board, board_id)
+
+
+async def _with_usernames(db: AsyncSession, entries):
+    usernames = await get_usernames_async(db, (entry["user_id"] for entry in entries))
+    for entry in entries:
+        entry["username"] = usernames.get(entry["user_id"])
+    return entries
+
+
+async def _page(db, leaderboards, board, board_id, offset, limit):
+    ranking = _ranking(leaderboards, board, board_id)
+    entries = await _with_usernames(db, leaderboards.top(ranking, offset, limit))
+    return {"total": len(ranking.board) if ranking is not None else 0, "entries": entries}
+
+
+async def _position(db, leaderboards, board, board_id, user_id, radius):
+    ranking = _ranking(leaderboards, board, board_id)
+    entry, neighbors = leaderboards.around(ranking, user_id, radius)
+    await _with_usernames(db, neighbors)
+    return {"entry": entry, "neighbors": neighbors}
+
+
+@router.get("/global", response_model=LeaderboardPage, response_model_exclude_none=True)
+async def get_global_leaderboard(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    leaderboards: LeaderboardService = Depends(get_leaderboards)
+):
+    """!
+    @brief Get a page of the global ranking
+    @param offset int: 0-based rank of the first entry
+    @param limit int: Maximum number of entries
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param leaderboards LeaderboardService: The leaderboards of the application
+    @return LeaderboardPage: Number of ranked users and the requested entries
+    @throws HTTPException: 503 while the leaderboards are rebuilt
+    """
+    return await _page(db, leaderboards, "global", None, offset, limit)
+
+
+@router.get("/global/me", response_model=LeaderboardPosition, response_model_exclude_none=True)
+async def get_global_position(
+    radius: int = Query(5, ge=0, le=50),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    leaderboards: LeaderboardService = Depends(get_leaderboards)
+):
+    """!
+    @brief Get the current user's global rank and the users around it
+    @param radius int: Number of neighbours on either side
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param leaderboards LeaderboardService: The leaderboards of the application
+    @return LeaderboardPosition: The user's entry, None if unranked, and its neighbours
+    @throws HTTPException: 503 while the leaderboards are rebuilt
+    """
+    return await _position(db, leaderboards, "global", None, current_user.id, radius)
+
+
+@router.get("/problems/{problem_id}", response_model=LeaderboardPage, response_model_exclude_none=True)
+async def get_problem_leaderboard(
+    problem_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    leaderboards: LeaderboardService = Depends(get_leaderboards)
+):
+    """!
+    @brief Get a page of the ranking of a problem, fastest accepted submission first
+    @param problem_id int: The id of the problem
+    @param offset int: 0-based rank of the first entry
+    @param limit int: Maximum number of entries
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param leaderboards LeaderboardService: The leaderboards of the application
+    @return LeaderboardPage: Number of ranked users and the requested entries
+    @throws HTTPException: 503 while the leaderboards are rebuilt
+    """
+    return await _page(db, leaderboards, "problem", problem_id, offset, limit)
+
+
+@router.get("/problems/{problem_id}/me", response_model=LeaderboardPosition, response_model_exclude_none=True)
+async def get_problem_position(
+    problem_id: int,
+    radius: int = Query(5, ge=0, le=50),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    leaderboards: LeaderboardService = Depends(get_leaderboards)
+):
+    """!
+    @brief Get the current user's rank on a problem and the users around it
+    @param problem_id int: The id of the problem
+    @param radius int: Number of neighbours on either side
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param leaderboards LeaderboardService: The leaderboards of the application
+    @return LeaderboardPosition: The user's entry, None if unranked, and its neighbours
+    @throws HTTPException: 503 while the leaderboards are rebuilt
+    """
+    return await _position(db, leaderboards, "problem", problem_id, current_user.id, radius)
+
+
+@router.get("/matches/{match_id}", response_model=LeaderboardPage, response_model_exclude_none=True)
+async def get_match_leaderboard(
+    match_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    leaderboards: LeaderboardService = Depends(get_leaderboards)
+):
+    """!
+    @brief Get a page of the ranking of a match
+    @param match_id int: The id of the match
+    @param offset int: 0-based rank of the first entry
+    @param limit int: Maximum number of entries
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param leaderboards LeaderboardService: The leaderboards of the application
+    @return LeaderboardPage: Number of ranked users and the requested entries
+    @throws HTTPException: 503 while the leaderboards are rebuilt
+    """
+    return await _page(db, leaderboards, "match", match_id, offset, limit)
+
+
+@router.get("/matches/{match_id}/me", response_model=LeaderboardPosition, response_model_exclude_none=True)
+async def get_match_position(
+    match_id: int,
+    radius: int = Query(5, ge=0, le=50),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    leaderboards: LeaderboardService = Depends(get_leaderboards)
+):
+    """!
+    @brief Get the current user's rank in a match and the users around it
+    @param match_id int: The id of the match
+    @param radius int: Number of neighbours on either side
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param leaderboards LeaderboardService: The leaderboards of the application
+    @return LeaderboardPosition: The user's entry, None if unranked, and its neighbours
+    @throws HTTPException: 503 while the leaderboards are rebuilt
+    """
+    return await _position(db, leaderboards, "match", match_id, current_user.id, radius)
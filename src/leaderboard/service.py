@@ -0,0 +1,330 @@
+"""!
+@file service.py
+@brief Incrementally maintained leaderboards
+@details Keeps one ranking per problem, one per match and a global one in sorted sets, so top-K,
+         rank and neighbour queries never aggregate the submissions table. The judge service
+         reports every stored verdict and accepted submissions update the affected rankings in
+         O(log n). On startup the rankings are rebuilt from the accepted submissions in the database.
+         When a rejudge fails the submission a user is ranked with, or makes it slower, the entry is
+         taken off its rankings and replaced with the best remaining accepted submission of the user.
+
+         A problem ranking orders users by their fastest accepted submission (execution_time_ms,
+         then submitted_at). Match and global rankings order users by the number of solved problems,
+         then by the sum of their best execution times, then by the time of their last improvement.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+from sqlalchemy import func, select
+
+from database import AsyncSessionLocal
+from leaderboard.sorted_set import SortedSet
+from models.models import StatusEnum, Submission
+
+logger = logging.getLogger(__name__)
+
+## @brief Accepted submissions fetched per round trip while rebuilding
+REBUILD_BATCH_SIZE = 5000
+
+
+class ProblemRanking:
+    """!
+    @brief Users ranked by their fastest accepted submission of one problem
+    """
+
+    def __init__(self):
+        self.board = SortedSet()
+
+    def record(self, user_id: int, problem_id: int, time_ms: float, submitted_at: datetime) -> bool:
+        """!
+        @brief Take an accepted submission into account
+        @return bool: True if the ranking changed
+        """
+        score = (time_ms, submitted_at, user_id)
+        current = self.board.zscore(user_id)
+        if current is not None and current <= score:
+            return False
+        self.board.zadd(user_id, score)
+        return True
+
+    def forget(self, user_id: int, time_ms: float) -> bool:
+        """!
+        @brief Take a user off the ranking if it is ranked with the given time
+        @return bool: True if the user was removed
+        """
+        current = self.board.zscore(user_id)
+        if current is None or current[0] != time_ms:
+            return False
+        return self.board.zrem(user_id)
+
+    @staticmethod
+    def describe(score) -> dict:
+        time_ms, submitted_at, _ = score
+        return {"execution_time_ms": time_ms, "submitted_at": submitted_at}
+
+
+class SolvedRanking:
+    """!
+    @brief Users ranked by solved problems and the sum of their best times
+    """
+
+    def __init__(self):
+        self.board = SortedSet()
+        self._best: Dict[Tuple[int, int], float] = {}
+        self._totals: Dict[int, list] = {}
+
+    def record(self, user_id: int, problem_id: int, time_ms: float, submitted_at: datetime) -> bool:
+        """!
+        @brief Take an accepted submission into account
+        @return bool: True if the ranking changed
+        """
+        best = self._best.get((user_id, problem_id))
+        if best is not None and best <= time_ms:
+            return False
+        self._best[(user_id, problem_id)] = time_ms
+        totals = self._totals.setdefault(user_id, [0, 0.0, submitted_at])
+        if best is None:
+            totals[0] += 1
+            totals[1] += time_ms
+        else:
+            totals[1] += time_ms - best
+        totals[2] = max(totals[2], submitted_at)
+        solved, total_ms, last_at = totals
+        self.board.zadd(user_id, (-solved, total_ms, last_at, user_id))
+        return True
+
+    def forget(self, user_id: int, problem_id: int, time_ms: float) -> bool:
+        """!
+        @brief Stop counting a problem as solved by a user if its best time is the given one
+        @details The time of the last improvement stays, the history behind it is not kept.
+        @return bool: True if the problem was removed
+        """
+        if self._best.get((user_id, problem_id)) != time_ms:
+            return False
+        del self._best[(user_id, problem_id)]
+        totals = self._totals[user_id]
+        totals[0] -= 1
+        totals[1] -= time_ms
+        if totals[0] == 0:
+            del self._totals[user_id]
+            self.board.zrem(user_id)
+        else:
+            solved, total_ms, last_at = totals
+            self.board.zadd(user_id, (-solved, total_ms, last_at, user_id))
+        return True
+
+    @staticmethod
+    def describe(score) -> dict:
+        solved, total_ms, last_at, _ = score
+        return {"solved": -solved, "total_time_ms": total_ms, "last_solved_at": last_at}
+
+
+class LeaderboardService:
+    """!
+    @brief All rankings of the application
+    @details Must be used from the event loop. While the rankings are rebuilt, reported submissions
+             are buffered and replayed afterwards; recording a submission twice has no effect.
+    """
+
+    def __init__(self):
+        self.global_ranking = SolvedRanking()
+        self.problems: Dict[int, ProblemRanking] = {}
+        self.matches: Dict[int, SolvedRanking] = {}
+        self.ready = False
+        self._buffer: Optional[list] = None
+        self._rejudged: list = []
+        self._task = None
+        self._restores = set()
+
+    def start(self):
+        """!
+        @brief Rebuild the rankings in the background, queries answer 503 until it finished
+        """
+        self._buffer = []
+        self._task = asyncio.create_task(self._rebuild())
+
+    async def stop(self):
+        """!
+        @brief Cancel a running rebuild and restores of rejudged entries
+        """
+        tasks = list(self._restores) + ([self._task] if self._task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def on_judged(self, submission: Submission, result):
+        """!
+        @brief Judge service listener, records accepted submissions
+        @param submission Submission: The judged submission with its stored verdict
+        @param result JudgeResult: The verdict
+        """
+        if submission.status != StatusEnum.accepted:
+            return
+        entry = (submission.user_id, submission.problem_id, submission.match_id,
+                 submission.execution_time_ms or 0.0, submission.submitted_at)
+        if self._buffer is not None:
+            self._buffer.append(entry)
+        else:
+            self._record(*entry)
+
+    def on_rejudged(self, submission: Submission, previous):
+        """!
+        @brief Judge service rejudge listener, replaces entries of submissions that failed or got slower
+        @details The user is taken off the rankings it holds with the previous time of the submission,
+                 then the best accepted submission left is looked up and recorded in the background.
+        @param submission Submission: The rejudged submission with its stored verdict
+        @param previous StoredVerdict: Its verdict before the rejudge
+        """
+        if previous.status != StatusEnum.accepted:
+            return
+        entry = (submission.user_id, submission.problem_id, submission.match_id, previous.execution_time_ms or 0.0)
+        if self._buffer is not None:
+            self._rejudged.append(entry)
+            return
+        self._forget(*entry)
+        if submission.status == StatusEnum.accepted:
+            self._record(submission.user_id, submission.problem_id, submission.match_id,
+                         submission.execution_time_ms or 0.0, submission.submitted_at)
+
+    def ranking(self, board: str, board_id: Optional[int] = None):
+        """!
+        @brief Look a ranking up
+        @param board str: "global", "problem" or "match"
+        @param board_id int|None: The problem or match id
+        @return ProblemRanking|SolvedRanking|None: The ranking, None if nobody is ranked on it yet
+        """
+        if board == "global":
+            return self.global_ranking
+        if board == "problem":
+            return self.problems.get(board_id)
+        return self.matches.get(board_id)
+
+    def top(self, ranking, offset: int, limit: int) -> List[dict]:
+        """!
+        @brief A page of a ranking
+        @param ranking ProblemRanking|SolvedRanking|None: The ranking
+        @param offset int: 0-based rank of the first entry
+        @param limit int: Maximum number of entries
+        @return list[dict]: Entries with 1-based rank, user_id and the ranking's score fields
+        """
+        if ranking is None or limit <= 0:
+            return []
+        entries = ranking.board.zrange(offset, offset + limit - 1)
+        return [self._entry(ranking, offset + index, member, score) for index, (member, score) in enumerate(entries)]
+
+    def around(self, ranking, user_id: int, radius: int) -> Tuple[Optional[dict], List[dict]]:
+        """!
+        @brief The entry of a user and the entries around it
+        @param ranking ProblemRanking|SolvedRanking|None: The ranking
+        @param user_id int: The user
+        @param radius int: Number of neighbours on either side
+        @return tuple[dict|None, list[dict]]: The user's entry and the window around it, (None, [])
+                if the user is not ranked
+        """
+        rank = ranking.board.zrank(user_id) if ranking is not None else None
+        if rank is None:
+            return None, []
+        start = max(rank - radius, 0)
+        window = self.top(ranking, start, rank + radius - start + 1)
+        return window[rank - start], window
+
+    def stats(self) -> dict:
+        """!
+        @brief Number of rankings and ranked users
+        @return dict: Leaderboard statistics
+        """
+        return {
+            "ready": self.ready,
+            "global": len(self.global_ranking.board),
+            "problems": len(self.problems),
+            "matches": len(self.matches),
+        }
+
+    @staticmethod
+    def _entry(ranking, index: int, member: int, score) -> dict:
+        return {"rank": index + 1, "user_id": member, **ranking.describe(score)}
+
+    def _record(self, user_id: int, problem_id: int, match_id: Optional[int], time_ms: float,
+                submitted_at: datetime):
+        self.global_ranking.record(user_id, problem_id, time_ms, submitted_at)
+        self.problems.setdefault(problem_id, ProblemRanking()).record(user_id, problem_id, time_ms, submitted_at)
+        if match_id is not None:
+            self.matches.setdefault(match_id, SolvedRanking()).record(user_id, problem_id, time_ms, submitted_at)
+
+    def _forget(self, user_id: int, problem_id: int, match_id: Optional[int], time_ms: float):
+        removed = self.global_ranking.forget(user_id, problem_id, time_ms)
+        problem = self.problems.get(problem_id)
+        if problem is not None:
+            removed = problem.forget(user_id, time_ms) or removed
+        match = self.matches.get(match_id) if match_id is not None else None
+        if match is not None:
+            removed = match.forget(user_id, problem_id, time_ms) or removed
+        if removed:
+            task = asyncio.create_task(self._restore(user_id, problem_id, match_id))
+            self._restores.add(task)
+            task.add_done_callback(self._restores.discard)
+
+    async def _restore(self, user_id: int, problem_id: int, match_id: Optional[int]):
+        # record() keeps the better entry, so verdicts recorded meanwhile are not overwritten
+        time_ms = func.coalesce(Submission.execution_time_ms, 0.0)
+        best = (
+            select(time_ms, Submission.submitted_at)
+            .where(Submission.user_id == user_id, Submission.problem_id == problem_id,
+                   Submission.status == StatusEnum.accepted)
+            .order_by(time_ms, Submission.submitted_at)
+            .limit(1)
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                row = (await db.execute(best)).first()
+                match_row = None
+                if match_id is not None:
+                    match_row = (await db.execute(best.where(Submission.match_id == match_id))).first()
+        except Exception:
+            logger.exception("Restoring the rankings of user %d on problem %d failed", user_id, problem_id)
+            return
+        if row is not None:
+            self.global_ranking.record(user_id, problem_id, *row)
+            self.problems.setdefault(problem_id, ProblemRanking()).record(user_id, problem_id, *row)
+        if match_row is not None:
+            self.matches.setdefault(match_id, SolvedRanking()).record(user_id, problem_id, *match_row)
+
+    async def _rebuild(self):
+        try:
+            last_id = 0
+            loaded = 0
+            while True:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(Submission.id, Submission.user_id, Submission.problem_id, Submission.match_id,
+                               Submission.execution_time_ms, Submission.submitted_at)
+                        .where(Submission.status == StatusEnum.accepted, Submission.id > last_id)
+                        .order_by(Submission.id)
+                        .limit(REBUILD_BATCH_SIZE)
+                    )).all()
+                for row in rows:
+                    self._record(row.user_id, row.problem_id, row.match_id, row.execution_time_ms or 0.0,
+                                 row.submitted_at)
+                loaded += len(rows)
+                if len(rows) < REBUILD_BATCH_SIZE:
+                    break
+                last_id = rows[-1].id
+                # Let requests run between batches
+                await asyncio.sleep(0)
+            logger.info("Leaderboards rebuilt from %d accepted submissions", loaded)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Rebuilding the leaderboards failed, continuing with live updates only")
+        for entry in self._buffer:
+            self._record(*entry)
+        self._buffer = None
+        # The rebuild may have read the verdicts from before the rejudges, _forget() is a no-op otherwise
+        for entry in self._rejudged:
+            self._forget(*entry)
+        self._rejudged = []
+        self.ready = True
@@ -0,0 +1,172 @@
+"""!
+@file sorted_set.py
+@brief In-process sorted set with rank queries, a local stand-in for a Redis ZSET
+@details Members are kept in an indexable skip list: every forward link stores how many elements it
+         skips, so inserting, removing, looking up the rank of a member and seeking to a rank all
+         take O(log n) expected time. The methods mirror the Redis commands of the same name, so the
+         leaderboards can move to Redis without changing their callers. Unlike Redis, scores are
+         arbitrary comparable values (the leaderboards use tuples for their tie-breaks) and ties are
+         not allowed: every score must be unique, which the leaderboards guarantee by ending their
+         score tuples with the member.
+"""
+
+from random import random
+from typing import Any, Hashable, List, Optional, Tuple
+import math
+
+## @brief Number of skip list levels, enough for 2^24 members at promotion probability 1/2
+MAX_LEVELS = 24
+
+
+class _Node:
+    __slots__ = ("score", "member", "next", "width")
+
+    def __init__(self, score, member, levels: int):
+        self.score = score
+        self.member = member
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class SortedSet:
+    """!
+    @brief Members ordered by ascending score with O(log n) rank queries
+    @details Not thread-safe, the leaderboards only use it from the event loop.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, None, MAX_LEVELS)
+        self._scores = {}
+
+    def zcard(self) -> int:
+        """!
+        @brief Number of members
+        """
+        return len(self._scores)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member: Hashable) -> bool:
+        return member in self._scores
+
+    def zscore(self, member: Hashable) -> Optional[Any]:
+        """!
+        @brief Score of a member
+        @param member Hashable: The member
+        @return Any|None: Its score, None if it is not in the set
+        """
+        return self._scores.get(member)
+
+    def zadd(self, member: Hashable, score: Any) -> bool:
+        """!
+        @brief Add a member or move it to a new score
+        @param member Hashable: The member
+        @param score Any: Its score, unique within the set
+        @return bool: True if the member was not in the set before
+        """
+        previous = self._scores.get(member)
+        if previous is not None:
+            if previous == score:
+                return False
+            self._remove(previous)
+        self._insert(score, member)
+        self._scores[member] = score
+        return previous is None
+
+    def zrem(self, member: Hashable) -> bool:
+        """!
+        @brief Remove a member
+        @param member Hashable: The member
+        @return bool: True if the member was in the set
+        """
+        score = self._scores.pop(member, None)
+        if score is None:
+            return False
+        self._remove(score)
+        return True
+
+    def zrank(self, member: Hashable) -> Optional[int]:
+        """!
+        @brief 0-based rank of a member, lowest score first
+        @param member Hashable: The member
+        @return int|None: Its rank, None if it is not in the set
+        """
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        rank = 0
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].score <= score:
+                rank += node.width[level]
+                node = node.next[level]
+        return rank - 1
+
+    def zrange(self, start: int, stop: int) -> List[Tuple[Hashable, Any]]:
+        """!
+        @brief Members by rank, like ZRANGE ... WITHSCORES
+        @param start int: First rank, negative values count from the end
+        @param stop int: Last rank, inclusive, negative values count from the end
+        @return list[tuple[Hashable, Any]]: Members and scores in rank order
+        """
+        size = len(self._scores)
+        if start < 0:
+            start = max(size + start, 0)
+        if stop < 0:
+            stop += size
+        stop = min(stop, size - 1)
+        if start > stop:
+            return []
+        node = self._node_at(start)
+        entries = []
+        for _ in range(stop - start + 1):
+            entries.append((node.member, node.score))
+            node = node.next[0]
+        return entries
+
+    def _node_at(self, index: int) -> _Node:
+        node = self._head
+        remaining = index + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def _insert(self, score, member):
+        chain = [None] * MAX_LEVELS
+        steps_at_level = [0] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].score < score:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        levels = min(MAX_LEVELS, 1 - int(math.log(1.0 - random(), 2.0)))
+        new = _Node(score, member, levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+
+    def _remove(self, score):
+        chain = [None] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].score < score:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
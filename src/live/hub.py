@@ -0,0 +1,247 @@
+"""!
+@file hub.py
+@brief Publish/subscribe hub pushing judge progress to WebSocket clients
+@details Every connection is subscribed to the topic of its user ("user:<id>") and may subscribe to
+         matches ("match:<id>") as participant or spectator. Events are serialized once and handed to
+         every subscribed connection without touching the database.
+
+         Each connection has a bounded send buffer holding the latest event per submission: a newer
+         event for the same submission replaces the queued one, so a slow client receives the current
+         state rather than every intermediate step. When the buffer is full the oldest progress
+         update is dropped; a client that cannot even keep up with final verdicts, or whose socket
+         does not accept data within LIVE_SEND_TIMEOUT_S, is disconnected.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Set
+import asyncio
+import json
+import logging
+import os
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+## @brief Submissions with undelivered events buffered per connection
+LIVE_SOCKET_BUFFER = int(os.getenv("LIVE_SOCKET_BUFFER", 64))
+
+## @brief Seconds a single send may take before the client is considered stalled
+LIVE_SEND_TIMEOUT_S = float(os.getenv("LIVE_SEND_TIMEOUT_S", 10))
+
+## @brief Matches a single connection may follow
+LIVE_MAX_SUBSCRIPTIONS = int(os.getenv("LIVE_MAX_SUBSCRIPTIONS", 16))
+
+## @brief WebSocket close code for clients that fall behind (RFC 6455 "try again later")
+CLOSE_TOO_SLOW = 1013
+
+
+class Connection:
+    """!
+    @brief A connected client and its coalescing send buffer
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, buffer_size: int = LIVE_SOCKET_BUFFER):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.topics: Set[str] = set()
+        self.buffer_size = buffer_size
+        self._pending: "OrderedDict[object, tuple]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def offer(self, key, message: str, final: bool) -> bool:
+        """!
+        @brief Queue a message, replacing an undelivered one with the same key
+        @param key Hashable: Coalescing key, the submission id
+        @param message str: The serialized event
+        @param final bool: Whether the event must not be dropped (verdicts)
+        @return bool: False if the connection cannot keep up and has to be closed
+        """
+        if self.closed:
+            return True
+        if key in self._pending:
+            _, was_final = self._pending.pop(key)
+            # A newer progress update never replaces a verdict that is still queued
+            final = final or was_final
+            self.coalesced += 1
+        elif len(self._pending) >= self.buffer_size:
+            victim = next((pending for pending, (_, is_final) in self._pending.items() if not is_final), None)
+            if victim is None:
+                return False
+            del self._pending[victim]
+            self.dropped += 1
+        self._pending[key] = (message, final)
+        self._wakeup.set()
+        return True
+
+    async def run_sender(self):
+        """!
+        @brief Deliver buffered messages until the connection is closed
+        @details A send blocked for longer than LIVE_SEND_TIMEOUT_S closes the connection.
+        """
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending and not self.closed:
+                _, (message, _) = self._pending.popitem(last=False)
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(message), LIVE_SEND_TIMEOUT_S)
+                except asyncio.TimeoutError:
+                    await self.close(CLOSE_TOO_SLOW)
+                    return
+                except Exception:
+                    self.closed = True
+                    return
+                self.sent += 1
+
+    async def close(self, code: int = 1000):
+        """!
+        @brief Close the socket and stop the sender
+        @param code int: WebSocket close code
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._wakeup.set()
+        try:
+            await self.websocket.close(code)
+        except Exception:
+            pass
+
+
+class Hub:
+    """!
+    @brief Topic registry and event fan-out
+    @details Must be used from the event loop.
+    """
+
+    def __init__(self):
+        self._topics: Dict[str, Set[Connection]] = {}
+        self.connections = 0
+        self.published = 0
+        self.disconnected_slow = 0
+
+    def subscribe(self, connection: Connection, topic: str) -> bool:
+        """!
+        @brief Subscribe a connection to a topic
+        @return bool: False if the connection follows too many topics already
+        """
+        if topic not in connection.topics and len(connection.topics) > LIVE_MAX_SUBSCRIPTIONS:
+            return False
+        connection.topics.add(topic)
+        self._topics.setdefault(topic, set()).add(connection)
+        return True
+
+    def unsubscribe(self, connection: Connection, topic: str):
+        """!
+        @brief Remove a connection from a topic
+        """
+        connection.topics.discard(topic)
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._topics[topic]
+
+    def register(self, connection: Connection):
+        """!
+        @brief Add a new connection, subscribed to the events of its own user
+        """
+        self.connections += 1
+        self.subscribe(connection, f"user:{connection.user_id}")
+
+    def unregister(self, connection: Connection):
+        """!
+        @brief Remove a closed connection from all topics
+        """
+        self.connections -= 1
+        for topic in list(connection.topics):
+            self.unsubscribe(connection, topic)
+
+    def publish(self, topics, key, event: dict, final: bool = False):
+        """!
+        @brief Send an event to the subscribers of some topics
+        @param topics Iterable[str]: The topics of the event, a connection on several of them gets it once
+        @param key Hashable: Coalescing key of the event
+        @param event dict: The JSON-serializable event
+        @param final bool: Whether the event must not be dropped for slow consumers
+        """
+        message = None
+        seen = set()
+        for topic in topics:
+            for connection in self._topics.get(topic, ()):
+                if connection in seen:
+                    continue
+                seen.add(connection)
+                if message is None:
+                    message = json.dumps(event, default=str)
+                if not connection.offer(key, message, final):
+                    self.disconnected_slow += 1
+                    asyncio.get_running_loop().create_task(connection.close(CLOSE_TOO_SLOW))
+        self.published += 1
+
+    def on_progress(self, job, passed: int, total: int):
+        """!
+        @brief Judge service progress listener
+        """
+        self.publish(_topics(job.user_id, job.match_id), job.submission_id, {
+            "type": "progress",
+            "submission_id": job.submission_id,
+            "problem_id": job.problem_id,
+            "match_id": job.match_id,
+            "user_id": job.user_id,
+            "passed": passed,
+            "total": total,
+        })
+
+    def on_judged(self, submission, result):
+        """!
+        @brief Judge service verdict listener
+        """
+        self.publish(_topics(submission.user_id, submission.match_id), submission.id, {
+            "type": "verdict",
+            "submission_id": submission.id,
+            "problem_id": submission.problem_id,
+            "match_id": submission.match_id,
+            "user_id": submission.user_id,
+            "status": submission.status.value,
+            "passed": result.passed,
+            "total": result.total,
+            "execution_time_ms": submission.execution_time_ms,
+            "memory_usage_mb": submission.memory_usage_mb,
+        }, final=True)
+
+    def on_match_started(self, match):
+        """!
+        @brief Matchmaking listener, tells the players of a new match
+        """
+        self.publish([f"user:{player}" for player in match.ratings], ("match", match.match_id), {
+            "type": "match_started",
+            "match_id": match.match_id,
+            "problem_id": match.problem_id,
+            "difficulty": match.difficulty.name,
+            "players": list(match.ratings),
+        }, final=True)
+
+    def stats(self) -> dict:
+        """!
+        @brief Connection and delivery counters
+        @return dict: Hub statistics
+        """
+        return {
+            "connections": self.connections,
+            "topics": len(self._topics),
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+        }
+
+
+def _topics(user_id, match_id):
+    topics = [f"user:{user_id}"]
+    if match_id is not None:
+        topics.append(f"match:{match_id}")
+    return topics
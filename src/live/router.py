@@ -0,0 +1,107 @@
+"""!
+@file router.py
+@brief WebSocket endpoint for live judge progress
+@details Clients connect to /ws with the access token from /login or /register, either as token
+         query parameter (browsers cannot set headers on WebSockets) or as bearer Authorization
+         header. They receive the progress and verdicts of their own submissions right away and can
+         follow matches by sending {"action": "subscribe", "match_id": <id>} or stop following them
+         with {"action": "unsubscribe", "match_id": <id>}.
+"""
+
+from typing import Optional
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+
+from auth.principal_cache import Principal
+from database import AsyncSessionLocal
+from dependencies import get_current_user, get_hub, resolve_principal
+from judge.submission_service import get_match
+from live.hub import Connection, Hub
+
+router = APIRouter(tags=["live"])
+
+## @brief WebSocket close code for missing or invalid credentials (RFC 6455 "policy violation")
+CLOSE_UNAUTHORIZED = 1008
+
+
+def _bearer_token(websocket: WebSocket) -> Optional[str]:
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+async def _match_exists(match_id: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        return await get_match(db, match_id) is not None
+
+
+async def _handle(hub: Hub, connection: Connection, message: dict):
+    """!
+    @brief Apply a subscription request of a client and acknowledge it
+    """
+    action = message.get("action")
+    match_id = message.get("match_id")
+    if action not in ("subscribe", "unsubscribe") or not isinstance(match_id, int):
+        reply = {"type": "error", "detail": "Expected {\"action\": \"subscribe\"|\"unsubscribe\", \"match_id\": <int>}"}
+    elif action == "unsubscribe":
+        hub.unsubscribe(connection, f"match:{match_id}")
+        reply = {"type": "unsubscribed", "match_id": match_id}
+    elif not await _match_exists(match_id):
+        reply = {"type": "error", "detail": "Match not found", "match_id": match_id}
+    elif not hub.subscribe(connection, f"match:{match_id}"):
+        reply = {"type": "error", "detail": "Too many subscriptions", "match_id": match_id}
+    else:
+        reply = {"type": "subscribed", "match_id": match_id}
+    connection.offer(("reply", action, match_id), json.dumps(reply), final=True)
+
+
+@router.websocket("/ws")
+async def live_events(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """!
+    @brief Stream judge progress and verdicts to a client
+    @param websocket WebSocket: The client connection
+    @param token str|None: The access token, alternatively sent as bearer Authorization header
+    """
+    token = token or _bearer_token(websocket)
+    try:
+        principal = await resolve_principal(token) if token else None
+    except HTTPException:
+        principal = None
+    if principal is None:
+        await websocket.close(code=CLOSE_UNAUTHORIZED)
+        return
+
+    await websocket.accept()
+    hub = websocket.app.state.hub
+    connection = Connection(websocket, principal.id)
+    hub.register(connection)
+    sender = asyncio.create_task(connection.run_sender())
+    try:
+        while not connection.closed:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                message = None
+            await _handle(hub, connection, message if isinstance(message, dict) else {})
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the hub closed the socket of a slow client while we were receiving
+        pass
+    finally:
+        hub.unregister(connection)
+        await connection.close()
+        sender.cancel()
+
+
+@router.get("/live/stats")
+async def get_live_stats(
+    current_user: Principal = Depends(get_current_user),
+    hub: Hub = Depends(get_hub)
+):
+    """!
+    @brief Get the number of live connections and delivered events
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param hub Hub: The live event hub of the application
+    @return dict: Hub statistics
+    """
+    return hub.stats()
@@ -2,22 +2,92 @@
 @file main.py
 @brief Main entry point for the CodeRunner FastAPI application
 @details This module sets up the FastAPI application for CodeRunner, a platform for practicing timed LeetCode problems.
-         It includes authentication routing and provides the main server entry point.
+         create_app() builds the application with authentication, submission, analysis, problem bank, leaderboard
+         and matchmaking routing, the lifespan hooks run the judge service, the rejudges, the leaderboards, the
+         submission statistics, the matchmaking and the live progress hub. Every request is timed by the metrics
+         middleware, the metrics are served at /metrics. Importing this module does not touch the database, engines
+         and the password hashing context are created on first use.
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from analysis.router import router as analysis_router
+from analysis.service import SubmissionStatsService
 from auth.router import router
+from auth.auth import get_pwd_context
+from auth.password_hasher import PasswordHasher
+from database import dispose_engines
+from judge.rejudge import RejudgeService
+from judge.router import router as judge_router
+from judge.service import JudgeService
+from leaderboard.router import router as leaderboard_router
+from leaderboard.service import LeaderboardService
+from live.hub import Hub
+from live.router import router as live_router
+from matchmaking.router import router as matchmaking_router
+from matchmaking.service import MatchmakingService
+from monitoring.middleware import MetricsMiddleware
+from monitoring.router import router as monitoring_router
+from problems.router import router as problems_router
 
-## @brief FastAPI application instance
-app = FastAPI(
-    title="CodeRunner API",
-    description="this is the API for CodeRunner, a platform for praciting timed leetocde problems",
-    version="1.0.0"
-)
 
-app.include_router(router)
+async def startup(app: FastAPI):
+    """!
+    @brief Start the services of the application
+    @details The password hashing context is built on a hasher thread, so startup does not wait for it
+    @param app FastAPI: The application instance
+    """
+    app.state.password_hasher = PasswordHasher()
+    app.state.password_hasher.prepare(get_pwd_context)
+    app.state.leaderboards = LeaderboardService()
+    app.state.leaderboards.start()
+    app.state.judge = JudgeService()
+    app.state.judge.add_listener(app.state.leaderboards.on_judged)
+    app.state.judge.add_rejudge_listener(app.state.leaderboards.on_rejudged)
+    app.state.submission_stats = SubmissionStatsService()
+    app.state.submission_stats.start()
+    app.state.judge.add_listener(app.state.submission_stats.on_judged)
+    app.state.judge.add_rejudge_listener(app.state.submission_stats.on_rejudged)
+    app.state.hub = Hub()
+    app.state.judge.add_progress_listener(app.state.hub.on_progress)
+    app.state.judge.add_listener(app.state.hub.on_judged)
+    app.state.matchmaking = MatchmakingService()
+    app.state.judge.add_listener(app.state.matchmaking.on_judged)
+    app.state.judge.add_rejudge_listener(app.state.matchmaking.on_rejudged)
+    app.state.matchmaking.add_listener(app.state.hub.on_match_started)
+    app.state.matchmaking.start()
+    await app.state.judge.start()
+    app.state.rejudge = RejudgeService(app.state.judge)
+
+
+async def shutdown(app: FastAPI):
+    """!
+    @brief Stop the services of the application and close the database connections
+    @param app FastAPI: The application instance
+    """
+    await app.state.rejudge.stop()
+    await app.state.judge.stop()
+    await app.state.matchmaking.stop()
+    await app.state.leaderboards.stop()
+    await app.state.submission_stats.stop()
+    app.state.password_hasher.shutdown()
+    await dispose_engines()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """!
+    @brief Application lifespan handler
+    @details Runs startup() before the first request and shutdown() after the last one
+    @param app FastAPI: The application instance
+    """
+    await startup(app)
+    try:
+        yield
+    finally:
+        await shutdown(app)
+
 
-@app.get("/")
 async def root():
     """!
     @brief Root endpoint handler
@@ -27,6 +97,36 @@ async def root():
     """
     return {"message": "Hello World!"}
 
+
+def create_app() -> FastAPI:
+    """!
+    @brief Build a CodeRunner application
+    @details Every call returns an independent application with its own services, which are started
+             by its lifespan. Usable as uvicorn factory: uvicorn main:create_app --factory
+    @return FastAPI: The application
+    """
+    app = FastAPI(
+        title="CodeRunner API",
+        description="this is the API for CodeRunner, a platform for praciting timed leetocde problems",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+    app.include_router(router)
+    app.include_router(judge_router)
+    app.include_router(analysis_router)
+    app.include_router(problems_router)
+    app.include_router(leaderboard_router)
+    app.include_router(live_router)
+    app.include_router(matchmaking_router)
+    app.include_router(monitoring_router)
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/", root, methods=["GET"])
+    return app
+
+
+## @brief FastAPI application instance for uvicorn main:app
+app = create_app()
+
 if __name__ == "__main__":
     """!
     @brief Main execution block
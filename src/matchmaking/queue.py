@@ -0,0 +1,165 @@
+"""!
+@file queue.py
+@brief In-memory matchmaking queues ordered by rating
+@details Waiting players are kept in one sorted set per difficulty, ordered by rating (see
+         leaderboard/sorted_set.py). A player's search window starts at MATCHMAKING_WINDOW_START
+         rating points and widens by MATCHMAKING_WINDOW_GROWTH points per second of waiting up to
+         MATCHMAKING_WINDOW_MAX. Two players may be paired when their rating difference is within
+         the window of both, so a newcomer is not thrown at a far stronger player just because the
+         other one waited long.
+
+         A player joining the queue is paired right away with the closest acceptable neighbour:
+         finding its rank and the neighbours around it costs O(log n). sweep() pairs players whose
+         windows have grown since, walking each queue once in rating order.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import os
+
+from leaderboard.sorted_set import SortedSet
+from models.models import DifficultyEnum
+
+## @brief Rating difference accepted right after joining the queue
+MATCHMAKING_WINDOW_START = float(os.getenv("MATCHMAKING_WINDOW_START", 50))
+
+## @brief Rating points the window widens by per second of waiting
+MATCHMAKING_WINDOW_GROWTH = float(os.getenv("MATCHMAKING_WINDOW_GROWTH", 10))
+
+## @brief Widest window, players further apart are never paired
+MATCHMAKING_WINDOW_MAX = float(os.getenv("MATCHMAKING_WINDOW_MAX", 400))
+
+## @brief Neighbours inspected on either side when pairing a joining player
+MATCHMAKING_SCAN_LIMIT = 8
+
+
+@dataclass
+class QueuedPlayer:
+    """!
+    @brief A player waiting for a match
+    @details enqueued_at is a UNIX timestamp, so the window keeps its width across restarts.
+    """
+    user_id: int
+    rating: float
+    difficulty: DifficultyEnum
+    enqueued_at: float
+
+    @property
+    def key(self) -> Tuple[float, float, int]:
+        # Unique score in the sorted set, ties in rating go to the longer waiting player
+        return (self.rating, self.enqueued_at, self.user_id)
+
+
+class MatchQueue:
+    """!
+    @brief Waiting players by difficulty, ordered by rating
+    @details Not thread-safe, the matchmaking service only uses it from the event loop.
+    """
+
+    def __init__(self, window_start: float = MATCHMAKING_WINDOW_START,
+                 window_growth: float = MATCHMAKING_WINDOW_GROWTH, window_max: float = MATCHMAKING_WINDOW_MAX):
+        self.window_start = window_start
+        self.window_growth = window_growth
+        self.window_max = window_max
+        self.players: Dict[int, QueuedPlayer] = {}
+        self._buckets: Dict[DifficultyEnum, SortedSet] = {difficulty: SortedSet() for difficulty in DifficultyEnum}
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.players
+
+    def window(self, player: QueuedPlayer, now: float) -> float:
+        """!
+        @brief Current search window of a player
+        @param player QueuedPlayer: The player
+        @param now float: The current UNIX time
+        @return float: Accepted rating difference
+        """
+        waited = max(now - player.enqueued_at, 0.0)
+        return min(self.window_start + self.window_growth * waited, self.window_max)
+
+    def add(self, player: QueuedPlayer):
+        """!
+        @brief Put a player into the queue of its difficulty without pairing it
+        @param player QueuedPlayer: The player, replacing an earlier ticket of the same user
+        """
+        self.remove(player.user_id)
+        self.players[player.user_id] = player
+        self._buckets[player.difficulty].zadd(player.user_id, player.key)
+
+    def remove(self, user_id: int) -> Optional[QueuedPlayer]:
+        """!
+        @brief Take a player out of the queue
+        @param user_id int: The user
+        @return QueuedPlayer|None: The removed player, None if the user was not waiting
+        """
+        player = self.players.pop(user_id, None)
+        if player is not None:
+            self._buckets[player.difficulty].zrem(user_id)
+        return player
+
+    def pair(self, user_id: int, now: float) -> Optional[Tuple[QueuedPlayer, QueuedPlayer]]:
+        """!
+        @brief Pair a waiting player with the closest acceptable neighbour
+        @details Paired players leave the queue. Costs O(log n) for the rank lookup and the
+                 neighbours around it.
+        @param user_id int: The user
+        @param now float: The current UNIX time
+        @return tuple[QueuedPlayer, QueuedPlayer]|None: The player and its opponent, None if no
+                neighbour is acceptable yet
+        """
+        player = self.players.get(user_id)
+        if player is None:
+            return None
+        bucket = self._buckets[player.difficulty]
+        rank = bucket.zrank(user_id)
+        window = self.window(player, now)
+        best = None
+        start = max(rank - MATCHMAKING_SCAN_LIMIT, 0)
+        for member, _ in bucket.zrange(start, rank + MATCHMAKING_SCAN_LIMIT):
+            if member == user_id:
+                continue
+            candidate = self.players[member]
+            gap = abs(candidate.rating - player.rating)
+            if gap > window or gap > self.window(candidate, now):
+                continue
+            if best is None or gap < abs(best.rating - player.rating):
+                best = candidate
+        if best is None:
+            return None
+        self.remove(player.user_id)
+        self.remove(best.user_id)
+        return player, best
+
+    def sweep(self, now: float) -> List[Tuple[QueuedPlayer, QueuedPlayer]]:
+        """!
+        @brief Pair the players whose windows grew enough since they joined
+        @details Walks every queue once in rating order and pairs neighbours whose difference is
+                 within both windows, O(n) per sweep.
+        @param now float: The current UNIX time
+        @return list[tuple[QueuedPlayer, QueuedPlayer]]: The pairs, removed from the queue
+        """
+        pairs = []
+        for bucket in self._buckets.values():
+            players = [self.players[member] for member, _ in bucket.zrange(0, -1)]
+            index = 0
+            while index + 1 < len(players):
+                first, second = players[index], players[index + 1]
+                gap = second.rating - first.rating
+                if gap <= self.window(first, now) and gap <= self.window(second, now):
+                    pairs.append((first, second))
+                    index += 2
+                else:
+                    index += 1
+        for first, second in pairs:
+            self.remove(first.user_id)
+            self.remove(second.user_id)
+        return pairs
+
+    def stats(self) -> Dict[str, int]:
+        """!
+        @brief Number of waiting players per difficulty
+        """
+        return {difficulty.name: len(bucket) for difficulty, bucket in self._buckets.items()}
@@ -0,0 +1,104 @@
+"""!
+@file router.py
+@brief Matchmaking API routes
+@details Users join the queue of a difficulty, poll their status and leave the queue again. Once
+         paired the status names the match and its problem, connected WebSocket clients are told
+         with a match_started event as well.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+
+from auth.principal_cache import Principal
+from dependencies import get_current_user, get_matchmaking
+from matchmaking.service import MatchmakingConflict, MatchmakingService, NoProblemAvailable
+from models.models import DifficultyEnum
+from models.schemas import MatchmakingJoin, MatchmakingStatus
+
+router = APIRouter(prefix="/matchmaking", tags=["matchmaking"])
+
+
+def _ready(matchmaking: MatchmakingService) -> MatchmakingService:
+    """!
+    @brief Require the matchmaking to be rebuilt
+    @throws HTTPException: 503 while the queues are rebuilt after a restart
+    """
+    if not matchmaking.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Matchmaking is being rebuilt, please try again shortly",
+            headers={"Retry-After": "2"}
+        )
+    return matchmaking
+
+
+@router.post("/queue", response_model=MatchmakingStatus, response_model_exclude_none=True,
+             status_code=status.HTTP_202_ACCEPTED)
+async def join_queue(
+    join: MatchmakingJoin,
+    current_user: Principal = Depends(get_current_user),
+    matchmaking: MatchmakingService = Depends(get_matchmaking)
+):
+    """!
+    @brief Wait for a match on a problem of a difficulty
+    @details Pairs the user right away if an opponent with a close rating is waiting, otherwise the
+             search window widens while the user waits.
+    @param join MatchmakingJoin: The difficulty
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param matchmaking MatchmakingService: The matchmaking of the application
+    @return MatchmakingStatus: "waiting", or "matched" with the match
+    @throws HTTPException: 404 if there is no problem of the difficulty, 409 if the user is waiting or playing already, 503 while rebuilding
+    """
+    try:
+        return await _ready(matchmaking).join(current_user.id, DifficultyEnum[join.difficulty])
+    except MatchmakingConflict as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except NoProblemAvailable as error:
+        raise HTTPException(status_code=404, detail=str(error))
+
+
+@router.get("/queue", response_model=MatchmakingStatus, response_model_exclude_none=True)
+async def get_queue_status(
+    current_user: Principal = Depends(get_current_user),
+    matchmaking: MatchmakingService = Depends(get_matchmaking)
+):
+    """!
+    @brief Get the matchmaking status of the current user
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param matchmaking MatchmakingService: The matchmaking of the application
+    @return MatchmakingStatus: "waiting" with the current search window, or "matched" with the running match
+    @throws HTTPException: 404 if the user neither waits nor plays, 503 while rebuilding
+    """
+    current = _ready(matchmaking).status(current_user.id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Not waiting for a match")
+    return current
+
+
+@router.delete("/queue", status_code=status.HTTP_204_NO_CONTENT)
+async def leave_queue(
+    current_user: Principal = Depends(get_current_user),
+    matchmaking: MatchmakingService = Depends(get_matchmaking)
+):
+    """!
+    @brief Stop waiting for a match
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param matchmaking MatchmakingService: The matchmaking of the application
+    @throws HTTPException: 404 if the user is not waiting, 503 while rebuilding
+    """
+    if not await _ready(matchmaking).leave(current_user.id):
+        raise HTTPException(status_code=404, detail="Not waiting for a match")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/stats")
+async def get_matchmaking_stats(
+    current_user: Principal = Depends(get_current_user),
+    matchmaking: MatchmakingService = Depends(get_matchmaking)
+):
+    """!
+    @brief Report queue lengths and match counters
+    @param current_user Principal: The authenticated user (injected by dependency)
+    @param matchmaking MatchmakingService: The matchmaking of the application
+    @return dict: Waiting users per difficulty, running and unrated matches
+    """
+    return matchmaking.stats()
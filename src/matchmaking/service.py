@@ -0,0 +1,491 @@
+"""!
+@file service.py
+@brief Rating-based matchmaking with batched Elo updates
+@details Users join the queue of a difficulty and are paired by rating (see matchmaking/queue.py).
+         A pair becomes a match on a random problem of that difficulty, created in one transaction
+         together with its players while their tickets are deleted. Matches end with the first
+         accepted submission of a player, which wins, or as a draw after MATCH_DURATION_S.
+
+         Ended matches are rated in batches: every MATCHMAKING_TICK_S the Elo updates of all matches
+         that ended since are computed in memory and written in one transaction, so a burst of
+         ending matches costs one round of writes instead of one per match.
+
+         When a rejudge fails an accepted submission of a match, the match is evaluated again with
+         the next rating batch: the earliest accepted submission left that was submitted before the
+         match ended wins, without one the match is a draw. Rated matches keep their place in the
+         rating history, the players' current ratings are moved by the difference between the new and
+         the old Elo change, both computed from the ratings the players started the match with.
+
+         The queues and running matches live in the memory of the API process and are rebuilt from
+         the match_tickets and matches tables on startup; matches that were won while the process
+         was down are ended from their accepted submissions. Like the leaderboards this assumes a
+         single API process.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import random
+import time
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from auth.principal_cache import invalidate_after_commit
+from database import AsyncSessionLocal
+from matchmaking.queue import MatchQueue, QueuedPlayer
+from models.models import DifficultyEnum, Match, MatchPlayer, MatchTicket, Problem, StatusEnum, Submission, User
+from monitoring.metrics import MATCHMAKING_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+## @brief Seconds between queue sweeps, match expiry checks and rating batches
+MATCHMAKING_TICK_S = float(os.getenv("MATCHMAKING_TICK_S", 1))
+
+## @brief Seconds after which a match without a winner ends as a draw
+MATCH_DURATION_S = float(os.getenv("MATCH_DURATION_S", 1800))
+
+## @brief Elo K-factor, the largest rating change of a single match
+MATCHMAKING_ELO_K = float(os.getenv("MATCHMAKING_ELO_K", 32))
+
+
+class MatchmakingConflict(Exception):
+    """!
+    @brief Raised when a user cannot join the queue, because it is waiting or playing already
+    """
+
+
+class NoProblemAvailable(Exception):
+    """!
+    @brief Raised when the problem bank holds no problem of the requested difficulty
+    """
+
+
+@dataclass
+class ActiveMatch:
+    """!
+    @brief A running matchmade match
+    """
+    match_id: int
+    problem_id: int
+    difficulty: DifficultyEnum
+    started_at: float
+    ratings: Dict[int, float]
+
+
+@dataclass
+class FinishedMatch:
+    """!
+    @brief An ended match waiting for its rating batch
+    """
+    match_id: int
+    ended_at: datetime
+    ratings: Dict[int, float]
+    scores: Dict[int, float] = field(default_factory=dict)
+
+
+def expected_score(rating: float, opponent: float) -> float:
+    """!
+    @brief Elo expectation of a player against an opponent
+    @return float: Expected score between 0 and 1
+    """
+    return 1.0 / (1.0 + 10.0 ** ((opponent - rating) / 400.0))
+
+
+def rate(ratings: Dict[int, float], scores: Dict[int, float], k: float = MATCHMAKING_ELO_K) -> Dict[int, float]:
+    """!
+    @brief New ratings of the players of a match
+    @details Every player is rated against every other one, the changes are averaged, so a match
+             of two players is the classic Elo update.
+    @param ratings dict[int, float]: Rating of every player before the match
+    @param scores dict[int, float]: Result of every player: 1 win, 0.5 draw, 0 loss
+    @param k float: The K-factor
+    @return dict[int, float]: Rating of every player after the match
+    """
+    opponents = max(len(ratings) - 1, 1)
+    updated = {}
+    for player, rating in ratings.items():
+        change = 0.0
+        for other, other_rating in ratings.items():
+            if other != player:
+                # Pairwise score: win against lower scores, draw against equal ones
+                actual = 0.5 if scores[player] == scores[other] else float(scores[player] > scores[other])
+                change += actual - expected_score(rating, other_rating)
+        updated[player] = rating + k * change / opponents
+    return updated
+
+
+class MatchmakingService:
+    """!
+    @brief Queues, running matches and rating updates of the application
+    @details Must be used from the event loop. Until the rebuild after startup finished the service
+             is not ready and the routes answer 503.
+    """
+
+    def __init__(self):
+        self.queue = MatchQueue()
+        self.active: Dict[int, ActiveMatch] = {}
+        self.ready = False
+        self.matches_started = 0
+        self.matches_rated = 0
+        self._user_matches: Dict[int, int] = {}
+        self._finished: List[FinishedMatch] = []
+        self._corrections: Set[int] = set()
+        self._listeners: List[Callable[[ActiveMatch], None]] = []
+        self._task = None
+
+    def start(self):
+        """!
+        @brief Rebuild the queues and running matches in the background, then run the matchmaking loop
+        """
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """!
+        @brief Stop the matchmaking loop and write the ratings of ended matches
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._finished:
+            await self._rate_finished()
+        if self._corrections:
+            await self._correct_results()
+
+    def add_listener(self, listener: Callable[[ActiveMatch], None]):
+        """!
+        @brief Register a callback for started matches
+        @details Listeners run on the event loop right after the match was committed and must not
+                 block. Exceptions are logged and do not affect the match.
+        @param listener callable: Called with the ActiveMatch
+        """
+        self._listeners.append(listener)
+
+    async def join(self, user_id: int, difficulty: DifficultyEnum) -> dict:
+        """!
+        @brief Put a user into the queue of a difficulty and pair it if an opponent is in reach
+        @param user_id int: The user
+        @param difficulty DifficultyEnum: The difficulty of the wanted problem
+        @return dict: The status of the user, see status()
+        @throws MatchmakingConflict: If the user is waiting or playing already
+        @throws NoProblemAvailable: If there is no problem of the difficulty
+        """
+        if user_id in self.queue or user_id in self._user_matches:
+            raise MatchmakingConflict("Already waiting for or playing a match")
+        async with AsyncSessionLocal() as db:
+            rating = (await db.execute(select(User.rating).where(User.id == user_id))).scalar_one()
+            if await _pick_problem(db, difficulty) is None:
+                raise NoProblemAvailable(f"No {difficulty.name} problem available")
+            ticket = MatchTicket(user_id=user_id, difficulty=difficulty, created_at=datetime.utcnow())
+            db.add(ticket)
+            try:
+                await db.commit()
+            except IntegrityError:
+                raise MatchmakingConflict("Already waiting for or playing a match")
+        self.queue.add(QueuedPlayer(user_id, rating, difficulty, _timestamp(ticket.created_at)))
+        pair = self.queue.pair(user_id, time.time())
+        if pair is not None:
+            await self._start_match(*pair)
+        return self.status(user_id)
+
+    async def leave(self, user_id: int) -> bool:
+        """!
+        @brief Take a user out of the queue
+        @param user_id int: The user
+        @return bool: True if the user was waiting
+        """
+        if self.queue.remove(user_id) is None:
+            return False
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(MatchTicket).where(MatchTicket.user_id == user_id))
+            await db.commit()
+        return True
+
+    def status(self, user_id: int) -> Optional[dict]:
+        """!
+        @brief Matchmaking status of a user
+        @param user_id int: The user
+        @return dict|None: "waiting" with the current window, "matched" with the running match, or
+                None if the user neither waits nor plays
+        """
+        match_id = self._user_matches.get(user_id)
+        if match_id is not None:
+            match = self.active[match_id]
+            return {"status": "matched", "difficulty": match.difficulty.name, "rating": match.ratings[user_id],
+                    "match_id": match_id, "problem_id": match.problem_id,
+                    "opponents": [player for player in match.ratings if player != user_id]}
+        player = self.queue.players.get(user_id)
+        if player is None:
+            return None
+        now = time.time()
+        return {"status": "waiting", "difficulty": player.difficulty.name, "rating": player.rating,
+                "waited_s": round(max(now - player.enqueued_at, 0.0), 3),
+                "window": round(self.queue.window(player, now), 1)}
+
+    def on_judged(self, submission: Submission, result):
+        """!
+        @brief Judge service listener, ends a running match with its first accepted submission
+        @param submission Submission: The judged submission with its stored verdict
+        @param result JudgeResult: The verdict
+        """
+        match = self.active.get(submission.match_id) if submission.match_id is not None else None
+        if match is None or submission.status != StatusEnum.accepted or submission.user_id not in match.ratings:
+            return
+        if submission.problem_id != match.problem_id:
+            return
+        self._finish(match, submission.user_id)
+
+    def on_rejudged(self, submission: Submission, previous):
+        """!
+        @brief Judge service rejudge listener, evaluates a match again once an accepted submission of it failed
+        @param submission Submission: The rejudged submission with its stored verdict
+        @param previous StoredVerdict: Its verdict before the rejudge
+        """
+        if submission.match_id is None or previous.status != StatusEnum.accepted:
+            return
+        if submission.status != StatusEnum.accepted:
+            self._corrections.add(submission.match_id)
+
+    def stats(self) -> dict:
+        """!
+        @brief Queue lengths and match counters
+        @return dict: Matchmaking statistics
+        """
+        return {
+            "ready": self.ready,
+            "queued": self.queue.stats(),
+            "active_matches": len(self.active),
+            "unrated_matches": len(self._finished),
+            "matches_started": self.matches_started,
+            "matches_rated": self.matches_rated,
+        }
+
+    def _finish(self, match: ActiveMatch, winner: Optional[int]):
+        del self.active[match.match_id]
+        for player in match.ratings:
+            self._user_matches.pop(player, None)
+        scores = {player: (0.5 if winner is None else float(player == winner)) for player in match.ratings}
+        self._finished.append(FinishedMatch(match.match_id, datetime.utcnow(), match.ratings, scores))
+
+    async def _start_match(self, first: QueuedPlayer, second: QueuedPlayer):
+        players = (first, second)
+        try:
+            async with AsyncSessionLocal() as db:
+                problem_id = await _pick_problem(db, first.difficulty)
+                if problem_id is None:
+                    raise NoProblemAvailable(f"No {first.difficulty.name} problem available")
+                now = datetime.utcnow()
+                match_id = (await db.execute(
+                    insert(Match).values(created_at=now, started_at=now, problem_id=problem_id).returning(Match.id)
+                )).scalar_one()
+                await db.execute(insert(MatchPlayer), [
+                    {"match_id": match_id, "user_id": player.user_id, "rating_before": player.rating}
+                    for player in players
+                ])
+                await db.execute(delete(MatchTicket).where(MatchTicket.user_id.in_([p.user_id for p in players])))
+                await db.commit()
+        except Exception:
+            logger.exception("Starting a match for users %d and %d failed, they stay queued",
+                             first.user_id, second.user_id)
+            for player in players:
+                self.queue.add(player)
+            return
+        started = time.time()
+        match = ActiveMatch(match_id, problem_id, first.difficulty, started,
+                            {player.user_id: player.rating for player in players})
+        self._activate(match)
+        for player in players:
+            MATCHMAKING_WAIT_SECONDS.observe(max(started - player.enqueued_at, 0.0))
+        self.matches_started += 1
+        for listener in self._listeners:
+            try:
+                listener(match)
+            except Exception:
+                logger.exception("Matchmaking listener failed for match %d", match_id)
+
+    def _activate(self, match: ActiveMatch):
+        self.active[match.match_id] = match
+        for player in match.ratings:
+            self._user_matches[player] = match.match_id
+
+    async def _rate_finished(self):
+        batch, self._finished = self._finished, []
+        try:
+            async with AsyncSessionLocal() as db:
+                players = {player for match in batch for player in match.ratings}
+                ratings = dict((await db.execute(select(User.id, User.rating).where(User.id.in_(players)))).all())
+                user_rows, player_rows = {}, []
+                # Matches are rated in the order they ended, a player of several sees every change
+                for match in batch:
+                    before = {player: ratings[player] for player in match.ratings}
+                    after = rate(before, match.scores)
+                    ratings.update(after)
+                    user_rows.update(after)
+                    player_rows.extend({"match_id": match.match_id, "user_id": player, "score": match.scores[player],
+                                        "rating_after": rating} for player, rating in after.items())
+                # Bulk updates by primary key, one executemany per table
+                await db.execute(update(User), [{"id": user_id, "rating": rating} for user_id, rating in user_rows.items()])
+                invalidate_after_commit(db, user_rows)
+                await db.execute(update(MatchPlayer), player_rows)
+                await db.execute(update(Match), [{"id": match.match_id, "ended_at": match.ended_at} for match in batch])
+                await db.commit()
+        except Exception:
+            logger.exception("Rating %d matches failed, retrying with the next batch", len(batch))
+            self._finished = batch + self._finished
+            return
+        self.matches_rated += len(batch)
+
+    async def _run(self):
+        try:
+            await self._rebuild()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Rebuilding the matchmaking queues failed, starting empty")
+        self.ready = True
+        while True:
+            await asyncio.sleep(MATCHMAKING_TICK_S)
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Matchmaking round failed")
+
+    async def _tick(self):
+        now = time.time()
+        for first, second in self.queue.sweep(now):
+            await self._start_match(first, second)
+        for match in [match for match in self.active.values() if now - match.started_at >= MATCH_DURATION_S]:
+            self._finish(match, None)
+        if self._finished:
+            await self._rate_finished()
+        if self._corrections:
+            await self._correct_results()
+
+    async def _correct_results(self):
+        match_ids, self._corrections = self._corrections, set()
+        unrated = {match.match_id: match for match in self._finished}
+        corrected = 0
+        try:
+            async with AsyncSessionLocal() as db:
+                for match_id in match_ids:
+                    players = (await db.execute(
+                        select(MatchPlayer.user_id, MatchPlayer.rating_before, MatchPlayer.score,
+                               MatchPlayer.rating_after, Match.problem_id, Match.ended_at)
+                        .join(Match, Match.id == MatchPlayer.match_id)
+                        .where(MatchPlayer.match_id == match_id)
+                    )).all()
+                    if not players or players[0].problem_id is None:
+                        continue
+                    finished = unrated.get(match_id)
+                    ended_at = finished.ended_at if finished is not None else players[0].ended_at
+                    if ended_at is None:
+                        continue
+                    winner = (await db.execute(
+                        select(Submission.user_id)
+                        .where(Submission.match_id == match_id, Submission.problem_id == players[0].problem_id,
+                               Submission.status == StatusEnum.accepted, Submission.submitted_at <= ended_at,
+                               Submission.user_id.in_([row.user_id for row in players]))
+                        .order_by(Submission.submitted_at, Submission.id)
+                        .limit(1)
+                    )).scalar_one_or_none()
+                    scores = {row.user_id: 0.5 if winner is None else float(row.user_id == winner) for row in players}
+                    if finished is not None:
+                        finished.scores = scores
+                        continue
+                    stored = {row.user_id: row.score for row in players}
+                    if stored == scores or None in stored.values():
+                        continue
+                    before = {row.user_id: row.rating_before for row in players}
+                    old, new = rate(before, stored), rate(before, scores)
+                    for row in players:
+                        change = new[row.user_id] - old[row.user_id]
+                        await db.execute(
+                            update(User).where(User.id == row.user_id).values(rating=User.rating + change)
+                        )
+                    invalidate_after_commit(db, [row.user_id for row in players])
+                    await db.execute(update(MatchPlayer), [
+                        {"match_id": match_id, "user_id": row.user_id, "score": scores[row.user_id],
+                         "rating_after": row.rating_after + new[row.user_id] - old[row.user_id]}
+                        for row in players
+                    ])
+                    corrected += 1
+                await db.commit()
+        except Exception:
+            logger.exception("Correcting the results of %d rejudged matches failed, retrying with the next round",
+                             len(match_ids))
+            self._corrections |= match_ids
+            return
+        if corrected:
+            logger.info("Corrected the results of %d matches after a rejudge", corrected)
+
+    async def _rebuild(self):
+        async with AsyncSessionLocal() as db:
+            tickets = (await db.execute(
+                select(MatchTicket.user_id, MatchTicket.difficulty, MatchTicket.created_at, User.rating)
+                .join(User, User.id == MatchTicket.user_id)
+            )).all()
+            running = (await db.execute(
+                select(Match.id, Match.problem_id, Match.started_at, Problem.difficulty,
+                       MatchPlayer.user_id, MatchPlayer.rating_before)
+                .join(MatchPlayer, MatchPlayer.match_id == Match.id)
+                .join(Problem, Problem.id == Match.problem_id)
+                .where(Match.ended_at.is_(None), Match.started_at.is_not(None))
+            )).all()
+            matches: Dict[int, ActiveMatch] = {}
+            for row in running:
+                match = matches.setdefault(row.id, ActiveMatch(row.id, row.problem_id, row.difficulty,
+                                                               _timestamp(row.started_at), {}))
+                match.ratings[row.user_id] = row.rating_before
+            winners: List[Tuple[int, int]] = []
+            if matches:
+                # Matches won while the process was down: the earliest accepted submission wins
+                first_accepted = (
+                    select(Submission.match_id, Submission.user_id,
+                           func.row_number().over(partition_by=Submission.match_id,
+                                                  order_by=(Submission.submitted_at, Submission.id)).label("position"))
+                    .join(Match, Match.id == Submission.match_id)
+                    .where(Submission.match_id.in_(list(matches)), Submission.status == StatusEnum.accepted,
+                           Submission.problem_id == Match.problem_id)
+                    .subquery()
+                )
+                winners = (await db.execute(
+                    select(first_accepted.c.match_id, first_accepted.c.user_id).where(first_accepted.c.position == 1)
+                )).all()
+        for row in tickets:
+            self.queue.add(QueuedPlayer(row.user_id, row.rating, row.difficulty, _timestamp(row.created_at)))
+        for match in matches.values():
+            self._activate(match)
+        for match_id, user_id in winners:
+            if user_id in matches[match_id].ratings:
+                self._finish(matches[match_id], user_id)
+        logger.info("Matchmaking rebuilt with %d waiting users and %d running matches",
+                    len(self.queue), len(self.active))
+
+
+async def _pick_problem(db, difficulty: DifficultyEnum) -> Optional[int]:
+    """!
+    @brief A random problem of a difficulty
+    @details Picks a random id between the smallest and the largest one of the difficulty and takes
+             the next problem from there, two index lookups instead of sorting the problem bank.
+    @return int|None: The problem id, None if there is no problem of the difficulty
+    """
+    bounds = (await db.execute(
+        select(func.min(Problem.id), func.max(Problem.id)).where(Problem.difficulty == difficulty)
+    )).one()
+    if bounds[0] is None:
+        return None
+    pivot = random.randint(bounds[0], bounds[1])
+    return (await db.execute(
+        select(Problem.id).where(Problem.difficulty == difficulty, Problem.id >= pivot).order_by(Problem.id).limit(1)
+    )).scalar_one()
+
+
+def _timestamp(moment: datetime) -> float:
+    # Timestamps are stored as naive UTC
+    return moment.replace(tzinfo=timezone.utc).timestamp()
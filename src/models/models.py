@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Enum, Float, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Enum, Float, Boolean, Index, LargeBinary, UniqueConstraint, false
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -26,6 +26,10 @@ class User(Base):
     email = Column(String(120), unique=True, nullable=False)
     hashed_password = Column(String(256), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Admins may edit the problem bank
+    is_admin = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Elo rating used by the matchmaking (see matchmaking/service.py)
+    rating = Column(Float, nullable=False, default=1200.0, server_default="1200")
 
     submissions = relationship("Submission", back_populates="user")
 
@@ -38,10 +42,22 @@ class Problem(Base):
     difficulty = Column(Enum(DifficultyEnum), nullable=False)
     example_input = Column(Text, nullable=True)
     example_output = Column(Text, nullable=True)
+    # Name of the output checker (see judge/checker.py) and the tolerance of the float checker
+    checker = Column(String(30), nullable=False, default="whitespace", server_default="whitespace")
+    checker_tolerance = Column(Float, nullable=True)
+    # SHA-256 of the problem pack record it was imported from (see problems/importer.py)
+    content_hash = Column(String(64), nullable=True)
 
-    test_cases = relationship("TestCase", back_populates="problem")
+    # Never loaded implicitly: readers select the test cases they need, hidden ones only for judging
+    test_cases = relationship("TestCase", back_populates="problem", lazy="raise")
     submissions = relationship("Submission", back_populates="problem")
 
+    __table_args__ = (
+        # Problem bank listing filtered by difficulty, paginated by id
+        Index("ix_problems_difficulty_id", "difficulty", "id"),
+        UniqueConstraint("content_hash", name="uq_problems_content_hash"),
+    )
+
 # Defines the Submission Table
 class Submission(Base):
     __tablename__ = 'submissions'
@@ -55,16 +71,94 @@ class Submission(Base):
     memory_usage_mb = Column(Float)
     submitted_at = Column(DateTime, default=datetime.utcnow)
 
+    match_id = Column(Integer, ForeignKey("matches.id"), nullable=True, index=True)
+
     user = relationship("User", back_populates="submissions")
     problem = relationship("Problem", back_populates="submissions")
+    match = relationship("Match", back_populates="submissions")
+
+    __table_args__ = (
+        # Submission history of a user, newest first, paginated by (submitted_at, id)
+        Index("ix_submissions_user_id_submitted_at", "user_id", "submitted_at", "id"),
+        # Per-problem statistics by status
+        Index("ix_submissions_problem_id_status", "problem_id", "status"),
+    )
+
+# Defines the Match Table
+class Match(Base):
+    __tablename__ = 'matches'
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    ended_at = Column(DateTime, nullable=True)
+    # Problem of a matchmade match, null for matches created otherwise
+    problem_id = Column(Integer, ForeignKey("problems.id"), nullable=True)
+
+    submissions = relationship("Submission", back_populates="match")
+    players = relationship("MatchPlayer", back_populates="match")
+
+# Defines the MatchPlayer Table, the participants of a match and their rating change
+class MatchPlayer(Base):
+    __tablename__ = 'match_players'
+    match_id = Column(Integer, ForeignKey("matches.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rating_before = Column(Float, nullable=False)
+    # Set once the match is rated: 1 for a win, 0.5 for a draw, 0 for a loss
+    score = Column(Float, nullable=True)
+    rating_after = Column(Float, nullable=True)
+
+    match = relationship("Match", back_populates="players")
+
+    # Match history of a user
+    __table_args__ = (Index("ix_match_players_user_id", "user_id"),)
+
+# Defines the MatchTicket Table, users waiting for a match, so the queues survive restarts
+class MatchTicket(Base):
+    __tablename__ = 'match_tickets'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    difficulty = Column(Enum(DifficultyEnum), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Defines the SubmissionSketch Table, percentile sketches of accepted submissions (see analysis/sketch.py)
+class SubmissionSketch(Base):
+    __tablename__ = 'submission_sketches'
+    problem_id = Column(Integer, ForeignKey("problems.id"), primary_key=True)
+    language = Column(String(30), primary_key=True)
+    # execution_time_ms or memory_usage_mb
+    metric = Column(String(30), primary_key=True)
+    count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    # Highest submission id counted, accepted submissions above it are replayed on startup
+    last_submission_id = Column(Integer, nullable=False)
 
 # Defines the TestCase Table
 class TestCase(Base):
     __tablename__ = 'test_cases'
     id = Column(Integer, primary_key=True)
     problem_id = Column(Integer, ForeignKey("problems.id"), nullable=False)
-    input = Column(Text, nullable=False)
-    expected_output = Column(Text, nullable=False)
+    input = Column(Text, nullable=True)
+    expected_output = Column(Text, nullable=True)
+    # SHA-256 digests of data kept in the blob store instead of the columns above (see judge/blob_store.py)
+    input_blob = Column(String(64), nullable=True)
+    expected_output_blob = Column(String(64), nullable=True)
     is_hidden = Column(Boolean, default=False)
 
     problem = relationship("Problem", back_populates="test_cases")
+
+    # Test cases of a problem, with or without the hidden ones
+    __table_args__ = (Index("ix_test_cases_problem_id_is_hidden", "problem_id", "is_hidden"),)
+
+# Defines the SubmissionTestResult Table, the outcome of every executed test case of a submission
+class SubmissionTestResult(Base):
+    __tablename__ = 'submission_test_results'
+    submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="CASCADE"), primary_key=True)
+    test_case_id = Column(Integer, ForeignKey("test_cases.id", ondelete="CASCADE"), primary_key=True)
+    # Digest of the test case when it was executed (see judge/cache.py), the result is stale once it differs
+    case_hash = Column(String(64), nullable=False)
+    status = Column(Enum(StatusEnum), nullable=False)
+    execution_time_ms = Column(Float)
+    judged_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # Results of a test case, dropped with it
+    __table_args__ = (Index("ix_submission_test_results_test_case_id", "test_case_id"),)
@@ -1,5 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_serializer
 from datetime import datetime
+from typing import Dict, List, Optional
+
+from models.models import DifficultyEnum, StatusEnum
 
 
 class UserCreate(BaseModel):
@@ -27,3 +30,198 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+
+
+class SubmissionCreate(BaseModel):
+    problem_id: int
+    match_id: Optional[int] = None
+    language: str = Field(..., max_length=30)
+    code: str = Field(..., min_length=1, max_length=65536)
+
+
+class SubmissionResponse(BaseModel):
+    id: int
+    problem_id: int
+    match_id: Optional[int] = None
+    language: str
+    status: StatusEnum
+    execution_time_ms: Optional[float] = None
+    memory_usage_mb: Optional[float] = None
+    submitted_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class RunCreate(BaseModel):
+    language: str = Field(..., max_length=30)
+    code: str = Field(..., min_length=1, max_length=65536)
+    input: Optional[str] = Field(None, max_length=65536)
+
+
+class RunResponse(BaseModel):
+    status: str
+    stdout: str
+    stderr: str
+    detail: str
+    execution_time_ms: Optional[float] = None
+    memory_usage_mb: Optional[float] = None
+    expected_output: Optional[str] = None
+    cached: bool
+
+
+class RejudgeStatus(BaseModel):
+    id: int
+    problem_id: int
+    status: str
+    total: int
+    checked: int
+    up_to_date: int
+    rejudged: int
+    failed: int
+    errors: int
+    test_cases_run: int
+    percent: float
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    elapsed_s: float
+    error: Optional[str] = None
+
+
+class SubmissionPage(BaseModel):
+    items: List[SubmissionResponse]
+    next_cursor: Optional[str] = None
+
+
+class ProblemSummary(BaseModel):
+    id: int
+    title: str
+    difficulty: DifficultyEnum
+
+    @field_serializer("difficulty")
+    def serialize_difficulty(self, difficulty: DifficultyEnum) -> str:
+        return difficulty.name
+
+    class Config:
+        from_attributes = True
+
+
+class ProblemPage(BaseModel):
+    items: List[ProblemSummary]
+    next_cursor: Optional[str] = None
+
+
+class ProblemExample(BaseModel):
+    id: int
+    input: Optional[str] = None
+    expected_output: Optional[str] = None
+
+
+class ProblemDetail(BaseModel):
+    id: int
+    title: str
+    description: str
+    difficulty: DifficultyEnum
+    example_input: Optional[str] = None
+    example_output: Optional[str] = None
+    examples: List[ProblemExample]
+
+    @field_serializer("difficulty")
+    def serialize_difficulty(self, difficulty: DifficultyEnum) -> str:
+        return difficulty.name
+
+
+class ProblemUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = Field(None, min_length=1)
+    difficulty: Optional[str] = Field(None, pattern=r'^(easy|medium|hard)$')
+    example_input: Optional[str] = None
+    example_output: Optional[str] = None
+    checker: Optional[str] = Field(None, min_length=1, max_length=30)
+    checker_tolerance: Optional[float] = Field(None, ge=0)
+
+
+class TestCaseRecord(BaseModel):
+    input: bytes = b""
+    expected_output: bytes = b""
+    is_hidden: bool = True
+
+
+class ProblemRecord(BaseModel):
+    title: str = Field(..., min_length=1, max_length=100)
+    description: str = Field(..., min_length=1)
+    difficulty: str = Field(..., pattern=r'^(easy|medium|hard)$')
+    example_input: Optional[str] = None
+    example_output: Optional[str] = None
+    checker: str = Field("whitespace", min_length=1, max_length=30)
+    checker_tolerance: Optional[float] = Field(None, ge=0)
+    test_cases: List[TestCaseRecord] = Field(default_factory=list)
+
+
+class ImportReport(BaseModel):
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    test_cases: int = 0
+    seconds: float = 0.0
+    errors: List[str] = Field(default_factory=list)
+
+
+class ProblemStats(BaseModel):
+    problem_id: int
+    submissions: int
+    by_status: Dict[str, int]
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: Optional[str] = None
+    execution_time_ms: Optional[float] = None
+    submitted_at: Optional[datetime] = None
+    solved: Optional[int] = None
+    total_time_ms: Optional[float] = None
+    last_solved_at: Optional[datetime] = None
+
+
+class LeaderboardPage(BaseModel):
+    total: int
+    entries: List[LeaderboardEntry]
+
+
+class LeaderboardPosition(BaseModel):
+    entry: Optional[LeaderboardEntry] = None
+    neighbors: List[LeaderboardEntry]
+
+
+class MatchmakingJoin(BaseModel):
+    difficulty: str = Field(..., pattern=r'^(easy|medium|hard)$')
+
+
+class MatchmakingStatus(BaseModel):
+    status: str
+    difficulty: str
+    rating: float
+    waited_s: Optional[float] = None
+    window: Optional[float] = None
+    match_id: Optional[int] = None
+    problem_id: Optional[int] = None
+    opponents: Optional[List[int]] = None
+
+
+class MetricAnalysis(BaseModel):
+    value: float
+    beats_percent: float
+    accepted: int
+    p50: float
+    p90: float
+    p99: float
+
+
+class SubmissionAnalysis(BaseModel):
+    submission_id: int
+    problem_id: int
+    language: str
+    execution_time_ms: Optional[MetricAnalysis] = None
+    memory_usage_mb: Optional[MetricAnalysis] = None
@@ -0,0 +1,344 @@
+"""!
+@file metrics.py
+@brief Process-local metrics in the Prometheus text format
+@details A minimal registry of counters, gauges and histograms, each optionally split by labels.
+         Updates take a lock and cost a few hundred nanoseconds, so they can sit on every request
+         and every database query. render() produces the text exposition format served by /metrics.
+
+         Metrics are kept per process: with several API processes every process has to be scraped,
+         Prometheus sums them up.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+import bisect
+import math
+import threading
+import time
+
+from sqlalchemy import event
+
+## @brief Bucket bounds in seconds of request and query latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+## @brief Bucket bounds in seconds of the judge stages, from a cache lookup to a slow test set
+JUDGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+## @brief Bucket bounds of the number of queries per request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+## @brief Registered metrics in registration order
+_registry: List["_Metric"] = []
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *values):
+        """!
+        @brief The child metric of one combination of label values
+        @param values str: One value per label name, in order
+        @return The child, created on first use
+        """
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def _labelled(self):
+        for key, child in list(self._children.items()):
+            yield dict(zip(self.labelnames, key)), child
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+
+class Counter(_Metric):
+    """!
+    @brief Monotonically increasing count
+    """
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        """!
+        @brief Increase the counter of a metric without labels
+        """
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for labels, child in self._labelled():
+            yield "", labels, child.value
+
+
+class _CounterChild(_Value):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+
+class Gauge(_Metric):
+    """!
+    @brief Value that goes up and down, set when it is scraped or when it changes
+    """
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        """!
+        @brief Set the value of a metric without labels
+        """
+        self.labels().set(value)
+
+    def _samples(self):
+        for labels, child in self._labelled():
+            yield "", labels, child.value
+
+
+class _GaugeChild(_Value):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class Histogram(_Metric):
+    """!
+    @brief Distribution of observed values in cumulative buckets
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        """!
+        @brief Record a value of a metric without labels
+        """
+        self.labels().observe(value)
+
+    def time(self):
+        """!
+        @brief Context manager observing the seconds spent in its block, for metrics without labels
+        """
+        return self.labels().time()
+
+    def _samples(self):
+        for labels, child in self._labelled():
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield "_bucket", {**labels, "le": "+Inf"}, count
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    """!
+    @brief All registered metrics in the Prometheus text exposition format 0.0.4
+    @return str: The metrics, one family after another
+    """
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+## @brief Requests served, by method, route template and status code
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served", ("method", "route", "status"))
+
+## @brief Request latency from the first byte received to the last byte sent
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency in seconds",
+                                 ("method", "route"))
+
+## @brief Database queries issued per request
+HTTP_REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries per HTTP request",
+                                 ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+
+## @brief Time spent waiting on database queries per request
+HTTP_REQUEST_QUERY_SECONDS = Histogram("http_request_db_query_seconds",
+                                       "Time spent in database queries per HTTP request in seconds",
+                                       ("method", "route"))
+
+## @brief Latency of single database queries by statement kind
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Database query latency in seconds", ("statement",))
+
+## @brief bcrypt time of hashing and verifying passwords
+PASSWORD_HASH_SECONDS = Histogram("password_hash_duration_seconds", "Password hashing time in seconds",
+                                  ("operation",))
+
+## @brief Time of every stage a submission passes through in the judge
+JUDGE_STAGE_SECONDS = Histogram("judge_stage_duration_seconds",
+                                "Judge stage duration in seconds: queue_wait, compile, sandbox_start, "
+                                "execution and comparison", ("stage",), buckets=JUDGE_BUCKETS)
+
+## @brief Verdicts by status and source: executed, served from the verdict cache or shared with an identical execution
+JUDGE_VERDICTS = Counter("judge_verdicts_total", "Verdicts produced by the judge", ("status", "source"))
+
+## @brief Time submissions waited in the fair-share judge queue by priority class
+JUDGE_QUEUE_WAIT_SECONDS = Histogram("judge_queue_wait_seconds", "Judge queue wait in seconds by priority class",
+                                     ("priority",), buckets=JUDGE_BUCKETS)
+
+## @brief Submissions turned away by the judge admission control, by reason
+JUDGE_REJECTED = Counter("judge_rejected_total", "Submissions rejected before judging: rate_limited, "
+                         "user_queue_full or queue_full", ("reason",))
+
+## @brief Runs of the run endpoint by outcome
+JUDGE_RUNS = Counter("judge_runs_total", "Runs answered by executing them, from the cache, or superseded by a "
+                     "newer run", ("source",))
+
+## @brief Submissions waiting in the judge queue, set on every scrape
+JUDGE_QUEUED = Gauge("judge_queued_submissions", "Submissions waiting in the judge queue")
+
+## @brief Distinct submissions being executed, set on every scrape
+JUDGE_INFLIGHT = Gauge("judge_inflight_executions", "Submissions being executed by the judge workers")
+
+## @brief Seconds users waited in the matchmaking queue until they were paired
+MATCHMAKING_WAIT_SECONDS = Histogram("matchmaking_wait_seconds", "Time from joining the matchmaking queue to the "
+                                     "start of the match in seconds", buckets=JUDGE_BUCKETS)
+
+## @brief Users waiting for a match by difficulty, set on every scrape
+MATCHMAKING_QUEUED = Gauge("matchmaking_queued_users", "Users waiting in the matchmaking queues", ("difficulty",))
+
+## @brief Query counters of the current request, None outside of requests
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+
+@contextmanager
+def track_queries():
+    """!
+    @brief Count the database queries issued by the current task and the tasks it starts
+    @return ContextManager[list]: [number of queries, seconds spent in them], filled in while the
+            block runs
+    """
+    counters = [0, 0.0]
+    token = _request_queries.set(counters)
+    try:
+        yield counters
+    finally:
+        _request_queries.reset(token)
+
+
+def instrument_engine(engine):
+    """!
+    @brief Time every query of an engine
+    @param engine Engine: A synchronous engine, for asynchronous engines their sync_engine
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("query_started", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    _, started = connection.info["query_started"].pop()
+    _observe_query(statement, started)
+
+
+def _handle_error(exception_context):
+    # A failed query gets no after_cursor_execute, its start has to be taken off the stack here. Errors
+    # raised before the cursor was executed never pushed one.
+    connection = exception_context.connection
+    stack = connection.info.get("query_started") if connection is not None else None
+    if stack and stack[-1][0] is exception_context.execution_context:
+        _, started = stack.pop()
+        _observe_query(exception_context.statement or "", started)
+
+
+def _observe_query(statement: str, started: float):
+    elapsed = time.perf_counter() - started
+    kind = statement.lstrip()[:6].lower()
+    DB_QUERY_SECONDS.labels(kind if kind in ("select", "insert", "update", "delete") else "other").observe(elapsed)
+    counters = _request_queries.get()
+    if counters is not None:
+        counters[0] += 1
+        counters[1] += elapsed
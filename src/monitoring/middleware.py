@@ -0,0 +1,65 @@
+"""!
+@file middleware.py
+@brief Request timing middleware
+@details Records the latency, status and database queries of every HTTP request by route template,
+         so /problems/{problem_id} is one series no matter how many problems are requested. With
+         METRICS_SLOW_REQUEST_MS set, requests slower than that are logged together with their
+         query count and query time.
+"""
+
+import logging
+import os
+import time
+
+from monitoring.metrics import (
+    HTTP_REQUEST_QUERIES, HTTP_REQUEST_QUERY_SECONDS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, track_queries
+)
+
+logger = logging.getLogger(__name__)
+
+## @brief Requests taking longer than this many milliseconds are logged, 0 disables the log
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", 0))
+
+
+class MetricsMiddleware:
+    """!
+    @brief ASGI middleware timing HTTP requests
+    @details A plain ASGI middleware rather than a BaseHTTPMiddleware, so responses are streamed
+             through unchanged and no extra task is started per request. WebSocket connections are
+             passed through without being timed.
+    """
+
+    def __init__(self, app, slow_request_ms: float = METRICS_SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with track_queries() as queries:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                elapsed = time.perf_counter() - started
+                # The router stores the matched route in the scope; unmatched paths share one series
+                route = scope.get("route")
+                template = getattr(route, "path", None) or "unmatched"
+                method = scope["method"]
+                HTTP_REQUESTS.labels(method, template, status).inc()
+                HTTP_REQUEST_SECONDS.labels(method, template).observe(elapsed)
+                HTTP_REQUEST_QUERIES.labels(method, template).observe(queries[0])
+                HTTP_REQUEST_QUERY_SECONDS.labels(method, template).observe(queries[1])
+                if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                    logger.warning("Slow request %s %s: %.0f ms, status %d, %d queries in %.0f ms",
+                                   method, scope["path"], elapsed * 1000, status, queries[0], queries[1] * 1000)
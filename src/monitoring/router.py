@@ -0,0 +1,35 @@
+"""!
+@file router.py
+@brief Metrics API route
+@details Serves the metrics of this process in the Prometheus text format. The endpoint is not
+         authenticated, expose it to the monitoring network only.
+"""
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from dependencies import get_judge_service, get_matchmaking
+from judge.service import JudgeService
+from matchmaking.service import MatchmakingService
+from monitoring.metrics import JUDGE_INFLIGHT, JUDGE_QUEUED, MATCHMAKING_QUEUED, render
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(
+    judge: JudgeService = Depends(get_judge_service),
+    matchmaking: MatchmakingService = Depends(get_matchmaking)
+):
+    """!
+    @brief Get the metrics of this process
+    @param judge JudgeService: The judge service of the application
+    @param matchmaking MatchmakingService: The matchmaking of the application
+    @return PlainTextResponse: The metrics in the Prometheus text exposition format 0.0.4
+    """
+    stats = judge.stats()
+    JUDGE_QUEUED.set(stats["queued"])
+    JUDGE_INFLIGHT.set(stats["inflight"])
+    for difficulty, queued in matchmaking.queue.stats().items():
+        MATCHMAKING_QUEUED.labels(difficulty).set(queued)
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,51 @@
+"""!
+@file pagination.py
+@brief Opaque cursors for keyset pagination
+@details List endpoints return a next_cursor with every page, which encodes the sort key of the last
+         row. The next page continues strictly after that key using an index range scan, so a page
+         costs the same no matter how deep into the listing it is, unlike OFFSET pagination.
+"""
+
+from datetime import datetime
+from typing import Callable, Sequence
+import base64
+import json
+
+## @brief Default number of rows per page
+DEFAULT_PAGE_SIZE = 20
+
+## @brief Maximum number of rows per page
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """!
+    @brief Raised for cursors that were not produced by encode_cursor() for the same listing
+    """
+
+
+def encode_cursor(*key) -> str:
+    """!
+    @brief Encode the sort key of the last row of a page
+    @param key Any: The sort key values, ints, strings or datetimes
+    @return str: URL-safe cursor
+    """
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable]) -> tuple:
+    """!
+    @brief Decode a cursor produced by encode_cursor()
+    @param cursor str: The cursor sent by the client
+    @param types Sequence[callable]: Converter of every key value, e.g. (datetime.fromisoformat, int)
+    @return tuple: The sort key
+    @throws InvalidCursor: If the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise InvalidCursor("Invalid cursor")
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError) as error:
+        raise InvalidCursor("Invalid cursor") from error
@@ -0,0 +1,160 @@
+"""!
+@file cache.py
+@brief In-process cache of serialized problem pages
+@details Every racer of a match loads the same problem pages at the same moment. Their JSON bodies are
+         kept in a bounded LRU map together with a strong ETag, so repeated reads neither query the
+         database nor serialize again and clients revalidating with If-None-Match get a 304.
+
+         Concurrent misses of one problem share a single load. Every invalidation bumps the version
+         of the problem, a load started before it is handed to the requests already waiting for it
+         but never stored. Changes made through the ORM invalidate the entry when they are flushed,
+         writers that read the problem right after committing invalidate it once more (see
+         update_problem()). Other processes see changes after at most the TTL.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+from models.models import Problem, TestCase
+
+## @brief Seconds a problem page stays cached
+PROBLEM_CACHE_TTL_S = float(os.getenv("PROBLEM_CACHE_TTL_S", 300))
+
+## @brief Maximum number of cached problem pages
+PROBLEM_CACHE_SIZE = int(os.getenv("PROBLEM_CACHE_SIZE", 1000))
+
+
+@dataclass(frozen=True)
+class CachedProblem:
+    """!
+    @brief Serialized problem page
+    """
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CachedProblem":
+        return cls(body=body, etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+
+class ProblemCache:
+    """!
+    @brief Versioned cache of problem pages with single-flight loading
+    """
+
+    def __init__(self, ttl: float = PROBLEM_CACHE_TTL_S, max_entries: int = PROBLEM_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "loads": 0, "invalidations": 0}
+
+    async def get(self, problem_id: int,
+                  loader: Callable[[int], Awaitable[Optional[bytes]]]) -> Optional[CachedProblem]:
+        """!
+        @brief Cached page of a problem, loaded once for all concurrent callers on a miss
+        @param problem_id int: The id of the problem
+        @param loader callable: Coroutine function returning the serialized page, None if the problem
+               does not exist
+        @return CachedProblem|None: The page, None if the problem does not exist
+        """
+        with self._lock:
+            entry = self._entries.get(problem_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(problem_id)
+                self.counters["hits"] += 1
+                return entry[1]
+            task = self._inflight.get(problem_id)
+            if task is None:
+                self.counters["misses"] += 1
+                version = self._versions.get(problem_id, 0)
+                task = asyncio.ensure_future(self._load(problem_id, version, loader))
+                self._inflight[problem_id] = task
+                task.add_done_callback(lambda done: self._finish(problem_id, done))
+            else:
+                self.counters["coalesced"] += 1
+        # A cancelled request must not cancel the load other requests wait for
+        return await asyncio.shield(task)
+
+    async def _load(self, problem_id: int, version: int, loader) -> Optional[CachedProblem]:
+        body = await loader(problem_id)
+        self.counters["loads"] += 1
+        if body is None:
+            return None
+        cached = CachedProblem.from_body(body)
+        with self._lock:
+            if self._versions.get(problem_id, 0) == version:
+                self._entries[problem_id] = (time.monotonic() + self.ttl, cached)
+                self._entries.move_to_end(problem_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return cached
+
+    def _finish(self, problem_id: int, task: asyncio.Future):
+        with self._lock:
+            if self._inflight.get(problem_id) is task:
+                del self._inflight[problem_id]
+
+    def invalidate(self, problem_id: int):
+        """!
+        @brief Drop a problem, loads already running for it are not stored
+        @param problem_id int: The id of the changed or deleted problem
+        """
+        with self._lock:
+            self._versions[problem_id] = self._versions.get(problem_id, 0) + 1
+            self._entries.pop(problem_id, None)
+            # Later requests start a new load instead of joining one that may read the old state
+            self._inflight.pop(problem_id, None)
+            self.counters["invalidations"] += 1
+
+    def clear(self):
+        """!
+        @brief Drop all cached problems
+        """
+        with self._lock:
+            for problem_id in list(self._entries) + list(self._inflight):
+                self._versions[problem_id] = self._versions.get(problem_id, 0) + 1
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        """!
+        @brief Size and hit/miss counters of the cache
+        @return dict: Cache statistics
+        """
+        return {"problems": len(self._entries), "inflight": len(self._inflight), **self.counters}
+
+
+## @brief Problem cache of this process
+problem_cache = ProblemCache()
+
+
+@event.listens_for(Problem, "after_update")
+@event.listens_for(Problem, "after_delete")
+def _invalidate_problem(mapper, connection, target):
+    """!
+    @brief Drop the cached page of a problem whenever it is changed or deleted through the ORM
+    """
+    if target.id is not None:
+        problem_cache.invalidate(target.id)
+
+
+@event.listens_for(TestCase, "after_insert")
+@event.listens_for(TestCase, "after_update")
+@event.listens_for(TestCase, "after_delete")
+def _invalidate_examples(mapper, connection, target):
+    """!
+    @brief Drop the cached page of a problem whenever one of its test cases changes
+    """
+    if target.problem_id is not None:
+        problem_cache.invalidate(target.problem_id)
@@ -0,0 +1,255 @@
+"""!
+@file importer.py
+@brief Bulk import of problem packs
+@details A problem pack is either a JSONL file with one problem per line,
+
+             {"title": "Sum", "description": "...", "difficulty": "easy", "checker": "whitespace",
+              "test_cases": [{"input": "1 2\n", "expected_output": "3\n", "is_hidden": false}]}
+
+         or a directory with one subdirectory per problem, holding problem.json with the same fields
+         except test_cases, and the test data as pairs of files: examples/<name>.in and
+         examples/<name>.out are visible, tests/<name>.in and tests/<name>.out are hidden. Test cases
+         in JSONL records are hidden unless they set is_hidden to false.
+
+         Records are validated one at a time and written in batches, each batch in one transaction:
+         problems with an executemany INSERT ... RETURNING, test cases with COPY on PostgreSQL and an
+         executemany INSERT elsewhere. Large test data goes to the blob store. Every problem stores
+         the SHA-256 of its record, problems already in the database are skipped, so an interrupted
+         import is resumed by running it again.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+import hashlib
+import io
+import json
+import os
+import time
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from database import get_engine
+from judge.blob_store import BlobStore, test_case_data_columns
+from judge.checker import get_checker
+from models.models import DifficultyEnum, Problem, TestCase
+from models.schemas import ImportReport, ProblemRecord
+
+## @brief Maximum number of problems written per transaction
+IMPORT_BATCH_PROBLEMS = int(os.getenv("IMPORT_BATCH_PROBLEMS", 500))
+
+## @brief Maximum test data in MB held in memory per transaction
+IMPORT_BATCH_MB = int(os.getenv("IMPORT_BATCH_MB", 64))
+
+## @brief Number of errors kept in the import report
+IMPORT_MAX_REPORTED_ERRORS = 50
+
+## @brief Columns written by COPY, in order
+_COPY_COLUMNS = ("problem_id", "input", "expected_output", "input_blob", "expected_output_blob", "is_hidden")
+
+
+class PackError(ValueError):
+    """!
+    @brief Raised for records of a problem pack that cannot be imported
+    """
+
+
+@dataclass
+class _Batch:
+    records: List[Tuple[str, ProblemRecord]] = field(default_factory=list)
+    size: int = 0
+
+
+def read_pack(path: str) -> Iterator[Tuple[str, Union[ProblemRecord, PackError]]]:
+    """!
+    @brief Read a problem pack from a JSONL file or a pack directory
+    @param path str: The pack
+    @return Iterator[tuple[str, ProblemRecord|PackError]]: The location of every record and the
+            validated record, or the reason it is invalid
+    """
+    if os.path.isdir(path):
+        return read_directory(path)
+    return read_jsonl(path)
+
+
+def read_jsonl(path: str) -> Iterator[Tuple[str, Union[ProblemRecord, PackError]]]:
+    """!
+    @brief Read a JSONL problem pack line by line
+    @param path str: The JSONL file
+    @return Iterator[tuple[str, ProblemRecord|PackError]]: Records located by line number
+    """
+    with open(path, "rb") as pack:
+        for number, line in enumerate(pack, 1):
+            if line.strip():
+                yield f"line {number}", _validate(lambda: ProblemRecord.model_validate_json(line))
+
+
+def read_directory(path: str) -> Iterator[Tuple[str, Union[ProblemRecord, PackError]]]:
+    """!
+    @brief Read a pack directory problem by problem, in name order
+    @param path str: The pack directory
+    @return Iterator[tuple[str, ProblemRecord|PackError]]: Records located by problem directory
+    """
+    for name in sorted(os.listdir(path)):
+        problem_dir = os.path.join(path, name)
+        if os.path.isdir(problem_dir):
+            yield name, _validate(lambda: _read_problem_dir(problem_dir))
+
+
+def _read_problem_dir(problem_dir: str) -> ProblemRecord:
+    with open(os.path.join(problem_dir, "problem.json"), "rb") as problem_file:
+        fields = json.loads(problem_file.read())
+    if not isinstance(fields, dict):
+        raise PackError("problem.json must hold an object")
+    test_cases = []
+    for folder, hidden in (("examples", False), ("tests", True)):
+        folder_path = os.path.join(problem_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for name in sorted(os.listdir(folder_path)):
+            if not name.endswith(".in"):
+                continue
+            expected_path = os.path.join(folder_path, name[:-3] + ".out")
+            if not os.path.isfile(expected_path):
+                raise PackError(f"{folder}/{name} has no {name[:-3]}.out")
+            with open(os.path.join(folder_path, name), "rb") as data, open(expected_path, "rb") as expected:
+                test_cases.append({"input": data.read(), "expected_output": expected.read(), "is_hidden": hidden})
+    return ProblemRecord.model_validate({**fields, "test_cases": test_cases})
+
+
+def _validate(build: Callable[[], ProblemRecord]) -> Union[ProblemRecord, PackError]:
+    try:
+        record = build()
+    except ValidationError as error:
+        return PackError("; ".join(f"{'.'.join(map(str, e['loc'])) or 'record'}: {e['msg']}"
+                                   for e in error.errors()))
+    except (OSError, ValueError) as error:
+        return PackError(str(error))
+    if get_checker(record.checker) is None:
+        return PackError(f"checker: unknown checker {record.checker}")
+    return record
+
+
+def content_hash(record: ProblemRecord) -> str:
+    """!
+    @brief Identity of a problem pack record
+    @details Covers every field and the digests of the test data, so re-importing an unchanged record
+             is recognized while any change yields a new problem.
+    @param record ProblemRecord: The validated record
+    @return str: Hex encoded SHA-256 digest
+    """
+    digest = hashlib.sha256(json.dumps(record.model_dump(exclude={"test_cases"}), sort_keys=True).encode())
+    for case in record.test_cases:
+        digest.update(b"\0" + hashlib.sha256(case.input).digest() + hashlib.sha256(case.expected_output).digest()
+                      + (b"h" if case.is_hidden else b"v"))
+    return digest.hexdigest()
+
+
+def import_problems(records: Iterable[Tuple[str, Union[ProblemRecord, PackError]]], engine=None,
+                    store: Optional[BlobStore] = None,
+                    on_progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """!
+    @brief Write a problem pack to the database
+    @details Invalid records are reported and skipped, the valid ones are imported anyway.
+    @param records Iterable[tuple[str, ProblemRecord|PackError]]: Output of read_pack()
+    @param engine Engine|None: Synchronous engine, defaults to the one of DATABASE_URL
+    @param store BlobStore|None: Blob store for large test data, defaults to the one of the process
+    @param on_progress callable|None: Called with the report after every batch
+    @return ImportReport: Counters of the import and the first errors
+    """
+    engine = engine or get_engine()
+    report = ImportReport()
+    started = time.monotonic()
+    batch = _Batch()
+    for location, record in records:
+        report.read += 1
+        if isinstance(record, PackError):
+            report.invalid += 1
+            if len(report.errors) < IMPORT_MAX_REPORTED_ERRORS:
+                report.errors.append(f"{location}: {record}")
+            continue
+        batch.records.append((content_hash(record), record))
+        batch.size += sum(len(case.input) + len(case.expected_output) for case in record.test_cases)
+        if len(batch.records) >= IMPORT_BATCH_PROBLEMS or batch.size >= IMPORT_BATCH_MB * 1024 * 1024:
+            _write_batch(engine, store, batch, report)
+            batch = _Batch()
+            report.seconds = time.monotonic() - started
+            if on_progress is not None:
+                on_progress(report)
+    if batch.records:
+        _write_batch(engine, store, batch, report)
+    report.seconds = time.monotonic() - started
+    if on_progress is not None:
+        on_progress(report)
+    return report
+
+
+def _write_batch(engine, store: Optional[BlobStore], batch: _Batch, report: ImportReport):
+    with engine.begin() as connection:
+        hashes = [digest for digest, _ in batch.records]
+        existing = set(connection.execute(
+            select(Problem.content_hash).where(Problem.content_hash.in_(hashes))
+        ).scalars())
+        new = {}
+        for digest, record in batch.records:
+            # Duplicates within the pack are skipped like problems imported before
+            if digest in existing or digest in new:
+                report.skipped += 1
+            else:
+                new[digest] = record
+        if not new:
+            return
+
+        rows = connection.execute(
+            insert(Problem).returning(Problem.id, Problem.content_hash),
+            [{
+                "title": record.title,
+                "description": record.description,
+                "difficulty": DifficultyEnum[record.difficulty],
+                "example_input": record.example_input,
+                "example_output": record.example_output,
+                "checker": record.checker,
+                "checker_tolerance": record.checker_tolerance,
+                "content_hash": digest,
+            } for digest, record in new.items()]
+        )
+        problem_ids = {row.content_hash: row.id for row in rows}
+
+        test_cases = [
+            {"problem_id": problem_ids[digest], "is_hidden": case.is_hidden,
+             **test_case_data_columns(case.input, case.expected_output, store)}
+            for digest, record in new.items() for case in record.test_cases
+        ]
+        if test_cases:
+            _insert_test_cases(connection, test_cases)
+    report.imported += len(new)
+    report.test_cases += len(test_cases)
+
+
+def _insert_test_cases(connection, test_cases: List[dict]):
+    cursor = None
+    if connection.dialect.name == "postgresql":
+        cursor = connection.connection.cursor()
+    if cursor is None or not hasattr(cursor, "copy_expert"):
+        connection.execute(insert(TestCase), test_cases)
+        return
+    # COPY in text format: tab separated, \N for NULL, backslash escapes
+    buffer = io.StringIO()
+    for case in test_cases:
+        buffer.write("\t".join(_copy_value(case[column]) for column in _COPY_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+    try:
+        cursor.copy_expert(f"COPY test_cases ({', '.join(_COPY_COLUMNS)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, int):
+        return str(value)
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
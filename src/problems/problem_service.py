@@ -0,0 +1,97 @@
+"""!
+@file problem_service.py
+@brief Problem service layer for database operations
+@details Provides service functions to browse the problem bank, to read and edit single problems and
+         to aggregate the submissions of a problem. All functions take an asynchronous session.
+"""
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy import false, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from models.models import DifficultyEnum, Problem, StatusEnum, Submission, TestCase
+from problems.cache import problem_cache
+
+## @brief Columns of a problem shown to racers
+PUBLIC_PROBLEM_COLUMNS = (Problem.id, Problem.title, Problem.description, Problem.difficulty,
+                          Problem.example_input, Problem.example_output)
+
+
+async def list_problems(db: AsyncSession, limit: int, after_id: Optional[int] = None,
+                        difficulty: Optional[DifficultyEnum] = None):
+    """!
+    @brief List problems of the problem bank in id order
+    @details Keyset pagination over id, served by the primary key or, with a difficulty filter, by the
+             ix_problems_difficulty_id index. Descriptions and examples are not loaded.
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param limit int: Maximum number of problems
+    @param after_id int|None: Id of the last problem of the previous page
+    @param difficulty DifficultyEnum|None: Only problems of this difficulty
+    @return list[Problem]: Up to limit problems with id, title and difficulty loaded
+    """
+    query = select(Problem).options(load_only(Problem.id, Problem.title, Problem.difficulty))
+    if after_id is not None:
+        query = query.where(Problem.id > after_id)
+    if difficulty is not None:
+        query = query.where(Problem.difficulty == difficulty)
+    query = query.order_by(Problem.id).limit(limit)
+    return list((await db.execute(query)).scalars())
+
+
+async def get_problem_stats(db: AsyncSession, problem_id: int) -> Dict[str, int]:
+    """!
+    @brief Count the submissions of a problem by status
+    @details Answered from the ix_submissions_problem_id_status index alone.
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem_id int: The id of the problem
+    @return dict[str, int]: Number of submissions per status, every status included
+    """
+    rows = await db.execute(
+        select(Submission.status, func.count())
+        .where(Submission.problem_id == problem_id)
+        .group_by(Submission.status)
+    )
+    counts = {status.value: 0 for status in StatusEnum}
+    for status, count in rows:
+        counts[status.value] = count
+    return counts
+
+
+async def get_problem_detail(db: AsyncSession, problem_id: int) -> Optional[Dict[str, Any]]:
+    """!
+    @brief Load the public part of a problem
+    @details Two queries: the public columns of the problem and its visible test cases, served by the
+             ix_test_cases_problem_id_is_hidden index. Hidden test cases and test data kept in the
+             blob store are never loaded.
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem_id int: The id of the problem
+    @return dict|None: The public problem fields and its examples, None if the problem does not exist
+    """
+    problem = (await db.execute(select(*PUBLIC_PROBLEM_COLUMNS).where(Problem.id == problem_id))).first()
+    if problem is None:
+        return None
+    examples = await db.execute(
+        select(TestCase.id, TestCase.input, TestCase.expected_output)
+        .where(TestCase.problem_id == problem_id, TestCase.is_hidden == false(),
+               TestCase.input_blob.is_(None), TestCase.expected_output_blob.is_(None))
+        .order_by(TestCase.id)
+    )
+    return {**problem._asdict(), "examples": [example._asdict() for example in examples]}
+
+
+async def update_problem(db: AsyncSession, problem: Problem, changes: Dict[str, Any]) -> Problem:
+    """!
+    @brief Change fields of a problem and drop its cached page
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @param problem Problem: The problem to change
+    @param changes dict: New values by column name
+    @return Problem: The changed problem
+    """
+    for column, value in changes.items():
+        setattr(problem, column, value)
+    await db.commit()
+    # The flush already invalidated the page, but a read between flush and commit may have cached the old state
+    problem_cache.invalidate(problem.id)
+    return problem
@@ -0,0 +1,197 @@
+"""!
+@file router.py
+@brief Problem bank API routes
+@details Lists the problems of the problem bank page by page, serves single problems and reports
+         submission statistics of a problem. Pages are addressed by the opaque next_cursor of the
+         previous page. Problem pages come from the problem cache with an ETag, clients sending it
+         back in If-None-Match get a 304 while the problem is unchanged. Admins edit problems and
+         import JSONL problem packs.
+"""
+
+from typing import Optional
+import logging
+import os
+import tempfile
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.principal_cache import Principal
+from database import AsyncSessionLocal, get_async_db
+from dependencies import get_current_admin
+from judge.checker import get_checker
+from judge.submission_service import get_problem
+from models.models import DifficultyEnum
+from models.schemas import ImportReport, ProblemDetail, ProblemPage, ProblemStats, ProblemSummary, ProblemUpdate
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+from problems.cache import CachedProblem, problem_cache
+from problems.importer import import_problems, read_jsonl
+from problems.problem_service import get_problem_detail, get_problem_stats, list_problems, update_problem
+
+router = APIRouter(prefix="/problems", tags=["problems"])
+
+logger = logging.getLogger(__name__)
+
+## @brief Maximum size of an uploaded problem pack in MB
+IMPORT_MAX_UPLOAD_MB = int(os.getenv("IMPORT_MAX_UPLOAD_MB", 1024))
+
+## @brief Columns an edit may not set to null
+_REQUIRED_COLUMNS = ("title", "description", "difficulty", "checker")
+
+
+async def _load_page(problem_id: int) -> Optional[bytes]:
+    """!
+    @brief Serialize the public page of a problem, run once per cache miss
+    @details Uses its own session, since the load is shared by every request waiting for it.
+    """
+    async with AsyncSessionLocal() as db:
+        problem = await get_problem_detail(db, problem_id)
+    if problem is None:
+        return None
+    return ProblemDetail.model_validate(problem).model_dump_json().encode()
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison as required for If-None-Match
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def _page_response(page: CachedProblem, if_none_match: Optional[str] = None) -> Response:
+    # no-cache: clients may store the page but revalidate it, so edits show up on the next request
+    headers = {"ETag": page.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, page.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
+@router.get("", response_model=ProblemPage)
+async def get_problems(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    difficulty: Optional[str] = Query(None, pattern=r"^(easy|medium|hard)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """!
+    @brief Get a page of the problem bank in id order
+    @param limit int: Maximum number of problems
+    @param cursor str|None: next_cursor of the previous page, None for the first page
+    @param difficulty str|None: Only problems of this difficulty (easy, medium or hard)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @return ProblemPage: The problems and the cursor of the next page, None on the last page
+    @throws HTTPException: 400 for malformed cursors
+    """
+    try:
+        after = decode_cursor(cursor, (int,))[0] if cursor is not None else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    level = DifficultyEnum[difficulty] if difficulty is not None else None
+    # One extra row tells whether there is a next page
+    problems = await list_problems(db, limit + 1, after, level)
+    next_cursor = None
+    if len(problems) > limit:
+        problems = problems[:limit]
+        next_cursor = encode_cursor(problems[-1].id)
+    return {"items": [ProblemSummary.model_validate(problem) for problem in problems], "next_cursor": next_cursor}
+
+
+@router.post("/import", response_model=ImportReport)
+async def import_pack(request: Request, current_user: Principal = Depends(get_current_admin)):
+    """!
+    @brief Import a JSONL problem pack sent as request body
+    @details The body is spooled to a temporary file while it arrives and imported in batches on a
+             worker thread. Importing the same pack again skips the problems it already added, so a
+             failed upload is resumed by sending it again.
+    @param request Request: The request, its body is the pack
+    @param current_user Principal: The authenticated admin (injected by dependency)
+    @return ImportReport: Counters of the import and the first invalid records
+    @throws HTTPException: 413 if the pack exceeds IMPORT_MAX_UPLOAD_MB
+    """
+    with tempfile.NamedTemporaryFile(suffix=".jsonl") as pack:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > IMPORT_MAX_UPLOAD_MB * 1024 * 1024:
+                raise HTTPException(status_code=413, detail="Problem pack too large")
+            pack.write(chunk)
+        pack.flush()
+
+        def on_progress(report: ImportReport):
+            logger.info("Import by %s: %d problems imported, %d skipped, %d invalid, %d test cases",
+                        current_user.username, report.imported, report.skipped, report.invalid, report.test_cases)
+
+        return await run_in_threadpool(import_problems, read_jsonl(pack.name), on_progress=on_progress)
+
+
+@router.get("/{problem_id}", response_model=ProblemDetail, responses={304: {"description": "Not modified"}})
+async def get_problem_page(problem_id: int, if_none_match: Optional[str] = Header(None)):
+    """!
+    @brief Get the public part of a problem with its visible examples
+    @details Served from the problem cache, concurrent requests for an uncached problem share one
+             database load. Hidden test cases are never included.
+    @param problem_id int: The id of the problem
+    @param if_none_match str|None: ETags the client already has
+    @return Response: The problem, or 304 without a body if the client's ETag is current
+    @throws HTTPException: 404 if the problem does not exist
+    """
+    page = await problem_cache.get(problem_id, _load_page)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    return _page_response(page, if_none_match)
+
+
+@router.patch("/{problem_id}", response_model=ProblemDetail)
+async def edit_problem(
+    problem_id: int,
+    problem_data: ProblemUpdate,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """!
+    @brief Change fields of a problem
+    @details Only the fields sent are changed. The cached page is dropped, so every process serves the
+             new version after at most PROBLEM_CACHE_TTL_S and this one right away.
+    @param problem_id int: The id of the problem
+    @param problem_data ProblemUpdate: The fields to change
+    @param current_user Principal: The authenticated admin (injected by dependency)
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @return Response: The changed problem with its new ETag
+    @throws HTTPException: 400 for null required fields or unknown checkers, 403 for non-admins, 404 if
+            the problem does not exist
+    """
+    changes = problem_data.model_dump(exclude_unset=True)
+    for column in _REQUIRED_COLUMNS:
+        if column in changes and changes[column] is None:
+            raise HTTPException(status_code=400, detail=f"{column} cannot be null")
+    if "difficulty" in changes:
+        changes["difficulty"] = DifficultyEnum[changes["difficulty"]]
+    if "checker" in changes and get_checker(changes["checker"]) is None:
+        raise HTTPException(status_code=400, detail="Unknown checker")
+
+    problem = await get_problem(db, problem_id)
+    if problem is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    await update_problem(db, problem, changes)
+
+    page = await problem_cache.get(problem_id, _load_page)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    return _page_response(page)
+
+
+@router.get("/{problem_id}/stats", response_model=ProblemStats)
+async def get_stats(problem_id: int, db: AsyncSession = Depends(get_async_db)):
+    """!
+    @brief Get the number of submissions of a problem by status
+    @param problem_id int: The id of the problem
+    @param db AsyncSession: SQLAlchemy asynchronous database session
+    @return ProblemStats: Total and per-status submission counts
+    @throws HTTPException: 404 if the problem does not exist
+    """
+    if await get_problem(db, problem_id) is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    counts = await get_problem_stats(db, problem_id)
+    return {"problem_id": problem_id, "submissions": sum(counts.values()), "by_status": counts}
@@ -0,0 +1,131 @@
+"""!
+@file conftest.py
+@brief Shared fixtures of the test suite
+@details The environment is set up before any application module is imported, since the modules read
+         their configuration on import: a throwaway SQLite database used through aiosqlite, caches and
+         the blob store in a temporary directory, cheap password hashes and short judge limits.
+
+         Submitted code runs in the sandbox. Running the suite as root isolates it in namespaces as
+         the root user, since the interpreter of a development machine often sits in a private home
+         directory the sandbox user cannot read; otherwise only the rlimits are applied. Both can be
+         overridden with JUDGE_SANDBOX_ISOLATION and JUDGE_SANDBOX_USER.
+"""
+
+import itertools
+import os
+import tempfile
+import time
+
+_TEST_DIR = tempfile.mkdtemp(prefix="coderunner-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}",
+    "SECRET_KEY": "test-secret-key-of-the-coderunner-test-suite",
+    "BCRYPT_ROUNDS": "4",
+    "AUTH_HASH_WORKERS": "1",
+    "JUDGE_CACHE_DIR": os.path.join(_TEST_DIR, "cache"),
+    "BLOB_STORE_DIR": os.path.join(_TEST_DIR, "blobs"),
+    "JUDGE_WORKERS": "2",
+    "JUDGE_TIME_LIMIT_MS": "1000",
+    "JUDGE_WALL_TIME_LIMIT_MS": "3000",
+})
+if os.geteuid() == 0:
+    os.environ.setdefault("JUDGE_SANDBOX_USER", "root")
+else:
+    os.environ.setdefault("JUDGE_SANDBOX_ISOLATION", "none")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import database  # noqa: E402
+from models.models import Base, DifficultyEnum, Problem, StatusEnum, TestCase, User  # noqa: E402
+
+## @brief Seconds a test waits for a verdict or a rejudge
+WAIT_TIMEOUT_S = 60
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    """!
+    @brief Create the tables of the test database once
+    """
+    Base.metadata.create_all(database.get_engine())
+    yield
+    database.get_engine().dispose()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="module")
+def client():
+    """!
+    @brief A running application, shared by the tests of a module
+    @details Its shutdown disposes the database engines, so the next module starts with engines of its own event loop.
+    """
+    from main import create_app
+    with TestClient(create_app()) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register(client):
+    """!
+    @brief Register users with unique names
+    @return callable: register(admin=False) -> (user id, Authorization headers)
+    """
+    def register_user(admin: bool = False):
+        name = f"user{next(_names)}"
+        response = client.post("/register", json={"username": name, "email": f"{name}@example.com",
+                                                   "password": "password"})
+        assert response.status_code == 201, response.text
+        with database.SessionLocal() as db:
+            user = db.query(User).filter(User.username == name).one()
+            user_id = user.id
+            if admin:
+                user.is_admin = True
+                db.commit()
+        token = response.json()["access_token"]
+        return user_id, {"Authorization": f"Bearer {token}"}
+    return register_user
+
+
+@pytest.fixture
+def make_problem():
+    """!
+    @brief Create problems in the test database
+    @return callable: make_problem(cases, example=None) -> problem id, with cases and example as (input, output)
+    """
+    def create(cases, example=None, difficulty=DifficultyEnum.easy):
+        with database.SessionLocal() as db:
+            problem = Problem(title=f"problem{next(_names)}", description="Add two numbers", difficulty=difficulty,
+                              example_input=example[0] if example else None,
+                              example_output=example[1] if example else None)
+            db.add(problem)
+            db.flush()
+            db.add_all(TestCase(problem_id=problem.id, input=data, expected_output=expected)
+                       for data, expected in cases)
+            db.commit()
+            return problem.id
+    return create
+
+
+@pytest.fixture
+def wait_verdict(client):
+    """!
+    @brief Poll a submission until it is judged
+    @return callable: wait_verdict(headers, submission id) -> the judged submission
+    """
+    def wait(headers, submission_id):
+        deadline = time.monotonic() + WAIT_TIMEOUT_S
+        while time.monotonic() < deadline:
+            submission = client.get(f"/submissions/{submission_id}", headers=headers).json()
+            if submission["status"] != StatusEnum.pending.value:
+                return submission
+            time.sleep(0.05)
+        raise AssertionError(f"Submission {submission_id} was not judged in time")
+    return wait
@@ -0,0 +1,107 @@
+"""!
+@file test_auth.py
+@brief Tests of password hashing, the password hasher pool and the user service
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from passlib.hash import bcrypt
+
+import database
+from auth import auth, password_hasher
+from auth.password_hasher import PasswordHasher, PasswordHasherBusy
+from auth.user_service import authenticate_user, create_user
+from dependencies import get_password_hasher
+
+
+def test_new_hashes_use_the_configured_rounds():
+    assert auth.BCRYPT_ROUNDS == 4
+    hashed = auth.hash_password("password")
+    assert hashed.startswith("$2b$04$")
+    assert auth.verify_and_update_password("password", hashed) == (True, None)
+
+
+def test_outdated_hashes_are_upgraded():
+    outdated = bcrypt.using(rounds=5).hash("password")
+    valid, new_hash = auth.verify_and_update_password("password", outdated)
+    assert valid and new_hash.startswith("$2b$04$")
+    assert auth.verify_and_update_password("wrong", outdated) == (False, None)
+
+
+@pytest.mark.anyio
+async def test_hashing_runs_on_the_pool_threads(monkeypatch):
+    hasher = PasswordHasher(workers=2, queue_size=0)
+    try:
+        assert (await hasher.verify("password", None)) == (False, None)
+        assert (await hasher.verify("password", await hasher.hash("password")))[0]
+
+        monkeypatch.setattr(password_hasher, "hash_password", lambda password: threading.current_thread().name)
+        threads = await asyncio.gather(hasher.hash("a"), hasher.hash("b"))
+        assert all(name.startswith("password-hasher") for name in threads)
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_saturated_hasher_rejects_requests(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(password_hasher, "hash_password", lambda password: release.wait(5) and "hash")
+    hasher = PasswordHasher(workers=1, queue_size=1)
+    try:
+        pending = [asyncio.ensure_future(hasher.hash("password")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.hash("password")
+        # The event loop keeps serving while both hashes are pending
+        assert not any(future.done() for future in pending)
+        release.set()
+        assert await asyncio.gather(*pending) == ["hash", "hash"]
+        assert (hasher.stats()["rejected"], hasher.stats()["pending"]) == (1, 0)
+    finally:
+        release.set()
+        hasher.shutdown()
+
+
+def test_register_answers_503_when_the_hasher_is_saturated(client, monkeypatch):
+    release = threading.Event()
+    hash_password = auth.hash_password
+    monkeypatch.setattr(password_hasher, "hash_password", lambda password: release.wait(5) and hash_password(password))
+    hasher = PasswordHasher(workers=1, queue_size=0)
+    client.app.dependency_overrides[get_password_hasher] = lambda: hasher
+    responses = {}
+
+    def register(name):
+        responses[name] = client.post("/register", json={"username": name, "email": f"{name}@example.com",
+                                                          "password": "password"})
+    try:
+        first = threading.Thread(target=register, args=("hasher_first",))
+        first.start()
+        while hasher.stats()["pending"] == 0:
+            time.sleep(0.01)
+        register("hasher_second")
+        release.set()
+        first.join()
+    finally:
+        release.set()
+        client.app.dependency_overrides.pop(get_password_hasher)
+        hasher.shutdown()
+
+    assert responses["hasher_first"].status_code == 201
+    assert responses["hasher_second"].status_code == 503
+    assert responses["hasher_second"].headers["Retry-After"] == "1"
+
+
+def test_create_user_takes_the_hash_by_keyword():
+    with database.SessionLocal() as db:
+        with pytest.raises(TypeError):
+            create_user(db, "plain", "plain@example.com", "password")
+        user = create_user(db, "hashed", "hashed@example.com", hashed_password=auth.hash_password("password"))
+        assert user.id is not None and user.hashed_password.startswith("$2b$")
+
+        with pytest.warns(DeprecationWarning):
+            assert authenticate_user(db, "hashed", "password").id == user.id
+        with pytest.warns(DeprecationWarning):
+            assert authenticate_user(db, "hashed", "wrong") is False
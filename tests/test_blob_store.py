@@ -0,0 +1,53 @@
+"""!
+@file test_blob_store.py
+@brief Tests of the blob store and of the permissions of the judge's files
+"""
+
+import os
+import stat
+
+from judge.blob_store import BlobStore
+from judge.cache import ArtifactCache, VerdictCache
+
+DATA = b"1 2\n" * 1000
+
+
+def mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_blobs_are_deduplicated_and_read_back(tmp_path):
+    store = BlobStore(root=str(tmp_path / "blobs"), compress=False, spool_root=str(tmp_path / "spool"))
+    key = store.put(DATA)
+    assert store.put(DATA) == key
+    assert store.read(key) == DATA
+    assert store.stats()["stores"] == 1 and store.stats()["deduplicated"] == 1
+
+
+def test_blob_files_are_private(tmp_path):
+    root = tmp_path / "store" / "blobs"
+    spool = tmp_path / "cache" / "blobs"
+    store = BlobStore(root=str(root), compress=True, spool_root=str(spool))
+    key = store.put(DATA)
+    assert store.read(key) == DATA
+
+    path, compressed = store.locate(key)
+    assert compressed
+    assert mode(path) == 0o600
+    for directory in (root.parent, root, os.path.dirname(path), spool.parent, spool, spool / key[:2]):
+        assert mode(directory) == 0o700, directory
+    assert mode(spool / key[:2] / key) == 0o600
+
+
+def test_cache_directories_are_private(tmp_path):
+    verdicts = VerdictCache(root=str(tmp_path / "cache" / "verdicts"))
+    verdicts.put(1, "a" * 64, {"status": "accepted"})
+    for directory in (tmp_path / "cache", tmp_path / "cache" / "verdicts", tmp_path / "cache" / "verdicts" / "1"):
+        assert mode(directory) == 0o700, directory
+
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    (workdir / "main").write_bytes(b"binary")
+    artifacts = ArtifactCache(root=str(tmp_path / "cache" / "artifacts"))
+    artifacts.store("b" * 64, str(workdir), "main.c")
+    assert mode(tmp_path / "cache" / "artifacts") == 0o700
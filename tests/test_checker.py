@@ -0,0 +1,105 @@
+"""!
+@file test_checker.py
+@brief Tests of the streaming output checkers
+"""
+
+import mmap
+
+import pytest
+
+from judge.checker import CHECKERS, CHUNK_SIZE, BufferedChecker, Checker, get_checker, register_checker
+
+
+def check(name: str, expected: bytes, output: bytes, chunk_size: int = 0, tolerance=None) -> bool:
+    """!
+    @brief Feed an output to a checker in chunks of chunk_size bytes, all at once for 0
+    """
+    checker = get_checker(name)(expected, b"", tolerance)
+    size = chunk_size or max(len(output), 1)
+    for start in range(0, len(output), size):
+        if not checker.feed(output[start:start + size]):
+            return False
+    return checker.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [0, 1, 3])
+@pytest.mark.parametrize("name, expected, output, accepted", [
+    ("exact", b"1 2\n3\n", b"1 2\n3\n", True),
+    ("exact", b"1 2\n3\n", b"1 2\n3", False),
+    ("exact", b"1 2\n3\n", b"1 2 \n3\n", False),
+    ("exact", b"1\n", b"1\n2\n", False),
+    ("whitespace", b"1 2\n3\n", b"1 2   \n3", True),
+    ("whitespace", b"1 2\n3\n", b"1 2\n3\n\n\n", True),
+    ("whitespace", b"1 2\n3\n\n", b"1 2\n3", True),
+    ("whitespace", b"1 2\n3\n", b"1  2\n3\n", False),
+    ("whitespace", b"1\n\n2\n", b"1\n2\n", False),
+    ("whitespace", b"1\n2\n", b"1\n", False),
+    ("whitespace", b"1\n", b"1\n2\n", False),
+    ("tokens", b"1 2\n3\n", b"1\n2 3", True),
+    ("tokens", b"12 3\n", b"1 23\n", False),
+    ("tokens", b"1 2 3\n", b"1 2\n", False),
+    ("tokens", b"1 2\n", b"1 2 3\n", False),
+    ("float", b"0.333333\n", b"0.3333331\n", True),
+    ("float", b"1000000\n", b"1000000.5\n", True),
+    ("float", b"0.5\n", b"0.6\n", False),
+    ("float", b"nan\n", b"nan\n", True),
+    ("float", b"1.0\n", b"nan\n", False),
+    ("float", b"yes 1.0\n", b"no 1.0\n", False),
+])
+def test_checkers(name, expected, output, accepted, chunk_size):
+    assert check(name, expected, output, chunk_size) is accepted
+
+
+def test_float_tolerance():
+    assert check("float", b"1.0\n", b"1.05\n", tolerance=0.1)
+    assert not check("float", b"1.0\n", b"1.05\n", tolerance=0.01)
+
+
+def test_default_checker_ignores_trailing_whitespace():
+    assert get_checker(None) is CHECKERS["whitespace"]
+    assert get_checker("no such checker") is None
+
+
+@pytest.mark.parametrize("name", ["exact", "whitespace", "tokens", "float"])
+def test_large_memory_mapped_expected_output(name, tmp_path):
+    lines = b"".join(b"%d %d\n" % (index, index * index) for index in range(3 * CHUNK_SIZE // 8))
+    path = tmp_path / "expected"
+    path.write_bytes(lines)
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as expected:
+        checker = get_checker(name)(expected)
+        for start in range(0, len(lines), 4096):
+            assert checker.feed(lines[start:start + 4096])
+        assert checker.finish()
+
+        wrong = bytearray(lines)
+        wrong[-3] = ord("x")
+        checker = get_checker(name)(expected)
+        accepted = all(checker.feed(bytes(wrong[start:start + 4096])) for start in range(0, len(wrong), 4096))
+        assert not (accepted and checker.finish())
+
+
+def test_checker_feed_rejects_early():
+    checker = get_checker("exact")(b"1\n2\n3\n")
+    assert not checker.feed(b"9")
+    assert not checker.finish()
+
+
+def test_base_classes_are_abstract():
+    with pytest.raises(TypeError):
+        Checker(b"")
+    with pytest.raises(TypeError):
+        BufferedChecker(b"")
+
+
+def test_registered_buffered_checker():
+    @register_checker("test_any_permutation")
+    class PermutationChecker(BufferedChecker):
+        def check(self, output: bytes) -> bool:
+            return sorted(output.split()) == sorted(self.expected.split())
+
+    try:
+        assert get_checker("test_any_permutation") is PermutationChecker
+        assert check("test_any_permutation", b"1 2 3\n", b"3 1 2\n", chunk_size=1)
+        assert not check("test_any_permutation", b"1 2 3\n", b"3 1 1\n")
+    finally:
+        del CHECKERS["test_any_permutation"]
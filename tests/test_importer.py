@@ -0,0 +1,133 @@
+"""!
+@file test_importer.py
+@brief Tests of importing problem packs: resumption, invalid records and the upload limit
+"""
+
+import json
+import uuid
+
+import pytest
+
+import database
+from models.models import Problem, TestCase
+from problems import importer, router as problems_router
+from problems.importer import import_problems, read_jsonl, read_pack
+
+
+def pack_lines(count: int) -> list:
+    """!
+    @brief JSONL records of distinct problems, with one visible and one hidden test case each
+    """
+    tag = uuid.uuid4().hex[:8]
+    return [json.dumps({
+        "title": f"Imported {tag} {index}",
+        "description": "Add two numbers",
+        "difficulty": "medium",
+        "test_cases": [
+            {"input": "1 2\n", "expected_output": "3\n", "is_hidden": False},
+            {"input": f"{index} 1\n", "expected_output": f"{index + 1}\n"},
+        ],
+    }) for index in range(count)]
+
+
+INVALID = [
+    "{not json",
+    json.dumps({"title": "No difficulty", "description": "x"}),
+    json.dumps({"title": "Bad checker", "description": "x", "difficulty": "easy", "checker": "nope"}),
+]
+
+
+def upload(client, headers, lines):
+    return client.post("/problems/import", content="\n".join(lines).encode() + b"\n", headers=headers)
+
+
+def imported_titles(titles) -> dict:
+    with database.SessionLocal() as db:
+        problems = db.query(Problem).filter(Problem.title.in_(titles)).all()
+        return {problem.title: db.query(TestCase).filter(TestCase.problem_id == problem.id).count()
+                for problem in problems}
+
+
+def test_import_reports_invalid_records(client, register):
+    _, admin = register(admin=True)
+    lines = pack_lines(2)
+    report = upload(client, admin, lines[:1] + INVALID + lines[1:]).json()
+    assert (report["read"], report["imported"], report["skipped"], report["invalid"], report["test_cases"]) == \
+        (5, 2, 0, 3, 4)
+    assert [error.split(":")[0] for error in report["errors"]] == ["line 2", "line 3", "line 4"]
+    assert "difficulty" in report["errors"][1]
+    assert "unknown checker nope" in report["errors"][2]
+
+    titles = [json.loads(line)["title"] for line in lines]
+    assert imported_titles(titles) == {title: 2 for title in titles}
+
+
+def test_failed_upload_is_resumed_by_sending_the_pack_again(client, register):
+    _, admin = register(admin=True)
+    lines = pack_lines(4)
+    # The connection broke after the first two problems arrived
+    assert upload(client, admin, lines[:2]).json()["imported"] == 2
+
+    report = upload(client, admin, lines).json()
+    assert (report["imported"], report["skipped"], report["test_cases"]) == (2, 2, 4)
+    report = upload(client, admin, lines + lines[:1]).json()
+    assert (report["imported"], report["skipped"]) == (0, 5)
+
+    titles = [json.loads(line)["title"] for line in lines]
+    assert imported_titles(titles) == {title: 2 for title in titles}
+
+
+def test_interrupted_import_is_resumed(tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_BATCH_PROBLEMS", 2)
+    pack = tmp_path / "pack.jsonl"
+    lines = pack_lines(5)
+    pack.write_text("\n".join(lines) + "\n")
+
+    def interrupt(report):
+        if report.imported >= 2:
+            raise KeyboardInterrupt()
+    with pytest.raises(KeyboardInterrupt):
+        import_problems(read_jsonl(str(pack)), on_progress=interrupt)
+
+    report = import_problems(read_jsonl(str(pack)))
+    assert (report.imported, report.skipped, report.invalid) == (3, 2, 0)
+    assert len(imported_titles([json.loads(line)["title"] for line in lines])) == 5
+
+
+def test_pack_directory(tmp_path):
+    problem_dir = tmp_path / "pack" / "sum"
+    (problem_dir / "examples").mkdir(parents=True)
+    (problem_dir / "tests").mkdir()
+    title = f"Directory {uuid.uuid4().hex[:8]}"
+    (problem_dir / "problem.json").write_text(json.dumps({"title": title, "description": "x", "difficulty": "easy"}))
+    (problem_dir / "examples" / "1.in").write_text("1 2\n")
+    (problem_dir / "examples" / "1.out").write_text("3\n")
+    (problem_dir / "tests" / "1.in").write_text("2 2\n")
+    (problem_dir / "tests" / "1.out").write_text("4\n")
+    (problem_dir / "tests" / "2.in").write_text("no output\n")
+
+    records = list(read_pack(str(tmp_path / "pack")))
+    assert [location for location, _ in records] == ["sum"]
+    assert "tests/2.in has no 2.out" in str(records[0][1])
+
+    (problem_dir / "tests" / "2.in").unlink()
+    report = import_problems(read_pack(str(tmp_path / "pack")))
+    assert (report.imported, report.test_cases) == (1, 2)
+    with database.SessionLocal() as db:
+        problem = db.query(Problem).filter(Problem.title == title).one()
+        hidden = [case.is_hidden for case in db.query(TestCase).filter(TestCase.problem_id == problem.id)
+                  .order_by(TestCase.id)]
+    assert hidden == [False, True]
+
+
+def test_import_limits_and_permissions(client, register, monkeypatch):
+    _, admin = register(admin=True)
+    _, user = register()
+    assert upload(client, user, pack_lines(1)).status_code == 403
+
+    monkeypatch.setattr(problems_router, "IMPORT_MAX_UPLOAD_MB", 0)
+    lines = pack_lines(1)
+    response = upload(client, admin, lines)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Problem pack too large"
+    assert imported_titles([json.loads(lines[0])["title"]]) == {}
@@ -0,0 +1,35 @@
+"""!
+@file test_judge_service.py
+@brief Tests of starting the judge worker processes
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+## @brief An entry point like `python main.py`, which imports auth.auth before the workers are started
+MAIN = textwrap.dedent("""
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    import auth.auth
+    from judge.service import _WorkerContext
+
+    if __name__ == "__main__":
+        with ProcessPoolExecutor(1, mp_context=_WorkerContext()) as pool:
+            names = ["SECRET_KEY", "DATABASE_URL", "API_TOKEN", "JUDGE_WORKERS"]
+            print([pool.submit(os.getenv, name).result() for name in names])
+        print(os.environ["SECRET_KEY"], os.environ["API_TOKEN"])
+""")
+
+
+def test_workers_start_without_secrets_from_a_main_importing_auth(tmp_path):
+    script = tmp_path / "main.py"
+    script.write_text(MAIN)
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, SECRET_KEY="secret", API_TOKEN="token", JUDGE_WORKERS="3")
+    result = subprocess.run([sys.executable, str(script)], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == ["[None, None, None, '3']", "secret token"]
@@ -0,0 +1,125 @@
+"""!
+@file test_live_hub.py
+@brief Tests of the live progress hub: coalescing send buffers, back-pressure and fan-out
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from live import hub as hub_module
+from live.hub import CLOSE_TOO_SLOW, Connection, Hub
+
+
+class FakeWebSocket:
+    """!
+    @brief Records the messages sent to it, sends block while the gate is closed
+    """
+
+    def __init__(self, open_gate: bool = True):
+        self.messages = []
+        self.close_codes = []
+        self.gate = asyncio.Event()
+        if open_gate:
+            self.gate.set()
+
+    async def send_text(self, message: str):
+        await self.gate.wait()
+        self.messages.append(message)
+
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+
+async def deliver(connection: Connection):
+    """!
+    @brief Run the sender of a connection until its buffer is empty
+    """
+    sender = asyncio.ensure_future(connection.run_sender())
+    for _ in range(100):
+        await asyncio.sleep(0)
+        if not connection._pending:
+            break
+    await connection.close()
+    await sender
+
+
+@pytest.mark.anyio
+async def test_queued_events_of_a_submission_are_merged():
+    connection = Connection(FakeWebSocket(), user_id=1)
+    assert connection.offer(1, "1: 1/3", final=False)
+    assert connection.offer(2, "2: 1/3", final=False)
+    assert connection.offer(1, "1: 2/3", final=False)
+    assert connection.offer(1, "1: accepted", final=True)
+    await deliver(connection)
+    assert connection.websocket.messages == ["2: 1/3", "1: accepted"]
+    assert (connection.coalesced, connection.sent, connection.dropped) == (2, 2, 0)
+
+
+@pytest.mark.anyio
+async def test_full_buffer_drops_the_oldest_progress_but_never_a_verdict():
+    connection = Connection(FakeWebSocket(), user_id=1, buffer_size=3)
+    assert connection.offer(1, "1: accepted", final=True)
+    assert connection.offer(2, "2: 1/3", final=False)
+    assert connection.offer(3, "3: 1/3", final=False)
+    assert connection.offer(4, "4: 1/3", final=False)
+    assert connection.dropped == 1
+    # A progress update for a submission whose verdict is queued keeps it undroppable
+    assert connection.offer(3, "3: wrong answer", final=True)
+    assert connection.offer(4, "4: 2/3", final=False)
+    assert connection.offer(5, "5: accepted", final=True)
+    assert connection.dropped == 2
+    await deliver(connection)
+    assert connection.websocket.messages == ["1: accepted", "3: wrong answer", "5: accepted"]
+
+
+@pytest.mark.anyio
+async def test_client_that_cannot_keep_up_with_verdicts_is_closed():
+    hub = Hub()
+    connection = Connection(FakeWebSocket(open_gate=False), user_id=1, buffer_size=2)
+    hub.register(connection)
+    for submission_id in (1, 2):
+        hub.publish(["user:1"], submission_id, {"submission_id": submission_id}, final=True)
+    assert connection.websocket.close_codes == []
+
+    hub.publish(["user:1"], 3, {"submission_id": 3}, final=True)
+    await asyncio.sleep(0)
+    assert connection.closed
+    assert connection.websocket.close_codes == [CLOSE_TOO_SLOW]
+    assert hub.stats()["disconnected_slow"] == 1
+
+
+@pytest.mark.anyio
+async def test_stalled_send_closes_the_client(monkeypatch):
+    monkeypatch.setattr(hub_module, "LIVE_SEND_TIMEOUT_S", 0.05)
+    connection = Connection(FakeWebSocket(open_gate=False), user_id=1)
+    connection.offer(1, "1: accepted", final=True)
+    await asyncio.wait_for(connection.run_sender(), 1)
+    assert connection.closed
+    assert connection.websocket.close_codes == [CLOSE_TOO_SLOW]
+    assert connection.sent == 0
+
+
+@pytest.mark.anyio
+async def test_event_is_delivered_once_per_connection():
+    hub = Hub()
+    player = Connection(FakeWebSocket(), user_id=1)
+    spectator = Connection(FakeWebSocket(), user_id=2)
+    other = Connection(FakeWebSocket(), user_id=3)
+    for connection in (player, spectator, other):
+        hub.register(connection)
+    assert hub.subscribe(player, "match:7")
+    assert hub.subscribe(spectator, "match:7")
+
+    hub.publish(["user:1", "match:7"], 10, {"type": "verdict", "submission_id": 10}, final=True)
+    for connection in (player, spectator, other):
+        await deliver(connection)
+    assert [json.loads(message) for message in player.websocket.messages] == \
+        [{"type": "verdict", "submission_id": 10}]
+    assert len(spectator.websocket.messages) == 1
+    assert other.websocket.messages == []
+
+    hub.unregister(spectator)
+    assert spectator.topics == set()
+    assert hub.stats()["topics"] == 3
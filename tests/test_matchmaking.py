@@ -0,0 +1,143 @@
+"""!
+@file test_matchmaking.py
+@brief Tests of the Elo rating, the rating-ordered queues and the batched rating of ended matches
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from matchmaking.queue import MatchQueue, QueuedPlayer
+from matchmaking.service import FinishedMatch, MatchmakingService, expected_score, rate
+from models.models import DifficultyEnum, Match, MatchPlayer, User
+
+EASY, HARD = DifficultyEnum.easy, DifficultyEnum.hard
+
+NOW = 1_700_000_000.0
+
+
+def queue() -> MatchQueue:
+    return MatchQueue(window_start=50, window_growth=10, window_max=400)
+
+
+def test_expected_score():
+    assert expected_score(1200, 1200) == 0.5
+    assert expected_score(1600, 1200) == pytest.approx(10 / 11)
+    assert expected_score(1300, 1200) + expected_score(1200, 1300) == pytest.approx(1.0)
+
+
+def test_rate_two_players():
+    assert rate({1: 1200, 2: 1200}, {1: 1, 2: 0}, k=32) == {1: 1216, 2: 1184}
+    assert rate({1: 1200, 2: 1200}, {1: 0.5, 2: 0.5}, k=32) == {1: 1200, 2: 1200}
+    upset = rate({1: 1000, 2: 1400}, {1: 1, 2: 0}, k=32)
+    assert upset[1] == pytest.approx(1000 + 32 * 10 / 11)
+    assert upset[1] + upset[2] == pytest.approx(2400)
+
+
+def test_rate_averages_over_several_opponents():
+    after = rate({1: 1200, 2: 1200, 3: 1200}, {1: 1, 2: 0, 3: 0}, k=32)
+    assert after == {1: 1216, 2: 1192, 3: 1192}
+
+
+def test_joining_player_is_paired_within_the_window():
+    matches = queue()
+    matches.add(QueuedPlayer(1, 1000, EASY, NOW))
+    matches.add(QueuedPlayer(2, 1100, EASY, NOW))
+    matches.add(QueuedPlayer(3, 1040, HARD, NOW))
+    assert matches.pair(2, NOW) is None
+
+    matches.add(QueuedPlayer(4, 1030, EASY, NOW))
+    matches.add(QueuedPlayer(5, 1045, EASY, NOW))
+    first, second = matches.pair(5, NOW)
+    # The closest acceptable neighbour, not the first one in reach
+    assert (first.user_id, second.user_id) == (5, 4)
+    assert 4 not in matches and 5 not in matches
+    assert matches.stats() == {"easy": 2, "medium": 0, "hard": 1}
+
+
+def test_window_widens_while_waiting():
+    matches = queue()
+    player = QueuedPlayer(1, 1000, EASY, NOW)
+    assert matches.window(player, NOW) == 50
+    assert matches.window(player, NOW + 5) == 100
+    assert matches.window(player, NOW + 1000) == 400
+
+    matches.add(player)
+    matches.add(QueuedPlayer(2, 1100, EASY, NOW))
+    assert matches.sweep(NOW + 4) == []
+    pairs = matches.sweep(NOW + 5)
+    assert [(first.user_id, second.user_id) for first, second in pairs] == [(1, 2)]
+    assert len(matches) == 0
+
+
+def test_pairing_needs_the_window_of_both_players():
+    matches = queue()
+    matches.add(QueuedPlayer(1, 1300, EASY, NOW - 100))
+    matches.add(QueuedPlayer(2, 1000, EASY, NOW))
+    # The first player accepts anyone within 400 points, the newcomer only 50
+    assert matches.pair(2, NOW) is None
+    assert matches.sweep(NOW + 24) == []
+    assert len(matches.sweep(NOW + 25)) == 1
+
+
+def test_sweep_pairs_neighbours_once():
+    matches = queue()
+    for user_id, rating in enumerate([1000, 1010, 1020, 1030, 1500], 1):
+        matches.add(QueuedPlayer(user_id, rating, EASY, NOW))
+    pairs = matches.sweep(NOW)
+    assert [(first.user_id, second.user_id) for first, second in pairs] == [(1, 2), (3, 4)]
+    assert list(matches.players) == [5]
+
+
+@pytest.fixture
+async def engines():
+    yield
+    await database.dispose_engines()
+
+
+def create_match(db, ended_at: datetime, ratings: dict) -> int:
+    match = Match(created_at=ended_at, started_at=ended_at)
+    db.add(match)
+    db.flush()
+    db.add_all(MatchPlayer(match_id=match.id, user_id=user_id, rating_before=rating)
+               for user_id, rating in ratings.items())
+    return match.id
+
+
+@pytest.mark.anyio
+async def test_matches_are_rated_in_the_order_they_ended(engines):
+    with database.SessionLocal() as db:
+        users = [User(username=f"rated{index}", email=f"rated{index}@example.com", hashed_password="x", rating=1200)
+                 for index in range(3)]
+        db.add_all(users)
+        db.flush()
+        first, second, third = (user.id for user in users)
+        ended = datetime.utcnow()
+        # The first player wins a match, then loses the next one it played at the same time
+        won = create_match(db, ended, {first: 1200, second: 1200})
+        lost = create_match(db, ended + timedelta(seconds=1), {first: 1200, third: 1200})
+        db.commit()
+
+    service = MatchmakingService()
+    service._finished = [
+        FinishedMatch(won, ended, {first: 1200, second: 1200}, {first: 1, second: 0}),
+        FinishedMatch(lost, ended + timedelta(seconds=1), {first: 1200, third: 1200}, {first: 0, third: 1}),
+    ]
+    await service._rate_finished()
+    assert service.matches_rated == 2 and service._finished == []
+
+    after_won = rate({first: 1200, second: 1200}, {first: 1, second: 0})
+    after_lost = rate({first: after_won[first], third: 1200}, {first: 0, third: 1})
+    with database.SessionLocal() as db:
+        ratings = {user.id: user.rating for user in db.query(User).filter(User.id.in_([first, second, third]))}
+        rows = {(row.match_id, row.user_id): (row.score, row.rating_after) for row in db.query(MatchPlayer)
+                .filter(MatchPlayer.match_id.in_([won, lost]))}
+        ended_at = {match.id: match.ended_at for match in db.query(Match).filter(Match.id.in_([won, lost]))}
+    assert ratings == pytest.approx({first: after_lost[first], second: after_won[second], third: after_lost[third]})
+    # The second match starts from the rating the first one produced, rating both from 1200 would give one of these
+    assert not any(ratings[first] == pytest.approx(rating) for rating in (1184, 1200))
+    assert rows[(won, first)] == (1, pytest.approx(after_won[first]))
+    assert rows[(lost, first)] == (0, pytest.approx(after_lost[first]))
+    assert rows[(lost, third)] == (1, pytest.approx(after_lost[third]))
+    assert ended_at == {won: ended, lost: ended + timedelta(seconds=1)}
@@ -0,0 +1,105 @@
+"""!
+@file test_metrics.py
+@brief Tests of the request and query metrics served by /metrics
+"""
+
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import database
+from monitoring import metrics
+from monitoring.metrics import Counter, Histogram, render
+
+ROUTE = "/problems/{problem_id}/stats"
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def parse(text_format: str) -> dict:
+    """!
+    @brief Parse the text exposition format
+    @return dict: Sample values keyed by (name, frozenset of label pairs)
+    """
+    samples = {}
+    for line in text_format.splitlines():
+        if line.startswith("#") or not line:
+            continue
+        name, labels, value = _SAMPLE.match(line).groups()
+        pairs = frozenset(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or ""))
+        samples[(name, pairs)] = float(value)
+    return samples
+
+
+def scrape(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return parse(response.text)
+
+
+def sample(samples: dict, name: str, **labels) -> float:
+    return samples.get((name, frozenset(labels.items())), 0.0)
+
+
+def test_requests_are_recorded_by_route_template(client, make_problem):
+    problem_ids = [make_problem([("1 2\n", "3\n")]) for _ in range(2)]
+    before = scrape(client)
+    for problem_id in problem_ids:
+        assert client.get(f"/problems/{problem_id}/stats").status_code == 200
+    assert client.get("/problems/999999/stats").status_code == 404
+    assert client.get("/no/such/path").status_code == 404
+    after = scrape(client)
+
+    def delta(name, **labels):
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert delta("http_requests_total", method="GET", route=ROUTE, status="200") == 2
+    assert delta("http_requests_total", method="GET", route=ROUTE, status="404") == 1
+    assert delta("http_requests_total", method="GET", route="unmatched", status="404") == 1
+    assert not any(name == "http_requests_total" and ("route", f"/problems/{problem_ids[0]}/stats") in labels
+                   for name, labels in after)
+
+    assert delta("http_request_duration_seconds_count", method="GET", route=ROUTE) == 3
+    assert delta("http_request_duration_seconds_sum", method="GET", route=ROUTE) > 0
+    # Every request looks the problem up, the found ones also count their submissions
+    assert delta("http_request_db_queries_count", method="GET", route=ROUTE) == 3
+    assert delta("http_request_db_queries_sum", method="GET", route=ROUTE) == 5
+    assert delta("http_request_db_queries_bucket", method="GET", route=ROUTE, le="1") == 1
+    assert delta("http_request_db_query_seconds_count", method="GET", route=ROUTE) == 3
+    assert delta("http_request_db_query_seconds_sum", method="GET", route=ROUTE) > 0
+    assert delta("db_query_duration_seconds_count", statement="select") >= 5
+
+
+def test_failed_queries_are_timed_and_leave_no_start_behind():
+    before = sample(parse(render()), "db_query_duration_seconds_count", statement="select")
+    with database.get_engine().connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM no_such_table"))
+        assert connection.info.get("query_started") == []
+        assert connection.execute(text("SELECT 1")).scalar_one() == 1
+    assert sample(parse(render()), "db_query_duration_seconds_count", statement="select") == before + 2
+
+
+@pytest.fixture
+def registry():
+    registered = list(metrics._registry)
+    yield
+    metrics._registry[:] = registered
+
+
+def test_rendering(registry):
+    counter = Counter("test_events_total", "Events of the test", ("kind",))
+    counter.labels('a "quoted"\nkind').inc(2)
+    histogram = Histogram("test_duration_seconds", "Durations of the test", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+    text_format = render()
+    assert 'test_events_total{kind="a \\"quoted\\"\\nkind"} 2' in text_format
+    assert "# TYPE test_duration_seconds histogram" in text_format
+    for line in ('test_duration_seconds_bucket{le="0.1"} 2', 'test_duration_seconds_bucket{le="1"} 3',
+                 'test_duration_seconds_bucket{le="+Inf"} 4', "test_duration_seconds_sum 5.65",
+                 "test_duration_seconds_count 4"):
+        assert line in text_format
@@ -0,0 +1,87 @@
+"""!
+@file test_pagination.py
+@brief Tests of the keyset cursors and of paging through the problem bank
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from models.models import DifficultyEnum
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+
+CASES = [("1 2\n", "3\n")]
+
+
+def all_pages(client, **params):
+    """!
+    @brief Follow next_cursor from the first to the last page
+    @return list[dict]: The pages
+    """
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor is not None else {}))
+        response = client.get("/problems", params=query)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = pages[-1]["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, (datetime.fromisoformat, int)) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor("x"), encode_cursor(1, 2), "e30"])
+def test_malformed_cursors(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, (int,))
+
+
+def test_paging_through_the_problem_bank(client, make_problem):
+    created = [make_problem(CASES) for _ in range(5)]
+    pages = all_pages(client, limit=2)
+    ids = [item["id"] for page in pages for item in page["items"]]
+
+    assert ids == sorted(set(ids))
+    assert set(created) <= set(ids)
+    assert all(len(page["items"]) == 2 for page in pages[:-1])
+    assert 1 <= len(pages[-1]["items"]) <= 2
+    assert pages[-1]["next_cursor"] is None
+    assert all_pages(client, limit=100)[0]["items"] == [item for page in pages for item in page["items"]]
+
+
+def test_last_page_has_no_cursor(client, make_problem):
+    for _ in range(3):
+        make_problem(CASES)
+    ids = [item["id"] for page in all_pages(client, limit=100) for item in page["items"]]
+    last = client.get("/problems", params={"limit": 1, "cursor": encode_cursor(ids[-2])}).json()
+    assert [item["id"] for item in last["items"]] == [ids[-1]] and last["next_cursor"] is None
+    # A full last page does not announce a next page either
+    full = client.get("/problems", params={"limit": 2, "cursor": encode_cursor(ids[-3])}).json()
+    assert len(full["items"]) == 2 and full["next_cursor"] is None
+    assert client.get("/problems", params={"cursor": encode_cursor(ids[-1])}).json() == \
+        {"items": [], "next_cursor": None}
+
+
+def test_difficulty_filter(client, make_problem):
+    hard = [make_problem(CASES, difficulty=DifficultyEnum.hard) for _ in range(3)]
+    easy = make_problem(CASES)
+    pages = all_pages(client, limit=2, difficulty="hard")
+    items = [item for page in pages for item in page["items"]]
+    assert {item["difficulty"] for item in items} == {"hard"}
+    assert set(hard) <= {item["id"] for item in items}
+    assert easy not in {item["id"] for item in items}
+    assert client.get("/problems", params={"difficulty": "impossible"}).status_code == 422
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor("x"), encode_cursor(1, 2)])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/problems", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
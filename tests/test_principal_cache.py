@@ -0,0 +1,99 @@
+"""!
+@file test_principal_cache.py
+@brief Tests of the principal cache: expiry, its size bound and invalidation when users change
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+
+import database
+from auth import principal_cache as principal_cache_module
+from auth.principal_cache import Principal, PrincipalCache, invalidate_after_commit
+from models.models import User
+
+
+CREATED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def principal(user_id: int) -> Principal:
+    return Principal(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", created_at=CREATED_AT)
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(principal_cache_module.time, "monotonic", lambda: now[0])
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put_user(principal(1))
+    now[0] += 59
+    assert cache.get_user(1) == principal(1)
+    now[0] += 2
+    assert cache.get_user(1) is None
+    assert (cache.stats()["user_hits"], cache.stats()["user_misses"], cache.stats()["users"]) == (1, 1, 0)
+
+
+def test_tokens_expire_with_the_token(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(principal_cache_module.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(principal_cache_module.time, "time", lambda: 5000.0)
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put_token("short", {"sub": "1", "exp": 5010})
+    cache.put_token("expired", {"sub": "1", "exp": 4990})
+    cache.put_token("long", {"sub": "1", "exp": 9000})
+    now[0] += 11
+    assert cache.get_token("short") is None
+    assert cache.get_token("expired") is None
+    assert cache.get_token("long") == {"sub": "1", "exp": 9000}
+    now[0] += 50
+    assert cache.get_token("long") is None
+
+
+def test_least_recently_used_users_are_evicted():
+    cache = PrincipalCache(ttl=60, max_entries=2)
+    cache.put_user(principal(1))
+    cache.put_user(principal(2))
+    assert cache.get_user(1) is not None
+    cache.put_user(principal(3))
+    assert cache.get_user(2) is None
+    assert cache.get_user(1) is not None and cache.get_user(3) is not None
+    assert cache.stats()["users"] == 2
+
+
+def me(client, headers) -> dict:
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_changes_through_the_orm_are_seen_by_the_next_request(client, register):
+    user_id, headers = register()
+    me(client, headers)
+    assert principal_cache_module.principal_cache.get_user(user_id) is not None
+
+    with database.SessionLocal() as db:
+        db.get(User, user_id).email = f"renamed{user_id}@example.com"
+        db.commit()
+    assert me(client, headers)["email"] == f"renamed{user_id}@example.com"
+
+    with database.SessionLocal() as db:
+        db.delete(db.get(User, user_id))
+        db.commit()
+    assert client.get("/me", headers=headers).status_code == 401
+
+
+def test_core_updates_are_seen_after_commit(client, register):
+    user_id, headers = register()
+    username = me(client, headers)["username"]
+
+    with database.SessionLocal() as db:
+        db.execute(update(User).where(User.id == user_id).values(username=f"{username}_core"))
+        db.commit()
+    # Not registered with invalidate_after_commit(): served from the cache until the TTL expires
+    assert me(client, headers)["username"] == username
+
+    with database.SessionLocal() as db:
+        db.execute(update(User).where(User.id == user_id).values(username=f"{username}_registered"))
+        invalidate_after_commit(db, [user_id])
+        assert me(client, headers)["username"] == username
+        db.commit()
+    assert me(client, headers)["username"] == f"{username}_registered"
@@ -0,0 +1,124 @@
+"""!
+@file test_problem_cache.py
+@brief Tests of the problem page cache: ETags, shared loads and invalidation on changes
+"""
+
+import asyncio
+
+import pytest
+
+import database
+from models.models import Problem, TestCase
+from problems.cache import ProblemCache, problem_cache
+
+CASES = [("1 2\n", "3\n")]
+
+
+def page(client, problem_id: int, **headers):
+    return client.get(f"/problems/{problem_id}", headers=headers)
+
+
+def test_revalidation_with_the_etag(client, make_problem):
+    problem_id = make_problem(CASES)
+    first = page(client, problem_id)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        revalidated = page(client, problem_id, **{"If-None-Match": if_none_match})
+        assert revalidated.status_code == 304, if_none_match
+        assert revalidated.content == b"" and revalidated.headers["ETag"] == etag
+    assert page(client, problem_id, **{"If-None-Match": '"other"'}).status_code == 200
+    assert page(client, 999999).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_load():
+    cache = ProblemCache(ttl=60, max_entries=10)
+    release = asyncio.Event()
+    calls = []
+
+    async def loader(problem_id):
+        calls.append(problem_id)
+        await release.wait()
+        return b'{"id": %d}' % problem_id
+
+    waiting = [asyncio.ensure_future(cache.get(1, loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    pages = await asyncio.gather(*waiting)
+    assert calls == [1]
+    assert all(cached is pages[0] for cached in pages)
+    assert (cache.stats()["misses"], cache.stats()["coalesced"], cache.stats()["loads"]) == (1, 4, 1)
+    assert await cache.get(1, loader) is pages[0]
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.anyio
+async def test_load_started_before_an_invalidation_is_not_stored():
+    cache = ProblemCache(ttl=60, max_entries=10)
+    release = asyncio.Event()
+    versions = iter([b"old", b"new"])
+
+    async def loader(problem_id):
+        await release.wait()
+        return next(versions)
+
+    stale = asyncio.ensure_future(cache.get(1, loader))
+    await asyncio.sleep(0)
+    cache.invalidate(1)
+    release.set()
+    assert (await stale).body == b"old"
+    assert (await cache.get(1, loader)).body == b"new"
+    assert (await cache.get(1, loader)).body == b"new"
+
+
+def test_flushed_problem_changes_invalidate_the_page(client, make_problem):
+    problem_id = make_problem(CASES)
+    before = page(client, problem_id)
+    assert problem_cache.stats()["problems"] > 0
+
+    with database.SessionLocal() as db:
+        db.get(Problem, problem_id).title = "Changed title"
+        db.commit()
+    after = page(client, problem_id)
+    assert after.json()["title"] == "Changed title"
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert page(client, problem_id, **{"If-None-Match": before.headers["ETag"]}).status_code == 200
+
+
+def test_flushed_test_cases_invalidate_the_page(client, make_problem):
+    problem_id = make_problem(CASES)
+
+    def examples():
+        shown = page(client, problem_id).json()["examples"]
+        return [(example["input"], example["expected_output"]) for example in shown]
+    assert examples() == CASES
+
+    with database.SessionLocal() as db:
+        db.add(TestCase(problem_id=problem_id, input="5 6\n", expected_output="11\n", is_hidden=False))
+        db.commit()
+    assert examples() == CASES + [("5 6\n", "11\n")]
+
+    with database.SessionLocal() as db:
+        example = db.query(TestCase).filter(TestCase.problem_id == problem_id, TestCase.input == "1 2\n").one()
+        example.is_hidden = True
+        db.commit()
+    assert examples() == [("5 6\n", "11\n")]
+
+
+def test_edit_serves_the_new_page(client, register, make_problem):
+    _, admin = register(admin=True)
+    problem_id = make_problem(CASES)
+    old_etag = page(client, problem_id).headers["ETag"]
+
+    edited = client.patch(f"/problems/{problem_id}", json={"title": "Edited", "difficulty": "hard"}, headers=admin)
+    assert edited.status_code == 200, edited.text
+    assert (edited.json()["title"], edited.json()["difficulty"]) == ("Edited", "hard")
+    assert edited.headers["ETag"] != old_etag
+
+    current = page(client, problem_id)
+    assert current.json()["title"] == "Edited"
+    assert current.headers["ETag"] == edited.headers["ETag"]
+    assert page(client, problem_id, **{"If-None-Match": edited.headers["ETag"]}).status_code == 304
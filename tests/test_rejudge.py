@@ -0,0 +1,82 @@
+"""!
+@file test_rejudge.py
+@brief Tests of rejudging the accepted submissions of a problem after its test cases changed
+"""
+
+import time
+
+import database
+from models.models import TestCase
+
+from conftest import WAIT_TIMEOUT_S
+
+SUM = "a, b = map(int, input().split())\nprint(a + b)\n"
+
+TRICKY = "a, b = map(int, input().split())\nprint(0 if a == 100 else a + b)\n"
+
+
+def submit(client, headers, problem_id: int, code: str) -> int:
+    response = client.post("/submissions", json={"problem_id": problem_id, "language": "python", "code": code},
+                           headers=headers)
+    assert response.status_code == 202, response.text
+    return response.json()["id"]
+
+
+def rejudge(client, headers, problem_id: int) -> dict:
+    response = client.post(f"/problems/{problem_id}/rejudge", headers=headers)
+    assert response.status_code == 202, response.text
+    deadline = time.monotonic() + WAIT_TIMEOUT_S
+    while time.monotonic() < deadline:
+        progress = client.get(f"/problems/{problem_id}/rejudge", headers=headers).json()
+        if progress["status"] != "running":
+            return progress
+        time.sleep(0.05)
+    raise AssertionError(f"The rejudge of problem {problem_id} did not finish in time")
+
+
+def ranked(client, headers, problem_id: int) -> list:
+    deadline = time.monotonic() + WAIT_TIMEOUT_S
+    while True:
+        response = client.get(f"/leaderboards/problems/{problem_id}", headers=headers)
+        if response.status_code != 503 or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    return [entry["user_id"] for entry in response.json()["entries"]]
+
+
+def test_rejudge_runs_new_test_cases_and_fails_submissions(client, register, make_problem, wait_verdict):
+    _, admin = register(admin=True)
+    solid_id, solid = register()
+    tricky_id, tricky = register()
+    problem_id = make_problem([("1 2\n", "3\n"), ("3 4\n", "7\n")])
+    solid_submission = submit(client, solid, problem_id, SUM)
+    tricky_submission = submit(client, tricky, problem_id, TRICKY)
+    assert wait_verdict(solid, solid_submission)["status"] == "accepted"
+    assert wait_verdict(tricky, tricky_submission)["status"] == "accepted"
+    assert sorted(ranked(client, solid, problem_id)) == sorted([solid_id, tricky_id])
+
+    progress = rejudge(client, admin, problem_id)
+    assert (progress["status"], progress["total"], progress["up_to_date"], progress["test_cases_run"]) == \
+        ("finished", 2, 2, 0)
+
+    with database.SessionLocal() as db:
+        db.add(TestCase(problem_id=problem_id, input="100 1\n", expected_output="101\n"))
+        db.commit()
+    progress = rejudge(client, admin, problem_id)
+    assert progress["status"] == "finished"
+    assert (progress["rejudged"], progress["failed"], progress["errors"]) == (2, 1, 0)
+    # Only the new test case is run
+    assert progress["test_cases_run"] == 2
+
+    assert wait_verdict(solid, solid_submission)["status"] == "accepted"
+    assert wait_verdict(tricky, tricky_submission)["status"] == "wrong_answer"
+    assert ranked(client, solid, problem_id) == [solid_id]
+
+
+def test_rejudge_permissions(client, register, make_problem):
+    _, admin = register(admin=True)
+    _, user = register()
+    problem_id = make_problem([("1 2\n", "3\n")])
+    assert client.post(f"/problems/{problem_id}/rejudge", headers=user).status_code == 403
+    assert client.post("/problems/999999/rejudge", headers=admin).status_code == 404
+    assert client.get(f"/problems/{problem_id}/rejudge", headers=admin).status_code == 404
@@ -0,0 +1,101 @@
+"""!
+@file test_runs.py
+@brief Tests of the run endpoint: checked and unchecked runs, the cache, supersession and rate limiting
+"""
+
+import threading
+import time
+
+SUM = "a, b = map(int, input().split())\nprint(a + b)\n"
+
+EXAMPLE = ("1 2\n", "3\n")
+
+
+def run(client, headers, problem_id: int, code: str, **fields):
+    return client.post(f"/problems/{problem_id}/run", json={"language": "python", "code": code, **fields},
+                       headers=headers)
+
+
+def test_checked_and_unchecked_runs(client, register, make_problem):
+    _, headers = register()
+    problem_id = make_problem([EXAMPLE], example=EXAMPLE)
+
+    result = run(client, headers, problem_id, SUM).json()
+    assert (result["status"], result["stdout"], result["expected_output"]) == ("ok", "3\n", "3\n")
+    assert not result["cached"]
+    assert run(client, headers, problem_id, SUM).json()["cached"]
+
+    result = run(client, headers, problem_id, "print(4)\n").json()
+    assert (result["status"], result["stdout"]) == ("wrong_answer", "4\n")
+
+    result = run(client, headers, problem_id, SUM, input="5 6\n").json()
+    assert (result["status"], result["stdout"], result["expected_output"]) == ("ok", "11\n", None)
+
+    result = run(client, headers, problem_id, "raise ValueError('boom')\n").json()
+    assert (result["status"], result["detail"]) == ("error", "Runtime error")
+    assert "ValueError: boom" in result["stderr"]
+
+
+def test_run_errors(client, register, make_problem):
+    _, headers = register()
+    without_example = make_problem([EXAMPLE])
+    assert run(client, headers, without_example, SUM).status_code == 400
+    assert run(client, headers, without_example, SUM, input="1 2\n").status_code == 200
+    assert run(client, headers, 999999, SUM).status_code == 404
+    problem_id = make_problem([EXAMPLE], example=EXAMPLE)
+    assert client.post(f"/problems/{problem_id}/run", json={"language": "cobol", "code": SUM},
+                       headers=headers).status_code == 400
+
+
+def test_newer_run_supersedes_the_running_one(client, register, make_problem):
+    _, headers = register()
+    problem_id = make_problem([EXAMPLE], example=EXAMPLE)
+    responses = {}
+
+    def slow():
+        responses["slow"] = run(client, headers, problem_id, "import time\ntime.sleep(2.5)\nprint(3)\n")
+
+    thread = threading.Thread(target=slow)
+    thread.start()
+    time.sleep(0.8)
+    started = time.monotonic()
+    newer = run(client, headers, problem_id, SUM)
+    thread.join()
+
+    assert newer.status_code == 200 and newer.json()["status"] == "ok"
+    assert responses["slow"].status_code == 409
+    assert time.monotonic() - started < 2.5
+
+
+def test_cached_run_supersedes_the_running_one(client, register, make_problem):
+    _, headers = register()
+    problem_id = make_problem([EXAMPLE], example=EXAMPLE)
+    code = SUM + "# cached\n"
+    assert not run(client, headers, problem_id, code).json()["cached"]
+    responses = {}
+
+    def slow():
+        responses["slow"] = run(client, headers, problem_id, "import time\ntime.sleep(2.5)\nprint(3)\n")
+
+    thread = threading.Thread(target=slow)
+    thread.start()
+    time.sleep(0.8)
+    newer = run(client, headers, problem_id, code)
+    thread.join()
+
+    assert newer.json()["cached"]
+    assert responses["slow"].status_code == 409
+
+
+def test_runs_are_rate_limited(client, register, make_problem):
+    _, headers = register()
+    problem_id = make_problem([EXAMPLE], example=EXAMPLE)
+    responses = [run(client, headers, problem_id, SUM) for _ in range(12)]
+    assert [response.status_code for response in responses[:10]] == [200] * 10
+    assert responses[-1].status_code == 429
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+
+    # Runs do not use up the submission bucket
+    response = client.post("/submissions", json={"problem_id": problem_id, "language": "python", "code": SUM},
+                           headers=headers)
+    assert response.status_code == 202
@@ -0,0 +1,120 @@
+"""!
+@file test_scheduler.py
+@brief Tests of the fair queue and the per-user admission control of the judge
+"""
+
+import asyncio
+
+import pytest
+
+from judge import scheduler
+from judge.scheduler import (
+    PRIORITY_MATCH, PRIORITY_PRACTICE, PRIORITY_REJUDGE, PRIORITY_RUN, AdmissionControl, FairQueue, QueueFull
+)
+
+
+async def drain(queue: FairQueue) -> list:
+    jobs = []
+    while queue.qsize():
+        jobs.append(await queue.get())
+    return jobs
+
+
+@pytest.mark.anyio
+async def test_flooding_user_does_not_delay_others():
+    queue = FairQueue()
+    for index in range(10):
+        queue.put_nowait(("flood", index), user_id=1)
+    queue.put_nowait(("other", 0), user_id=2)
+    assert queue.queued_by(1) == 10
+
+    order = [job.item for job in await drain(queue)]
+    assert order.index(("other", 0)) <= 1
+    assert [item for item in order if item[0] == "flood"] == [("flood", index) for index in range(10)]
+    assert queue.queued_by(1) == 0
+
+
+@pytest.mark.anyio
+async def test_priority_classes_share_by_weight():
+    queue = FairQueue()
+    for index in range(20):
+        queue.put_nowait(("practice", index), user_id=1, priority=PRIORITY_PRACTICE)
+        queue.put_nowait(("match", index), user_id=2, priority=PRIORITY_MATCH)
+    queue.put_nowait(("run", 0), user_id=3, priority=PRIORITY_RUN)
+    queue.put_nowait(("rejudge", 0), user_id=None, priority=PRIORITY_REJUDGE)
+
+    order = [job.item[0] for job in await drain(queue)]
+    assert order[0] == "run"
+    first = order[:10]
+    assert first.count("match") > first.count("practice") > 0
+    # Rejudges keep moving under load, but come after the practice jobs queued with them
+    assert order.index("rejudge") > order.index("practice")
+
+
+@pytest.mark.anyio
+async def test_idle_flow_does_not_bank_credit():
+    queue = FairQueue()
+    for index in range(5):
+        queue.put_nowait(index, user_id=1)
+        await queue.get()
+    for index in range(3):
+        queue.put_nowait(("busy", index), user_id=2)
+    queue.put_nowait(("idle", 0), user_id=1)
+    order = [job.item for job in await drain(queue)]
+    assert order.index(("idle", 0)) <= 1
+
+
+@pytest.mark.anyio
+async def test_bounded_queue():
+    queue = FairQueue(maxsize=2)
+    queue.put_nowait(1, user_id=1)
+    queue.put_nowait(2, user_id=1)
+    assert queue.full()
+    with pytest.raises(QueueFull):
+        queue.put_nowait(3, user_id=2)
+    with pytest.raises(ValueError):
+        FairQueue().put_nowait(1, priority="unknown")
+
+    putter = asyncio.ensure_future(queue.put(3, user_id=2))
+    await asyncio.sleep(0)
+    assert not putter.done()
+    assert (await queue.get()).item == 1
+    await putter
+    assert queue.stats()[PRIORITY_PRACTICE] == 2
+
+
+@pytest.mark.anyio
+async def test_get_waits_for_a_job():
+    queue = FairQueue()
+    getter = asyncio.ensure_future(queue.get())
+    await asyncio.sleep(0)
+    assert not getter.done()
+    queue.put_nowait("job", user_id=1, priority=PRIORITY_RUN)
+    job = await asyncio.wait_for(getter, 1)
+    assert (job.item, job.user_id, job.priority) == ("job", 1, PRIORITY_RUN)
+
+
+def test_admission_control_bucket(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: now[0])
+    admission = AdmissionControl(rate=0.5, burst=3)
+
+    assert [admission.acquire(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert admission.acquire(1) == pytest.approx(2.0)
+    assert admission.acquire(2) == 0.0
+
+    now[0] += 1.0
+    assert admission.acquire(1) == pytest.approx(1.0)
+    now[0] += 1.0
+    assert admission.acquire(1) == 0.0
+
+    admission.refund(1)
+    assert admission.acquire(1) == 0.0
+    assert admission.acquire(1) > 0
+
+
+def test_admission_control_without_refill(monkeypatch):
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: 0.0)
+    admission = AdmissionControl(rate=0, burst=1)
+    assert admission.acquire(1) == 0.0
+    assert admission.acquire(1) == float("inf")
@@ -0,0 +1,94 @@
+"""!
+@file test_sketch.py
+@brief Tests of the accuracy, merging and serialization of the percentile sketches
+"""
+
+import bisect
+import random
+
+import pytest
+
+from analysis.sketch import SKETCH_MIN_VALUE, LogHistogram
+
+ACCURACY = 0.02
+
+FRACTIONS = (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+
+def values(seed: int, count: int = 20000) -> list:
+    generator = random.Random(seed)
+    # Execution times in ms: mostly tens of ms with a long tail
+    return [generator.lognormvariate(3, 1.2) for _ in range(count)]
+
+
+def sketch_of(data) -> LogHistogram:
+    sketch = LogHistogram(relative_accuracy=ACCURACY)
+    for value in data:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_quantiles_are_within_the_relative_accuracy(seed):
+    data = values(seed)
+    sketch = sketch_of(data)
+    ordered = sorted(data)
+    for fraction in FRACTIONS:
+        exact = ordered[int(fraction * (len(ordered) - 1))]
+        assert sketch.quantile(fraction) == pytest.approx(exact, rel=ACCURACY), fraction
+
+
+def test_bucket_values_are_within_the_relative_accuracy():
+    sketch = LogHistogram(relative_accuracy=ACCURACY)
+    for value in (0.0011, 0.5, 1.0, 7.3, 250.0, 99999.0):
+        assert sketch.value(sketch.index(value)) == pytest.approx(value, rel=ACCURACY)
+    assert sketch.value(sketch.index(SKETCH_MIN_VALUE / 10)) == 0.0
+
+
+def test_rank_is_within_the_bucket_of_the_value():
+    data = values(4)
+    sketch = sketch_of(data)
+    ordered = sorted(data)
+    gamma = sketch.gamma
+    for value in (1.0, 5.0, 20.0, 100.0, 1000.0):
+        # Every value of the bucket of the value lies within a factor of gamma of it
+        lowest = bisect.bisect_left(ordered, value / gamma)
+        highest = bisect.bisect_right(ordered, value * gamma)
+        assert lowest <= sketch.rank(value) <= highest
+    assert sketch.rank(SKETCH_MIN_VALUE) == 0
+    assert sketch.rank(1e7) == len(data)
+
+
+def test_merged_sketches_equal_the_sketch_of_all_values():
+    first, second = values(5, 5000), values(6, 15000)
+    merged = sketch_of(first)
+    merged.merge(sketch_of(second))
+    combined = sketch_of(first + second)
+
+    assert merged.count == combined.count == 20000
+    assert merged.counts == combined.counts
+    assert merged.to_bytes() == combined.to_bytes()
+    for fraction in FRACTIONS:
+        assert merged.quantile(fraction) == combined.quantile(fraction)
+    for value in (1.0, 20.0, 500.0):
+        assert merged.rank(value) == combined.rank(value)
+
+    with pytest.raises(ValueError):
+        merged.merge(LogHistogram(relative_accuracy=0.05))
+
+
+def test_serialization_round_trip():
+    sketch = sketch_of(values(7, 1000))
+    restored = LogHistogram.from_bytes(sketch.to_bytes())
+    assert (restored.gamma, restored.count, restored.counts) == (sketch.gamma, sketch.count, sketch.counts)
+    assert len(sketch.to_bytes()) < 2048
+    assert LogHistogram().quantile(0.5) is None and LogHistogram().rank(1.0) == 0
+
+
+def test_removed_values_are_no_longer_counted():
+    data = values(8, 1000)
+    sketch = sketch_of(data)
+    for value in data[:500]:
+        sketch.remove(value)
+    assert sketch.counts == sketch_of(data[500:]).counts
+    assert sketch.count == 500
@@ -0,0 +1,61 @@
+"""!
+@file test_sorted_set.py
+@brief Tests of the skip list behind the leaderboards
+"""
+
+import random
+
+from leaderboard.sorted_set import SortedSet
+
+
+def test_ranks_and_ranges():
+    board = SortedSet()
+    assert board.zadd("b", (2, "b"))
+    assert board.zadd("a", (1, "a"))
+    assert board.zadd("c", (3, "c"))
+    assert not board.zadd("a", (1, "a"))
+
+    assert len(board) == board.zcard() == 3
+    assert [board.zrank(member) for member in "abc"] == [0, 1, 2]
+    assert board.zrange(0, -1) == [("a", (1, "a")), ("b", (2, "b")), ("c", (3, "c"))]
+    assert board.zrange(-2, 10) == [("b", (2, "b")), ("c", (3, "c"))]
+    assert board.zrange(2, 1) == []
+    assert board.zrank("d") is None
+    assert board.zscore("d") is None
+
+
+def test_move_and_remove():
+    board = SortedSet()
+    for index, member in enumerate("abcd"):
+        board.zadd(member, (index, member))
+    assert not board.zadd("a", (10, "a"))
+    assert board.zrank("a") == 3
+    assert board.zscore("a") == (10, "a")
+
+    assert board.zrem("b")
+    assert not board.zrem("b")
+    assert "b" not in board
+    assert [member for member, _ in board.zrange(0, -1)] == ["c", "d", "a"]
+    assert board.zrank("d") == 1
+
+
+def test_matches_a_sorted_list():
+    generator = random.Random(7)
+    board = SortedSet()
+    scores = {}
+    for _ in range(5000):
+        member = generator.randrange(300)
+        if generator.random() < 0.3:
+            assert board.zrem(member) == (member in scores)
+            scores.pop(member, None)
+        else:
+            score = (generator.randrange(1000), member)
+            assert board.zadd(member, score) == (member not in scores)
+            scores[member] = score
+
+    expected = sorted((score, member) for member, score in scores.items())
+    assert len(board) == len(expected)
+    assert board.zrange(0, -1) == [(member, score) for score, member in expected]
+    for rank, (score, member) in enumerate(expected):
+        assert board.zrank(member) == rank
+    assert board.zrange(10, 19) == [(member, score) for score, member in expected[10:20]]
@@ -0,0 +1,101 @@
+"""!
+@file test_submissions.py
+@brief Tests of submitting code through the API and of the judged verdicts
+"""
+
+import time
+
+from models.models import SubmissionTestResult
+import database
+
+SUM = "a, b = map(int, input().split())\nprint(a + b)\n"
+
+CASES = [("1 2\n", "3\n"), ("3 4\n", "7\n")]
+
+
+def submit(client, headers, problem_id: int, code: str, language: str = "python"):
+    return client.post("/submissions", json={"problem_id": problem_id, "language": language, "code": code},
+                       headers=headers)
+
+
+def cache_hits(client) -> float:
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith('judge_verdicts_total{status="accepted",source="cache"}'):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_verdicts_through_the_api(client, register, make_problem, wait_verdict):
+    _, headers = register()
+    problem_id = make_problem(CASES)
+    codes = {
+        "accepted": SUM,
+        "wrong_answer": "print(3)\n",
+        "error": "while True:\n    pass\n",
+    }
+    submitted = {}
+    for expected, code in codes.items():
+        response = submit(client, headers, problem_id, code)
+        assert response.status_code == 202, response.text
+        assert response.json()["status"] == "pending"
+        submitted[expected] = response.json()["id"]
+
+    for expected, submission_id in submitted.items():
+        submission = wait_verdict(headers, submission_id)
+        assert submission["status"] == expected
+    accepted = wait_verdict(headers, submitted["accepted"])
+    assert accepted["execution_time_ms"] is not None and accepted["memory_usage_mb"] > 0
+
+    with database.SessionLocal() as db:
+        results = db.query(SubmissionTestResult).filter(
+            SubmissionTestResult.submission_id == submitted["accepted"]).count()
+    assert results == len(CASES)
+
+    page = client.get("/submissions", headers=headers).json()
+    assert {item["id"] for item in page["items"]} == set(submitted.values())
+
+
+def test_resubmission_is_answered_from_the_cache(client, register, make_problem, wait_verdict):
+    _, headers = register()
+    problem_id = make_problem(CASES)
+    first = wait_verdict(headers, submit(client, headers, problem_id, SUM).json()["id"])
+    cached = cache_hits(client)
+    second = wait_verdict(headers, submit(client, headers, problem_id, SUM).json()["id"])
+    assert first["status"] == second["status"] == "accepted"
+    assert second["execution_time_ms"] == first["execution_time_ms"]
+    assert cache_hits(client) == cached + 1
+
+
+def test_rejected_submissions(client, register, make_problem):
+    _, headers = register()
+    problem_id = make_problem(CASES)
+    assert submit(client, headers, problem_id, SUM, language="cobol").status_code == 400
+    assert submit(client, headers, 999999, SUM).status_code == 404
+    assert client.post("/submissions", json={"problem_id": problem_id, "language": "python", "code": SUM}).status_code \
+        in (401, 403)
+
+    responses = [submit(client, headers, problem_id, SUM) for _ in range(12)]
+    limited = [response for response in responses if response.status_code == 429]
+    assert limited and int(limited[0].headers["Retry-After"]) >= 1
+
+
+def test_submissions_of_other_users_are_hidden(client, register, make_problem):
+    _, owner = register()
+    _, other = register()
+    submission_id = submit(client, owner, make_problem(CASES), SUM).json()["id"]
+    assert client.get(f"/submissions/{submission_id}", headers=other).status_code == 404
+
+
+def test_accepted_submission_is_ranked(client, register, make_problem, wait_verdict):
+    user_id, headers = register()
+    problem_id = make_problem(CASES)
+    wait_verdict(headers, submit(client, headers, problem_id, SUM).json()["id"])
+
+    deadline = time.monotonic() + 10
+    while True:
+        response = client.get(f"/leaderboards/problems/{problem_id}", headers=headers)
+        if response.status_code != 503 or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert response.status_code == 200
+    assert [entry["user_id"] for entry in response.json()["entries"]] == [user_id]
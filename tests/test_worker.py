@@ -0,0 +1,132 @@
+"""!
+@file test_worker.py
+@brief Tests of the verdicts produced by the judge worker
+@details Judges submissions in the test process itself, the sandbox is the same as in the worker pool.
+"""
+
+import shutil
+
+import pytest
+
+from judge.sandbox import LANGUAGES, Limits
+from judge.worker import (
+    RUN_ERROR, RUN_OK, RUN_WRONG_ANSWER, JudgeJob, RunJob, judge_submission, run_code, startup_time_ms
+)
+from judge.worker import TestCaseData as CaseData
+from models.models import StatusEnum
+
+LIMITS = Limits(cpu_time_ms=1000, memory_mb=256, wall_time_ms=3000, output_bytes=1024 * 1024)
+
+CASES = [CaseData(1, "1 2\n", "3\n"), CaseData(2, "3 4\n", "7\n"), CaseData(3, "10 20\n", "30\n")]
+
+PYTHON_SUM = "a, b = map(int, input().split())\nprint(a + b)\n"
+
+C_SUM = '#include <stdio.h>\nint main(void) { int a, b; scanf("%d %d", &a, &b); printf("%d\\n", a + b); return 0; }\n'
+
+
+def judge(code: str, language: str = "python", cases=CASES, checker=None):
+    return judge_submission(JudgeJob(1, 1, language, code, list(cases), LIMITS, checker=checker))
+
+
+def test_accepted():
+    result = judge(PYTHON_SUM)
+    assert result.status == StatusEnum.accepted
+    assert (result.passed, result.total) == (3, 3)
+    assert [case.status for case in result.cases] == [StatusEnum.accepted] * 3
+    assert 0 <= result.execution_time_ms < LIMITS.cpu_time_ms
+    assert result.memory_usage_mb > 0
+    assert result.cacheable
+
+
+def test_wrong_answer_stops_at_the_failing_case():
+    result = judge("a, b = map(int, input().split())\nprint(a + b if a < 3 else 0)\n")
+    assert result.status == StatusEnum.wrong_answer
+    assert result.detail == "Wrong answer on test case 2"
+    assert [case.status for case in result.cases] == [StatusEnum.accepted, StatusEnum.wrong_answer]
+    assert result.passed == 1
+
+
+def test_time_limit_exceeded():
+    result = judge("while True:\n    pass\n")
+    assert result.status == StatusEnum.error
+    assert result.detail == "Time limit exceeded on test case 1"
+    assert not result.cacheable
+
+
+def test_memory_limit_exceeded():
+    result = judge("data = bytearray(1024 * 1024 * 1024)\nprint(len(data))\n")
+    assert result.status == StatusEnum.error
+    assert result.detail == "Runtime error on test case 1"
+    assert result.memory_usage_mb < LIMITS.memory_mb
+
+
+def test_runtime_error():
+    result = judge("raise ValueError('boom')\n")
+    assert result.status == StatusEnum.error
+    assert result.detail == "Runtime error on test case 1"
+    assert result.cacheable
+
+
+def test_output_limit_exceeded():
+    result = judge("import sys\nsys.stdout.write('3' * (4 * 1024 * 1024))\n", checker="tokens")
+    assert result.status == StatusEnum.error
+    assert result.detail == "Output limit exceeded on test case 1"
+
+
+def test_python_syntax_error_is_a_compilation_error():
+    result = judge("def solve(:\n    pass\n")
+    assert result.status == StatusEnum.error
+    assert result.detail.startswith("Compilation failed\n")
+    assert "SyntaxError" in result.detail and "main.py" in result.detail
+    assert result.cases == []
+
+
+def test_builtins_are_restored_between_cases():
+    result = judge(PYTHON_SUM + "import builtins\nbuiltins.int = None\nbuiltins.print = None\n")
+    assert result.status == StatusEnum.accepted
+
+
+def test_submission_terminating_the_harness_is_run_in_fresh_processes():
+    code = "import os, sys\n" + PYTHON_SUM + "sys.stdout.flush()\nos._exit(0)\n"
+    result = judge(code)
+    assert result.status == StatusEnum.accepted
+    assert result.passed == 3
+    # The fresh processes are timed without the interpreter startup, like the harness
+    assert startup_time_ms(LANGUAGES["python"], LIMITS) > 0
+    assert startup_time_ms(LANGUAGES["c"], LIMITS) == 0
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="gcc is not installed")
+def test_compiled_language_verdicts():
+    assert judge(C_SUM, "c").status == StatusEnum.accepted
+
+    result = judge("int main(void) { return }\n", "c")
+    assert result.status == StatusEnum.error
+    assert result.detail.startswith("Compilation failed\n")
+    assert "error" in result.detail
+
+    result = judge("int main(void) { int *p = 0; *p = 1; return 0; }\n", "c")
+    assert result.status == StatusEnum.error
+    assert result.detail == "Runtime error on test case 1"
+    # Killed by a signal, which may come from outside the program
+    assert not result.cacheable
+
+
+def test_unsupported_language_and_checker():
+    assert judge(PYTHON_SUM, "cobol").detail == "Unsupported language 'cobol'"
+    result = judge(PYTHON_SUM, checker="no such checker")
+    assert result.status == StatusEnum.error
+    assert not result.cacheable
+
+
+@pytest.mark.parametrize("code, expected_output, status", [
+    (PYTHON_SUM, "3\n", RUN_OK),
+    ("print(4)\n", "3\n", RUN_WRONG_ANSWER),
+    (PYTHON_SUM, None, RUN_OK),
+    ("raise SystemExit(3)\n", "3\n", RUN_ERROR),
+])
+def test_run_code(code, expected_output, status):
+    result = run_code(RunJob(1, 1, "python", code, "1 2\n", LIMITS, expected_output=expected_output))
+    assert result.status == status
+    if status == RUN_OK:
+        assert result.stdout == "3\n"